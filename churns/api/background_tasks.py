@@ -1,7 +1,5 @@
 import asyncio
-import json
 import traceback
-import base64
 import os
 from datetime import datetime
 from typing import Dict, Any, Optional
@@ -14,7 +12,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from churns.api.database import (
     get_session, PipelineRun, PipelineStage, RefinementJob,
     RunStatus, StageStatus, engine, async_session_factory,
-    retry_db_operation
+    retry_db_operation, STAGE_RESOURCE_COLUMNS, STAGE_TOKEN_COLUMNS
 )
 from churns.pipeline.executor import PipelineExecutor
 from churns.api.schemas import (
@@ -24,6 +22,18 @@ from churns.api.schemas import (
 from churns.api.websocket import connection_manager
 from churns.pipeline.context import PipelineContext
 from churns.core.input_normalizer import normalize_unified_brief_into_context
+from churns.core.image_registry import lookup_image, run_directory, KIND_ORIGINAL, KIND_REFINEMENT
+from churns.core.refinements_index import append_refinement
+from churns.core.caption_index import caption_directory, record_caption_result, release_caption_version
+from churns.core.artifact_writer import write_bytes_atomic
+from churns.core.blob_store import link_blob
+from churns.core.serialization import dumps, dumps_str, read_json_file, to_jsonable
+from churns.core.run_metadata import (
+    REFINEMENT_SECTIONS, has_run_metadata, load_run_metadata, run_metadata_path, write_run_metadata
+)
+from churns.core.service_metrics import RUNS_QUEUED, observe_costs
+from churns.core.tracing import current_trace_id, set_trace_output_directory, start_span, traced_run
+from churns.core.run_profiler import profiled_run
 from churns.core.constants import (
     MODEL_PRICING, 
     IMAGE_ASSESSMENT_MODEL_ID,
@@ -39,7 +49,6 @@ from churns.core.constants import (
 )
 from churns.core.model_selector import get_caption_model_for_processing_mode
 from churns.core.token_cost_manager import get_token_cost_manager, calculate_stage_cost_from_usage
-from churns.stages.image_assessment import ImageAssessor
 
 logger = logging.getLogger(__name__)
 
@@ -76,7 +85,15 @@ class PipelineTaskProcessor:
     def __init__(self):
         self.active_tasks: Dict[str, asyncio.Task] = {}
         self.run_timeouts: Dict[str, asyncio.Task] = {}
+        self.queued_tasks: Dict[str, str] = {}  # task ID -> pipeline mode, until its executor starts
         self.PIPELINE_TIMEOUT_SECONDS = 3600  # 1 hour timeout
+    
+    def queued_counts(self) -> Dict[tuple, int]:
+        """Number of accepted tasks per mode that have not started executing stages"""
+        counts: Dict[tuple, int] = {}
+        for mode in list(self.queued_tasks.values()):
+            counts[(mode,)] = counts.get((mode,), 0) + 1
+        return counts
         
     async def _check_run_timeout(self, run_id: str):
         """Check if a run has exceeded the timeout limit"""
@@ -164,6 +181,7 @@ class PipelineTaskProcessor:
         # Create and start the background task (don't update status to RUNNING here)
         task = asyncio.create_task(self._execute_pipeline(run_id, request, image_data, executor))
         self.active_tasks[run_id] = task
+        self.queued_tasks[run_id] = "generation"
         
         # Start timeout monitor
         timeout_task = asyncio.create_task(self._check_run_timeout(run_id))
@@ -172,6 +190,7 @@ class PipelineTaskProcessor:
         # Clean up completed tasks
         def cleanup_tasks(t):
             self.active_tasks.pop(run_id, None)
+            self.queued_tasks.pop(run_id, None)
             if run_id in self.run_timeouts:
                 self.run_timeouts[run_id].cancel()
         
@@ -179,6 +198,8 @@ class PipelineTaskProcessor:
         
         logger.info(f"Started background pipeline task for run {run_id} - task in active_tasks: {run_id in self.active_tasks}")
     
+    @traced_run("run.generation", "run_id")
+    @profiled_run("generation", "run_id")
     async def _execute_pipeline(self, run_id: str, request: PipelineRunRequest, image_data: Optional[bytes] = None, executor: Optional[PipelineExecutor] = None):
         """Execute the complete pipeline with progress updates"""
         logger.info(f"_execute_pipeline called for run {run_id}")
@@ -211,14 +232,19 @@ class PipelineTaskProcessor:
             # Create output directory
             output_dir = Path(f"./data/runs/{run_id}")
             output_dir.mkdir(parents=True, exist_ok=True)
+            set_trace_output_directory(str(output_dir))
             
             # Save uploaded image if provided
             image_path = None
-            if image_data and request.image_reference:
+            if request.image_reference and (request.image_reference.blob_sha256 or image_data):
                 image_filename = f"input_{request.image_reference.filename}"
                 image_path = output_dir / image_filename
-                with open(image_path, "wb") as f:
-                    f.write(image_data)
+                if request.image_reference.blob_sha256:
+                    # Linked from the blob store, no second copy
+                    await asyncio.to_thread(link_blob, request.image_reference.blob_sha256, image_path)
+                else:
+                    with open(image_path, "wb") as f:
+                        f.write(image_data)
                 logger.info(f"Saved input image to {image_path}")
             
             # Convert request to pipeline context format (matching original notebook)
@@ -453,21 +479,27 @@ class PipelineTaskProcessor:
                 
                 await self._send_stage_update(
                     run_id, stage_name, stage_order, status, 
-                    enhanced_message, output_data, error_message, duration_seconds
+                    enhanced_message, output_data, error_message, duration_seconds,
+                    resources=context.stage_resources.get(stage_name) if status != StageStatus.RUNNING else None,
+                    token_usage=context.stage_token_usage.get(stage_name) if status != StageStatus.RUNNING else None
                 )
             
             # Execute pipeline - use provided executor or create fallback
             if executor is None:
-                logger.warning("No executor provided, creating new instance (this should not happen in production)")
-                from churns.pipeline.executor import PipelineExecutor
-                executor = PipelineExecutor()
+                logger.warning("No executor provided, using the shared instance (this should not happen in production)")
+                from churns.pipeline.executor import get_pipeline_executor
+                executor = get_pipeline_executor("generation")
             
             # Pass database session to executor for preset loading
+            self.queued_tasks.pop(run_id, None)
+            context.partial_output_callback = connection_manager.partial_output_forwarder(run_id)
             async with async_session_factory() as session:
                 await executor.run_async(context, progress_callback, session)
             
             # Calculate final cost summary using actual LLM usage data
             await self._calculate_final_cost_summary(context)
+            if isinstance(context.cost_summary, dict):
+                observe_costs("generation", context.cost_summary.get("stage_costs") or [])
             
             # Process results
             await self._process_pipeline_results(run_id, context, str(output_dir))
@@ -625,6 +657,7 @@ class PipelineTaskProcessor:
         # Create and start the background task
         task = asyncio.create_task(self._execute_refinement(job_id, refinement_data, executor))
         self.active_tasks[job_id] = task
+        self.queued_tasks[job_id] = "refinement"
         
         # Start timeout monitor (shorter timeout for refinements)
         refinement_timeout = 1800  # 30 minutes for refinements
@@ -634,6 +667,7 @@ class PipelineTaskProcessor:
         # Clean up completed tasks
         def cleanup_tasks(t):
             self.active_tasks.pop(job_id, None)
+            self.queued_tasks.pop(job_id, None)
             if job_id in self.run_timeouts:
                 self.run_timeouts[job_id].cancel()
         
@@ -685,6 +719,8 @@ class PipelineTaskProcessor:
                 {"type": "timeout"}
             )
 
+    @traced_run("run.refinement", "job_id")
+    @profiled_run("refinement", "job_id")
     async def _execute_refinement(self, job_id: str, refinement_data: Dict[str, Any], executor: Optional[PipelineExecutor] = None):
         """Execute the refinement pipeline with progress updates"""
         try:
@@ -765,6 +801,7 @@ class PipelineTaskProcessor:
                 context.prompt = refinement_data.get("prompt")
                 context.mask_coordinates = refinement_data.get("mask_coordinates")  # Legacy support
                 context.mask_file_path = refinement_data.get("mask_file_path")  # New mask file support
+                context.mask_sha256 = refinement_data.get("mask_sha256")
                 
                 # Handle optional reference image for prompt refinement
                 reference_image_path = refinement_data.get("reference_image_path")
@@ -774,13 +811,15 @@ class PipelineTaskProcessor:
                     else:
                         context.reference_image_path = str(parent_run_dir / reference_image_path)
             
+            context.reference_image_sha256 = refinement_data.get("reference_image_sha256")
+            
             # Load parent run metadata for context enhancement
-            metadata_path = parent_run_dir / "pipeline_metadata.json"
-            if metadata_path.exists():
-                with open(metadata_path, 'r') as f:
-                    context.original_pipeline_data = json.load(f)
+            if has_run_metadata(parent_run_dir):
+                context.original_pipeline_data = await asyncio.to_thread(
+                    load_run_metadata, parent_run_dir, REFINEMENT_SECTIONS
+                )
             else:
-                logger.warning(f"No pipeline metadata found at {metadata_path}")
+                logger.warning(f"No pipeline metadata found in {parent_run_dir}")
                 context.original_pipeline_data = {"processing_context": {}, "user_inputs": {}}
             
             # Initialize cost tracking
@@ -828,11 +867,13 @@ class PipelineTaskProcessor:
             
             # Execute refinement pipeline - use shared executor if available
             if executor is None:
-                logger.warning("No executor provided, creating new refinement instance (this should not happen in production)")
-                from churns.pipeline.executor import PipelineExecutor
-                executor = PipelineExecutor(mode="refinement")
+                logger.warning("No executor provided, using the shared refinement instance (this should not happen in production)")
+                from churns.pipeline.executor import get_pipeline_executor
+                executor = get_pipeline_executor("refinement")
             
+            self.queued_tasks.pop(job_id, None)
             await executor.run_async(context, refinement_progress_callback)
+            observe_costs("refinement", stage_costs)
             
             # Update job with results using database_updates from save_outputs stage
             async with async_session_factory() as session:
@@ -932,31 +973,13 @@ class PipelineTaskProcessor:
                 logger.warning(f"Cannot send error notification for refinement {job_id} - job details not available")
 
     async def _update_refinements_index(self, refinement_result):
-        """Update the refinements.json index file"""
+        """Append the refinement to the run's refinements index"""
         try:
-            parent_run_dir = Path(f"./data/runs/{refinement_result['parent_run_id']}")
-            refinements_file = parent_run_dir / "refinements.json"
-            
-            # Load existing refinements or create new structure
-            if refinements_file.exists():
-                with open(refinements_file, 'r') as f:
-                    refinements_data = json.load(f)
-            else:
-                logger.info(f"Refinements file {refinements_file} does not exist, creating new")
-                refinements_data = {
-                    "refinements": [],
-                    "total_cost": 0.0,
-                    "total_refinements": 0
-                }
-            
-            refinements_data["refinements"].append(refinement_result)
-            refinements_data["total_cost"] += refinement_result["cost_usd"]
-            refinements_data["total_refinements"] = len(refinements_data["refinements"])
-            
-            # Save updated index
-            with open(refinements_file, 'w') as f:
-                json.dump(refinements_data, f, indent=2)
-            
+            await asyncio.to_thread(
+                append_refinement,
+                run_directory(refinement_result['parent_run_id']),
+                refinement_result
+            )
             logger.info(f"Updated refinements index for run {refinement_result['job_id']}")
             
         except Exception as e:
@@ -964,42 +987,34 @@ class PipelineTaskProcessor:
 
     def _get_parent_image_path(self, job: RefinementJob) -> str:
         """Get the relative path to the parent image"""        
+        run_dir = run_directory(job.parent_run_id)
         if job.parent_image_type == "original":
-            # Directory where originals are stored
-            originals_dir = Path(f"./data/runs/{job.parent_run_id}").resolve()
-            if not os.path.exists(originals_dir):
-                raise FileNotFoundError(f"Originals directory does not exist: {originals_dir}")
-            # Patterns: with and without timestamp
-            patterns = [
-                f"edited_image_strategy_{job.generation_index}.png",
-                f"edited_image_strategy_{job.generation_index}_*.png"
-            ]
-            matches = []
-            for pattern in patterns:
-                matches.extend(originals_dir.glob(pattern))
-            matches = list(set(matches))  # Remove duplicates if any
-
-            logger.info(f"Searching for parent image with patterns {patterns} in {originals_dir}")
-            if not matches:
-                raise FileNotFoundError(f"No image found for patterns: {patterns} in {originals_dir}")
-            matches.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-            logger.info(f"Found parent image: {matches[0]}")
-            return str(matches[0].relative_to(originals_dir))
+            entry = lookup_image(run_dir, KIND_ORIGINAL, job.generation_index)
+            if not entry:
+                raise FileNotFoundError(f"No image registered for generation index {job.generation_index} in {run_dir}")
+            logger.info(f"Found parent image: {entry['path']}")
+            return entry["path"]
         else:
-            # It's a refinement, need to look up the path
+            # It's a refinement, look up the registered output path
+            entry = lookup_image(run_dir, KIND_REFINEMENT, job.parent_image_id)
+            if entry:
+                return entry["path"]
             return f"refinements/{job.parent_image_id}_from_{job.generation_index}.png"
     
     async def _send_stage_update(self, run_id: str, stage_name: str, stage_order: int, 
                                 status: StageStatus, message: str, 
                                 output_data: Optional[Dict] = None,
                                 error_message: Optional[str] = None,
-                                duration_seconds: Optional[float] = None):
+                                duration_seconds: Optional[float] = None,
+                                resources: Optional[Dict[str, Any]] = None,
+                                token_usage: Optional[Dict[str, Any]] = None):
         """Send stage progress update via WebSocket"""
         
         # Update database and capture values for WebSocket
         stage_started_at = None
         stage_completed_at = None
         stage_duration_seconds = duration_seconds
+        stage_resources = {column: (resources or {}).get(column) for column in STAGE_RESOURCE_COLUMNS}
         
         # Check if this is a refinement job by trying to find it in refinement_jobs table
         is_refinement_job = False
@@ -1050,10 +1065,18 @@ class PipelineTaskProcessor:
                     stage.duration_seconds = duration_seconds
                 
                 if output_data:
-                    stage.output_data = json.dumps(output_data)
+                    stage.output_data = dumps_str(output_data)
                 
                 if error_message:
                     stage.error_message = error_message
+                
+                if resources:
+                    for column, value in stage_resources.items():
+                        setattr(stage, column, value)
+                
+                if token_usage:
+                    for column in STAGE_TOKEN_COLUMNS:
+                        setattr(stage, column, token_usage.get(column))
                     
                 session.add(stage)
                 await session.commit()
@@ -1076,7 +1099,8 @@ class PipelineTaskProcessor:
             duration_seconds=stage_duration_seconds,
             message=message,
             output_data=output_data,
-            error_message=error_message
+            error_message=error_message,
+            **stage_resources
         )
         
         # Determine pipeline mode based on context
@@ -1146,8 +1170,9 @@ class PipelineTaskProcessor:
                 "size_bytes": request.image_reference.size_bytes,
                 "instruction": request.image_reference.instruction,
                 "saved_image_path_in_run_dir": str(image_path),
+                "blob_sha256": request.image_reference.blob_sha256,
                 "image_content_base64": None,  # Will be populated when needed
-                "_image_data_bytes": image_data  # Store raw bytes temporarily
+                "_image_data_bytes": image_data  # Legacy callers only; streamed uploads are read from the run dir
             }
         
         # Add marketing goals if provided
@@ -1159,27 +1184,28 @@ class PipelineTaskProcessor:
                 "niche": request.marketing_goals.niche
             }
 
-        # Add brand kit and handle logo upload - only if branding is enabled
-        if pipeline_data["user_inputs"]["brand_kit"] and pipeline_data["user_inputs"]["brand_kit"].get("logo_file_base64") and request.apply_branding:
-            brand_kit_data = pipeline_data["user_inputs"]["brand_kit"]
-            try:
-                # Decode the base64 string
-                header, encoded = brand_kit_data["logo_file_base64"].split(",", 1)
-                logo_bytes = base64.b64decode(encoded)
-                
-                # Save the logo file
-                logo_filename = "logo.png"
-                logo_path = Path(output_dir) / logo_filename
-                with open(logo_path, "wb") as f:
-                    f.write(logo_bytes)
-                
-                # Add the saved path to the context data
-                brand_kit_data["saved_logo_path_in_run_dir"] = str(logo_path)
-                logger.info(f"Saved brand logo to {logo_path}")
-
-            except Exception as e:
-                logger.error(f"Failed to decode or save brand logo: {e}")
+        # Add brand kit and link its logo into the run directory - only if branding is enabled
+        brand_kit_data = pipeline_data["user_inputs"]["brand_kit"]
+        if brand_kit_data and request.apply_branding and (
+            brand_kit_data.get("logo_file_base64") or brand_kit_data.get("logo_blob_sha256")
+        ):
+            if not brand_kit_data.get("logo_blob_sha256"):
+                # The router stores logos before saving the run; a blob taken here
+                # would be recorded on no row and never released
+                logger.warning("Ignoring inline brand logo that was not stored by the API router")
                 brand_kit_data["saved_logo_path_in_run_dir"] = None
+            else:
+                try:
+                    logo_filename = "logo.png"
+                    logo_path = link_blob(brand_kit_data["logo_blob_sha256"], Path(output_dir) / logo_filename)
+
+                    # Add the saved path to the context data
+                    brand_kit_data["saved_logo_path_in_run_dir"] = str(logo_path)
+                    logger.info(f"Linked brand logo {brand_kit_data['logo_blob_sha256'][:12]} to {logo_path}")
+
+                except Exception as e:
+                    logger.error(f"Failed to link brand logo: {e}")
+                    brand_kit_data["saved_logo_path_in_run_dir"] = None
             
             # Remove base64 from context to avoid oversized metadata
             brand_kit_data.pop("logo_file_base64", None)
@@ -1200,8 +1226,8 @@ class PipelineTaskProcessor:
     async def _process_pipeline_results(self, run_id: str, context: PipelineContext, output_dir: str):
         """Process and save pipeline results"""
         try:
-            # Save complete pipeline metadata as JSON
-            metadata_path = Path(output_dir) / "pipeline_metadata.json"
+            # Save complete pipeline metadata in sections (see churns.core.run_metadata)
+            metadata_path = run_metadata_path(output_dir)
             
             # Ensure context has valid data
             if not context or not context.data:
@@ -1212,7 +1238,7 @@ class PipelineTaskProcessor:
             
             # Create a sanitized version for saving (remove base64 data)
             try:
-                sanitized_data = json.loads(json.dumps(context.data, default=str))
+                sanitized_data = to_jsonable(context.data)
             except Exception as e:
                 logger.error(f"Failed to serialize context data for run {run_id}: {e}")
                 sanitized_data = {"error": "Failed to serialize pipeline data", "processing_context": {}}
@@ -1255,8 +1281,13 @@ class PipelineTaskProcessor:
                     sanitized_data["pipeline_settings"]["pipeline_mode"] = "style_adaptation"
                     sanitized_data["pipeline_settings"]["adaptation_type"] = "subject_substitution" if getattr(context, 'image_reference', None) else "prompt_override"
             
-            with open(metadata_path, 'w') as f:
-                json.dump(sanitized_data, f, indent=2)
+            # Trace ID links the metadata to the run's trace (see churns.core.tracing)
+            trace_id = current_trace_id()
+            if trace_id and isinstance(sanitized_data, dict):
+                sanitized_data.setdefault("pipeline_settings", {})["trace_id"] = trace_id
+            
+            with start_span("metadata.write", path=str(metadata_path)):
+                await asyncio.to_thread(write_run_metadata, output_dir, sanitized_data)
             
             # Update database with metadata path
             async with async_session_factory() as session:
@@ -1749,15 +1780,19 @@ class PipelineTaskProcessor:
         # Create and start the background task
         task = asyncio.create_task(self._execute_caption_generation(caption_id, caption_data, executor))
         self.active_tasks[caption_id] = task
+        self.queued_tasks[caption_id] = "caption"
         
         # Clean up completed tasks
         def cleanup_tasks(t):
             self.active_tasks.pop(caption_id, None)
+            self.queued_tasks.pop(caption_id, None)
         
         task.add_done_callback(cleanup_tasks)
         
         logger.info(f"Started background caption generation task for {caption_id}")
 
+    @traced_run("run.caption", "caption_id")
+    @profiled_run("caption", "caption_id")
     async def _execute_caption_generation(self, caption_id: str, caption_data: Dict[str, Any], executor: Optional[PipelineExecutor] = None):
         """Execute caption generation with real-time updates"""
         try:
@@ -1799,21 +1834,23 @@ class PipelineTaskProcessor:
                 operation_name=f"load run metadata for caption {caption_id}"
             )
             
-            # Load metadata from the original run
-            metadata_path = Path(run.output_directory) / "pipeline_metadata.json"
-            if not metadata_path.exists():
-                raise Exception(f"Metadata file not found: {metadata_path}")
+            # Load metadata from the original run (results and costs are not used for captions)
+            if not has_run_metadata(run.output_directory):
+                raise Exception(f"Metadata not found for run {run_id} in {run.output_directory}")
             
-            with open(metadata_path, 'r') as f:
-                metadata = json.load(f)
+            metadata = await asyncio.to_thread(
+                load_run_metadata, run.output_directory, ("settings", "strategies", "concepts")
+            )
             
             # Create a pipeline context from the metadata for caption generation
             context = PipelineContext.from_dict(metadata)
+            context.output_directory = run.output_directory
             
             # Add caption-specific settings to context
             context.caption_settings = settings
             context.caption_version = version
             context.regenerate_writer_only = writer_only
+            context.refresh_caption_brief = caption_data.get("refresh_brief", False)
             
             # Load cached brief for writer-only regeneration
             if writer_only and "previous_version" in caption_data:
@@ -1821,8 +1858,7 @@ class PipelineTaskProcessor:
                 brief_file = Path(run.output_directory) / "captions" / image_id / f"v{previous_version}_brief.json"
                 if brief_file.exists():
                     try:
-                        with open(brief_file, 'r', encoding='utf-8') as f:
-                            brief_data = json.load(f)
+                        brief_data = await asyncio.to_thread(read_json_file, brief_file)
                         
                         # Import CaptionBrief model to recreate the object
                         from churns.models import CaptionBrief
@@ -1863,9 +1899,9 @@ class PipelineTaskProcessor:
             
             # Execute caption pipeline using shared executor if available
             if executor is None:
-                logger.warning("No executor provided, creating new caption instance (this should not happen in production)")
-                from churns.pipeline.executor import PipelineExecutor
-                executor = PipelineExecutor(mode="caption")
+                logger.warning("No executor provided, using the shared caption instance (this should not happen in production)")
+                from churns.pipeline.executor import get_pipeline_executor
+                executor = get_pipeline_executor("caption")
             
             # Set up progress callback for caption generation
             async def caption_progress_callback(stage_name: str, stage_order: int, status: StageStatus, 
@@ -1892,8 +1928,12 @@ class PipelineTaskProcessor:
             
             # Set the selected model ID in context for the caption stage to use
             context.caption_model_id = model_id
+            context.partial_output_callback = connection_manager.partial_output_forwarder(
+                run_id, caption_id=caption_id, image_id=image_id
+            )
             
             # Run the caption stage through the executor
+            self.queued_tasks.pop(caption_id, None)
             await executor.run_async(context, caption_progress_callback)
             
             # Extract the generated caption
@@ -1913,12 +1953,6 @@ class PipelineTaskProcessor:
                 caption_dir.mkdir(parents=True, exist_ok=True)
                 
                 caption_file = caption_dir / f"v{version}.txt"
-                with open(caption_file, 'w', encoding='utf-8') as f:
-                    f.write(caption_text)
-                
-                brief_file = caption_dir / f"v{version}_brief.json"
-                with open(brief_file, 'w', encoding='utf-8') as f:
-                    json.dump(caption_result["brief_used"], f, indent=2)
                 
                 # Create streamlined usage summary
                 analyst_usage = context.llm_usage.get("caption_analyst", {})
@@ -1945,6 +1979,11 @@ class PipelineTaskProcessor:
                     writer_latency = writer_usage.get("latency_seconds", 0)
                     total_latency += writer_latency
                 
+                observe_costs("caption", [
+                    {"stage_name": "caption_analyst", "cost_usd": analyst_cost},
+                    {"stage_name": "caption_writer", "cost_usd": writer_cost}
+                ])
+                
                 usage_summary = {
                     "total_cost_usd": round(total_cost, 6),
                     "total_latency_seconds": round(total_latency, 3),
@@ -1970,17 +2009,18 @@ class PipelineTaskProcessor:
                 }
 
                 # Also save caption result with metadata to match pipeline pattern
-                result_file = caption_dir / f"v{version}_result.json"
-                with open(result_file, 'w', encoding='utf-8') as f:
-                    json.dump({
-                        "text": caption_text,
-                        "version": version,
-                        "settings_used": caption_result.get("settings_used", {}),
-                        "brief_used": caption_result["brief_used"],
-                        "created_at": caption_result.get("created_at"),
-                        "model_id": model_id,  # Save the model used
-                        "usage_summary": usage_summary
-                    }, f, indent=2)
+                result_record = {
+                    "text": caption_text,
+                    "version": version,
+                    "settings_used": caption_result.get("settings_used", {}),
+                    "brief_used": caption_result["brief_used"],
+                    "created_at": caption_result.get("created_at"),
+                    "model_id": model_id,  # Save the model used
+                    "usage_summary": usage_summary
+                }
+                await asyncio.to_thread(
+                    self._write_caption_version, caption_dir, caption_id, result_record
+                )
                 
                 # Send success update
                 success_message = WebSocketMessage(
@@ -2008,6 +2048,16 @@ class PipelineTaskProcessor:
             error_traceback = traceback.format_exc()
             logger.error(f"Caption generation {caption_id} failed: {error_message}\n{error_traceback}")
             
+            # Free the reserved version so the next request can reuse it
+            try:
+                await asyncio.to_thread(
+                    release_caption_version,
+                    caption_directory(caption_data["run_id"], caption_data["image_id"]),
+                    caption_data.get("version", 0)
+                )
+            except Exception as release_error:
+                logger.warning(f"Could not release caption version for {caption_id}: {release_error}")
+            
             # Send error notification
             error_message_obj = WebSocketMessage(
                 type=WSMessageType.CAPTION_ERROR,
@@ -2021,6 +2071,21 @@ class PipelineTaskProcessor:
             )
             await connection_manager.send_message_to_run(run_id, error_message_obj)
 
+    def _write_caption_version(self, caption_dir: Path, caption_id: str, result_record: Dict[str, Any]):
+        """Atomically write a caption version's files, then mark it completed in the manifest"""
+        version = result_record["version"]
+        write_bytes_atomic(result_record["text"].encode("utf-8"), caption_dir / f"v{version}.txt")
+        write_bytes_atomic(
+            dumps(result_record["brief_used"], indent=True),
+            caption_dir / f"v{version}_brief.json"
+        )
+        write_bytes_atomic(
+            dumps(result_record, indent=True),
+            caption_dir / f"v{version}_result.json"
+        )
+        # The manifest update is the commit point for listings
+        record_caption_result(caption_dir, version, result_record, caption_id=caption_id)
+
     async def run_noise_assessment_for_refinement(self, job_id: str, executor: Optional[PipelineExecutor] = None):
         """Run noise assessment for a completed refinement job"""
         try:
@@ -2109,6 +2174,7 @@ class PipelineTaskProcessor:
                     return
                 
                 # Create assessor with shared pre-configured client
+                from churns.stages.image_assessment import ImageAssessor
                 model_id = model_config.get('IMAGE_ASSESSMENT_MODEL_ID', IMAGE_ASSESSMENT_MODEL_ID)
                 assessor = ImageAssessor(model_id=model_id, client=image_assessment_client)
                 
@@ -2165,4 +2231,5 @@ class PipelineTaskProcessor:
 
 
 # Global task processor instance
-task_processor = PipelineTaskProcessor() 
\ No newline at end of file
+task_processor = PipelineTaskProcessor()
+RUNS_QUEUED.set_function(task_processor.queued_counts) 
\ No newline at end of file
@@ -1,16 +1,22 @@
-from typing import Optional, Callable, TypeVar, Any
+from typing import Optional, Callable, TypeVar, Any, Iterable, List
 from sqlalchemy import Column, DateTime, Text, JSON, text, event
 from sqlalchemy.sql import func
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import OperationalError
-from sqlmodel import SQLModel, Field
+from sqlmodel import SQLModel, Field, Session, select
 import uuid
 from datetime import datetime
 from enum import Enum
 from churns.models.presets import PipelineInputSnapshot, StyleRecipeData
 from churns.models import LogoAnalysisResult
+from churns.core.service_metrics import DB_LOCK_RETRIES
+from churns.core.blob_store import brand_kit_logo_hash, link_blob, put_blob, store_brand_kit_logo
+from churns.core.tracing import start_span
+import json
 import logging
+import mimetypes
+import os
 import asyncio
 import random
 
@@ -19,6 +25,14 @@ logger = logging.getLogger(__name__)
 
 T = TypeVar('T')
 
+# Number of "database is locked" retries since startup (reported by benchmarks and metrics)
+db_lock_retry_count = 0
+
+
+def get_db_lock_retry_count() -> int:
+    """Total lock-contention retries performed by retry_db_operation."""
+    return db_lock_retry_count
+
 
 async def retry_db_operation(
     operation: Callable[[], T], 
@@ -43,6 +57,7 @@ async def retry_db_operation(
     Raises:
         OperationalError: If all retries are exhausted
     """
+    global db_lock_retry_count
     last_error = None
     
     for attempt in range(max_retries + 1):
@@ -59,13 +74,17 @@ async def retry_db_operation(
                 logger.error(f"Failed to execute {operation_name} after {max_retries} retries. Last error: {e}")
                 raise
             
+            db_lock_retry_count += 1
+            DB_LOCK_RETRIES.inc()
+            
             # Calculate delay with exponential backoff and jitter
             delay = min(base_delay * (2 ** attempt), max_delay)
             jitter = random.uniform(0, delay * 0.1)  # Add up to 10% jitter
             total_delay = delay + jitter
             
             logger.warning(f"Database locked during {operation_name}, retrying in {total_delay:.2f}s (attempt {attempt + 1}/{max_retries})")
-            await asyncio.sleep(total_delay)
+            with start_span("db.lock_retry", operation=operation_name, attempt=attempt + 1, delay_seconds=round(total_delay, 3)):
+                await asyncio.sleep(total_delay)
     
     # This should never be reached, but just in case
     if last_error:
@@ -123,6 +142,7 @@ class PipelineRun(SQLModel, table=True):
     # Image reference
     has_image_reference: bool = Field(default=False)
     image_filename: Optional[str] = Field(default=None)
+    image_blob_sha256: Optional[str] = Field(default=None, description="SHA-256 of the uploaded image in the blob store")
     image_instruction: Optional[str] = Field(default=None)
 
     # Brand Kit data (UPDATED: unified brand kit structure)
@@ -197,6 +217,8 @@ class RefinementJob(SQLModel, table=True):
     instructions: Optional[str] = Field(None, description="Specific instructions")
     mask_data: Optional[str] = Field(None, sa_column=Column(Text), description="JSON string of mask coordinates")
     reference_image_path: Optional[str] = Field(None, description="Path to reference image for subject repair")
+    reference_blob_sha256: Optional[str] = Field(default=None, description="SHA-256 of the reference image in the blob store")
+    mask_blob_sha256: Optional[str] = Field(default=None, description="SHA-256 of the mask in the blob store")
 
 
 class PipelineStage(SQLModel, table=True):
@@ -218,10 +240,19 @@ class PipelineStage(SQLModel, table=True):
     model_id: Optional[str] = Field(default=None)
     provider: Optional[str] = Field(default=None)
     input_tokens: Optional[int] = Field(default=None)
+    cached_input_tokens: Optional[int] = Field(default=None, description="Input tokens served from the provider's prompt cache")
     output_tokens: Optional[int] = Field(default=None)
     images_generated: Optional[int] = Field(default=None)
     stage_cost_usd: Optional[float] = Field(default=None)
     
+    # Resource accounting (see churns.core.stage_resources)
+    cpu_seconds: Optional[float] = Field(default=None, description="Process CPU time during the stage")
+    peak_memory_delta_bytes: Optional[int] = Field(default=None, description="Peak memory above the stage's starting point")
+    io_read_bytes: Optional[int] = Field(default=None)
+    io_write_bytes: Optional[int] = Field(default=None)
+    provider_wait_seconds: Optional[float] = Field(default=None, description="Wall time waiting on provider calls")
+    local_compute_seconds: Optional[float] = Field(default=None, description="Wall time not spent waiting on providers")
+    
     # Results and errors
     output_data: Optional[str] = Field(default=None, sa_column=Column(Text))  # JSON string
     error_message: Optional[str] = Field(default=None)
@@ -264,6 +295,7 @@ class BrandPreset(SQLModel, table=True):
 
 # Database configuration - Updated to use async with improved settings
 DATABASE_URL = "sqlite+aiosqlite:///./data/runs.db"
+SYNC_DATABASE_URL = "sqlite:///./data/runs.db"
 engine = create_async_engine(
     DATABASE_URL, 
     echo=False,
@@ -384,6 +416,172 @@ async def migrate_pipeline_runs_preset_fields():
         # Don't raise the error to avoid breaking the app startup
 
 
+STAGE_RESOURCE_COLUMNS = {
+    "cpu_seconds": "FLOAT",
+    "peak_memory_delta_bytes": "INTEGER",
+    "io_read_bytes": "INTEGER",
+    "io_write_bytes": "INTEGER",
+    "provider_wait_seconds": "FLOAT",
+    "local_compute_seconds": "FLOAT",
+}
+
+
+async def migrate_pipeline_stages_resource_fields():
+    """Migration to add the per-stage resource accounting columns to pipeline_stages"""
+    try:
+        async with engine.begin() as conn:
+            result = await conn.execute(text("PRAGMA table_info(pipeline_stages)"))
+            columns = [row[1] for row in result.fetchall()]
+            
+            for column, column_type in STAGE_RESOURCE_COLUMNS.items():
+                if column not in columns:
+                    await conn.execute(text(f"ALTER TABLE pipeline_stages ADD COLUMN {column} {column_type}"))
+                    logger.info(f"Added {column} column to pipeline_stages table")
+                
+    except Exception as e:
+        logger.error(f"Failed to migrate pipeline_stages table: {e}")
+        # Don't raise the error to avoid breaking the app startup
+
+
+# Per-stage token accounting (see churns.core.prompt_cache_accounting)
+STAGE_TOKEN_COLUMNS = {
+    "model_id": "VARCHAR",
+    "input_tokens": "INTEGER",
+    "cached_input_tokens": "INTEGER",
+    "output_tokens": "INTEGER",
+}
+
+
+async def migrate_pipeline_stages_token_fields():
+    """Migration to add the per-stage token accounting columns to pipeline_stages"""
+    try:
+        async with engine.begin() as conn:
+            result = await conn.execute(text("PRAGMA table_info(pipeline_stages)"))
+            columns = [row[1] for row in result.fetchall()]
+            
+            for column, column_type in STAGE_TOKEN_COLUMNS.items():
+                if column not in columns:
+                    await conn.execute(text(f"ALTER TABLE pipeline_stages ADD COLUMN {column} {column_type}"))
+                    logger.info(f"Added {column} column to pipeline_stages table")
+                
+    except Exception as e:
+        logger.error(f"Failed to migrate pipeline_stages table: {e}")
+        # Don't raise the error to avoid breaking the app startup
+
+
+def _store_run_input_image(run_dir: str, image_filename: str) -> Optional[str]:
+    """Move a run's saved input image into the blob store; its hash, or None if the file is gone."""
+    image_path = os.path.join(run_dir, f"input_{image_filename}")
+    try:
+        with open(image_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    sha256 = put_blob(data, mimetypes.guess_type(image_filename)[0]).sha256
+    # Share the stored content instead of keeping a second copy
+    link_blob(sha256, image_path)
+    return sha256
+
+
+async def migrate_pipeline_runs_blob_fields():
+    """Migration to add the uploaded image's blob hash to pipeline_runs and backfill it for existing runs"""
+    try:
+        async with engine.begin() as conn:
+            result = await conn.execute(text("PRAGMA table_info(pipeline_runs)"))
+            columns = [row[1] for row in result.fetchall()]
+            
+            if 'image_blob_sha256' not in columns:
+                await conn.execute(text("ALTER TABLE pipeline_runs ADD COLUMN image_blob_sha256 VARCHAR"))
+                logger.info("Added image_blob_sha256 column to pipeline_runs table")
+            
+            # Runs created before the blob store only have the image in their directory
+            result = await conn.execute(text(
+                "SELECT id, output_directory, image_filename FROM pipeline_runs "
+                "WHERE image_blob_sha256 IS NULL AND image_filename IS NOT NULL"
+            ))
+            backfilled = 0
+            for run_id, output_directory, image_filename in result.fetchall():
+                run_dir = output_directory or os.path.join("data", "runs", run_id)
+                try:
+                    sha256 = await asyncio.to_thread(_store_run_input_image, run_dir, image_filename)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Skipping input image of run {run_id}: {e}")
+                    continue
+                if sha256:
+                    await conn.execute(
+                        text("UPDATE pipeline_runs SET image_blob_sha256 = :sha256 WHERE id = :id"),
+                        {"sha256": sha256, "id": run_id}
+                    )
+                    backfilled += 1
+            if backfilled:
+                logger.info(f"Moved {backfilled} run input images into the blob store")
+                
+    except Exception as e:
+        logger.error(f"Failed to migrate pipeline_runs table: {e}")
+        # Don't raise the error to avoid breaking the app startup
+
+
+async def migrate_refinement_jobs_blob_fields():
+    """Migration to add the reference image and mask blob hashes to refinement_jobs"""
+    try:
+        async with engine.begin() as conn:
+            result = await conn.execute(text("PRAGMA table_info(refinement_jobs)"))
+            columns = [row[1] for row in result.fetchall()]
+            
+            for column in ("reference_blob_sha256", "mask_blob_sha256"):
+                if column not in columns:
+                    await conn.execute(text(f"ALTER TABLE refinement_jobs ADD COLUMN {column} VARCHAR"))
+                    logger.info(f"Added {column} column to refinement_jobs table")
+                
+    except Exception as e:
+        logger.error(f"Failed to migrate refinement_jobs table: {e}")
+        # Don't raise the error to avoid breaking the app startup
+
+
+def _brand_kit_with_stored_logo(raw: Any) -> Optional[str]:
+    """Re-encoded brand_kit column value with its inline logo moved to the blob store, or None if unchanged."""
+    if not raw or "logo_file_base64" not in raw:
+        return None
+    value = json.loads(raw)
+    # Rows hold json.dumps() output in a JSON column, i.e. a JSON string containing JSON
+    double_encoded = isinstance(value, str)
+    brand_kit = json.loads(value) if double_encoded else value
+    if not isinstance(brand_kit, dict) or not brand_kit.get("logo_file_base64"):
+        return None
+    brand_kit = store_brand_kit_logo(brand_kit)
+    encoded = json.dumps(brand_kit)
+    return json.dumps(encoded) if double_encoded else encoded
+
+
+async def migrate_brand_kit_logos_to_blobs():
+    """Migration moving inline base64 logos of presets and runs into the blob store"""
+    try:
+        async with engine.begin() as conn:
+            for table in ("brand_presets", "pipeline_runs"):
+                result = await conn.execute(text(
+                    f"SELECT id, brand_kit FROM {table} WHERE brand_kit LIKE '%logo_file_base64%'"
+                ))
+                migrated = 0
+                for row_id, raw in result.fetchall():
+                    try:
+                        updated = await asyncio.to_thread(_brand_kit_with_stored_logo, raw)
+                    except (ValueError, TypeError) as e:
+                        logger.warning(f"Skipping brand kit logo of {table} row {row_id}: {e}")
+                        continue
+                    if updated is not None:
+                        await conn.execute(
+                            text(f"UPDATE {table} SET brand_kit = :brand_kit WHERE id = :id"),
+                            {"brand_kit": updated, "id": row_id}
+                        )
+                        migrated += 1
+                if migrated:
+                    logger.info(f"Moved {migrated} inline logos of {table} into the blob store")
+                
+    except Exception as e:
+        logger.error(f"Failed to migrate brand kit logos: {e}")
+        # Don't raise the error to avoid breaking the app startup
+
+
 async def create_db_and_tables():
     """Create database and tables, including migrations"""
     async with engine.begin() as conn:
@@ -394,6 +592,11 @@ async def create_db_and_tables():
     # Run migrations for existing installations
     await migrate_brand_presets_add_source_fields()
     await migrate_pipeline_runs_preset_fields()
+    await migrate_pipeline_stages_resource_fields()
+    await migrate_pipeline_stages_token_fields()
+    await migrate_pipeline_runs_blob_fields()
+    await migrate_refinement_jobs_blob_fields()
+    await migrate_brand_kit_logos_to_blobs()
     
     logger.info("Database tables created and migrations applied")
 
@@ -404,6 +607,38 @@ async def get_session():
         yield session
 
 
+def run_blob_hashes(run: PipelineRun, jobs: Iterable[RefinementJob] = ()) -> List[str]:
+    """Blobs a run and its refinement jobs each hold one reference to."""
+    hashes = [run.image_blob_sha256, brand_kit_logo_hash(run.brand_kit)]
+    for job in jobs:
+        hashes.extend((job.reference_blob_sha256, job.mask_blob_sha256))
+    return [sha256 for sha256 in hashes if sha256]
+
+
+def delete_run_rows(session: Session, run: PipelineRun) -> List[str]:
+    """
+    Delete a run with its stages and refinement jobs in a sync session.
+
+    Returns the blob hashes the deleted rows held; release them with
+    ``release_blobs`` once the session has committed.
+    """
+    jobs = session.exec(select(RefinementJob).where(RefinementJob.parent_run_id == run.id)).all()
+    hashes = run_blob_hashes(run, jobs)
+    for stage in session.exec(select(PipelineStage).where(PipelineStage.run_id == run.id)).all():
+        session.delete(stage)
+    for job in jobs:
+        session.delete(job)
+    session.delete(run)
+    return hashes
+
+
+def create_sync_engine(url: str = SYNC_DATABASE_URL):
+    """Synchronous engine on the runs database, for scripts/utilities."""
+    from sqlalchemy import create_engine
+    
+    return create_engine(url, echo=False)
+
+
 # Backward compatibility function for scripts that need sync access
 def get_sync_session():
     """Get synchronous database session for scripts/utilities"""
@@ -417,6 +652,6 @@ def get_sync_session():
         stacklevel=2
     )
     
-    sync_engine = create_engine("sqlite:///./data/runs.db", echo=False)
+    sync_engine = create_engine(SYNC_DATABASE_URL, echo=False)
     with Session(sync_engine) as session:
         yield session 
\ No newline at end of file
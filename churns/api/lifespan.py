@@ -1,8 +1,14 @@
+import asyncio
 import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from churns.pipeline.executor import PipelineExecutor
+from churns.pipeline.executor import get_pipeline_executor
 from churns.api.database import create_db_and_tables
+from churns.core.artifact_writer import close_http_client
+from churns.core.loop_watchdog import EventLoopWatchdog
+from churns.core.model_pool import model_pool
+from churns.core.stage_resources import enable_tracemalloc_from_env
+from churns.core.tracing import shutdown_tracing
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,18 +27,20 @@ async def lifespan(app: FastAPI):
     os.makedirs("./data/runs", exist_ok=True)
     logger.info("Data directories created/verified")
     
+    enable_tracemalloc_from_env()
+    
     try:
         # Initialize the shared PipelineExecutor instances for all modes
         logger.info("🔧 Initializing shared PipelineExecutor instances...")
         
         # Create executors for each mode (they will share the same client configuration)
-        app.state.generation_executor = PipelineExecutor(mode="generation")
+        app.state.generation_executor = get_pipeline_executor("generation")
         logger.info("✅ Generation executor initialized successfully")
         
-        app.state.refinement_executor = PipelineExecutor(mode="refinement")
+        app.state.refinement_executor = get_pipeline_executor("refinement")
         logger.info("✅ Refinement executor initialized successfully")
         
-        app.state.caption_executor = PipelineExecutor(mode="caption")
+        app.state.caption_executor = get_pipeline_executor("caption")
         logger.info("✅ Caption executor initialized successfully")
         
         # Log executor configuration summary
@@ -54,11 +62,23 @@ async def lifespan(app: FastAPI):
         logger.error(f"❌ Failed to initialize PipelineExecutors: {e}")
         raise  # Fail fast - don't start the app if executors can't be created
     
+    # Load embedding models in the background; /health/ready waits for them
+    model_pool.warm_from_env()
+    
+    # Sample event-loop lag for /metrics and report calls that block the loop
+    app.state.loop_lag_monitor = EventLoopWatchdog.from_env()
+    app.state.loop_lag_monitor.start()
+    
     logger.info("🎉 Application startup completed successfully")
     
     yield
     
     # Shutdown (optional cleanup)
     logger.info("🛑 Shutting down Churns API...")
+    await app.state.loop_lag_monitor.stop()
     # Note: PipelineExecutors don't require explicit cleanup currently
+    await close_http_client()
+    model_pool.shutdown()
+    # Flush queued OTLP trace exports
+    await asyncio.to_thread(shutdown_tracing)
     logger.info("✅ Application shutdown completed") 
\ No newline at end of file
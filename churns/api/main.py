@@ -1,12 +1,14 @@
 import os
 import logging
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 
 from churns.api.routers import api_router
 from churns.api.lifespan import lifespan
+from churns.core.model_pool import model_pool
+from churns.core.service_metrics import render_metrics
 
 
 # Configure logging
@@ -89,6 +91,35 @@ async def health_check():
     }
 
 
+# Readiness endpoint
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness check: 503 while the warmed embedding models are loading; failed models are reported as degraded"""
+    models = model_pool.status()
+    if not models["ready"]:
+        status = "not_ready"
+    elif models["degraded"]:
+        status = "degraded"
+    else:
+        status = "ready"
+    return JSONResponse(
+        status_code=200 if models["ready"] else 503,
+        content={
+            "status": status,
+            "degraded": models["degraded"],
+            "models": models["models"]
+        }
+    )
+
+
+# Prometheus metrics endpoint
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Stage, provider, queue and event-loop metrics in Prometheus exposition format"""
+    content, content_type = render_metrics(request.headers.get("accept"))
+    return Response(content=content, headers={"Content-Type": content_type})
+
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -98,6 +129,8 @@ async def root():
         "version": "1.0.0",
         "docs": "/docs",
         "health": "/health",
+        "ready": "/health/ready",
+        "metrics": "/metrics",
         "api": "/api/v1"
     }
 
@@ -1,4 +1,4 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable, Tuple
 import os
 import json
 from pathlib import Path
@@ -8,11 +8,10 @@ import time
 import asyncio
 from datetime import datetime, timezone
 import traceback
-import base64
 
 
-from fastapi import APIRouter, HTTPException, Depends, WebSocket, UploadFile, File, Form, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Depends, WebSocket, UploadFile, File, Form, BackgroundTasks, Query, Request
+from fastapi.responses import FileResponse, Response
 from sqlmodel import select
 from sqlalchemy import desc, and_
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -20,7 +19,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from churns.api.database import (
     get_session, PipelineRun, PipelineStage, RefinementJob, RefinementType,
     RunStatus, StageStatus, create_db_and_tables, BrandPreset, PresetType,
-    retry_db_operation
+    retry_db_operation, STAGE_RESOURCE_COLUMNS
 )
 from churns.api.dependencies import get_executor, get_refinement_executor, get_caption_executor
 from churns.pipeline.executor import PipelineExecutor
@@ -33,28 +32,50 @@ from churns.api.schemas import (
     CaptionModelsResponse, CaptionModelOption,
     BrandPresetCreateRequest, BrandPresetUpdateRequest, BrandPresetResponse,
     BrandPresetListResponse, SavePresetFromResultRequest, ParentPresetInfo,
-    UnifiedBrief
+    UnifiedBrief, ProfilingRequest, ProfilingStatusResponse, PromptCacheReportResponse
 )
 from churns.api.websocket import websocket_endpoint
 from churns.api.background_tasks import task_processor
+from churns.api.uploads import BlobUploadFile, BlobUploadRoute
 from churns.core.constants import (
     SOCIAL_MEDIA_PLATFORMS, TASK_TYPES, PLATFORM_DISPLAY_NAMES,
-    CAPTION_MODEL_OPTIONS, CAPTION_MODEL_ID
+    CAPTION_MODEL_OPTIONS, CAPTION_MODEL_ID,
+    UPLOAD_CHUNK_BYTES, MAX_IMAGE_UPLOAD_BYTES, MAX_MASK_UPLOAD_BYTES
 )
 from churns.models.presets import StyleRecipeEnvelope, StyleRecipeData
 from churns.models import VisualConceptDetails, MarketingGoalSetFinal, StyleGuidance
 from churns.core.brand_kit_utils import extract_colors_from_image, generate_color_harmonies
+from churns.core.image_registry import lookup_image_path, run_directory, KIND_ORIGINAL, KIND_REFINEMENT
+from churns.core.refinements_index import get_refinement_entry
+from churns.core.caption_index import (
+    caption_directory, reserve_caption_version, get_caption_version, list_caption_versions
+)
+from churns.core.image_derivatives import (
+    DerivativeError, get_or_create_derivative, file_sha256, is_derivable
+)
+from churns.core.run_profiler import profiler_control, profiling_enabled
+from churns.core.prompt_cache_accounting import (
+    MIN_CACHEABLE_PREFIX_TOKENS, prefix_stability_report, summarize_stage_token_rows
+)
+from churns.core.serialization import loads, read_json_file
+from churns.core.run_metadata import has_run_metadata, load_run_metadata
+from churns.core.blob_store import (
+    BlobInfo, BlobTooLargeError, BlobUpload, brand_kit_logo_hash, get_blob, link_blob, put_blob, release_blob,
+    store_brand_kit_logo
+)
 
 # Create logger
 logger = logging.getLogger(__name__)
 
 # Create routers
 api_router = APIRouter(prefix="/api/v1")
-runs_router = APIRouter(prefix="/runs", tags=["Pipeline Runs"])
+runs_router = APIRouter(prefix="/runs", tags=["Pipeline Runs"], route_class=BlobUploadRoute)
 files_router = APIRouter(prefix="/files", tags=["File Operations"])
 ws_router = APIRouter(prefix="/ws", tags=["WebSocket"])
 presets_router = APIRouter(prefix="/brand-presets", tags=["Brand Presets"])
 brand_kit_utils_router = APIRouter(prefix="/brand-kit", tags=["Brand Kit Utilities"])
+admin_router = APIRouter(prefix="/admin", tags=["Admin"])
+blobs_router = APIRouter(prefix="/blobs", tags=["File Operations"])
 
 
 @api_router.on_event("startup")
@@ -177,7 +198,6 @@ async def create_pipeline_run(
         logger.info("✅ Input validation passed")
         
         # Process image file if provided
-        image_data = None
         image_reference = None
         if image_file:
             logger.info(f"📷 Processing image file: {image_file.filename}")
@@ -185,16 +205,14 @@ async def create_pipeline_run(
             if not image_file.content_type or not image_file.content_type.startswith('image/'):
                 raise HTTPException(status_code=400, detail="Uploaded file must be an image")
             
-            # Read image data
-            image_data = await image_file.read()
-            if len(image_data) > 50 * 1024 * 1024:  # 50MB limit
-                raise HTTPException(status_code=400, detail="Image file too large (max 50MB)")
-            
+            # Stream into the blob store (size limit and header check before storing)
+            image_blob = await _ingest_image_upload(image_file, MAX_IMAGE_UPLOAD_BYTES, "Image file")
             image_reference = ImageReferenceInput(
                 filename=image_file.filename or "uploaded_image",
                 content_type=image_file.content_type,
-                size_bytes=len(image_data),
-                instruction=image_instruction
+                size_bytes=image_blob.size_bytes,
+                instruction=image_instruction,
+                blob_sha256=image_blob.sha256
             )
         
         # Build marketing goals if any provided
@@ -226,6 +244,8 @@ async def create_pipeline_run(
             except json.JSONDecodeError as e:
                 logger.error(f"❌ Failed to parse brand_kit JSON: {e}")
                 raise HTTPException(status_code=400, detail="Invalid JSON format for brand_kit")
+            # The run row and metadata reference the logo by hash
+            parsed_brand_kit = await _store_brand_kit_logo(parsed_brand_kit)
         
 
         
@@ -277,6 +297,7 @@ async def create_pipeline_run(
             apply_branding=request.apply_branding,
             has_image_reference=image_reference is not None,
             image_filename=image_reference.filename if image_reference else None,
+            image_blob_sha256=image_reference.blob_sha256 if image_reference else None,
             image_instruction=image_reference.instruction if image_reference else None,
             task_description=request.task_description,
             marketing_audience=marketing_goals.target_audience if marketing_goals else None,
@@ -311,7 +332,7 @@ async def create_pipeline_run(
         
         # Start background pipeline execution
         logger.info(f"🎬 Starting background task for run {run.id}")
-        asyncio.create_task(task_processor.start_pipeline_run(run.id, request, image_data, executor))
+        asyncio.create_task(task_processor.start_pipeline_run(run.id, request, executor=executor))
         
         logger.info(f"🚀 Background task started for run {run.id}")
         
@@ -385,59 +406,51 @@ async def create_refinement(
         raise HTTPException(status_code=400, detail=f"Invalid refinement type: {refine_type}. Must be 'subject', 'text', or 'prompt'")
     
     # Process reference image if provided
-    reference_image_data = None
+    reference_blob = None
     if reference_image:
         # Validate image file
         if not reference_image.content_type or not reference_image.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="Reference file must be an image")
         
-        # Read image data
-        reference_image_data = await reference_image.read()
-        if len(reference_image_data) > 50 * 1024 * 1024:  # 50MB limit
-            raise HTTPException(status_code=400, detail="Reference image file too large (max 50MB)")
+        reference_blob = await _ingest_image_upload(reference_image, MAX_IMAGE_UPLOAD_BYTES, "Reference image file")
     
     # Process mask file if provided
-    mask_file_data = None
+    mask_blob = None
     if mask_file:
         # Validate mask file
         if not mask_file.content_type or mask_file.content_type != 'image/png':
             raise HTTPException(status_code=400, detail="Mask file must be a PNG image")
         
-        # Read mask data
-        mask_file_data = await mask_file.read()
-        if len(mask_file_data) > 4 * 1024 * 1024:  # 4MB limit
-            raise HTTPException(status_code=400, detail="Mask file too large (max 4MB)")
+        # Mask dimensions must match the base image (use parent run_id, not current run_id)
+        base_image_path = await asyncio.to_thread(
+            _get_base_image_path, run_id, parent_image_id, parent_image_type, generation_index
+        )
+        if not base_image_path or not os.path.exists(base_image_path):
+            raise HTTPException(status_code=400, detail="Base image not found for mask validation")
         
-        # Validate mask dimensions match the base image
         try:
-            from PIL import Image
-            import io
-            
-            # Load mask image to validate
-            mask_image = Image.open(io.BytesIO(mask_file_data))
-            
-            # Load base image to compare dimensions (use parent run_id, not current run_id)
-            base_image_path = _get_base_image_path(run_id, parent_image_id, parent_image_type, generation_index)
-            if not base_image_path or not os.path.exists(base_image_path):
-                raise HTTPException(status_code=400, detail="Base image not found for mask validation")
-            
-            base_image = Image.open(base_image_path)
-            
-            # Check dimensions match
-            if mask_image.size != base_image.size:
+            _, base_size, _ = await asyncio.to_thread(_probe_image, base_image_path)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Invalid base image for mask validation: {str(e)}")
+        
+        def validate_mask(image_format: Optional[str], size: Tuple[int, int], mode: str) -> None:
+            if image_format != "PNG":
+                raise HTTPException(status_code=400, detail="Mask file must be a PNG image")
+            if size != base_size:
                 raise HTTPException(
                     status_code=400, 
-                    detail=f"Mask dimensions {mask_image.size} must match base image dimensions {base_image.size}"
+                    detail=f"Mask dimensions {size} must match base image dimensions {base_size}"
                 )
-            
             # Validate mask is grayscale or RGB (can be converted to grayscale)
-            if mask_image.mode not in ['L', 'RGB', 'RGBA']:
+            if mode not in ['L', 'RGB', 'RGBA']:
                 raise HTTPException(status_code=400, detail="Mask must be grayscale or RGB format")
-                
-        except Exception as e:
-            if isinstance(e, HTTPException):
-                raise
-            raise HTTPException(status_code=400, detail=f"Invalid mask file: {str(e)}")
+        
+        try:
+            mask_blob = await _ingest_image_upload(mask_file, MAX_MASK_UPLOAD_BYTES, "Mask file", validate_mask)
+        except BaseException:
+            if reference_blob:
+                await asyncio.to_thread(release_blob, reference_blob.sha256)
+            raise
     
     # Generate refinement summary
     refinement_summary = _generate_refinement_summary(refinement_type, prompt, instructions)
@@ -453,7 +466,9 @@ async def create_refinement(
         refinement_summary=refinement_summary,
         prompt=prompt,
         instructions=instructions,
-        mask_data=mask_data
+        mask_data=mask_data,
+        reference_blob_sha256=reference_blob.sha256 if reference_blob else None,
+        mask_blob_sha256=mask_blob.sha256 if mask_blob else None
     )
     
     session.add(refinement_job)
@@ -465,13 +480,11 @@ async def create_refinement(
         "refinement_type": refinement_type,
         "prompt": prompt,
         "instructions": instructions,
-        "mask_coordinates": mask_data,  # Legacy support
-        "reference_image_data": reference_image_data,
-        "mask_file_data": mask_file_data
+        "mask_coordinates": mask_data  # Legacy support
     }
     
     # Save reference image if provided (updated for hybrid structure)
-    if reference_image_data:
+    if reference_blob:
         parent_run_dir = Path(f"./data/runs/{run_id}").resolve()  # Make absolute
         
         # Create job-specific directory for hybrid structure
@@ -484,14 +497,14 @@ async def create_refinement(
         ref_image_filename = f"reference{original_extension}"
         ref_image_path = job_refinement_dir / ref_image_filename
         
-        with open(ref_image_path, "wb") as f:
-            f.write(reference_image_data)
+        await asyncio.to_thread(link_blob, reference_blob.sha256, ref_image_path)
         
         # Store absolute path for the refinement utilities
         refinement_data["reference_image_path"] = str(ref_image_path)
+        refinement_data["reference_image_sha256"] = reference_blob.sha256
     
     # Save mask file if provided
-    if mask_file_data:
+    if mask_blob:
         parent_run_dir = Path(f"./data/runs/{run_id}").resolve()  # Make absolute
         
         # Create job-specific directory for hybrid structure
@@ -501,11 +514,11 @@ async def create_refinement(
         # Store mask file directly in job-specific directory
         mask_file_path = job_refinement_dir / "mask.png"
         
-        with open(mask_file_path, "wb") as f:
-            f.write(mask_file_data)
+        await asyncio.to_thread(link_blob, mask_blob.sha256, mask_file_path)
         
         # Store absolute path for the refinement utilities
         refinement_data["mask_file_path"] = str(mask_file_path)
+        refinement_data["mask_sha256"] = mask_blob.sha256
         logger.info(f"Saved mask file: {mask_file_path}")
     
     logger.info(f"Refinement request received - Job ID: {refinement_job.id}")
@@ -627,6 +640,14 @@ async def get_refinement_details(
             "reference_image_source": "uploaded" if refinement.reference_image_path else None,
         })
     
+    # Lineage recorded in the run's refinements index when the job completed
+    index_entry = await asyncio.to_thread(
+        get_refinement_entry, run_directory(refinement.parent_run_id), refinement.id
+    )
+    if index_entry:
+        details["parent_image_path"] = index_entry.get("parent_image_path")
+        details["image_path"] = index_entry.get("image_path")
+    
     # Try to load comprehensive metadata from the job directory
     try:
         parent_run_dir = Path(f"./data/runs/{refinement.parent_run_id}")
@@ -640,9 +661,8 @@ async def get_refinement_details(
         
         if job_metadata_path.exists():
             logger.info(f"Loading metadata from: {job_metadata_path}")
-            with open(job_metadata_path, 'r') as f:
-                job_metadata = json.load(f)
-                
+            job_metadata = await asyncio.to_thread(read_json_file, job_metadata_path)
+            
             # Extract inputs section
             inputs = job_metadata.get("inputs", {})
             details["original_prompt"] = inputs.get("original_prompt")
@@ -697,12 +717,12 @@ async def get_refinement_details(
         else:
             logger.warning(f"Metadata file not found: {job_metadata_path}")
             # Try to load basic metadata from parent run
-            parent_metadata_path = parent_run_dir / "pipeline_metadata.json"
-            if parent_metadata_path.exists():
-                logger.info(f"Loading parent metadata from: {parent_metadata_path}")
-                with open(parent_metadata_path, 'r') as f:
-                    parent_metadata = json.load(f)
-                    
+            if has_run_metadata(parent_run_dir):
+                logger.info(f"Loading parent metadata from: {parent_run_dir}")
+                parent_metadata = await asyncio.to_thread(
+                    load_run_metadata, parent_run_dir, ("settings", "concepts")
+                )
+                
                 # Extract what we can from parent metadata
                 processing_context = parent_metadata.get("processing_context", {})
                 user_inputs = parent_metadata.get("user_inputs", {})
@@ -726,7 +746,7 @@ async def get_refinement_details(
                         
                 logger.info(f"Loaded fallback metadata from parent run")
             else:
-                logger.warning(f"Parent metadata not found: {parent_metadata_path}")
+                logger.warning(f"Parent metadata not found in {parent_run_dir}")
                 
     except Exception as e:
         logger.error(f"Error loading metadata for refinement {job_id}: {str(e)}")
@@ -819,75 +839,94 @@ async def assess_refinement_noise(
     }
 
 
+async def _ingest_image_upload(
+    upload: UploadFile,
+    max_bytes: int,
+    label: str,
+    validate: Optional[Callable[[Optional[str], Tuple[int, int], str], None]] = None
+) -> BlobInfo:
+    """
+    Stream an image upload into the blob store and take a reference to it.
+
+    Uploads parsed by a BlobUploadRoute (churns.api.uploads) were already
+    hashed into a BlobUpload while the request body arrived and are committed
+    without another copy. Any other UploadFile is copied in
+    UPLOAD_CHUNK_BYTES chunks into a temp file that is hashed as it is
+    written. Either way a file over ``max_bytes`` is rejected, and the header
+    is probed off the event loop and passed to ``validate`` (which raises
+    HTTPException to reject) before anything is stored.
+    """
+    too_large = HTTPException(status_code=400, detail=f"{label} too large (max {max_bytes // (1024 * 1024)}MB)")
+    if upload.size is not None and upload.size > max_bytes:
+        raise too_large
+    
+    streamed = isinstance(upload, BlobUploadFile)
+    blob_upload = upload.blob_upload if streamed else await asyncio.to_thread(BlobUpload, max_bytes)
+    try:
+        while not streamed:
+            chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            await asyncio.to_thread(blob_upload.write, chunk)
+        
+        def check_header() -> None:
+            try:
+                image_format, size, mode = _probe_image(blob_upload.path)
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"{label} is not a readable image: {str(e)}")
+            if validate:
+                validate(image_format, size, mode)
+        
+        await asyncio.to_thread(check_header)
+        return await asyncio.to_thread(blob_upload.commit, upload.content_type)
+    except BlobTooLargeError:
+        raise too_large from None
+    finally:
+        # No-op once committed
+        await asyncio.to_thread(blob_upload.abort)
+
+
+def _probe_image(path: str) -> Tuple[Optional[str], Tuple[int, int], str]:
+    """Format, size and mode of an image from its header; pixel data is never decoded."""
+    from PIL import Image
+    
+    with Image.open(path) as image:
+        return image.format, image.size, image.mode
+
+
 def _get_base_image_path(run_id: str, parent_image_id: str, parent_image_type: str, generation_index: Optional[int]) -> Optional[str]:
     """Get the path to the base image for mask validation"""
     try:
-        base_run_dir = Path(f"./data/runs/{run_id}")
+        base_run_dir = run_directory(run_id)
         
         if parent_image_type == "original":
-            # Original generated images are stored directly in the run directory
-            # with patterns like: generated_image_strategy_{index}_{timestamp}.png or edited_image_strategy_{index}_{timestamp}.png
-            if generation_index is not None:
-                # Look for generated images with this index
-                patterns = [
-                    f"generated_image_strategy_{generation_index}_*.png",
-                    f"edited_image_strategy_{generation_index}_*.png",
-                    f"image_{generation_index}*.png",  # Fallback pattern
-                ]
-                
-                for pattern in patterns:
-                    matches = list(base_run_dir.glob(pattern))
-                    if matches:
-                        # Sort by modification time (newest first) and return the first match
-                        matches.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-                        image_path = matches[0]
-                        if image_path.exists():
-                            logger.info(f"Found original image: {image_path}")
-                            return str(image_path)
-                
-                logger.warning(f"No original image found for generation_index {generation_index} in {base_run_dir}")
-                return None
-            else:
+            if generation_index is None:
                 # Try to parse generation index from parent_image_id (e.g., "image_0" -> 0)
                 if parent_image_id.startswith("image_"):
                     try:
-                        index = int(parent_image_id.split("_")[1])
-                        return _get_base_image_path(run_id, parent_image_id, parent_image_type, index)
+                        generation_index = int(parent_image_id.split("_")[1])
                     except (IndexError, ValueError):
                         pass
                 
-                logger.warning(f"Cannot determine generation index from parent_image_id: {parent_image_id}")
-                return None
-        else:
-            # Refinement image - look in refinements directory
-            refinements_dir = base_run_dir / "refinements"
+                if generation_index is None:
+                    logger.warning(f"Cannot determine generation index from parent_image_id: {parent_image_id}")
+                    return None
             
-            # Look for the refinement image (could be in various formats)
-            possible_patterns = [
-                f"{parent_image_id}_from_*.png",
-                f"{parent_image_id}.png",
-                f"refinement_{parent_image_id}.png",
-            ]
+            image_path = lookup_image_path(base_run_dir, KIND_ORIGINAL, generation_index)
+            if image_path:
+                logger.info(f"Found original image: {image_path}")
+                return str(image_path)
             
-            for pattern in possible_patterns:
-                if '*' in pattern:
-                    # Use glob for wildcard patterns
-                    matches = list(refinements_dir.glob(pattern))
-                    if matches:
-                        # Sort by modification time (newest first)
-                        matches.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-                        image_path = matches[0]
-                        if image_path.exists():
-                            logger.info(f"Found refinement image: {image_path}")
-                            return str(image_path)
-                else:
-                    # Direct path check
-                    image_path = refinements_dir / pattern
-                    if image_path.exists():
-                        logger.info(f"Found refinement image: {image_path}")
-                        return str(image_path)
+            logger.warning(f"No original image found for generation_index {generation_index} in {base_run_dir}")
+            return None
+        else:
+            # Refinement image - parent_image_id is the refinement job ID
+            image_path = lookup_image_path(base_run_dir, KIND_REFINEMENT, parent_image_id)
+            if image_path:
+                logger.info(f"Found refinement image: {image_path}")
+                return str(image_path)
             
-            logger.warning(f"No refinement image found for parent_image_id {parent_image_id} in {refinements_dir}")
+            logger.warning(f"No refinement image found for parent_image_id {parent_image_id} in {base_run_dir}")
             return None
         
     except Exception as e:
@@ -1029,7 +1068,7 @@ async def get_pipeline_run(
         stage_output_data = getattr(stage, 'output_data', None)
         if stage_output_data:
             try:
-                output_data = json.loads(stage_output_data)
+                output_data = loads(stage_output_data)
             except:
                 pass
         
@@ -1061,7 +1100,8 @@ async def get_pipeline_run(
                 "duration_seconds": getattr(stage, 'duration_seconds', None),
                 "message": message,
                 "output_data": output_data,  # KEEP for developers - this is the "stage outputs" section
-                "error_message": getattr(stage, 'error_message', None)  # KEEP for developers
+                "error_message": getattr(stage, 'error_message', None),  # KEEP for developers
+                **{column: getattr(stage, column, None) for column in STAGE_RESOURCE_COLUMNS}
             })
         else:
             message = f"Stage {stage_name} {stage_status.value if hasattr(stage_status, 'value') else stage_status}"
@@ -1074,7 +1114,8 @@ async def get_pipeline_run(
                 "duration_seconds": getattr(stage, 'duration_seconds', None),
                 "message": message,
                 "output_data": output_data,
-                "error_message": getattr(stage, 'error_message', None)
+                "error_message": getattr(stage, 'error_message', None),
+                **{column: getattr(stage, column, None) for column in STAGE_RESOURCE_COLUMNS}
             })
     
     # NEW: Handle parent preset for STYLE_RECIPE runs
@@ -1274,14 +1315,14 @@ async def get_pipeline_results(
         if run.status != RunStatus.COMPLETED:
             raise HTTPException(status_code=400, detail=f"Pipeline not completed yet. Current status: {run.status}")
         
-        if not run.metadata_file_path or not os.path.exists(run.metadata_file_path):
+        if not run.metadata_file_path or not has_run_metadata(run.metadata_file_path):
             raise HTTPException(status_code=404, detail=f"Pipeline results not found. Metadata path: {run.metadata_file_path}")
         
-        # Load pipeline metadata
-        import json
+        # Load pipeline metadata (run settings are not part of the results)
         try:
-            with open(run.metadata_file_path, 'r') as f:
-                pipeline_data = json.load(f)
+            pipeline_data = await asyncio.to_thread(
+                load_run_metadata, run.metadata_file_path, ("strategies", "concepts", "results", "costs")
+            )
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to load pipeline metadata: {str(e)}")
         
@@ -1369,14 +1410,42 @@ async def get_pipeline_results(
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+# File serving endpoints
+# Cache headers for served files. Derivatives are content-addressed and never
+# change; originals are revalidated against their ETag.
+DERIVATIVE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+ORIGINAL_CACHE_CONTROL = "public, no-cache"
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Check an If-None-Match header against a strong ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(
+        tag.removeprefix("W/") == etag for tag in candidates
+    )
+
+
 # File serving endpoints
 @files_router.get("/{run_id}/{file_path:path}")
 async def get_run_file(
     run_id: str,
     file_path: str,
+    request: Request,
+    size: Optional[str] = Query(None, description="Derivative size preset (thumb, small, medium, large)"),
+    image_format: Optional[str] = Query(None, alias="format", description="Derivative format (webp, avif, jpeg, png)"),
+    quality: Optional[int] = Query(None, description="Derivative encoding quality (1-100)"),
     session: AsyncSession = Depends(get_session)
 ):
-    """Serve files from a pipeline run (images, metadata, etc.)"""
+    """
+    Serve files from a pipeline run (images, metadata, etc.)
+    
+    Images can be requested as resized derivatives via ``size`` (and optionally
+    ``format``/``quality``), which are cached on disk. All responses carry an
+    ETag and honour If-None-Match with a 304.
+    """
     
     run = await session.get(PipelineRun, run_id)
     if not run:
@@ -1404,6 +1473,27 @@ async def get_run_file(
     if full_file_path.is_dir():
         raise HTTPException(status_code=404, detail="Cannot serve directory as file")
     
+    # Serve a resized derivative if requested
+    if size or image_format or quality is not None:
+        if not is_derivable(full_file_path):
+            raise HTTPException(status_code=400, detail="Derivatives are only available for images")
+        try:
+            derivative = await get_or_create_derivative(
+                full_file_path, size or "medium", image_format, quality
+            )
+        except DerivativeError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        headers = {"ETag": derivative.etag, "Cache-Control": DERIVATIVE_CACHE_CONTROL}
+        if _etag_matches(request, derivative.etag):
+            return Response(status_code=304, headers=headers)
+        return FileResponse(path=derivative.path, media_type=derivative.media_type, headers=headers)
+    
+    etag = f'"{await asyncio.to_thread(file_sha256, full_file_path)}"'
+    headers = {"ETag": etag, "Cache-Control": ORIGINAL_CACHE_CONTROL}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    
     # Determine media type
     media_type, _ = mimetypes.guess_type(str(full_file_path))
     if not media_type:
@@ -1415,10 +1505,26 @@ async def get_run_file(
     return FileResponse(
         path=str(full_file_path),
         media_type=media_type,
-        filename=filename
+        filename=filename,
+        headers=headers
     )
 
 
+@blobs_router.get("/{sha256}")
+async def get_blob_file(sha256: str, request: Request):
+    """Serve a stored logo, reference image or mask by its SHA-256."""
+    blob = await asyncio.to_thread(get_blob, sha256)
+    if not blob:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    
+    # Content never changes under its hash
+    etag = f'"{blob.sha256}"'
+    headers = {"ETag": etag, "Cache-Control": DERIVATIVE_CACHE_CONTROL}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path=blob.path, media_type=blob.content_type or "application/octet-stream", headers=headers)
+
+
 # Configuration endpoints
 @api_router.get("/config/platforms")
 async def get_platforms():
@@ -1465,15 +1571,87 @@ async def get_caption_models():
 
 
 @api_router.get("/status")
-async def get_api_status():
+async def get_api_status(request: Request):
     """Get API status and stats"""
     active_runs = task_processor.get_active_runs()
     
-    return {
+    status = {
         "status": "healthy",
         "active_runs": len(active_runs),
         "active_run_ids": active_runs
     }
+    
+    watchdog = getattr(request.app.state, "loop_lag_monitor", None)
+    if watchdog is not None:
+        status["event_loop"] = {
+            "last_lag_ms": round(watchdog.last_lag_seconds * 1000, 1),
+            "recent_blocks": list(getattr(watchdog, "recent_blocks", []))[:10]
+        }
+    
+    return status
+
+
+# === PROFILING ENDPOINTS ===
+
+def _require_profiling_enabled():
+    if not profiling_enabled():
+        raise HTTPException(status_code=403, detail="Profiling is disabled (set PROFILING_ENABLED=true)")
+
+
+@admin_router.post("/profiling", response_model=ProfilingStatusResponse)
+async def arm_profiling(request: ProfilingRequest):
+    """Profile the next matching background job(s); profiles are written to data/runs/{id}/profiles/"""
+    _require_profiling_enabled()
+    profiler_control.arm(
+        kind=request.kind,
+        mode=request.mode,
+        count=request.count,
+        target_id=request.target_id,
+        interval_ms=request.interval_ms
+    )
+    return ProfilingStatusResponse(**profiler_control.status())
+
+
+@admin_router.get("/profiling", response_model=ProfilingStatusResponse)
+async def get_profiling_status():
+    """Get armed profile requests, the active profile and recently written profiles"""
+    _require_profiling_enabled()
+    return ProfilingStatusResponse(**profiler_control.status())
+
+
+@admin_router.delete("/profiling", response_model=ProfilingStatusResponse)
+async def disarm_profiling():
+    """Cancel pending profile requests (a profile already running still completes)"""
+    _require_profiling_enabled()
+    profiler_control.disarm()
+    return ProfilingStatusResponse(**profiler_control.status())
+
+
+# === PROMPT CACHE REPORT ===
+
+@admin_router.get("/prompt-cache", response_model=PromptCacheReportResponse)
+async def get_prompt_cache_report(
+    runs: int = Query(200, ge=1, le=5000, description="Number of most recent runs to summarize"),
+    session: AsyncSession = Depends(get_session)
+):
+    """Cached versus uncached input tokens per stage and model, and which prompts have unstable prefixes"""
+    recent_runs = (
+        select(PipelineRun.id).order_by(desc(PipelineRun.created_at)).limit(runs).scalar_subquery()
+    )
+    result = await session.execute(
+        select(PipelineStage).where(
+            PipelineStage.run_id.in_(recent_runs),
+            PipelineStage.input_tokens.is_not(None)
+        )
+    )
+    stages = result.scalars().all()
+    
+    return PromptCacheReportResponse(
+        runs_considered=len({stage.run_id for stage in stages}),
+        usage=summarize_stage_token_rows(stages),
+        prefix_stability=prefix_stability_report(),
+        min_cacheable_prefix_tokens=MIN_CACHEABLE_PREFIX_TOKENS
+    )
 
 
 # WebSocket endpoint
@@ -1485,28 +1663,20 @@ async def websocket_run_updates(websocket: WebSocket, run_id: str):
 
 # === CAPTION ENDPOINTS ===
 
-def _get_next_caption_version(run_id: str, image_id: str) -> int:
-    """Calculate the next version number for a caption by checking existing files"""
-    caption_dir = Path(f"./data/runs/{run_id}/captions/{image_id}")
-    next_version = 0  # Default for first caption
-    
-    if caption_dir.exists():
-        # Find existing version files and get the highest version number
-        existing_files = list(caption_dir.glob("v*_result.json"))
-        if existing_files:
-            versions = []
-            for file in existing_files:
-                try:
-                    # Extract version number from filename (e.g., "v2_result.json" -> 2)
-                    version_str = file.stem.split('_')[0][1:]  # Remove 'v' prefix
-                    versions.append(int(version_str))
-                except (ValueError, IndexError):
-                    continue
-            
-            if versions:
-                next_version = max(versions) + 1
-    
-    return next_version
+def _get_next_caption_version(
+    run_id: str,
+    image_id: str,
+    caption_id: Optional[str] = None,
+    model_id: Optional[str] = None,
+    settings: Optional[Dict[str, Any]] = None
+) -> int:
+    """Reserve the next version number for a caption in the image's caption manifest"""
+    return reserve_caption_version(
+        caption_directory(run_id, image_id),
+        caption_id=caption_id,
+        model_id=model_id,
+        settings=settings
+    )
 
 def _is_settings_empty(settings):
     """Check if a settings object is effectively empty (all values are defaults)"""
@@ -1565,15 +1735,18 @@ async def generate_caption(
     import uuid
     caption_id = str(uuid.uuid4())
     
-    # Calculate the next version by checking existing files
-    next_version = _get_next_caption_version(run_id, image_id)
+    # Reserve the next version in the caption manifest
+    settings_dict = request.settings.model_dump() if request.settings else {}
+    next_version = await asyncio.to_thread(
+        _get_next_caption_version, run_id, image_id, caption_id, model_id, settings_dict
+    )
     
     # Prepare caption generation data
     caption_data = {
         "run_id": run_id,
         "image_id": image_id,
         "caption_id": caption_id,
-        "settings": request.settings.model_dump() if request.settings else {},
+        "settings": settings_dict,
         "version": next_version,
         "model_id": model_id
     }
@@ -1624,29 +1797,22 @@ async def regenerate_caption(
     previous_model_id = None
     
     # If no model specified, try to use the model from the previous version
+    try:
+        previous_entry = await asyncio.to_thread(
+            get_caption_version, caption_directory(run_id, image_id), caption_version
+        )
+    except Exception as e:
+        logger.warning(f"Could not load previous caption {caption_version}: {e}")
+        previous_entry = None
+    
     if not request.model_id:
-        try:
-            previous_caption_file = Path(f"./data/runs/{run_id}/captions/{image_id}/v{caption_version}_result.json")
-            if previous_caption_file.exists():
-                with open(previous_caption_file, 'r', encoding='utf-8') as f:
-                    previous_data = json.load(f)
-                    previous_model = previous_data.get("model_id")
-                    if previous_model and previous_model in CAPTION_MODEL_OPTIONS:
-                        model_id = previous_model
-                        previous_model_id = previous_model
-        except Exception as e:
-            logger.warning(f"Could not load previous model from caption {caption_version}: {e}")
-    else:
+        previous_model = previous_entry.get("model_id") if previous_entry else None
+        if previous_model and previous_model in CAPTION_MODEL_OPTIONS:
+            model_id = previous_model
+            previous_model_id = previous_model
+    elif previous_entry:
         # If model was explicitly specified, also load the previous model for comparison
-        try:
-            previous_caption_file = Path(f"./data/runs/{run_id}/captions/{image_id}/v{caption_version}_result.json")
-            if previous_caption_file.exists():
-                with open(previous_caption_file, 'r', encoding='utf-8') as f:
-                    previous_data = json.load(f)
-                    previous_model_id = previous_data.get("model_id", CAPTION_MODEL_ID)
-        except Exception as e:
-            logger.warning(f"Could not load previous model for comparison: {e}")
-            previous_model_id = CAPTION_MODEL_ID
+        previous_model_id = previous_entry.get("model_id") or CAPTION_MODEL_ID
     
     # Validate model_id
     if model_id not in CAPTION_MODEL_OPTIONS:
@@ -1659,8 +1825,11 @@ async def regenerate_caption(
     import uuid
     new_caption_id = str(uuid.uuid4())
     
-    # Calculate the next version by checking existing files
-    new_version = _get_next_caption_version(run_id, image_id)
+    # Reserve the next version in the caption manifest
+    settings_dict = request.settings.model_dump() if request.settings else {}
+    new_version = await asyncio.to_thread(
+        _get_next_caption_version, run_id, image_id, new_caption_id, model_id, settings_dict
+    )
     
     # Check if model has changed
     model_has_changed = previous_model_id and (model_id != previous_model_id)
@@ -1678,9 +1847,11 @@ async def regenerate_caption(
         "run_id": run_id,
         "image_id": image_id,
         "caption_id": new_caption_id,
-        "settings": request.settings.model_dump() if request.settings else {},
+        "settings": settings_dict,
         "version": new_version,
         "writer_only": writer_only_result,  # Only writer if no settings change AND no model change
+        # Briefs are otherwise reused from the brief cache whenever their inputs are unchanged
+        "refresh_brief": not request.writer_only,
         "previous_version": caption_version,
         "model_id": model_id
     }
@@ -1713,43 +1884,22 @@ async def list_captions(
     if not run:
         raise HTTPException(status_code=404, detail="Pipeline run not found")
     
-    # Load captions from file system
+    # Load captions from the image's caption manifest (single read)
     captions = []
     try:
-        caption_dir = Path(f"./data/runs/{run_id}/captions/{image_id}")
-        if caption_dir.exists():
-            # Find all caption result files and sort by version number
-            result_files = list(caption_dir.glob("v*_result.json"))
-            
-            # Sort files by version number for consistent ordering
-            def get_version_from_filename(file_path):
-                try:
-                    version_str = file_path.stem.split('_')[0][1:]  # Remove 'v' prefix
-                    return int(version_str)
-                except (ValueError, IndexError):
-                    return 0
-            
-            result_files.sort(key=get_version_from_filename)
-            
-            for result_file in result_files:
-                try:
-                    with open(result_file, 'r', encoding='utf-8') as f:
-                        caption_data = json.load(f)
-                    
-                    # Convert to frontend format
-                    captions.append({
-                        "version": caption_data.get("version", 0),
-                        "text": caption_data.get("text", ""),
-                        "settings_used": caption_data.get("settings_used", {}),
-                        "brief_used": caption_data.get("brief_used", {}),
-                        "created_at": caption_data.get("created_at", ""),
-                        "model_id": caption_data.get("model_id"),
-                        "usage_summary": caption_data.get("usage_summary", {}),
-                        "llm_usage": caption_data.get("llm_usage", {})
-                    })
-                except Exception as e:
-                    logger.warning(f"Failed to load caption from {result_file}: {e}")
-                    continue
+        entries = await asyncio.to_thread(list_caption_versions, caption_directory(run_id, image_id))
+        for entry in entries:
+            # Convert to frontend format
+            captions.append({
+                "version": entry.get("version", 0),
+                "text": entry.get("text", ""),
+                "settings_used": entry.get("settings_used", {}),
+                "brief_used": entry.get("brief_used", {}),
+                "created_at": entry.get("created_at", ""),
+                "model_id": entry.get("model_id"),
+                "usage_summary": entry.get("usage_summary", {}),
+                "llm_usage": entry.get("llm_usage", {})
+            })
     
     except Exception as e:
         logger.error(f"Failed to load captions for {run_id}/{image_id}: {e}")
@@ -1784,6 +1934,8 @@ async def create_brand_preset(
     if request.preset_type == PresetType.STYLE_RECIPE and not request.style_recipe:
         raise HTTPException(status_code=400, detail="style_recipe is required for STYLE_RECIPE presets")
     
+    brand_kit = await _store_brand_kit_logo(request.brand_kit.model_dump()) if request.brand_kit else None
+    
     # Create the preset
     preset = BrandPreset(
         name=request.name,
@@ -1791,7 +1943,7 @@ async def create_brand_preset(
         preset_type=request.preset_type,
         preset_source_type=request.preset_source_type,
         pipeline_version=request.pipeline_version,
-        brand_kit=json.dumps(request.brand_kit.model_dump()) if request.brand_kit else None,
+        brand_kit=json.dumps(brand_kit) if brand_kit else None,
         input_snapshot=request.input_snapshot.model_dump_json() if request.input_snapshot else None,
         style_recipe=request.style_recipe.model_dump_json() if request.style_recipe else None,
     )
@@ -1886,16 +2038,29 @@ async def update_brand_preset(
         )
     
     # Update fields
+    previous_logo = new_logo = None
     if request.name is not None:
         preset.name = request.name
     if request.brand_kit is not None:
-        preset.brand_kit = json.dumps(request.brand_kit.model_dump())
+        previous_logo = brand_kit_logo_hash(preset.brand_kit)
+        brand_kit = await _store_brand_kit_logo(request.brand_kit.model_dump())
+        new_logo = brand_kit_logo_hash(brand_kit)
+        preset.brand_kit = json.dumps(brand_kit)
     
     # Increment version
     preset.version += 1
     preset.updated_at = datetime.utcnow()
     
-    await session.commit()
+    try:
+        await session.commit()
+    except Exception:
+        # The preset still references its previous logo
+        if new_logo:
+            await asyncio.to_thread(release_blob, new_logo)
+        raise
+    # Only give the old logo back once no committed row points at it
+    if previous_logo:
+        await asyncio.to_thread(release_blob, previous_logo)
     await session.refresh(preset)
     
     return _convert_preset_to_response(preset)
@@ -1921,8 +2086,11 @@ async def delete_brand_preset(
     if not preset:
         raise HTTPException(status_code=404, detail="Brand preset not found")
     
+    logo_hash = brand_kit_logo_hash(preset.brand_kit)
     await session.delete(preset)
     await session.commit()
+    if logo_hash:
+        await asyncio.to_thread(release_blob, logo_hash)
     
     return {"message": "Brand preset deleted successfully"}
 
@@ -1979,12 +2147,13 @@ async def save_preset_from_result(
         raise HTTPException(status_code=400, detail="Can only save presets from completed runs")
     
     # Load the run metadata to extract the style recipe data
-    if not run.metadata_file_path or not os.path.exists(run.metadata_file_path):
+    if not run.metadata_file_path or not has_run_metadata(run.metadata_file_path):
         raise HTTPException(status_code=400, detail="Run metadata not found")
     
     try:
-        with open(run.metadata_file_path, 'r') as f:
-            run_metadata = json.load(f)
+        run_metadata = await asyncio.to_thread(
+            load_run_metadata, run.metadata_file_path, ("strategies", "concepts", "results")
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load run metadata: {str(e)}")
     
@@ -2041,36 +2210,28 @@ async def save_preset_from_result(
     # The brand kit from the PARENT run is the source of truth for the preset's brand kit
     parent_brand_kit_json = run.brand_kit
     
-    # Convert logo file path to base64 for frontend compatibility
+    # The preset takes its own reference to the run's logo in the blob store
     if parent_brand_kit_json:
         try:
             parent_brand_kit = json.loads(parent_brand_kit_json)
+            logo_path = parent_brand_kit.get('saved_logo_path_in_run_dir')
+            
+            if (not parent_brand_kit.get('logo_blob_sha256') and not parent_brand_kit.get('logo_file_base64')
+                    and logo_path and os.path.exists(logo_path)):
+                # Runs from before the blob store only kept the logo in their directory
+                logo_blob = await asyncio.to_thread(_put_logo_file, logo_path)
+                parent_brand_kit['logo_blob_sha256'] = logo_blob.sha256
+                parent_brand_kit['logo_content_type'] = logo_blob.content_type
+                logger.info(f"Stored run logo {logo_path} as blob {logo_blob.sha256[:12]} for preset")
+            else:
+                parent_brand_kit = await asyncio.to_thread(store_brand_kit_logo, parent_brand_kit)
             
-            # Check if we have a logo file path but no base64 data
-            if (parent_brand_kit.get('saved_logo_path_in_run_dir') and 
-                not parent_brand_kit.get('logo_file_base64')):
-                
-                logo_path = parent_brand_kit['saved_logo_path_in_run_dir']
-                if os.path.exists(logo_path):
-                    # Read logo file and convert to base64
-                    with open(logo_path, 'rb') as logo_file:
-                        logo_data = logo_file.read()
-                        logo_base64 = base64.b64encode(logo_data).decode('utf-8')
-                        
-                        # Determine MIME type
-                        mime_type = mimetypes.guess_type(logo_path)[0] or 'image/png'
-                        logo_data_uri = f"data:{mime_type};base64,{logo_base64}"
-                        
-                        # Add base64 data to brand kit
-                        parent_brand_kit['logo_file_base64'] = logo_data_uri
-                        logger.info(f"Converted logo file to base64 for preset: {logo_path}")
-                
             # Update the JSON string
             parent_brand_kit_json = json.dumps(parent_brand_kit)
             
         except Exception as e:
-            logger.warning(f"Failed to convert logo to base64: {e}")
-            # Continue with original brand_kit if conversion fails
+            logger.warning(f"Failed to store logo for preset: {e}")
+            # Continue with original brand_kit if storing fails
     
     # Create the preset
     preset = BrandPreset(
@@ -2081,7 +2242,7 @@ async def save_preset_from_result(
         pipeline_version="1.1.0",  # TODO: Get from run metadata
         source_run_id=run_id,
         source_image_path=source_image_path,
-        brand_kit=parent_brand_kit_json, # Now includes base64 logo data
+        brand_kit=parent_brand_kit_json,  # References the logo by hash
         input_snapshot=None,
         style_recipe=style_recipe_envelope.model_dump_json() # Serialize the envelope
     )
@@ -2093,6 +2254,20 @@ async def save_preset_from_result(
     return _convert_preset_to_response(preset)
 
 
+async def _store_brand_kit_logo(brand_kit: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Brand kit with its logo in the blob store, referenced by hash (one reference per stored row)."""
+    try:
+        return await asyncio.to_thread(store_brand_kit_logo, brand_kit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid brand kit logo: {e}")
+
+
+def _put_logo_file(logo_path: str):
+    with open(logo_path, "rb") as f:
+        data = f.read()
+    return put_blob(data, mimetypes.guess_type(logo_path)[0] or "image/png")
+
+
 def _convert_preset_to_response(preset: BrandPreset) -> BrandPresetResponse:
     """Convert a BrandPreset database model to a response model"""
     try:
@@ -2204,4 +2379,6 @@ api_router.include_router(runs_router)
 api_router.include_router(files_router)
 api_router.include_router(ws_router)
 api_router.include_router(presets_router)
-api_router.include_router(brand_kit_utils_router) 
\ No newline at end of file
+api_router.include_router(brand_kit_utils_router)
+api_router.include_router(admin_router)
+api_router.include_router(blobs_router)
@@ -2,6 +2,7 @@ from typing import Optional, List, Dict, Any, Literal
 from pydantic import BaseModel, Field, HttpUrl
 from datetime import datetime
 from churns.api.database import RunStatus, StageStatus, RefinementType, PresetType
+from churns.core.tracing import current_trace_id
 from churns.models import BrandKitInput
 from churns.models.presets import StyleRecipeData, PipelineInputSnapshot, StyleRecipeEnvelope
 
@@ -41,6 +42,7 @@ class ImageReferenceInput(BaseModel):
     content_type: str
     size_bytes: int
     instruction: Optional[str] = None
+    blob_sha256: Optional[str] = Field(None, description="SHA-256 of the uploaded image in the blob store")
 
 
 class MarketingGoalsInput(BaseModel):
@@ -152,6 +154,13 @@ class StageProgressUpdate(BaseModel):
     message: str
     output_data: Optional[Dict[str, Any]] = None
     error_message: Optional[str] = None
+    # Resource accounting (see churns.core.stage_resources)
+    cpu_seconds: Optional[float] = None
+    peak_memory_delta_bytes: Optional[int] = None
+    io_read_bytes: Optional[int] = None
+    io_write_bytes: Optional[int] = None
+    provider_wait_seconds: Optional[float] = None
+    local_compute_seconds: Optional[float] = None
 
 
 class PipelineRunResponse(BaseModel):
@@ -282,6 +291,7 @@ class WebSocketMessage(BaseModel):
     run_id: str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     data: Dict[str, Any] = Field(default_factory=dict)
+    trace_id: Optional[str] = Field(default_factory=current_trace_id, description="Trace of the run that sent the message")
 
 
 class ImageAnalysisResult(BaseModel):  
@@ -332,7 +342,7 @@ class CaptionRequest(BaseModel):
 class CaptionRegenerateRequest(BaseModel):
     """Request model for caption regeneration"""
     settings: Optional[CaptionSettings] = Field(default=None, description="New caption settings (if provided, runs full pipeline)")
-    writer_only: bool = Field(default=True, description="If true and no new settings, only regenerates writer step")
+    writer_only: bool = Field(default=True, description="If true, only the writer step runs when the caption brief can be reused (no new settings, or settings that leave the cached brief's inputs unchanged); false always regenerates the brief")
     model_id: Optional[str] = Field(default=None, description="Selected model ID (uses previous model if not provided)")
 
 
@@ -407,3 +417,53 @@ class SavePresetFromResultRequest(BaseModel):
     
     # Brand Kit (UPDATED: unified brand kit structure)
     brand_kit: Optional[BrandKitInput] = Field(None, description="Brand kit with colors, voice, and logo")
+
+
+class ProfilingRequest(BaseModel):
+    """Request model for arming the per-run profiler"""
+    kind: Literal["any", "generation", "refinement", "caption"] = Field(default="any", description="Kind of background job to profile")
+    mode: Literal["sample", "cprofile"] = Field(default="sample", description="Sampling (collapsed stacks) or deterministic cProfile")
+    count: int = Field(default=1, ge=1, le=100, description="Number of jobs to profile")
+    target_id: Optional[str] = Field(default=None, description="Profile only this run, refinement job or caption ID")
+    interval_ms: float = Field(default=5.0, ge=1.0, le=1000.0, description="Sampling interval in milliseconds")
+
+
+class ProfilingStatusResponse(BaseModel):
+    """Response model for the per-run profiler state"""
+    armed: List[Dict[str, Any]] = Field(description="Pending profile requests")
+    active: Optional[Dict[str, Any]] = Field(None, description="Job currently being profiled")
+    recent: List[Dict[str, Any]] = Field(description="Recently written profiles, newest first")
+
+
+class PromptCacheUsage(BaseModel):
+    """Cached versus uncached input tokens of one stage and model"""
+    stage: str
+    model: str
+    stage_runs: int = Field(description="Stage executions with token usage")
+    input_tokens: int
+    cached_input_tokens: int
+    uncached_input_tokens: int
+    output_tokens: int
+    cache_hit_rate: float = Field(description="Share of input tokens served from the provider's prompt cache")
+
+
+class PromptPrefixStability(BaseModel):
+    """How much consecutive prompts of one stage and model share (this process only)"""
+    stage: str
+    model: str
+    requests: int
+    compared_requests: int
+    mean_prompt_tokens: int
+    mean_shared_prefix_tokens: int
+    min_shared_prefix_tokens: Optional[int] = None
+    shared_prefix_ratio: Optional[float] = None
+    unstable_prefix: bool = Field(description="Prompts are long enough to cache but diverge before the cacheable minimum")
+    last_divergence: Optional[Dict[str, Any]] = Field(None, description="Offset and excerpts where the last two prompts first differed")
+
+
+class PromptCacheReportResponse(BaseModel):
+    """Response model for the prompt cache report"""
+    runs_considered: int = Field(description="Most recent runs whose stages are summarized")
+    usage: List[PromptCacheUsage] = Field(description="Per stage and model, lowest cache hit rate first")
+    prefix_stability: List[PromptPrefixStability] = Field(description="Per stage and model, unstable prefixes first")
+    min_cacheable_prefix_tokens: int
@@ -0,0 +1,110 @@
+"""
+Streaming multipart uploads.
+
+Starlette's form parser spools every file part to a temp file before the
+endpoint runs, so the upload size limit and the hash would only apply to a
+second copy of a body that has already been received in full. Routes built
+with ``BlobUploadRoute`` parse the request stream themselves: each file part
+is written straight into a ``BlobUpload`` as its bytes arrive, hashed on the
+way, and the request is rejected as soon as a part crosses
+MAX_IMAGE_UPLOAD_BYTES or the request carries more than MAX_UPLOAD_FILES
+files. Endpoints receive a ``BlobUploadFile`` (an UploadFile) that
+``_ingest_image_upload`` commits without copying; uploads the endpoint does
+not commit are dropped when FastAPI closes the form.
+"""
+
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import Any, Callable, Coroutine, List
+
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+from starlette.datastructures import FormData, Headers, UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser, parse_options_header
+
+from churns.core.blob_store import BlobTooLargeError, BlobUpload
+from churns.core.constants import MAX_IMAGE_UPLOAD_BYTES, MAX_UPLOAD_FILES
+
+logger = logging.getLogger(__name__)
+
+
+class BlobUploadFile(UploadFile):
+    """A form file part whose bytes went straight into a BlobUpload."""
+
+    def __init__(self, blob_upload: BlobUpload, filename: str, headers: Headers):
+        self.blob_upload = blob_upload
+        super().__init__(file=open(blob_upload.path, "rb"), size=0, filename=filename, headers=headers)
+
+    async def write(self, data: bytes) -> None:
+        # Raises BlobTooLargeError once the part crosses the upload's limit
+        await asyncio.to_thread(self.blob_upload.write, data)
+        self.size += len(data)
+
+    async def seek(self, offset: int) -> None:
+        await asyncio.to_thread(self.blob_upload.flush)
+        await super().seek(offset)
+
+    async def close(self) -> None:
+        await super().close()
+        # No-op once committed
+        await asyncio.to_thread(self.blob_upload.abort)
+
+
+class BlobMultiPartParser(MultiPartParser):
+    """Multipart parser that writes file parts into the blob store as they arrive."""
+
+    def __init__(self, *args: Any, max_file_bytes: int, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.max_file_bytes = max_file_bytes
+        self._uploads: List[BlobUploadFile] = []
+
+    def on_headers_finished(self) -> None:
+        super().on_headers_finished()
+        part = self._current_part
+        if part.file is not None:
+            # Nothing was written to the spooled file yet: it never touched disk
+            part.file = BlobUploadFile(BlobUpload(self.max_file_bytes), part.file.filename, part.file.headers)
+            self._uploads.append(part.file)
+
+    async def parse(self) -> FormData:
+        try:
+            return await super().parse()
+        except BaseException as exc:
+            for upload in self._uploads:
+                await upload.close()
+            if isinstance(exc, BlobTooLargeError):
+                limit_mb = self.max_file_bytes // (1024 * 1024)
+                raise MultiPartException(f"Uploaded file too large (max {limit_mb}MB)") from exc
+            raise
+
+
+class BlobUploadRequest(Request):
+    """Request whose multipart form is parsed with BlobMultiPartParser."""
+
+    async def _get_form(self, **kwargs: Any) -> FormData:
+        content_type, _ = parse_options_header(self.headers.get("Content-Type"))
+        if self._form is None and content_type == b"multipart/form-data":
+            kwargs["max_files"] = min(kwargs.get("max_files", MAX_UPLOAD_FILES), MAX_UPLOAD_FILES)
+            try:
+                async with aclosing(self.stream()) as stream:
+                    parser = BlobMultiPartParser(
+                        self.headers, stream, max_file_bytes=MAX_IMAGE_UPLOAD_BYTES, **kwargs
+                    )
+                    self._form = await parser.parse()
+            except MultiPartException as exc:
+                logger.warning(f"Rejected multipart upload: {exc.message}")
+                raise HTTPException(status_code=400, detail=exc.message)
+        return await super()._get_form(**kwargs)
+
+
+class BlobUploadRoute(APIRoute):
+    """Route class for routers whose endpoints take image uploads."""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def blob_upload_handler(request: Request) -> Response:
+            return await handler(BlobUploadRequest(request.scope, request.receive))
+
+        return blob_upload_handler
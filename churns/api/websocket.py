@@ -1,15 +1,18 @@
 from enum import Enum
-from typing import Dict, List, Set, Optional
+from typing import Any, Callable, Dict, List, Set, Optional
 from fastapi import WebSocket, WebSocketDisconnect
 import json
 import asyncio
 from datetime import datetime
 import logging
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from churns.api.schemas import WebSocketMessage, WSMessageType, StageProgressUpdate
 from churns.api.database import RunStatus, StageStatus
 from churns.core.user_config import get_user_settings
+from churns.core.service_metrics import WEBSOCKET_CONNECTIONS
+from churns.core.tracing import current_trace_id
+from churns.core.serialization import dumps_str
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +28,8 @@ class WSMessageType(str, Enum):
     CAPTION_UPDATE = "caption_update"
     CAPTION_COMPLETE = "caption_complete"
     CAPTION_ERROR = "caption_error"
+    # Streamed LLM output of a running stage (LLM_STREAMING)
+    PARTIAL_OUTPUT = "partial_output"
 
 
 class WebSocketMessage(BaseModel):
@@ -32,6 +37,7 @@ class WebSocketMessage(BaseModel):
     type: WSMessageType
     run_id: str
     data: dict
+    trace_id: Optional[str] = Field(default_factory=current_trace_id)  # Trace of the run that sent it
 
 
 class ConnectionManager:
@@ -70,8 +76,14 @@ class ConnectionManager:
             logger.debug(f"No active connections for run {run_id}")
             return
         
-        # Convert message to JSON
-        message_data = message.model_dump_json()
+        # Encode once for all connections; fields are read directly so the
+        # (possibly large) data dict is not copied by model_dump first
+        message_data = dumps_str({
+            "type": message.type,
+            "run_id": message.run_id,
+            "data": message.data,
+            "trace_id": message.trace_id,
+        })
         
         # Send to all connections for this run (create a copy to avoid iteration issues)
         disconnected_connections = []
@@ -90,6 +102,9 @@ class ConnectionManager:
     
     async def send_stage_update(self, run_id: str, stage_update: StageProgressUpdate, pipeline_mode: str = "generation"):
         """Send a stage progress update"""
+        if run_id not in self.active_connections:
+            return
+        
         from churns.core.user_config import get_user_settings, obfuscate_stage_name
         user_settings = get_user_settings()
         
@@ -116,7 +131,7 @@ class ConnectionManager:
         message = WebSocketMessage(
             type=WSMessageType.STAGE_UPDATE,
             run_id=run_id,
-            data=update_to_send.model_dump()
+            data=dict(update_to_send)  # Shallow: output_data is encoded as is
         )
         await self.send_message_to_run(run_id, message)
     
@@ -156,6 +171,30 @@ class ConnectionManager:
         )
         await self.send_message_to_run(run_id, message)
     
+    async def send_partial_output(self, run_id: str, data: dict):
+        """Send streamed LLM output (partial fields or text) of a running stage"""
+        message = WebSocketMessage(
+            type=WSMessageType.PARTIAL_OUTPUT,
+            run_id=run_id,
+            data=data
+        )
+        await self.send_message_to_run(run_id, message)
+    
+    def partial_output_forwarder(self, run_id: str, **extra: Any) -> Callable[[dict], None]:
+        """
+        Callback for ``PipelineContext.partial_output_callback`` that forwards
+        partial output to the run's connections. Safe to call from worker
+        threads; must be created on the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        
+        def forward(partial: dict) -> None:
+            if run_id not in self.active_connections:
+                return
+            asyncio.run_coroutine_threadsafe(self.send_partial_output(run_id, {**extra, **partial}), loop)
+        
+        return forward
+    
     async def ping_connections(self, run_id: str):
         """Send ping to keep connections alive"""
         message = WebSocketMessage(
@@ -172,10 +211,15 @@ class ConnectionManager:
     def get_all_active_runs(self) -> List[str]:
         """Get list of all runs with active connections"""
         return list(self.active_connections.keys())
+    
+    def get_total_connection_count(self) -> int:
+        """Get number of open connections across all runs"""
+        return len(self.connection_run_ids)
 
 
 # Global connection manager instance
 connection_manager = ConnectionManager()
+WEBSOCKET_CONNECTIONS.set_function(connection_manager.get_total_connection_count)
 
 
 async def websocket_endpoint(websocket: WebSocket, run_id: str):
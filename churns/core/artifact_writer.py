@@ -0,0 +1,255 @@
+"""
+Async Artifact Writer
+=====================
+
+Shared helpers for persisting binary pipeline artifacts (generated images,
+refinement outputs) without blocking the event loop.
+
+Every write goes through the same path:
+- Data is streamed into a temporary file created next to the destination
+- A SHA-256 content hash and byte count are computed while writing
+- The temporary file is fsync'ed and atomically renamed into place
+
+Readers therefore never observe a partially written image, and a crash
+mid-write only leaves a hidden ``.part`` file behind.
+
+Remote images are downloaded with a pooled ``httpx.AsyncClient`` so that
+repeated downloads reuse connections instead of opening a new session
+(and a worker thread) per image.
+"""
+
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Optional, Union
+
+import httpx
+
+from .tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+# Download settings
+DOWNLOAD_TIMEOUT_SECONDS = 30.0
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+HTTP_POOL_MAX_CONNECTIONS = 20
+HTTP_POOL_MAX_KEEPALIVE = 10
+
+# Base64 is decoded in slices so large payloads never need a second full copy
+# in memory. The slice size must be a multiple of 4 to keep quanta aligned.
+B64_DECODE_CHUNK_SIZE = 4 * 256 * 1024
+
+PathLike = Union[str, "os.PathLike[str]"]
+
+
+class ArtifactWriteError(Exception):
+    """Raised when an artifact cannot be downloaded, decoded or written."""
+
+
+class ArtifactTooSmallError(ArtifactWriteError):
+    """Raised when a written artifact is below the caller's minimum size."""
+
+
+@dataclass
+class ArtifactInfo:
+    """Result of a successful artifact write."""
+    path: str
+    size_bytes: int
+    sha256: str
+
+
+class _AtomicFileSink:
+    """Temp-file writer that hashes content and renames into place on commit."""
+
+    def __init__(self, dest_path: PathLike):
+        self.dest_path = os.fspath(dest_path)
+        dest_dir = os.path.dirname(self.dest_path) or "."
+        os.makedirs(dest_dir, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(
+            dir=dest_dir,
+            prefix=f".{os.path.basename(self.dest_path)}.",
+            suffix=".part"
+        )
+        self._file = os.fdopen(fd, "wb")
+        self._hasher = hashlib.sha256()
+        self.size_bytes = 0
+
+    def write(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        self._file.write(chunk)
+        self._hasher.update(chunk)
+        self.size_bytes += len(chunk)
+
+    def flush(self) -> None:
+        """Make the bytes written so far readable through ``temp_path``."""
+        self._file.flush()
+
+    def commit(self, min_bytes: int = 0) -> ArtifactInfo:
+        if self.size_bytes < min_bytes:
+            self.abort()
+            raise ArtifactTooSmallError(
+                f"Artifact is {self.size_bytes} bytes, expected at least {min_bytes}"
+            )
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            os.replace(self.temp_path, self.dest_path)
+        except BaseException:
+            self.abort()
+            raise
+        _fsync_directory(os.path.dirname(self.dest_path) or ".")
+        return ArtifactInfo(
+            path=self.dest_path,
+            size_bytes=self.size_bytes,
+            sha256=self._hasher.hexdigest()
+        )
+
+    def abort(self) -> None:
+        try:
+            if not self._file.closed:
+                self._file.close()
+        finally:
+            try:
+                os.unlink(self.temp_path)
+            except FileNotFoundError:
+                pass
+
+
+def _fsync_directory(directory: str) -> None:
+    """Persist the rename itself. Not supported on every platform."""
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def write_bytes_atomic(data: bytes, dest_path: PathLike, min_bytes: int = 0) -> ArtifactInfo:
+    """Synchronous atomic write, for callers already running off the event loop."""
+    with start_span("file.write", path=os.fspath(dest_path), size_bytes=len(data)):
+        sink = _AtomicFileSink(dest_path)
+        try:
+            sink.write(data)
+        except BaseException:
+            sink.abort()
+            raise
+        return sink.commit(min_bytes)
+
+
+def _write_base64_sync(b64_data: str, dest_path: PathLike, min_bytes: int) -> ArtifactInfo:
+    with start_span("file.write", path=os.fspath(dest_path), encoding="base64") as span:
+        sink = _AtomicFileSink(dest_path)
+        try:
+            # Whitespace (line-wrapped base64) is stripped per slice; characters
+            # past the last whole quantum carry over to the next slice
+            carry = ""
+            for start in range(0, len(b64_data), B64_DECODE_CHUNK_SIZE):
+                piece = carry + b64_data[start:start + B64_DECODE_CHUNK_SIZE]
+                if any(ch in piece for ch in "\r\n\t "):
+                    piece = "".join(piece.split())
+                aligned = len(piece) - len(piece) % 4
+                carry = piece[aligned:]
+                if aligned:
+                    sink.write(base64.b64decode(piece[:aligned]))
+            if carry:
+                sink.write(base64.b64decode(carry))
+        except BaseException as e:
+            sink.abort()
+            if isinstance(e, Exception):
+                raise ArtifactWriteError(f"Invalid base64 image data: {e}") from e
+            raise
+        info = sink.commit(min_bytes)
+        span.set_attribute("size_bytes", info.size_bytes)
+        return info
+
+
+async def write_bytes_artifact(
+    data: bytes,
+    dest_path: PathLike,
+    min_bytes: int = 0
+) -> ArtifactInfo:
+    """Atomically write raw bytes to ``dest_path`` off the event loop."""
+    return await asyncio.to_thread(write_bytes_atomic, data, dest_path, min_bytes)
+
+
+async def write_base64_artifact(
+    b64_data: str,
+    dest_path: PathLike,
+    min_bytes: int = 0
+) -> ArtifactInfo:
+    """Decode base64 data in chunks and atomically write it to ``dest_path``."""
+    return await asyncio.to_thread(_write_base64_sync, b64_data, dest_path, min_bytes)
+
+
+# Pooled HTTP client, bound to the event loop that created it
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared download client, creating it for the running loop if needed."""
+    global _http_client, _http_client_loop
+
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client.is_closed or _http_client_loop is not loop:
+        _http_client = httpx.AsyncClient(
+            timeout=DOWNLOAD_TIMEOUT_SECONDS,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=HTTP_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE
+            )
+        )
+        _http_client_loop = loop
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared download client (called on application shutdown)."""
+    global _http_client, _http_client_loop
+
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
+    _http_client_loop = None
+
+
+async def download_artifact(
+    url: str,
+    dest_path: PathLike,
+    min_bytes: int = 0,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE
+) -> ArtifactInfo:
+    """
+    Stream ``url`` into ``dest_path`` using the pooled HTTP client.
+
+    Raises:
+        ArtifactWriteError: On HTTP errors, network failures or write failures.
+    """
+    client = get_http_client()
+    with start_span("file.download", path=os.fspath(dest_path)) as span:
+        sink = await asyncio.to_thread(_AtomicFileSink, dest_path)
+        try:
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(chunk_size):
+                    await asyncio.to_thread(sink.write, chunk)
+        except BaseException as e:
+            await asyncio.to_thread(sink.abort)
+            if isinstance(e, (httpx.HTTPError, OSError)):
+                raise ArtifactWriteError(f"Error downloading {url}: {e}") from e
+            raise
+        info = await asyncio.to_thread(sink.commit, min_bytes)
+        span.set_attribute("size_bytes", info.size_bytes)
+        return info
@@ -0,0 +1,343 @@
+"""
+Blob Store
+==========
+
+Content-addressed storage for user-supplied binaries: brand logos, reference
+images and refinement masks. A file that is uploaded again, carried over from
+a run into a preset, or reused by later runs is stored once, and DB rows and
+run metadata hold its hash instead of the bytes.
+
+Layout:
+    {BLOB_STORE_DIR}/{sha[:2]}/{sha}         content (SHA-256 of the bytes)
+    {BLOB_STORE_DIR}/{sha[:2]}/{sha}.json    {"refs", "size_bytes", "content_type", "created_at"}
+
+Every holder (a run, a refinement job, a preset) takes one reference with
+``put_blob``/``retain_blob`` and gives it back with ``release_blob``; the
+content is deleted when the last reference goes. Run and job directories get
+a hard link (``link_blob``) so stages keep reading plain paths without a second
+copy on disk. Linked files must be replaced (write-then-rename), never
+rewritten in place, or the stored content would change under its hash.
+
+Uploads are streamed in with ``BlobUpload``: chunks go to a temp file inside
+the store while being hashed, so memory stays at one chunk, a size limit is
+enforced as the bytes arrive, and the finished file is renamed into place
+instead of being written a second time.
+"""
+
+import base64
+import binascii
+import contextlib
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from .artifact_writer import _AtomicFileSink, write_bytes_atomic
+from .constants import BLOB_STORE_DIR
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOCK_FILENAME = ".lock"
+INCOMING_DIRNAME = ".incoming"
+
+_BLOB_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+_DATA_URI_RE = re.compile(r"^data:(?P<type>[\w.+-]+/[\w.+-]+)?(?:;[^,]*)?;base64,", re.IGNORECASE)
+
+_lock = threading.RLock()
+
+
+class BlobNotFoundError(KeyError):
+    """Raised when a hash does not name a stored blob."""
+
+
+class BlobTooLargeError(ValueError):
+    """Raised when streamed content grows past the upload's size limit."""
+
+
+@dataclass
+class BlobInfo:
+    """A stored blob."""
+    sha256: str
+    size_bytes: int
+    content_type: Optional[str]
+    path: str
+
+
+def is_blob_hash(value: Any) -> bool:
+    return isinstance(value, str) and bool(_BLOB_HASH_RE.match(value))
+
+
+def _root() -> Path:
+    return Path(BLOB_STORE_DIR)
+
+
+def blob_path(sha256: str) -> Path:
+    """Path of a blob's content (which may not exist)."""
+    if not is_blob_hash(sha256):
+        raise BlobNotFoundError(sha256)
+    return _root() / sha256[:2] / sha256
+
+
+def _meta_path(sha256: str) -> Path:
+    return blob_path(sha256).with_suffix(".json")
+
+
+@contextlib.contextmanager
+def _locked() -> Iterator[None]:
+    """Serialize reference counting across threads and processes."""
+    root = _root()
+    root.mkdir(parents=True, exist_ok=True)
+    with _lock:
+        with open(root / LOCK_FILENAME, "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _read_meta(sha256: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_meta_path(sha256), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read blob metadata for {sha256[:12]}: {e}")
+        return None
+
+
+def _write_meta(sha256: str, meta: Dict[str, Any]) -> None:
+    write_bytes_atomic(json.dumps(meta, indent=2).encode("utf-8"), _meta_path(sha256))
+
+
+def _info(sha256: str, meta: Dict[str, Any]) -> BlobInfo:
+    return BlobInfo(
+        sha256=sha256,
+        size_bytes=meta.get("size_bytes", 0),
+        content_type=meta.get("content_type"),
+        path=str(blob_path(sha256)),
+    )
+
+
+def _add_reference(
+    sha256: str,
+    size_bytes: int,
+    content_type: Optional[str],
+    store: Callable[[Path], None]
+) -> BlobInfo:
+    """Take a reference to ``sha256``, calling ``store(path)`` first if the content is new."""
+    with _locked():
+        meta = _read_meta(sha256) if blob_path(sha256).exists() else None
+        if meta is None:
+            store(blob_path(sha256))
+            meta = {
+                "refs": 0,
+                "size_bytes": size_bytes,
+                "content_type": content_type,
+                "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            }
+        meta["refs"] += 1
+        if content_type and not meta.get("content_type"):
+            meta["content_type"] = content_type
+        _write_meta(sha256, meta)
+    return _info(sha256, meta)
+
+
+def put_blob(data: bytes, content_type: Optional[str] = None) -> BlobInfo:
+    """Store ``data`` (once) and take a reference to it."""
+    sha256 = hashlib.sha256(data).hexdigest()
+    return _add_reference(sha256, len(data), content_type, lambda dest: write_bytes_atomic(data, dest))
+
+
+class BlobUpload:
+    """
+    Content streamed into the store chunk by chunk.
+
+    ``write`` hashes each chunk into a temp file and raises BlobTooLargeError
+    once ``max_bytes`` is exceeded. ``path`` can be inspected (e.g. to probe an
+    image header) before ``commit`` stores the content and takes a reference;
+    ``abort`` drops it. Both are safe to call after the other.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self._sink = _AtomicFileSink(_root() / INCOMING_DIRNAME / uuid.uuid4().hex)
+
+    @property
+    def path(self) -> str:
+        """The content written so far (complete once the last chunk is written)."""
+        self.flush()
+        return self._sink.temp_path
+
+    @property
+    def size_bytes(self) -> int:
+        return self._sink.size_bytes
+
+    def write(self, chunk: bytes) -> None:
+        if self.max_bytes is not None and self._sink.size_bytes + len(chunk) > self.max_bytes:
+            raise BlobTooLargeError(f"Content exceeds {self.max_bytes} bytes")
+        self._sink.write(chunk)
+
+    def flush(self) -> None:
+        """Make the chunks written so far readable through ``path``."""
+        self._sink.flush()
+
+    def commit(self, content_type: Optional[str] = None) -> BlobInfo:
+        # Flush, fsync and rename to the staging path, then move it into place
+        staged = self._sink.commit()
+
+        def adopt(dest: Path) -> None:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staged.path, dest)
+
+        try:
+            return _add_reference(staged.sha256, staged.size_bytes, content_type, adopt)
+        finally:
+            # Content already stored: the staged copy is not needed
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(staged.path)
+
+    def abort(self) -> None:
+        self._sink.abort()
+
+
+def retain_blob(sha256: str) -> BlobInfo:
+    """Take another reference to a stored blob."""
+    with _locked():
+        meta = _read_meta(sha256)
+        if meta is None or not blob_path(sha256).exists():
+            raise BlobNotFoundError(sha256)
+        meta["refs"] += 1
+        _write_meta(sha256, meta)
+    return _info(sha256, meta)
+
+
+def release_blob(sha256: str) -> int:
+    """Give back a reference; returns the references left (0 once deleted)."""
+    if not is_blob_hash(sha256):
+        return 0
+    with _locked():
+        meta = _read_meta(sha256)
+        if meta is None:
+            return 0
+        meta["refs"] = max(0, meta["refs"] - 1)
+        if meta["refs"]:
+            _write_meta(sha256, meta)
+            return meta["refs"]
+        for path in (blob_path(sha256), _meta_path(sha256)):
+            with contextlib.suppress(FileNotFoundError):
+                path.unlink()
+        logger.info(f"Deleted unreferenced blob {sha256[:12]}")
+        return 0
+
+
+def release_blobs(hashes: Iterable[Optional[str]]) -> None:
+    """Give back one reference per hash (e.g. everything a deleted run held)."""
+    for sha256 in hashes:
+        if sha256:
+            release_blob(sha256)
+
+
+def get_blob(sha256: str) -> Optional[BlobInfo]:
+    """The stored blob for a hash, or None."""
+    if not is_blob_hash(sha256) or not blob_path(sha256).exists():
+        return None
+    meta = _read_meta(sha256) or {"size_bytes": blob_path(sha256).stat().st_size}
+    return _info(sha256, meta)
+
+
+def blob_refcount(sha256: str) -> int:
+    meta = _read_meta(sha256) if is_blob_hash(sha256) else None
+    return meta["refs"] if meta else 0
+
+
+def read_blob(sha256: str) -> bytes:
+    try:
+        return blob_path(sha256).read_bytes()
+    except FileNotFoundError:
+        raise BlobNotFoundError(sha256) from None
+
+
+def link_blob(sha256: str, dest_path: os.PathLike) -> Path:
+    """Make a blob available at ``dest_path`` (hard link, or a copy across filesystems)."""
+    source = blob_path(sha256)
+    if not source.exists():
+        raise BlobNotFoundError(sha256)
+    dest = Path(dest_path)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    with contextlib.suppress(FileNotFoundError):
+        dest.unlink()
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copyfile(source, dest)
+    return dest
+
+
+def decode_data_uri(value: str) -> Tuple[bytes, Optional[str]]:
+    """Bytes and media type of a base64 ``data:`` URI (or bare base64)."""
+    match = _DATA_URI_RE.match(value)
+    encoded = value[match.end():] if match else value
+    try:
+        data = base64.b64decode(encoded, validate=False)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid base64 data: {e}") from e
+    return data, (match.group("type") if match else None)
+
+
+def brand_kit_logo_hash(brand_kit: Any) -> Optional[str]:
+    """
+    Blob hash of the logo in a brand kit: a dict or a stored ``brand_kit``
+    column value (JSON, possibly JSON-encoded twice when read raw).
+    """
+    for _ in range(2):
+        if not isinstance(brand_kit, str):
+            break
+        try:
+            brand_kit = json.loads(brand_kit)
+        except ValueError:
+            return None
+    return brand_kit.get("logo_blob_sha256") if isinstance(brand_kit, dict) else None
+
+
+def store_brand_kit_logo(brand_kit: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Take one reference to a brand kit's logo for a new holder (run or preset).
+
+    An inline ``logo_file_base64`` is moved into the store and replaced by
+    ``logo_blob_sha256``; a kit that already names a stored logo is retained
+    as is. Raises ValueError for undecodable or unknown logos.
+    """
+    if not brand_kit:
+        return brand_kit
+    if not brand_kit.get("logo_file_base64"):
+        if brand_kit.get("logo_blob_sha256"):
+            try:
+                retain_blob(brand_kit["logo_blob_sha256"])
+            except BlobNotFoundError:
+                raise ValueError(f"Unknown logo blob: {brand_kit['logo_blob_sha256']}") from None
+        return brand_kit
+    data, content_type = decode_data_uri(brand_kit["logo_file_base64"])
+    if not data:
+        raise ValueError("Logo data is empty")
+    blob = put_blob(data, content_type)
+    stored = {key: value for key, value in brand_kit.items() if key != "logo_file_base64"}
+    stored["logo_blob_sha256"] = blob.sha256
+    stored["logo_content_type"] = blob.content_type
+    return stored
@@ -0,0 +1,84 @@
+"""
+Caption Brief Cache
+===================
+
+Caption generation runs an analyst LLM (strategy, visual concept and
+settings -> ``CaptionBrief``) and then a writer LLM (brief -> caption). The
+brief only depends on the analyst's inputs, so it is cached on disk and
+shared by caption versions, images and runs: a regeneration whose inputs
+produce the same brief costs a single writer call.
+
+Cache layout:
+    {CAPTION_BRIEF_CACHE_DIR}/{key[:2]}/{key}.json
+
+The key is the SHA-256 of the analyst model and the rendered analyst
+messages. Those messages carry everything that shapes the brief (strategy,
+visual concept, style context, brand voice, the instructions resolved from
+the caption settings, language and platform), while settings that never
+reach the analyst (processing mode, writer-only flags) leave the key alone.
+Bump ``BRIEF_CACHE_VERSION`` when ``CaptionBrief`` changes shape.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .artifact_writer import write_bytes_atomic
+from .constants import CAPTION_BRIEF_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+BRIEF_CACHE_VERSION = 1
+
+
+def brief_cache_key(model_id: Optional[str], messages: List[Dict[str, Any]]) -> str:
+    """Hash of the analyst call that produces a brief."""
+    canonical = json.dumps(
+        {"version": BRIEF_CACHE_VERSION, "model": model_id, "messages": messages},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _brief_path(key: str, cache_dir: Optional[os.PathLike] = None) -> Path:
+    return Path(cache_dir or CAPTION_BRIEF_CACHE_DIR) / key[:2] / f"{key}.json"
+
+
+def load_cached_brief(key: str, cache_dir: Optional[os.PathLike] = None) -> Optional[Dict[str, Any]]:
+    """The cached brief for ``key``, or None when missing or unreadable."""
+    path = _brief_path(key, cache_dir)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable caption brief cache entry {path}: {e}")
+        return None
+    brief = entry.get("brief") if isinstance(entry, dict) else None
+    return brief if isinstance(brief, dict) else None
+
+
+def store_brief(
+    key: str,
+    brief: Dict[str, Any],
+    model_id: Optional[str] = None,
+    cache_dir: Optional[os.PathLike] = None
+) -> None:
+    """Cache a brief under ``key``; failures are logged, never raised."""
+    entry = {"version": BRIEF_CACHE_VERSION, "model": model_id, "brief": brief}
+    try:
+        data = json.dumps(entry, ensure_ascii=False, indent=2).encode("utf-8")
+        write_bytes_atomic(data, _brief_path(key, cache_dir))
+    except Exception as e:
+        logger.warning(f"Could not cache caption brief {key[:12]}: {e}")
+
+
+def count_brief_lookup(result: str) -> None:
+    """Count a cache ``hit``, ``miss`` or ``refresh``."""
+    from .service_metrics import CAPTION_BRIEF_CACHE
+
+    CAPTION_BRIEF_CACHE.labels(result=result).inc()
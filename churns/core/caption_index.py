@@ -0,0 +1,269 @@
+"""
+Caption Index
+=============
+
+Per-image caption manifest that replaces globbing ``v*_result.json`` files.
+
+Manifest: ``data/runs/{run_id}/captions/{image_id}/manifest.json``
+
+    {
+      "next_version": 3,
+      "versions": {
+        "0": {"version": 0, "status": "completed", "caption_id": "...", "model_id": "...",
+              "settings_hash": "...", "created_at": "...", "completed_at": "...",
+              "result_file": "v0_result.json"},
+        "2": {"version": 2, "status": "pending", ...}
+      }
+    }
+
+Versions are reserved when a generation is requested and filled in when it
+finishes, so two concurrent regenerations never get the same number. All
+updates happen under a thread lock plus an ``flock`` on ``manifest.lock`` and
+are written atomically. The manifest only holds status and file pointers,
+so each update stays small; the caption text, brief, settings and usage stay
+in the version's result file, which listing reads for completed versions.
+
+Caption directories created before the manifest existed are indexed once from
+their ``v{n}_result.json`` files.
+"""
+
+import contextlib
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .artifact_writer import write_bytes_atomic
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.json"
+LOCK_FILENAME = "manifest.lock"
+
+STATUS_PENDING = "pending"
+STATUS_COMPLETED = "completed"
+
+_RESULT_FILE_RE = re.compile(r"^v(\d+)_result\.json$")
+
+# Fields a manifest entry keeps; anything else lives in the result file
+_ENTRY_FIELDS = (
+    "version", "status", "caption_id", "model_id", "settings_hash", "created_at", "completed_at", "result_file"
+)
+
+_lock = threading.RLock()
+
+
+def caption_directory(run_id: str, image_id: str) -> Path:
+    """Directory holding caption versions for one image of a run."""
+    return Path(f"./data/runs/{run_id}/captions/{image_id}")
+
+
+def settings_hash(settings: Optional[Dict[str, Any]]) -> str:
+    """Stable short hash of caption settings, for comparing versions."""
+    canonical = json.dumps(settings or {}, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+@contextlib.contextmanager
+def _locked(caption_dir: Path) -> Iterator[None]:
+    """Serialize manifest updates across threads and processes."""
+    caption_dir.mkdir(parents=True, exist_ok=True)
+    with _lock:
+        with open(caption_dir / LOCK_FILENAME, "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _read_manifest(caption_dir: Path) -> Optional[Dict[str, Any]]:
+    manifest_path = caption_dir / MANIFEST_FILENAME
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read caption manifest {manifest_path}: {e}")
+        return None
+
+
+def _write_manifest(caption_dir: Path, manifest: Dict[str, Any]) -> None:
+    payload = json.dumps(manifest, indent=2, ensure_ascii=False, default=str).encode("utf-8")
+    write_bytes_atomic(payload, caption_dir / MANIFEST_FILENAME)
+
+
+def _backfill_manifest(caption_dir: Path) -> Dict[str, Any]:
+    """Build a manifest from legacy ``v{n}_result.json`` files (one-time)."""
+    versions: Dict[str, Dict[str, Any]] = {}
+    if caption_dir.is_dir():
+        for path in caption_dir.iterdir():
+            match = _RESULT_FILE_RE.match(path.name)
+            if not match:
+                continue
+            version = int(match.group(1))
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    result = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable caption result {path}: {e}")
+                continue
+            versions[str(version)] = _completed_entry(version, result)
+
+    next_version = max((int(v) for v in versions), default=-1) + 1
+    return {"next_version": next_version, "versions": versions}
+
+
+def _load_or_backfill(caption_dir: Path) -> Dict[str, Any]:
+    manifest = _read_manifest(caption_dir)
+    if manifest is None:
+        return _backfill_manifest(caption_dir)
+    # Manifests written before entries were slimmed down carried whole results
+    for key, entry in manifest["versions"].items():
+        manifest["versions"][key] = {field: entry[field] for field in _ENTRY_FIELDS if field in entry}
+        if entry.get("status") == STATUS_COMPLETED:
+            manifest["versions"][key].setdefault("result_file", result_filename(entry["version"]))
+    return manifest
+
+
+def result_filename(version: int) -> str:
+    return f"v{version}_result.json"
+
+
+def _completed_entry(version: int, result: Dict[str, Any], caption_id: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "version": version,
+        "status": STATUS_COMPLETED,
+        "caption_id": caption_id,
+        "model_id": result.get("model_id"),
+        "settings_hash": settings_hash(result.get("settings_used", {})),
+        "created_at": result.get("created_at"),
+        "completed_at": result.get("completed_at") or result.get("created_at"),
+        "result_file": result_filename(version),
+    }
+
+
+def _with_result(caption_dir: Path, entry: Dict[str, Any]) -> Dict[str, Any]:
+    """A completed entry with the fields of its result file (text, settings, brief, usage)."""
+    result_path = caption_dir / entry.get("result_file", result_filename(entry["version"]))
+    try:
+        with open(result_path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read caption result {result_path}: {e}")
+        return dict(entry)
+    return {**result, **entry}
+
+
+def reserve_caption_version(
+    caption_dir: os.PathLike,
+    caption_id: Optional[str] = None,
+    model_id: Optional[str] = None,
+    settings: Optional[Dict[str, Any]] = None
+) -> int:
+    """
+    Atomically allocate the next caption version for an image.
+
+    The version is recorded as pending so a concurrent request gets the next
+    number. Blocking; call via ``asyncio.to_thread`` from async code.
+    """
+    caption_dir = Path(caption_dir)
+    with _locked(caption_dir):
+        manifest = _load_or_backfill(caption_dir)
+        version = manifest["next_version"]
+        manifest["next_version"] = version + 1
+        manifest["versions"][str(version)] = {
+            "version": version,
+            "status": STATUS_PENDING,
+            "caption_id": caption_id,
+            "model_id": model_id,
+            "settings_hash": settings_hash(settings),
+            "created_at": _now(),
+        }
+        _write_manifest(caption_dir, manifest)
+    return version
+
+
+def record_caption_result(
+    caption_dir: os.PathLike,
+    version: int,
+    result: Dict[str, Any],
+    caption_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Mark a version completed. ``result`` is the record already written to the
+    version's result file; the manifest only keeps its summary fields.
+    """
+    caption_dir = Path(caption_dir)
+    with _locked(caption_dir):
+        manifest = _load_or_backfill(caption_dir)
+        entry = _completed_entry(version, result, caption_id)
+        entry["completed_at"] = _now()
+        manifest["versions"][str(version)] = entry
+        manifest["next_version"] = max(manifest["next_version"], version + 1)
+        _write_manifest(caption_dir, manifest)
+    return entry
+
+
+def release_caption_version(caption_dir: os.PathLike, version: int) -> None:
+    """
+    Drop a pending version after a failed generation.
+
+    If it was the most recently reserved number it is handed out again, so
+    failures do not leave gaps in the version sequence.
+    """
+    caption_dir = Path(caption_dir)
+    with _locked(caption_dir):
+        manifest = _read_manifest(caption_dir)
+        if manifest is None:
+            return
+        entry = manifest["versions"].get(str(version))
+        if not entry or entry.get("status") != STATUS_PENDING:
+            return
+        del manifest["versions"][str(version)]
+        if manifest["next_version"] == version + 1:
+            manifest["next_version"] = version
+        _write_manifest(caption_dir, manifest)
+
+
+def list_caption_versions(caption_dir: os.PathLike) -> List[Dict[str, Any]]:
+    """Completed caption versions for an image with their results, ordered by version."""
+    caption_dir = Path(caption_dir)
+    manifest = _read_manifest(caption_dir)
+    if manifest is None:
+        if not caption_dir.is_dir():
+            return []
+        with _locked(caption_dir):
+            manifest = _load_or_backfill(caption_dir)
+            _write_manifest(caption_dir, manifest)
+
+    completed = [
+        entry for entry in manifest.get("versions", {}).values()
+        if entry.get("status") == STATUS_COMPLETED
+    ]
+    return [_with_result(caption_dir, entry) for entry in sorted(completed, key=lambda entry: entry["version"])]
+
+
+def get_caption_version(caption_dir: os.PathLike, version: int) -> Optional[Dict[str, Any]]:
+    """Return a single manifest entry (status and model, no result), or None if the version is unknown."""
+    manifest = _read_manifest(Path(caption_dir))
+    if manifest is None:
+        manifest = _backfill_manifest(Path(caption_dir))
+    return manifest.get("versions", {}).get(str(version))
@@ -33,6 +33,9 @@ from .constants import (
     IMAGE_REFINEMENT_MODEL_ID,
     get_image_generation_model_id
 )
+from .stub_provider import STUB_API_KEY, stub_providers_enabled
+from .provider_cassette import MODE_OFF, MODE_REPLAY, provider_cassette_mode
+from .provider_http import build_provider_http_client
 
 # Import OpenAI and related libraries
 try:
@@ -66,6 +69,12 @@ class ClientConfig:
         self.gemini_api_key = None
         self.openai_api_key = None
         
+        # Offline stub transport for load testing (USE_STUB_PROVIDERS=true)
+        self.use_stub_providers = False
+        
+        # Provider record/replay cassettes (PROVIDER_CASSETTE_MODE=record|replay)
+        self.provider_cassette_mode = MODE_OFF
+        
         # Use centralized configuration (from constants.py)
         self.max_llm_retries = MAX_LLM_RETRIES
         self.force_manual_json_parse = FORCE_MANUAL_JSON_PARSE
@@ -132,6 +141,23 @@ class ClientConfig:
         else:
             print(f"⚠️ Warning: .env file not found at {self.env_path}")
             print("  API keys should be set as environment variables or the pipeline will use simulation mode")
+        
+        self.use_stub_providers = stub_providers_enabled()
+        if self.use_stub_providers:
+            # Every client gets a placeholder key and talks to the local stub transport
+            self.openrouter_api_key = self.openrouter_api_key or STUB_API_KEY
+            self.gemini_api_key = self.gemini_api_key or STUB_API_KEY
+            self.openai_api_key = self.openai_api_key or STUB_API_KEY
+            print("🧪 USE_STUB_PROVIDERS enabled: all provider calls are served by the local stub (no network, no cost)")
+        
+        self.provider_cassette_mode = provider_cassette_mode()
+        if self.provider_cassette_mode != MODE_OFF:
+            if self.provider_cassette_mode == MODE_REPLAY:
+                # Replayed calls never reach a provider, so clients only need a placeholder key
+                self.openrouter_api_key = self.openrouter_api_key or STUB_API_KEY
+                self.gemini_api_key = self.gemini_api_key or STUB_API_KEY
+                self.openai_api_key = self.openai_api_key or STUB_API_KEY
+            print(f"📼 PROVIDER_CASSETTE_MODE={self.provider_cassette_mode}: provider calls go through run cassettes")
     
     def _check_model_config_overrides(self):
         """Check for environment variable overrides of model configuration."""
@@ -208,7 +234,8 @@ class ClientConfig:
                 base_client = OpenAI(
                     api_key=api_key_to_use,
                     base_url=base_url_to_use,
-                    max_retries=self.max_llm_retries
+                    max_retries=self.max_llm_retries,
+                    **self._http_client_kwargs()
                 )
                 
                 if instructor and not self.force_manual_json_parse:
@@ -228,6 +255,10 @@ class ClientConfig:
         
         return base_client, instructor_client_patched
     
+    def _http_client_kwargs(self) -> Dict[str, Any]:
+        """Extra OpenAI client arguments: the shared instrumented (and optionally stubbed/recorded) HTTP client."""
+        return {"http_client": build_provider_http_client()}
+    
     def _configure_clients(self):
         """Configure all LLM and image generation clients."""
         print("\n🔧 Configuring API Clients...")
@@ -284,7 +315,8 @@ class ClientConfig:
             try:
                 image_gen_client_openai = OpenAI(
                     api_key=self.openai_api_key,
-                    max_retries=self.max_llm_retries
+                    max_retries=self.max_llm_retries,
+                    **self._http_client_kwargs()
                 )
                 print(f"✅ OpenAI Image Generation client configured. Model: gpt-image-1")
             except Exception as e:
@@ -301,7 +333,8 @@ class ClientConfig:
             try:
                 image_refinement_client = OpenAI(
                     api_key=self.openai_api_key,
-                    max_retries=self.max_llm_retries
+                    max_retries=self.max_llm_retries,
+                    **self._http_client_kwargs()
                 )
                 print(f"✅ OpenAI Image Refinement client configured. Model: {IMAGE_REFINEMENT_MODEL_ID}")
             except Exception as e:
@@ -317,7 +350,10 @@ class ClientConfig:
         if provider == "Gemini":
             if google_genai and self.gemini_api_key:
                 try:
-                    image_gen_client_gemini = google_genai.Client(api_key=self.gemini_api_key)
+                    image_gen_client_gemini = google_genai.Client(
+                        api_key=self.gemini_api_key,
+                        http_options=google_genai.types.HttpOptions(httpx_client=build_provider_http_client())
+                    )
                     model_id = get_image_generation_model_id()
                     print(f"✅ Gemini Image Generation client configured. Model: {model_id}")
                 except Exception as e:
@@ -400,6 +436,8 @@ class ClientConfig:
         print(f"\n⚙️ Parsing Configuration:")
         print(f"  Force Manual JSON Parse: {self.force_manual_json_parse}")
         print(f"  Problematic Models: {self.instructor_tool_mode_problem_models}")
+        print(f"  Stub Providers: {self.use_stub_providers}")
+        print(f"  Provider Cassette Mode: {self.provider_cassette_mode}")
         
         configured_count = sum(1 for status in summary.values() if "✅" in status)
         total_count = len(summary)
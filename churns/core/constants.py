@@ -99,6 +99,35 @@ def get_image_generation_model_id() -> str:
 IMAGE_REFINEMENT_PROVIDER = "OpenAI"  # Always OpenAI for refinements
 IMAGE_REFINEMENT_MODEL_ID = "gpt-image-1"  # Always OpenAI for refinements
 
+# Image Derivatives Configuration (resized previews served from /files)
+# Presets map to the maximum edge length in pixels; aspect ratio is preserved
+IMAGE_DERIVATIVE_SIZE_PRESETS = {
+    "thumb": 256,
+    "small": 512,
+    "medium": 1024,
+    "large": 2048,
+}
+IMAGE_DERIVATIVE_FORMATS = ["webp", "avif", "jpeg", "png"]
+IMAGE_DERIVATIVE_DEFAULT_FORMAT = "webp"
+IMAGE_DERIVATIVE_DEFAULT_QUALITY = 80
+IMAGE_DERIVATIVE_CACHE_DIR = "./data/derivatives"
+# (size preset, format) pairs generated eagerly whenever a new image is written
+IMAGE_DERIVATIVE_PREGENERATE = [("thumb", "webp"), ("small", "webp")]
+
+# --- Blob Store ---
+# Content-addressed logos, reference images and masks (see churns.core.blob_store)
+BLOB_STORE_DIR = "./data/blobs"
+# Uploads are streamed into the store in chunks and rejected once over the limit
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+MAX_IMAGE_UPLOAD_BYTES = 50 * 1024 * 1024
+MAX_MASK_UPLOAD_BYTES = 4 * 1024 * 1024
+# File parts one multipart request may carry (see churns.api.uploads)
+MAX_UPLOAD_FILES = 4
+
+# --- Caption Brief Cache ---
+# Analyst briefs keyed by the hash of their inputs, shared by all runs
+CAPTION_BRIEF_CACHE_DIR = "./data/caption_briefs"
+
 # Models known to have issues with instructor's default TOOLS mode via OpenRouter
 INSTRUCTOR_TOOL_MODE_PROBLEM_MODELS = ["openai/o4-mini", "google/gemini-2.5-pro", "openai/o4-mini-high"]
 
@@ -0,0 +1,242 @@
+"""
+Image Derivatives
+=================
+
+Resized, re-encoded previews of run images (thumbnails for galleries and the
+refinement UI) generated on demand and cached on disk.
+
+Cache layout:
+    {IMAGE_DERIVATIVE_CACHE_DIR}/{sha[:2]}/{sha}_{preset}_q{quality}.{format}
+
+Derivatives are keyed by the SHA-256 of the source image plus the requested
+parameters, so identical sources share cache entries and a regenerated source
+never serves a stale preview. The same key doubles as a strong ETag.
+"""
+
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+from PIL import Image, features
+
+from .artifact_writer import write_bytes_artifact
+from .constants import (
+    IMAGE_DERIVATIVE_SIZE_PRESETS,
+    IMAGE_DERIVATIVE_FORMATS,
+    IMAGE_DERIVATIVE_DEFAULT_FORMAT,
+    IMAGE_DERIVATIVE_DEFAULT_QUALITY,
+    IMAGE_DERIVATIVE_CACHE_DIR,
+    IMAGE_DERIVATIVE_PREGENERATE,
+)
+
+logger = logging.getLogger(__name__)
+
+# Format name -> (Pillow encoder, media type, optional Pillow feature to check)
+_FORMAT_INFO = {
+    "webp": ("WEBP", "image/webp", "webp"),
+    "avif": ("AVIF", "image/avif", "avif"),
+    "jpeg": ("JPEG", "image/jpeg", None),
+    "png": ("PNG", "image/png", None),
+}
+
+DERIVABLE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp"}
+
+# Source hashes remembered; one entry per image served, least recently used dropped first
+MAX_SOURCE_HASHES = 4096
+
+# Source hash cache: path -> ((mtime_ns, size), sha256), in least recently used order
+_source_hash_cache: "OrderedDict[str, Tuple[Tuple[int, int], str]]" = OrderedDict()
+_source_hash_lock = threading.Lock()
+
+# Keep references to background pre-generation tasks so they are not collected
+_pending_tasks: Set[asyncio.Task] = set()
+
+
+class DerivativeError(ValueError):
+    """Raised for unsupported derivative parameters or undecodable sources."""
+
+
+@dataclass
+class DerivativeInfo:
+    """A cached derivative ready to be served."""
+    path: str
+    media_type: str
+    etag: str
+
+
+def is_derivable(path: os.PathLike) -> bool:
+    """Return True if previews can be generated for this file type."""
+    return Path(path).suffix.lower() in DERIVABLE_EXTENSIONS
+
+
+def file_sha256(path: os.PathLike) -> str:
+    """SHA-256 of a file, memoized on (mtime, size) so repeat requests skip the read."""
+    path_str = os.fspath(path)
+    stat = os.stat(path_str)
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    with _source_hash_lock:
+        cached = _source_hash_cache.get(path_str)
+        if cached and cached[0] == signature:
+            _source_hash_cache.move_to_end(path_str)
+            return cached[1]
+
+    hasher = hashlib.sha256()
+    with open(path_str, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    digest = hasher.hexdigest()
+    with _source_hash_lock:
+        _source_hash_cache[path_str] = (signature, digest)
+        _source_hash_cache.move_to_end(path_str)
+        while len(_source_hash_cache) > MAX_SOURCE_HASHES:
+            _source_hash_cache.popitem(last=False)
+    return digest
+
+
+def remove_run_derivatives(run_dir: os.PathLike) -> int:
+    """
+    Delete the cached derivatives of every image in a run directory; call it
+    before the directory is removed. Returns the number of files deleted.
+
+    Runs that share a source image (e.g. the same upload) share its
+    derivatives too; those are simply rendered again on their next request.
+    """
+    removed = 0
+    run_dir = Path(run_dir)
+    if not run_dir.is_dir():
+        return 0
+    for source in run_dir.rglob("*"):
+        if not source.is_file() or not is_derivable(source):
+            continue
+        try:
+            source_hash = file_sha256(source)
+        except OSError:
+            continue
+        with _source_hash_lock:
+            _source_hash_cache.pop(os.fspath(source), None)
+        for derivative in (Path(IMAGE_DERIVATIVE_CACHE_DIR) / source_hash[:2]).glob(f"{source_hash}_*"):
+            try:
+                derivative.unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+def normalize_params(
+    size: str,
+    image_format: Optional[str] = None,
+    quality: Optional[int] = None
+) -> Tuple[str, str, int]:
+    """Validate and fill defaults for derivative parameters."""
+    if size not in IMAGE_DERIVATIVE_SIZE_PRESETS:
+        raise DerivativeError(
+            f"Invalid size preset: {size}. Must be one of {list(IMAGE_DERIVATIVE_SIZE_PRESETS)}"
+        )
+
+    image_format = (image_format or IMAGE_DERIVATIVE_DEFAULT_FORMAT).lower()
+    if image_format == "jpg":
+        image_format = "jpeg"
+    if image_format not in IMAGE_DERIVATIVE_FORMATS:
+        raise DerivativeError(
+            f"Invalid format: {image_format}. Must be one of {IMAGE_DERIVATIVE_FORMATS}"
+        )
+    feature = _FORMAT_INFO[image_format][2]
+    if feature and not features.check(feature):
+        raise DerivativeError(f"Format {image_format} is not supported by this server")
+
+    quality = IMAGE_DERIVATIVE_DEFAULT_QUALITY if quality is None else quality
+    if not 1 <= quality <= 100:
+        raise DerivativeError("Quality must be between 1 and 100")
+
+    return size, image_format, quality
+
+
+def _derivative_path(source_hash: str, size: str, image_format: str, quality: int) -> Path:
+    return (
+        Path(IMAGE_DERIVATIVE_CACHE_DIR)
+        / source_hash[:2]
+        / f"{source_hash}_{size}_q{quality}.{image_format}"
+    )
+
+
+def _render_derivative(source_path: str, size: str, image_format: str, quality: int) -> bytes:
+    """Resize and encode the source image. CPU-bound; run off the event loop."""
+    encoder = _FORMAT_INFO[image_format][0]
+    max_edge = IMAGE_DERIVATIVE_SIZE_PRESETS[size]
+
+    try:
+        with Image.open(source_path) as img:
+            img.draft("RGB", (max_edge, max_edge))  # Fast JPEG downscale on decode
+            img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+            if encoder == "JPEG" and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            elif img.mode not in ("RGB", "RGBA", "L", "LA"):
+                img = img.convert("RGBA")
+
+            buffer = io.BytesIO()
+            save_kwargs = {"optimize": True} if encoder in ("JPEG", "PNG") else {}
+            if encoder != "PNG":
+                save_kwargs["quality"] = quality
+            img.save(buffer, format=encoder, **save_kwargs)
+            return buffer.getvalue()
+    except (OSError, ValueError) as e:
+        raise DerivativeError(f"Could not create derivative for {source_path}: {e}")
+
+
+async def get_or_create_derivative(
+    source_path: os.PathLike,
+    size: str,
+    image_format: Optional[str] = None,
+    quality: Optional[int] = None
+) -> DerivativeInfo:
+    """
+    Return the cached derivative for ``source_path``, rendering it on a miss.
+
+    Raises:
+        DerivativeError: If parameters are invalid or the source cannot be decoded.
+    """
+    size, image_format, quality = normalize_params(size, image_format, quality)
+    source_path = os.fspath(source_path)
+
+    source_hash = await asyncio.to_thread(file_sha256, source_path)
+    cache_path = _derivative_path(source_hash, size, image_format, quality)
+    media_type = _FORMAT_INFO[image_format][1]
+    etag = f'"{source_hash[:32]}-{size}-q{quality}-{image_format}"'
+
+    if not await asyncio.to_thread(cache_path.exists):
+        data = await asyncio.to_thread(_render_derivative, source_path, size, image_format, quality)
+        await write_bytes_artifact(data, cache_path)
+        logger.debug(f"Created {size}/{image_format} derivative for {source_path} ({len(data)} bytes)")
+
+    return DerivativeInfo(path=str(cache_path), media_type=media_type, etag=etag)
+
+
+async def pregenerate_derivatives(source_path: os.PathLike) -> None:
+    """Render the configured common previews for a newly written image."""
+    for size, image_format in IMAGE_DERIVATIVE_PREGENERATE:
+        try:
+            await get_or_create_derivative(source_path, size, image_format)
+        except Exception as e:
+            logger.warning(f"Could not pre-generate {size}/{image_format} derivative for {source_path}: {e}")
+
+
+def schedule_pregeneration(source_path: os.PathLike) -> None:
+    """Fire-and-forget ``pregenerate_derivatives`` so callers are not slowed down."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+
+    task = loop.create_task(pregenerate_derivatives(source_path))
+    _pending_tasks.add(task)
+    task.add_done_callback(_pending_tasks.discard)
@@ -0,0 +1,252 @@
+"""
+Image Registry
+==============
+
+Run-local manifest of every generated and refined image, recorded at write
+time so later lookups never have to list directories or sort by mtime.
+
+Manifest: ``{run_directory}/image_registry.json``
+
+    {
+      "version": 1,
+      "images": {
+        "original:0":        {"kind": "original", "generation_index": 0, "path": "edited_image_strategy_0_....png", ...},
+        "refinement:<job>":  {"kind": "refinement", "parent_image_id": "...", "path": "refinements/<job>/output.png", ...}
+      }
+    }
+
+Paths are stored relative to the run directory. Each entry also carries the
+image size and SHA-256 as written. Updates happen under a thread lock plus
+an ``flock`` on ``image_registry.lock``, so concurrent workers never lose
+each other's entries. Reads are cached per manifest and revalidated with a
+single ``stat`` call.
+
+Runs created before the registry existed are indexed once on first lookup
+(``ensure_registry``), after which they behave like new runs.
+"""
+
+import contextlib
+import datetime
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from .artifact_writer import write_bytes_atomic
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_FILENAME = "image_registry.json"
+LOCK_FILENAME = "image_registry.lock"
+REGISTRY_VERSION = 1
+RUNS_ROOT = "./data/runs"
+
+KIND_ORIGINAL = "original"
+KIND_REFINEMENT = "refinement"
+
+# Legacy filename patterns, only used when backfilling pre-registry runs
+_LEGACY_ORIGINAL_RE = re.compile(
+    r"^(?:generated|edited)_image_strategy_(\d+)(?:_\d+)?\.png$|^image_(\d+)(?:_[^/]*)?\.png$"
+)
+_LEGACY_REFINEMENT_RE = re.compile(r"^(?:refinement_(.+)|(.+?)_from_.+)\.png$")
+
+_write_lock = threading.RLock()
+# manifest path -> ((mtime_ns, size), images)
+_manifest_cache: Dict[str, Tuple[Tuple[int, int], Dict[str, Dict[str, Any]]]] = {}
+
+
+def run_directory(run_id: str) -> Path:
+    """Directory for a pipeline run."""
+    return Path(RUNS_ROOT) / run_id
+
+
+def image_key(kind: str, identifier: Any) -> str:
+    """Registry key: ``original:<generation_index>`` or ``refinement:<job_id>``."""
+    return f"{kind}:{identifier}"
+
+
+def _manifest_path(run_dir: os.PathLike) -> Path:
+    return Path(run_dir) / REGISTRY_FILENAME
+
+
+@contextlib.contextmanager
+def _locked(run_dir: Path) -> Iterator[None]:
+    """Serialize registry updates across threads and processes."""
+    run_dir.mkdir(parents=True, exist_ok=True)
+    with _write_lock:
+        with open(run_dir / LOCK_FILENAME, "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _read_manifest(run_dir: os.PathLike) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Return the images mapping, or None if the run has no manifest yet."""
+    manifest_path = _manifest_path(run_dir)
+    cache_key = str(manifest_path)
+    try:
+        stat = os.stat(manifest_path)
+    except FileNotFoundError:
+        _manifest_cache.pop(cache_key, None)
+        return None
+
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _manifest_cache.get(cache_key)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    try:
+        with open(manifest_path, "r") as f:
+            images = json.load(f).get("images", {})
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read image registry {manifest_path}: {e}")
+        return None
+
+    _manifest_cache[cache_key] = (signature, images)
+    return images
+
+
+def _write_manifest(run_dir: os.PathLike, images: Dict[str, Dict[str, Any]]) -> None:
+    manifest_path = _manifest_path(run_dir)
+    payload = json.dumps({"version": REGISTRY_VERSION, "images": images}, indent=2).encode("utf-8")
+    write_bytes_atomic(payload, manifest_path)
+    _manifest_cache.pop(str(manifest_path), None)
+
+
+def register_image(
+    run_dir: os.PathLike,
+    kind: str,
+    identifier: Any,
+    image_path: os.PathLike,
+    size_bytes: Optional[int] = None,
+    sha256: Optional[str] = None,
+    **fields: Any
+) -> Dict[str, Any]:
+    """
+    Record an image in the run's registry, replacing any previous entry for the key.
+
+    Blocking (small file I/O); call via ``asyncio.to_thread`` from async code.
+    Extra keyword fields (generation_index, parent_image_id, ...) are stored as-is.
+    """
+    run_dir = Path(run_dir)
+    image_path = Path(image_path)
+    try:
+        relative_path = image_path.resolve().relative_to(run_dir.resolve())
+    except ValueError:
+        relative_path = image_path
+
+    if size_bytes is None and image_path.exists():
+        size_bytes = image_path.stat().st_size
+
+    entry = {
+        "kind": kind,
+        "path": relative_path.as_posix(),
+        "size_bytes": size_bytes,
+        "sha256": sha256,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        **fields,
+    }
+
+    with _locked(run_dir):
+        images = dict(_read_manifest(run_dir) or _backfill_from_directory(run_dir))
+        images[image_key(kind, identifier)] = entry
+        _write_manifest(run_dir, images)
+
+    return entry
+
+
+def lookup_image(run_dir: os.PathLike, kind: str, identifier: Any) -> Optional[Dict[str, Any]]:
+    """Return the registry entry for an image, or None if it is not registered."""
+    return ensure_registry(run_dir).get(image_key(kind, identifier))
+
+
+def lookup_image_path(run_dir: os.PathLike, kind: str, identifier: Any) -> Optional[Path]:
+    """Return the on-disk path of a registered image, or None if unknown or deleted."""
+    entry = lookup_image(run_dir, kind, identifier)
+    if not entry:
+        return None
+    path = Path(run_dir) / entry["path"]
+    return path if path.exists() else None
+
+
+def ensure_registry(run_dir: os.PathLike) -> Dict[str, Dict[str, Any]]:
+    """
+    Return the run's registry, indexing legacy files once if no manifest exists.
+
+    The one-off backfill mirrors the old lookup rules (newest file wins) so
+    pre-registry runs resolve to the same images they always did.
+    """
+    images = _read_manifest(run_dir)
+    if images is not None:
+        return images
+
+    run_dir = Path(run_dir)
+    if not run_dir.is_dir():
+        return {}
+
+    with _locked(run_dir):
+        images = _read_manifest(run_dir)
+        if images is not None:
+            return images
+        images = _backfill_from_directory(run_dir)
+        _write_manifest(run_dir, images)
+        logger.info(f"Indexed {len(images)} existing images into {_manifest_path(run_dir)}")
+        return images
+
+
+def _backfill_from_directory(run_dir: Path) -> Dict[str, Dict[str, Any]]:
+    """Build registry entries from the legacy file layout of an existing run."""
+    newest: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+    def consider(key: str, path: Path, entry: Dict[str, Any]) -> None:
+        stat = path.stat()
+        if key in newest and newest[key][0] >= stat.st_mtime:
+            return
+        entry.update({
+            "path": path.relative_to(run_dir).as_posix(),
+            "size_bytes": stat.st_size,
+            "sha256": None,
+            "created_at": datetime.datetime.fromtimestamp(stat.st_mtime, datetime.timezone.utc).isoformat(),
+        })
+        newest[key] = (stat.st_mtime, entry)
+
+    for path in run_dir.iterdir():
+        match = _LEGACY_ORIGINAL_RE.match(path.name)
+        if match and path.is_file():
+            index = int(match.group(1) or match.group(2))
+            consider(image_key(KIND_ORIGINAL, index), path,
+                     {"kind": KIND_ORIGINAL, "generation_index": index})
+
+    refinements_dir = run_dir / "refinements"
+    if refinements_dir.is_dir():
+        legacy: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        for path in refinements_dir.iterdir():
+            if path.is_dir() and (path / "output.png").exists():
+                consider(image_key(KIND_REFINEMENT, path.name), path / "output.png",
+                         {"kind": KIND_REFINEMENT})
+                continue
+            match = _LEGACY_REFINEMENT_RE.match(path.name)
+            if match and path.exists():
+                job_id = match.group(1) or match.group(2)
+                legacy_key = image_key(KIND_REFINEMENT, job_id)
+                stat = path.stat()
+                if legacy_key not in legacy or legacy[legacy_key][0] < stat.st_mtime:
+                    legacy[legacy_key] = (stat.st_mtime, path)
+        # Per-job directories take precedence over flat legacy files
+        for key, (_, path) in legacy.items():
+            if key not in newest:
+                consider(key, path, {"kind": KIND_REFINEMENT})
+
+    return {key: entry for key, (_, entry) in newest.items()}
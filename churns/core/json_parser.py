@@ -12,6 +12,12 @@ Key Features:
 - Integration with FORCE_MANUAL_JSON_PARSE and problematic model handling
 - Comprehensive error reporting and debugging support
 
+Each candidate is decoded once: ``extract_json`` returns the parsed value
+together with the JSON text and its span in the response, so
+``extract_and_parse`` never parses the same text twice. Direct, "extra data"
+and embedded JSON are found with ``JSONDecoder.raw_decode``, and all regexes
+are compiled once at import.
+
 Usage:
     from churns.core.json_parser import RobustJSONParser
     
@@ -22,10 +28,52 @@ Usage:
 import json
 import re
 import traceback
-from typing import Dict, Any, List, Optional, Type, Union
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple, Type, Union
 from pydantic import BaseModel, ValidationError
 
 from .constants import FORCE_MANUAL_JSON_PARSE, INSTRUCTOR_TOOL_MODE_PROBLEM_MODELS
+from .tracing import start_span
+
+
+_DECODER = json.JSONDecoder()
+
+# Bounds the raw_decode scan over text with many stray braces
+MAX_SCAN_CANDIDATES = 64
+
+_PREFIX_PATTERNS = tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+    r'^(Here\'s the|Here is the|Here\'s|Here is)\s*(assessment|response|answer|result|json|output)[:.]?\s*',
+    r'^(Assessment|Response|Answer|Result|JSON|Output)[:.]?\s*',
+    r'^```json\s*',
+    r'^Let me\s+\w+.*?[:.]?\s*',
+    r'^I\'ll\s+\w+.*?[:.]?\s*',
+))
+# No leading \s*: it makes search() retry at every position, and the span is stripped anyway.
+_SUFFIX_PATTERNS = tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+    r'```\s*$',
+    r'(Let me know if you need.*|I hope this helps.*|Feel free to ask.*|Is there anything else.*)$',
+    r'(Please let me know.*|Any questions.*|Happy to help.*)$',
+))
+
+# Preprocessing strips a trailing fence, so the json block may run to the end
+_JSON_BLOCK = re.compile(r"```json\s*([\s\S]+?)\s*(?:```|$)", re.IGNORECASE)
+_CODE_BLOCK = re.compile(r"```\s*([\s\S]+?)\s*```", re.IGNORECASE)
+_OPENING_BRACKET = re.compile(r"[{\[]")
+
+_REPAIR_TRAILING_COMMA = re.compile(r',(\s*[}\]])')
+_REPAIR_UNQUOTED_KEY = re.compile(r'(?<!")(\w+)(?!"):')
+_REPAIR_STRING_LINE_BREAK = re.compile(r'"\s*\n\s*"')
+_REPAIR_UNQUOTED_VALUE = re.compile(r':\s*([a-zA-Z][a-zA-Z0-9_\s]*[a-zA-Z0-9])(?=\s*[,}])')
+
+_TRUNCATED_STRING_VALUE = re.compile(r':\s*"[^"]*$')
+_TRUNCATED_KEY_VALUE = re.compile(r'[,{]\s*"[^"]*"?\s*:?\s*$')
+_TRUNCATED_CONTAINER = re.compile(r'[,\[\{]\s*$')
+_UNCLOSED_JSON_BLOCK = re.compile(r'```json\s*(.*?)(?:```|$)', re.DOTALL)
+_INCOMPLETE_JSON_PATTERNS = tuple(re.compile(pattern) for pattern in (
+    r'\{\s*"[^"]*"\s*:\s*"[^"]*$',  # Object with unclosed string value
+    r'\[\s*"[^"]*$',                # Array with unclosed string
+    r'"\s*:\s*\{\s*"[^"]*$',       # Nested object with unclosed string
+    r'"[^"]*"\s*:\s*\[\s*$',       # Array value that's just opened
+))
 
 
 class JSONExtractionError(Exception):
@@ -38,6 +86,22 @@ class TruncatedResponseError(JSONExtractionError):
     pass
 
 
+class JSONExtraction(NamedTuple):
+    """A JSON value found in an LLM response."""
+    value: Any
+    text: str  # JSON text the value was decoded from (the repaired text if repair was needed)
+    start: int  # Span of the source text in the raw response
+    end: int
+    repaired: bool = False
+
+
+def _decode(text: str) -> Tuple[bool, Any]:
+    try:
+        return True, json.loads(text)
+    except json.JSONDecodeError:
+        return False, None
+
+
 class RobustJSONParser:
     """
     Centralized, robust JSON parser for LLM responses.
@@ -94,6 +158,16 @@ class RobustJSONParser:
             JSONExtractionError: If JSON cannot be extracted or validated
             TruncatedResponseError: If response appears to be truncated
         """
+        schema_name = expected_schema.__name__ if expected_schema else None
+        with start_span("json.parse", chars=len(raw_response or ""), schema=schema_name):
+            return self._extract_and_parse(raw_response, expected_schema, fallback_validation)
+    
+    def _extract_and_parse(
+        self, 
+        raw_response: str, 
+        expected_schema: Optional[Type[BaseModel]],
+        fallback_validation: Optional[callable]
+    ) -> Dict[str, Any]:
         # Step 1: Check for truncated response before attempting extraction
         if self._is_likely_truncated_response(raw_response):
             raise TruncatedResponseError(
@@ -101,9 +175,9 @@ class RobustJSONParser:
                 f"Last 100 characters: ...{raw_response[-100:]}"
             )
         
-        # Step 2: Extract JSON string
-        json_str = self.extract_json_string(raw_response)
-        if not json_str:
+        # Step 2: Extract and decode JSON (each candidate is decoded once)
+        extraction = self.extract_json(raw_response)
+        if extraction is None:
             # Check if the failure was due to truncation in a different pattern
             if self._contains_incomplete_json_patterns(raw_response):
                 raise TruncatedResponseError(
@@ -115,39 +189,9 @@ class RobustJSONParser:
                 f"Could not extract JSON from response. "
                 f"Raw content preview: {raw_response[:200]}..."
             )
+        parsed_data = extraction.value
         
-        # Step 3: Parse JSON string
-        try:
-            parsed_data = json.loads(json_str)
-        except json.JSONDecodeError as e:
-            # Check if this is a truncation-related decode error
-            if self._is_truncation_json_error(json_str, e):
-                raise TruncatedResponseError(
-                    f"JSON parsing failed due to truncated content. "
-                    f"JSONDecodeError: {e}. Last 100 chars: ...{json_str[-100:]}"
-                )
-            
-            if self.debug_mode:
-                print(f"Initial JSON parse failed: {e}")
-                print(f"Attempting repair on: {json_str[:200]}...")
-            
-            # Attempt repair and re-parse
-            repaired_json = self._attempt_json_repair(json_str)
-            if repaired_json:
-                try:
-                    parsed_data = json.loads(repaired_json)
-                    if self.debug_mode:
-                        print("JSON repair successful!")
-                except json.JSONDecodeError:
-                    pass
-            
-            if 'parsed_data' not in locals():
-                raise JSONExtractionError(
-                    f"Failed to parse JSON after extraction and repair attempts. "
-                    f"JSONDecodeError: {e}. Extracted JSON: {json_str[:500]}..."
-                )
-        
-        # Step 4: Validate with schema if provided
+        # Step 3: Validate with schema if provided
         if expected_schema:
             try:
                 validated_model = expected_schema(**parsed_data)
@@ -180,109 +224,111 @@ class RobustJSONParser:
         Returns:
             Extracted JSON string or None if not found
         """
+        extraction = self.extract_json(raw_text)
+        return extraction.text if extraction else None
+    
+    def extract_json(self, raw_text: str) -> Optional[JSONExtraction]:
+        """
+        Find and decode the JSON in an LLM response.
+        
+        Strategies, in order: markdown code blocks, the whole text (repaired
+        if needed, or its valid JSON prefix when followed by extra data), then
+        the outermost brackets and finally a ``raw_decode`` scan for the
+        longest embedded object or array.
+        
+        Args:
+            raw_text: Raw text response from LLM
+            
+        Returns:
+            The decoded value with its JSON text and span, or None if not found
+        """
         if not isinstance(raw_text, str) or not raw_text.strip():
             return None
         
         # Preprocess text to remove common problematic elements
-        cleaned_text = self._preprocess_response(raw_text)
-        
-        # Strategy 1: Extract from markdown code blocks
-        json_str = self._extract_from_markdown_blocks(cleaned_text)
-        if json_str:
-            return json_str
-        
-        # Strategy 2: Parse entire text directly
-        json_str = self._extract_direct_json(cleaned_text)
-        if json_str:
-            return json_str
-        
-        # Strategy 3: Handle "Extra data" JSON parse errors
-        json_str = self._extract_partial_json(cleaned_text)
-        if json_str:
-            return json_str
-        
-        # Strategy 4: Find JSON by brace/bracket matching
-        json_str = self._extract_by_bracket_matching(cleaned_text)
-        if json_str:
-            return json_str
-        
-        if self.debug_mode:
-            print(f"All extraction strategies failed for text: {raw_text[:300]}...")
+        offset, end = self._preprocess_span(raw_text)
+        text = raw_text[offset:end]
+        
+        extraction = (
+            self._extract_from_markdown_blocks(text)
+            or self._extract_direct_json(text)
+            or self._extract_by_bracket_matching(text)
+        )
+        if extraction is None:
+            if self.debug_mode:
+                print(f"All extraction strategies failed for text: {raw_text[:300]}...")
+            return None
         
-        return None
+        return extraction._replace(start=extraction.start + offset, end=extraction.end + offset)
     
     def _preprocess_response(self, raw_text: str) -> str:
         """Remove common problematic prefixes and suffixes from LLM responses."""
-        text = raw_text.strip()
+        start, end = self._preprocess_span(raw_text)
+        return raw_text[start:end]
+    
+    def _preprocess_span(self, raw_text: str) -> Tuple[int, int]:
+        """Span of the response left after removing problematic prefixes and suffixes."""
+        start, end = _strip_span(raw_text, 0, len(raw_text))
         
         # Remove common prefixes
-        prefix_patterns = [
-            r'^(Here\'s the|Here is the|Here\'s|Here is)\s*(assessment|response|answer|result|json|output)[:.]?\s*',
-            r'^(Assessment|Response|Answer|Result|JSON|Output)[:.]?\s*',
-            r'^```json\s*',
-            r'^Let me\s+\w+.*?[:.]?\s*',
-            r'^I\'ll\s+\w+.*?[:.]?\s*',
-        ]
-        
-        for pattern in prefix_patterns:
-            text = re.sub(pattern, '', text, flags=re.IGNORECASE)
-        
-        # Remove common suffixes
-        suffix_patterns = [
-            r'\s*```\s*$',
-            r'\s*(Let me know if you need.*|I hope this helps.*|Feel free to ask.*|Is there anything else.*)$',
-            r'\s*(Please let me know.*|Any questions.*|Happy to help.*)$',
-        ]
-        
-        for pattern in suffix_patterns:
-            text = re.sub(pattern, '', text, flags=re.IGNORECASE)
-        
-        return text.strip()
+        for pattern in _PREFIX_PATTERNS:
+            match = pattern.match(raw_text[start:end])
+            if match:
+                start += match.end()
+        
+        # Remove common suffixes (their ``.*$`` cannot cross a newline, so only the last line is searched)
+        for pattern in _SUFFIX_PATTERNS:
+            match = pattern.search(raw_text, raw_text.rfind('\n', start, end) + 1 or start, end)
+            if match:
+                start, end = _strip_span(raw_text, start, match.start())
+        
+        return _strip_span(raw_text, start, end)
     
-    def _extract_from_markdown_blocks(self, text: str) -> Optional[str]:
+    def _extract_from_markdown_blocks(self, text: str) -> Optional[JSONExtraction]:
         """Extract JSON from markdown code blocks."""
         # Try ```json ... ``` blocks first
-        match = re.search(r"```json\s*([\s\S]+?)\s*```", text, re.IGNORECASE)
+        match = _JSON_BLOCK.search(text)
         if match:
-            json_str = match.group(1).strip()
-            if self._is_valid_json(json_str):
-                return json_str
+            extraction = self._decode_span(text, *match.span(1))
+            if extraction:
+                return extraction
         
         # Try generic ``` ... ``` blocks
-        match = re.search(r"```\s*([\s\S]+?)\s*```", text, re.IGNORECASE)
+        match = _CODE_BLOCK.search(text)
         if match:
-            potential_json = match.group(1).strip()
-            if (self._looks_like_json(potential_json) and 
-                self._is_valid_json(potential_json)):
-                return potential_json
+            start, end = _strip_span(text, *match.span(1))
+            if self._looks_like_json(text[start:end]):
+                return self._decode_span(text, start, end)
         
         return None
     
-    def _extract_direct_json(self, text: str) -> Optional[str]:
-        """Try to parse the text directly as JSON, with repair attempt."""
+    def _extract_direct_json(self, text: str) -> Optional[JSONExtraction]:
+        """
+        Parse the text directly as JSON, with repair attempt.
+        
+        A single ``raw_decode`` covers both the whole-text case and the
+        "Extra data" case (valid JSON followed by explanation), whose valid
+        prefix is used when repairing the whole text does not help.
+        """
         try:
-            json.loads(text)
-            return text
+            value, end = _DECODER.raw_decode(text)
         except json.JSONDecodeError:
-            # Try repairing the JSON and parsing again
-            repaired = self._attempt_json_repair(text)
-            if repaired and self._is_valid_json(repaired):
-                return repaired
-            return None
-    
-    def _extract_partial_json(self, text: str) -> Optional[str]:
-        """Handle 'Extra data' JSON parse errors by extracting valid prefix."""
-        try:
-            json.loads(text)
-            return text  # Should not reach here, but just in case
-        except json.JSONDecodeError as e:
-            if "Extra data" in str(e) and hasattr(e, 'pos') and e.pos > 0:
-                potential_json = text[:e.pos].strip()
-                if self._is_valid_json(potential_json):
-                    return potential_json
+            value, end = None, None
+        
+        if end == len(text):
+            return JSONExtraction(value, text, 0, end)
+        
+        # Try repairing the JSON and parsing again
+        repaired = self._repair_json(text)
+        if repaired:
+            repaired_text, repaired_value = repaired
+            return JSONExtraction(repaired_value, repaired_text, 0, len(text), repaired=True)
+        
+        if end is not None:
+            return JSONExtraction(value, text[:end], 0, end)
         return None
     
-    def _extract_by_bracket_matching(self, text: str) -> Optional[str]:
+    def _extract_by_bracket_matching(self, text: str) -> Optional[JSONExtraction]:
         """Find JSON by matching opening and closing braces/brackets."""
         # Find object-like JSON
         first_brace = text.find('{')
@@ -291,17 +337,16 @@ class RobustJSONParser:
         json_candidate = None
         
         if first_brace != -1 and last_brace != -1 and first_brace < last_brace:
-            potential_obj = text[first_brace:last_brace + 1]
-            if self._is_valid_json(potential_obj):
-                json_candidate = potential_obj
+            json_candidate = self._decode_span(text, first_brace, last_brace + 1)
         
         # Find array-like JSON
         first_bracket = text.find('[')
         last_bracket = text.rfind(']')
         
-        if first_bracket != -1 and last_bracket != -1 and first_bracket < last_bracket:
-            potential_arr = text[first_bracket:last_bracket + 1]
-            if self._is_valid_json(potential_arr):
+        array_inside_object = json_candidate is not None and first_brace < first_bracket and last_bracket < last_brace
+        if first_bracket != -1 and last_bracket != -1 and first_bracket < last_bracket and not array_inside_object:
+            potential_arr = self._decode_span(text, first_bracket, last_bracket + 1)
+            if potential_arr:
                 # Prefer object over array if both found, unless array wraps object
                 if json_candidate:
                     if not (first_bracket > first_brace and last_bracket < last_brace):
@@ -309,7 +354,31 @@ class RobustJSONParser:
                 else:
                     json_candidate = potential_arr
         
-        return json_candidate
+        return json_candidate or self._scan_for_json(text)
+    
+    def _scan_for_json(self, text: str) -> Optional[JSONExtraction]:
+        """Longest object or array that ``raw_decode`` finds starting at an opening bracket."""
+        best = None
+        match = _OPENING_BRACKET.search(text)
+        for _ in range(MAX_SCAN_CANDIDATES):
+            if match is None:
+                break
+            start = match.start()
+            try:
+                value, end = _DECODER.raw_decode(text, start)
+            except json.JSONDecodeError:
+                match = _OPENING_BRACKET.search(text, start + 1)
+                continue
+            if best is None or end - start > best.end - best.start:
+                best = JSONExtraction(value, text[start:end], start, end)
+            match = _OPENING_BRACKET.search(text, end)
+        return best
+    
+    def _decode_span(self, text: str, start: int, end: int) -> Optional[JSONExtraction]:
+        start, end = _strip_span(text, start, end)
+        candidate = text[start:end]
+        ok, value = _decode(candidate)
+        return JSONExtraction(value, candidate, start, end) if ok else None
     
     def _looks_like_json(self, text: str) -> bool:
         """Quick heuristic to check if text looks like JSON."""
@@ -317,41 +386,37 @@ class RobustJSONParser:
         return ((text.startswith('{') and text.endswith('}')) or
                 (text.startswith('[') and text.endswith(']')))
     
-    def _is_valid_json(self, text: str) -> bool:
-        """Check if text is valid JSON."""
-        try:
-            json.loads(text)
-            return True
-        except json.JSONDecodeError:
-            return False
-    
     def _attempt_json_repair(self, json_str: str) -> Optional[str]:
         """Attempt to repair common JSON formatting issues."""
+        repaired = self._repair_json(json_str)
+        return repaired[0] if repaired else None
+    
+    def _repair_json(self, json_str: str) -> Optional[Tuple[str, Any]]:
+        """Repaired JSON text and its decoded value, or None if repair does not help."""
         if not json_str:
             return None
         
-        repaired = json_str
-        
-        # Fix single quotes to double quotes first (preserves string integrity)
-        repaired = repaired.replace("'", '"')
-        
-        # Fix trailing commas
-        repaired = re.sub(r',(\s*[}\]])', r'\1', repaired)
-        
-        # Fix unquoted keys (only match keys that aren't already quoted)
-        repaired = re.sub(r'(?<!")(\w+)(?!"):', r'"\1":', repaired)
-        
-        # Fix line breaks in strings (basic attempt)
-        repaired = re.sub(r'"\s*\n\s*"', '" "', repaired)
-        
-        # Fix missing quotes around string values (only unquoted values)
-        repaired = re.sub(r':\s*([a-zA-Z][a-zA-Z0-9_\s]*[a-zA-Z0-9])(?=\s*[,}])', r': "\1"', repaired)
-        
-        # Verify the repair worked
-        if self._is_valid_json(repaired):
-            return repaired
+        with start_span("json.repair", chars=len(json_str)) as repair_span:
+            # Fix single quotes to double quotes first (preserves string integrity)
+            repaired = json_str.replace("'", '"')
+            
+            # Fix trailing commas
+            repaired = _REPAIR_TRAILING_COMMA.sub(r'\1', repaired)
+            
+            # Fix unquoted keys (only match keys that aren't already quoted)
+            repaired = _REPAIR_UNQUOTED_KEY.sub(r'"\1":', repaired)
+            
+            # Fix line breaks in strings (basic attempt)
+            repaired = _REPAIR_STRING_LINE_BREAK.sub('" "', repaired)
+            
+            # Fix missing quotes around string values (only unquoted values)
+            repaired = _REPAIR_UNQUOTED_VALUE.sub(r': "\1"', repaired)
+            
+            # Verify the repair worked
+            ok, value = _decode(repaired)
+            repair_span.set_attribute("repaired", ok)
         
-        return None
+        return (repaired, value) if ok else None
     
     def _is_likely_truncated_response(self, raw_text: str) -> bool:
         """
@@ -369,21 +434,21 @@ class RobustJSONParser:
         text = raw_text.strip()
         
         # Pattern 1: Ends with incomplete JSON string (quote without closing)
-        if re.search(r':\s*"[^"]*$', text):
+        if _TRUNCATED_STRING_VALUE.search(text):
             return True
         
         # Pattern 2: Ends in the middle of a key-value pair
-        if re.search(r'[,{]\s*"[^"]*"?\s*:?\s*$', text):
+        if _TRUNCATED_KEY_VALUE.search(text):
             return True
         
         # Pattern 3: Ends with incomplete array or object
-        if re.search(r'[,\[\{]\s*$', text):
+        if _TRUNCATED_CONTAINER.search(text):
             return True
         
         # Pattern 4: Contains markdown code block start but no end
         if '```json' in text and not text.strip().endswith('```'):
             # Check if the JSON inside is incomplete
-            json_match = re.search(r'```json\s*(.*?)(?:```|$)', text, re.DOTALL)
+            json_match = _UNCLOSED_JSON_BLOCK.search(text)
             if json_match:
                 json_content = json_match.group(1).strip()
                 if json_content and not self._is_likely_complete_json(json_content):
@@ -405,50 +470,9 @@ class RobustJSONParser:
             return False
         
         # Look for JSON-like structures that are clearly incomplete
-        patterns = [
-            r'\{\s*"[^"]*"\s*:\s*"[^"]*$',  # Object with unclosed string value
-            r'\[\s*"[^"]*$',                # Array with unclosed string
-            r'"\s*:\s*\{\s*"[^"]*$',       # Nested object with unclosed string
-            r'"[^"]*"\s*:\s*\[\s*$',       # Array value that's just opened
-        ]
-        
-        for pattern in patterns:
-            if re.search(pattern, raw_text):
-                return True
-        
-        return False
-    
-    def _is_truncation_json_error(self, json_str: str, error: json.JSONDecodeError) -> bool:
-        """
-        Determine if a JSONDecodeError is likely due to truncation.
-        
-        Args:
-            json_str: The JSON string that failed to parse
-            error: The JSONDecodeError that occurred
-            
-        Returns:
-            True if error is likely due to truncation
-        """
-        error_msg = str(error).lower()
-        
-        # Common truncation-related JSON errors
-        truncation_indicators = [
-            "unterminated string",
-            "expecting ',' delimiter",
-            "expecting '}'" and json_str.strip().endswith('"'),
-            "expecting ']'" and json_str.strip().endswith('"'),
-            "end of json input",
-        ]
-        
-        for indicator in truncation_indicators:
-            if isinstance(indicator, str) and indicator in error_msg:
+        for pattern in _INCOMPLETE_JSON_PATTERNS:
+            if pattern.search(raw_text):
                 return True
-            elif isinstance(indicator, bool) and indicator:  # For composite conditions
-                return True
-        
-        # Check if error position is near the end of the string
-        if hasattr(error, 'pos') and error.pos > len(json_str) * 0.8:
-            return True
         
         return False
     
@@ -476,6 +500,15 @@ class RobustJSONParser:
         return False
 
 
+def _strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    """``text[start:end].strip()`` as a span."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
 # Convenience functions for backward compatibility and easy usage
 def extract_json_from_llm_response(
     raw_response: str, 
@@ -0,0 +1,488 @@
+"""
+LLM Response Streaming
+======================
+
+Optional streaming for chat completions (``LLM_STREAMING=true``), so stages
+see the output while it is generated instead of after the whole call:
+
+- ``IncrementalJSONParser`` follows the structure of a JSON reply chunk by
+  chunk. It rejects output that can never parse (a closing bracket that does
+  not match, a second value at the top level) and exposes the string fields
+  read so far, e.g. ``{"visual_concept.main_subject": "A steaming bowl of"}``.
+  It is as lenient as ``RobustJSONParser``'s repairs (single quotes, trailing
+  commas, unquoted keys and values) so it never rejects output that the
+  final parse would have accepted.
+- ``create_chat_completion`` streams the call, pushes partial output to an
+  ``on_partial`` callback (at most every ``LLM_STREAM_PARTIAL_INTERVAL_MS``),
+  and stops reading as soon as the reply is malformed or runs past
+  ``LLM_STREAM_RUNAWAY_FACTOR`` times its expected length. Those calls, and
+  replies cut off by ``max_tokens``, are retried straight away (up to
+  ``LLM_STREAM_MAX_RETRIES`` times) with ``max_tokens`` adjusted: capped near
+  the expected length after a runaway, raised after a truncation.
+  The result is an ordinary ``ChatCompletion`` (with usage when the provider
+  reports it), so callers parse and account for it exactly as before.
+  Aborted attempts are billed too, but the stream is closed before the
+  provider's usage chunk arrives, so their usage is estimated from the prompt
+  and the characters received and added to the returned completion's usage.
+
+Streaming needs the plain (non-instructor) client; calls that use an
+instructor ``response_model`` are made without it. ``partial_output_publisher``
+turns ``ctx.partial_output_callback`` (set by the API to forward to the run's
+WebSocket) into an ``on_partial`` callback for a stage.
+"""
+
+import logging
+import os
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .stage_resources import provider_wait
+from .tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RUNAWAY_FACTOR = 4.0
+DEFAULT_PARTIAL_INTERVAL_MS = 150.0
+DEFAULT_MAX_RETRIES = 1
+
+# Rough size of a token, used to turn character budgets into max_tokens
+CHARS_PER_TOKEN = 4
+# max_tokens multiplier for the retry of a reply cut off by the token limit
+TRUNCATION_RETRY_FACTOR = 1.5
+
+ABORT_MALFORMED = "malformed"
+ABORT_RUNAWAY = "runaway"
+ABORT_TRUNCATED = "truncated"
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_OPENERS = {"{": "}", "[": "]"}
+_CLOSERS = {"}": "{", "]": "["}
+# Runs of characters with no meaning to the parser's state
+_PLAIN_STRING_RUN = {'"': re.compile(r'[^"\\]+'), "'": re.compile(r"[^'\\]+")}
+_BARE_TOKEN_RUN = re.compile(r'[^\s{}\[\],:"\']+')
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def streaming_enabled() -> bool:
+    """Whether ``LLM_STREAMING`` turns on streamed chat calls."""
+    return _env_flag("LLM_STREAMING", False)
+
+
+class MalformedJSONError(ValueError):
+    """Streamed output can no longer become valid JSON."""
+
+
+class StreamAborted(Exception):
+    """A streamed call was stopped before the provider finished."""
+
+    def __init__(self, reason: str, detail: str):
+        super().__init__(f"{reason}: {detail}")
+        self.reason = reason
+        self.completion: Any = None  # What was received before the abort
+        self.usage: Optional[Dict[str, Any]] = None  # Reported or estimated usage of the attempt
+
+
+class IncrementalJSONParser:
+    """Structural JSON checker fed one chunk at a time."""
+
+    def __init__(self):
+        self.started = False
+        self.complete = False
+        self.chars = 0
+        self._stack: List[Dict[str, Any]] = []  # {"type": "{" or "[", "key": last key, "expect_key": bool}
+        self._quote: Optional[str] = None  # Quote of the string being read
+        self._string_is_key = False
+        self._string_path: Optional[str] = None  # Field path when the string is a tracked value
+        self._buffer: List[str] = []
+        self._escape: Optional[str] = None  # Pending escape sequence, e.g. "\\" or "\\u00"
+        self._in_bare_token = False
+        self._fields: Dict[str, str] = {}
+
+    @property
+    def fields(self) -> Dict[str, str]:
+        """String values read so far (the last one possibly partial), keyed by dotted path."""
+        fields = dict(self._fields)
+        if self._string_path is not None and not self._string_is_key:
+            fields[self._string_path] = "".join(self._buffer)
+        return fields
+
+    def feed(self, text: str) -> None:
+        """Consume the next chunk; raises ``MalformedJSONError`` once the output cannot parse."""
+        self.chars += len(text)
+        i, length = 0, len(text)
+        while i < length:
+            if self.complete:
+                # Trailing commentary is left to RobustJSONParser
+                return
+            if self._quote is not None:
+                i = self._feed_string(text, i)
+                continue
+
+            char = text[i]
+            if not self.started:
+                # Preambles and markdown fences come before the value
+                if char in _OPENERS:
+                    self.started = True
+                    self._open(char)
+                i += 1
+                continue
+
+            if char.isspace():
+                self._in_bare_token = False
+                i += 1
+            elif char in _OPENERS:
+                self._value_started()
+                self._open(char)
+                i += 1
+            elif char in _CLOSERS:
+                self._close(char)
+                i += 1
+            elif char == ",":
+                self._in_bare_token = False
+                frame = self._stack[-1]
+                frame["expect_key"] = frame["type"] == "{"
+                i += 1
+            elif char == ":":
+                self._in_bare_token = False
+                self._stack[-1]["expect_key"] = False
+                i += 1
+            elif char in ('"', "'"):
+                self._start_string(char)
+                i += 1
+            else:
+                # Numbers, literals and the unquoted keys/values repair can fix
+                match = _BARE_TOKEN_RUN.match(text, i)
+                self._bare_token(match.group())
+                i = match.end()
+
+    def _feed_string(self, text: str, i: int) -> int:
+        if self._escape is not None:
+            self._escape += text[i]
+            i += 1
+            self._finish_escape()
+            return i
+        char = text[i]
+        if char == self._quote:
+            self._end_string()
+            return i + 1
+        if char == "\\":
+            self._escape = ""
+            return i + 1
+        match = _PLAIN_STRING_RUN[self._quote].match(text, i)
+        if self._string_path is not None:
+            self._buffer.append(match.group())
+        return match.end()
+
+    def _finish_escape(self) -> None:
+        escape = self._escape
+        if escape[0] == "u":
+            if len(escape) < 5:
+                return
+            try:
+                decoded = chr(int(escape[1:], 16))
+            except ValueError:
+                decoded = escape
+        else:
+            decoded = _ESCAPES.get(escape, escape)
+        self._escape = None
+        if self._string_path is not None:
+            self._buffer.append(decoded)
+
+    def _open(self, char: str) -> None:
+        self._stack.append({"type": char, "key": None, "expect_key": char == "{"})
+
+    def _close(self, char: str) -> None:
+        self._in_bare_token = False
+        if self._stack[-1]["type"] != _CLOSERS[char]:
+            raise MalformedJSONError(f"'{char}' cannot close '{self._stack[-1]['type']}'")
+        self._stack.pop()
+        if not self._stack:
+            self.complete = True
+
+    def _value_started(self) -> None:
+        if not self._stack:
+            raise MalformedJSONError("Second value after the top-level JSON value")
+        frame = self._stack[-1]
+        if frame["type"] == "{" and frame["expect_key"]:
+            raise MalformedJSONError("Object or array used as a key")
+
+    def _bare_token(self, token: str) -> None:
+        frame = self._stack[-1]
+        if frame["type"] == "{" and frame["expect_key"]:
+            # An unquoted key, possibly split across chunks
+            frame["key"] = frame["key"] + token if self._in_bare_token else token
+        self._in_bare_token = True
+
+    def _start_string(self, quote: str) -> None:
+        self._in_bare_token = False
+        frame = self._stack[-1]
+        self._quote = quote
+        self._string_is_key = frame["type"] == "{" and frame["expect_key"]
+        self._buffer = []
+        self._string_path = None
+        if self._string_is_key:
+            self._string_path = ""  # Keys are collected to name the value that follows
+        elif frame["type"] == "{":
+            path = self._object_path()
+            if path is not None:
+                self._string_path = path
+
+    def _end_string(self) -> None:
+        value = "".join(self._buffer)
+        frame = self._stack[-1]
+        if self._string_is_key:
+            frame["key"] = value
+        elif self._string_path is not None:
+            self._fields[self._string_path] = value
+        self._quote = None
+        self._string_path = None
+        self._buffer = []
+
+    def _object_path(self) -> Optional[str]:
+        """Dotted path of the current object value; None inside arrays."""
+        keys = []
+        for frame in self._stack:
+            if frame["type"] != "{" or frame["key"] is None:
+                return None
+            keys.append(frame["key"])
+        return ".".join(keys)
+
+
+def partial_output_publisher(ctx: Any, source: str) -> Optional[Callable[[Dict[str, Any]], None]]:
+    """
+    ``on_partial`` callback forwarding a stage's streamed output through
+    ``ctx.partial_output_callback``, or None when nothing listens.
+    """
+    callback = getattr(ctx, "partial_output_callback", None)
+    if callback is None:
+        return None
+
+    def publish(partial: Dict[str, Any]) -> None:
+        try:
+            callback({"source": source, **partial})
+        except Exception as e:
+            logger.debug(f"Dropping partial output of {source}: {e}")
+
+    return publish
+
+
+def create_chat_completion(
+    client: Any,
+    llm_args: Dict[str, Any],
+    expect_json: bool = False,
+    expected_chars: Optional[int] = None,
+    on_partial: Optional[Callable[[Dict[str, Any]], None]] = None,
+    stream: Optional[bool] = None
+) -> Any:
+    """
+    ``client.chat.completions.create(**llm_args)``, streamed when enabled.
+
+    Args:
+        client: Plain OpenAI-compatible client
+        llm_args: Arguments of the call (without ``stream``)
+        expect_json: Whether the reply should be a JSON value (checked as it streams)
+        expected_chars: Typical reply length; ``LLM_STREAM_RUNAWAY_FACTOR`` times
+            this aborts the call (no limit when None)
+        on_partial: Receives ``{"text", "fields", "chars", "attempt", "done"}``
+            while the reply streams (``fields`` only for JSON replies)
+        stream: Overrides ``LLM_STREAMING``
+
+    Returns:
+        A ``ChatCompletion``; after the retries are used up, the last attempt's
+        (possibly incomplete) reply, for the caller's usual error handling
+    """
+    if not (streaming_enabled() if stream is None else stream) or "response_model" in llm_args:
+        return client.chat.completions.create(**llm_args)
+
+    max_retries = int(_env_number("LLM_STREAM_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+    runaway_chars = None
+    if expected_chars:
+        runaway_chars = int(expected_chars * _env_number("LLM_STREAM_RUNAWAY_FACTOR", DEFAULT_RUNAWAY_FACTOR))
+
+    args = dict(llm_args)
+    retry_reason = None
+    aborted_usage: List[Dict[str, Any]] = []
+    for attempt in range(1, max_retries + 2):
+        try:
+            if retry_reason is None:
+                completion = _stream_once(client, args, expect_json, runaway_chars, on_partial, attempt)
+            else:
+                with start_span("llm.retry", model=args.get("model"), reason=retry_reason,
+                                max_tokens=args.get("max_tokens")):
+                    completion = _stream_once(client, args, expect_json, runaway_chars, on_partial, attempt)
+            if aborted_usage:
+                # The aborted attempts were billed as well
+                completion = _with_usage(completion, aborted_usage + [_attempt_usage(completion, args)])
+            return completion
+        except StreamAborted as aborted:
+            if attempt > max_retries:
+                logger.warning(f"Streamed {args.get('model')} call aborted ({aborted}), no retries left")
+                return _with_usage(aborted.completion, aborted_usage + [aborted.usage])
+            aborted_usage.append(aborted.usage)
+            retry_args = dict(args)
+            max_tokens = args.get("max_tokens")
+            if aborted.reason == ABORT_TRUNCATED and max_tokens:
+                retry_args["max_tokens"] = int(max_tokens * TRUNCATION_RETRY_FACTOR)
+            elif aborted.reason == ABORT_RUNAWAY:
+                cap = max(256, 2 * expected_chars // CHARS_PER_TOKEN)
+                retry_args["max_tokens"] = min(max_tokens, cap) if max_tokens else cap
+            logger.info(f"Retrying streamed {args.get('model')} call after {aborted} "
+                        f"(max_tokens {max_tokens} -> {retry_args.get('max_tokens')})")
+            retry_reason = aborted.reason
+            args = retry_args
+
+
+def _estimate_usage(args: Dict[str, Any], completion_chars: int) -> Dict[str, Any]:
+    """Token usage guessed from the prompt text and the characters received."""
+    prompt_chars = 0
+    for message in args.get("messages") or []:
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, str):
+            prompt_chars += len(content)
+        elif isinstance(content, list):
+            prompt_chars += sum(len(part.get("text") or "") for part in content if isinstance(part, dict))
+    prompt_tokens = prompt_chars // CHARS_PER_TOKEN
+    completion_tokens = completion_chars // CHARS_PER_TOKEN
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _attempt_usage(completion: Any, args: Dict[str, Any]) -> Dict[str, Any]:
+    """Usage the provider reported for an attempt, else an estimate."""
+    if completion.usage is not None:
+        return completion.usage.model_dump(exclude_none=True)
+    content = completion.choices[0].message.content if completion.choices else ""
+    return _estimate_usage(args, len(content or ""))
+
+
+def _add_usage(total: Dict[str, Any], usage: Dict[str, Any]) -> Dict[str, Any]:
+    """Sum of two usage dicts, including nested token details."""
+    merged = dict(total)
+    for key, value in usage.items():
+        if isinstance(value, dict):
+            merged[key] = _add_usage(merged.get(key) or {}, value)
+        elif isinstance(value, int) and not isinstance(value, bool):
+            merged[key] = (merged.get(key) or 0) + value
+        elif key not in merged:
+            merged[key] = value
+    return merged
+
+
+def _with_usage(completion: Any, usages: List[Dict[str, Any]]) -> Any:
+    """``completion`` carrying the summed usage of all its attempts."""
+    from openai.types.chat import ChatCompletion
+
+    total: Dict[str, Any] = {}
+    for usage in usages:
+        total = _add_usage(total, usage)
+    return ChatCompletion.model_validate({**completion.model_dump(exclude_none=True), "usage": total})
+
+
+def _stream_once(
+    client: Any,
+    args: Dict[str, Any],
+    expect_json: bool,
+    runaway_chars: Optional[int],
+    on_partial: Optional[Callable[[Dict[str, Any]], None]],
+    attempt: int
+) -> Any:
+    from openai.types.chat import ChatCompletion
+
+    parser = IncrementalJSONParser() if expect_json else None
+    interval = _env_number("LLM_STREAM_PARTIAL_INTERVAL_MS", DEFAULT_PARTIAL_INTERVAL_MS) / 1000
+    parts: List[str] = []
+    chars = 0
+    finish_reason = None
+    usage = None
+    meta: Dict[str, Any] = {}
+    abort: Optional[StreamAborted] = None
+    last_published = 0.0
+
+    def publish(done: bool) -> None:
+        if on_partial is None:
+            return
+        partial = {"text": "".join(parts), "chars": chars, "attempt": attempt, "done": done}
+        if parser is not None:
+            partial["fields"] = parser.fields
+        on_partial(partial)
+
+    with start_span("llm.stream", model=args.get("model"), attempt=attempt) as span, provider_wait():
+        started = time.perf_counter()
+        stream = client.chat.completions.create(
+            **args, stream=True, stream_options={"include_usage": True}
+        )
+        try:
+            for chunk in stream:
+                meta = meta or {"id": chunk.id, "created": chunk.created, "model": chunk.model}
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                finish_reason = choice.finish_reason or finish_reason
+                text = choice.delta.content if choice.delta else None
+                if not text:
+                    continue
+                if not parts:
+                    span.set_attribute("time_to_first_token_ms", round((time.perf_counter() - started) * 1000, 1))
+                parts.append(text)
+                chars += len(text)
+
+                if parser is not None:
+                    try:
+                        parser.feed(text)
+                    except MalformedJSONError as e:
+                        abort = StreamAborted(ABORT_MALFORMED, str(e))
+                        break
+                if runaway_chars and chars > runaway_chars and not (parser and parser.complete):
+                    abort = StreamAborted(ABORT_RUNAWAY, f"{chars} characters, expected about {runaway_chars}")
+                    break
+
+                now = time.perf_counter()
+                if now - last_published >= interval:
+                    last_published = now
+                    publish(False)
+        finally:
+            stream.close()
+
+        if abort is None and finish_reason == "length" and not (parser and parser.complete):
+            abort = StreamAborted(ABORT_TRUNCATED, f"max_tokens {args.get('max_tokens')} reached")
+        span.set_attribute("chars", chars)
+        if abort is not None:
+            span.set_attribute("aborted", abort.reason)
+
+    completion = ChatCompletion.model_validate({
+        "id": meta.get("id", ""),
+        "object": "chat.completion",
+        "created": meta.get("created", int(time.time())),
+        "model": meta.get("model", args.get("model", "")),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(parts)},
+            "finish_reason": finish_reason or ("stop" if abort is None else "length"),
+        }],
+        "usage": usage.model_dump() if usage is not None else None,
+    })
+    if abort is not None:
+        abort.completion = completion
+        abort.usage = _attempt_usage(completion, args)
+        raise abort
+    publish(True)
+    return completion
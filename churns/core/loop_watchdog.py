@@ -0,0 +1,149 @@
+"""
+Event Loop Watchdog
+===================
+
+Detects code that blocks the API's event loop (synchronous provider calls,
+file I/O, image decoding on the loop thread) and reports which stage and
+function was responsible.
+
+``EventLoopWatchdog`` extends the lag monitor from
+``churns.core.service_metrics`` with a short heartbeat. Every wakeup that
+arrives more than ``EVENT_LOOP_BLOCK_THRESHOLD_MS`` late counts as a block:
+
+- ``churns_event_loop_blocks_total{stage, function}`` is incremented
+- a warning is logged with the stall duration
+
+With stack capture on (``EVENT_LOOP_BLOCK_STACKS``, default on when
+``LOG_LEVEL=DEBUG``) a watcher thread grabs the loop thread's stack while
+the block is still in progress, so the metric labels and the log name the
+offending stage module and function and the log carries the stack.
+Recent blocks are kept in ``recent_blocks`` for ``/api/v1/status`` and tests.
+"""
+
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Deque, Dict, Optional
+
+from .service_metrics import EVENT_LOOP_BLOCKS, EventLoopLagMonitor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_THRESHOLD_MS = 100.0
+# Heartbeats per threshold; bounds how much of a block can go unmeasured
+HEARTBEATS_PER_THRESHOLD = 4
+MAX_HEARTBEAT_INTERVAL_SECONDS = 0.5
+STACK_FRAMES_LOGGED = 15
+RECENT_BLOCKS_KEPT = 50
+
+UNKNOWN = "unknown"
+
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_STAGES_DIR = os.path.join(_PACKAGE_DIR, "stages")
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def describe_blocking_frame(frame) -> Dict[str, Any]:
+    """Stage, innermost repo function and formatted stack for a loop-thread frame."""
+    stage = stage_function = repo_function = None
+    walker = frame
+    while walker is not None:
+        filename = os.path.abspath(walker.f_code.co_filename)
+        module = os.path.splitext(os.path.basename(filename))[0]
+        if repo_function is None and filename.startswith(_PACKAGE_DIR + os.sep):
+            repo_function = f"{module}.{walker.f_code.co_name}"
+        if stage is None and filename.startswith(_STAGES_DIR + os.sep):
+            stage = module
+            stage_function = f"{module}.{walker.f_code.co_name}"
+        walker = walker.f_back
+    return {
+        "stage": stage or UNKNOWN,
+        # The stage's own code is the actionable frame even when the wait is deeper (e.g. in httpx)
+        "function": stage_function or repo_function or UNKNOWN,
+        "stack": "".join(traceback.format_stack(frame)[-STACK_FRAMES_LOGGED:])
+    }
+
+
+class EventLoopWatchdog(EventLoopLagMonitor):
+    """Lag monitor that attributes event-loop stalls to the code causing them."""
+
+    def __init__(self, threshold_ms: float = DEFAULT_BLOCK_THRESHOLD_MS, capture_stacks: bool = False):
+        self.threshold = threshold_ms / 1000
+        super().__init__(interval=min(MAX_HEARTBEAT_INTERVAL_SECONDS, self.threshold / HEARTBEATS_PER_THRESHOLD))
+        self.capture_stacks = capture_stacks
+        self.recent_blocks: Deque[Dict[str, Any]] = collections.deque(maxlen=RECENT_BLOCKS_KEPT)
+        self._loop_thread_id: Optional[int] = None
+        self._captured: Optional[Dict[str, Any]] = None
+        self._captured_beat: Optional[float] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._watcher_stop = threading.Event()
+
+    @classmethod
+    def from_env(cls) -> "EventLoopWatchdog":
+        """Configure from ``EVENT_LOOP_BLOCK_THRESHOLD_MS`` and ``EVENT_LOOP_BLOCK_STACKS``."""
+        try:
+            threshold_ms = float(os.getenv("EVENT_LOOP_BLOCK_THRESHOLD_MS", DEFAULT_BLOCK_THRESHOLD_MS))
+        except ValueError:
+            threshold_ms = DEFAULT_BLOCK_THRESHOLD_MS
+        debug = os.getenv("LOG_LEVEL", "INFO").strip().upper() == "DEBUG"
+        return cls(threshold_ms=threshold_ms, capture_stacks=_env_flag("EVENT_LOOP_BLOCK_STACKS", debug))
+
+    def start(self) -> None:
+        super().start()
+        self._loop_thread_id = threading.get_ident()
+        if self.capture_stacks and self._watcher is None:
+            self._watcher_stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name="event-loop-watchdog", daemon=True)
+            self._watcher.start()
+
+    async def stop(self) -> None:
+        await super().stop()
+        if self._watcher is not None:
+            self._watcher_stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self) -> None:
+        """Watcher thread: snapshot the loop thread's stack while a heartbeat is overdue."""
+        while not self._watcher_stop.wait(self.interval):
+            beat = self.beat_started
+            overdue = time.perf_counter() - beat - self.interval
+            if overdue < self.threshold or self._captured_beat == beat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._captured = describe_blocking_frame(frame)
+            self._captured_beat = beat
+
+    def _on_sample(self, lag: float) -> None:
+        if lag < self.threshold:
+            return
+        culprit = self._captured if self._captured_beat == self.beat_started else None
+        self._captured = None
+        stage = culprit["stage"] if culprit else UNKNOWN
+        function = culprit["function"] if culprit else UNKNOWN
+
+        EVENT_LOOP_BLOCKS.labels(stage=stage, function=function).inc()
+        self.recent_blocks.appendleft({
+            "at": time.time(),
+            "lag_seconds": round(lag, 4),
+            "stage": stage,
+            "function": function
+        })
+        if culprit:
+            logger.warning(
+                f"Event loop blocked for {lag * 1000:.0f}ms in stage {stage} at {function}\n{culprit['stack']}"
+            )
+        else:
+            logger.warning(f"Event loop blocked for {lag * 1000:.0f}ms (set EVENT_LOOP_BLOCK_STACKS=true to capture the stack)")
@@ -5,6 +5,7 @@ This module provides functions to calculate consistency metrics for STYLE_RECIPE
 measuring how well new generated images match the original style.
 """
 
+import importlib.util
 import numpy as np
 import logging
 from typing import Dict, Any, Optional, List, Tuple
@@ -12,21 +13,19 @@ from pathlib import Path
 from PIL import Image
 import colorsys
 
+from .model_pool import MODEL_CLIP, model_pool
+
 logger = logging.getLogger(__name__)
 
-# Optional imports for advanced metrics
-try:
-    from sentence_transformers import SentenceTransformer
-    SENTENCE_TRANSFORMERS_AVAILABLE = True
-except ImportError:
-    SENTENCE_TRANSFORMERS_AVAILABLE = False
+# Optional dependencies for advanced metrics. Only checked for here: importing
+# sentence-transformers (torch, transformers) or cv2 takes seconds, so they are
+# imported when a metric first needs them.
+SENTENCE_TRANSFORMERS_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
+if not SENTENCE_TRANSFORMERS_AVAILABLE:
     logger.warning("sentence-transformers not available, CLIP similarity metrics will be disabled")
 
-try:
-    import cv2
-    CV2_AVAILABLE = True
-except ImportError:
-    CV2_AVAILABLE = False
+CV2_AVAILABLE = importlib.util.find_spec("cv2") is not None
+if not CV2_AVAILABLE:
     logger.warning("opencv-python not available, advanced color metrics will be disabled")
 
 
@@ -38,18 +37,16 @@ class ConsistencyMetrics:
         self._initialize_clip_model()
     
     def _initialize_clip_model(self):
-        """Initialize CLIP model for image similarity calculation."""
+        """Use the pooled CLIP model (loaded once per process) for image similarity."""
         if not SENTENCE_TRANSFORMERS_AVAILABLE:
             logger.warning("CLIP model not available - similarity metrics will be disabled")
             return
         
-        try:
-            # Use a lightweight CLIP model for similarity calculation
-            self.clip_model = SentenceTransformer('clip-ViT-B-32')
-            logger.info("CLIP model initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize CLIP model: {e}")
-            self.clip_model = None
+        clip_model = model_pool.get(MODEL_CLIP)
+        if clip_model.wait_ready():
+            self.clip_model = clip_model
+        else:
+            logger.error(f"Failed to initialize CLIP model: {clip_model.error}")
     
     def calculate_consistency_metrics(
         self, 
@@ -123,8 +120,7 @@ class ConsistencyMetrics:
         
         try:
             # Convert images to embeddings
-            embedding1 = self.clip_model.encode(image1)
-            embedding2 = self.clip_model.encode(image2)
+            embedding1, embedding2 = self.clip_model.encode([image1, image2])
             
             # Calculate cosine similarity
             similarity = np.dot(embedding1, embedding2) / (
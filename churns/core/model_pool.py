@@ -0,0 +1,290 @@
+"""
+Embedding Model Pool
+====================
+
+Loads each embedding model (sentence-transformers) once per API process and
+serves encode requests from every run through it.
+
+- ``text_similarity``: the text-repair similarity model, loaded from
+  ``TEXT_SIMILARITY_MODEL_PATH`` (default ``churns/stages/artifacts/model``
+  resolved against the package, not the working directory)
+- ``clip``: the CLIP model behind the style-recipe consistency metrics,
+  ``CLIP_MODEL_NAME`` (default ``clip-ViT-B-32``)
+
+Each model has one worker thread that loads it and then drains a request
+queue, encoding whatever concurrent runs submitted within
+``MODEL_POOL_BATCH_WAIT_MS`` (up to ``MODEL_POOL_MAX_BATCH_SIZE`` inputs) in a
+single ``encode`` call. The lifespan starts loading the models listed in
+``MODEL_POOL_WARMUP`` at startup so the first request does not pay for (or
+race) the load; ``GET /health/ready`` reports 503 while they are loading. A
+model that fails to load (e.g. no ``text_similarity`` model on disk) does not
+hold readiness back: the endpoint reports it as degraded and only the
+requests that need it fail.
+
+The service runs one uvicorn worker per container, so one copy per process
+is one copy per node; scaling out with more workers would need the pool moved
+into its own process.
+"""
+
+import asyncio
+import concurrent.futures
+import importlib.util
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODEL_TEXT_SIMILARITY = "text_similarity"
+MODEL_CLIP = "clip"
+
+DEFAULT_TEXT_SIMILARITY_MODEL_PATH = Path(__file__).resolve().parent.parent / "stages" / "artifacts" / "model"
+DEFAULT_CLIP_MODEL_NAME = "clip-ViT-B-32"
+DEFAULT_WARMUP = MODEL_TEXT_SIMILARITY
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_BATCH_WAIT_MS = 5.0
+
+STATE_NOT_LOADED = "not_loaded"
+STATE_LOADING = "loading"
+STATE_READY = "ready"
+STATE_FAILED = "failed"
+
+
+def sentence_transformers_available() -> bool:
+    return importlib.util.find_spec("sentence_transformers") is not None
+
+
+def model_source(name: str) -> str:
+    """Absolute model path (or hub name) configured for a pooled model."""
+    if name == MODEL_TEXT_SIMILARITY:
+        path = Path(os.getenv("TEXT_SIMILARITY_MODEL_PATH", str(DEFAULT_TEXT_SIMILARITY_MODEL_PATH))).expanduser()
+        return str(path.resolve())
+    if name == MODEL_CLIP:
+        return os.getenv("CLIP_MODEL_NAME", DEFAULT_CLIP_MODEL_NAME)
+    raise ValueError(f"Unknown model '{name}', expected one of {(MODEL_TEXT_SIMILARITY, MODEL_CLIP)}")
+
+
+def _load_sentence_transformer(source: str) -> Any:
+    # Local paths must exist; anything else is treated as a hub model name
+    if os.path.isabs(source) and not os.path.exists(source):
+        raise FileNotFoundError(f"Model directory not found: {source}")
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(source)
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class PooledModel:
+    """One loaded model and the worker thread batching its encode requests."""
+
+    def __init__(
+        self,
+        name: str,
+        source: str,
+        loader: Callable[[str], Any] = _load_sentence_transformer,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        batch_wait_ms: float = DEFAULT_BATCH_WAIT_MS
+    ):
+        self.name = name
+        self.source = source
+        self.max_batch_size = max_batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self.state = STATE_NOT_LOADED
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.batches = 0
+        self.encoded_inputs = 0
+        self._loader = loader
+        self._model: Any = None
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._requests: "queue.Queue[Optional[Tuple[List[Any], Dict[str, Any], concurrent.futures.Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start_loading(self) -> None:
+        """Start the worker thread (and the model load) if it is not running."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.state = STATE_LOADING
+            self._thread = threading.Thread(target=self._run, name=f"model-pool-{self.name}", daemon=True)
+            self._thread.start()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until the model has loaded; ``False`` if loading failed or timed out."""
+        self.start_loading()
+        self._loaded.wait(timeout)
+        return self.state == STATE_READY
+
+    def submit(self, inputs: Sequence[Any], **encode_kwargs) -> concurrent.futures.Future:
+        """Queue ``inputs`` for encoding; the future resolves to one embedding per input."""
+        self.start_loading()
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        if self.state == STATE_FAILED:
+            future.set_exception(RuntimeError(f"Model {self.name} failed to load: {self.error}"))
+        else:
+            self._requests.put((list(inputs), encode_kwargs, future))
+        return future
+
+    def encode(self, inputs: Sequence[Any], **encode_kwargs) -> Any:
+        return self.submit(inputs, **encode_kwargs).result()
+
+    async def encode_async(self, inputs: Sequence[Any], **encode_kwargs) -> Any:
+        return await asyncio.wrap_future(self.submit(inputs, **encode_kwargs))
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "source": self.source,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+            "batches": self.batches,
+            "encoded_inputs": self.encoded_inputs
+        }
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._requests.put(None)
+
+    def _run(self) -> None:
+        started = time.perf_counter()
+        try:
+            logger.info(f"Loading {self.name} model from {self.source}")
+            self._model = self._loader(self.source)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = STATE_FAILED
+            logger.exception(f"Failed to load {self.name} model from {self.source}")
+        else:
+            self.load_seconds = round(time.perf_counter() - started, 3)
+            self.state = STATE_READY
+            logger.info(f"{self.name} model ready in {self.load_seconds:.1f}s")
+        finally:
+            self._loaded.set()
+
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            if self.state == STATE_FAILED:
+                for _, _, future in batch:
+                    future.set_exception(RuntimeError(f"Model {self.name} failed to load: {self.error}"))
+                continue
+            self._encode_batch(batch)
+
+    def _next_batch(self) -> Optional[List[Tuple[List[Any], Dict[str, Any], concurrent.futures.Future]]]:
+        """Block for one request, then collect whatever else arrives within the batch window."""
+        first = self._requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        size = len(first[0])
+        deadline = time.perf_counter() + self.batch_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                self._requests.put(None)
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    def _encode_batch(self, batch) -> None:
+        # Requests can only share an encode call when they ask for the same output format
+        groups: Dict[Tuple, list] = {}
+        for request in batch:
+            groups.setdefault(tuple(sorted(request[1].items())), []).append(request)
+
+        for requests in groups.values():
+            inputs = [item for request_inputs, _, _ in requests for item in request_inputs]
+            try:
+                embeddings = self._model.encode(inputs, **requests[0][1])
+            except Exception as e:
+                for _, _, future in requests:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.encoded_inputs += len(inputs)
+            offset = 0
+            for request_inputs, _, future in requests:
+                future.set_result(embeddings[offset:offset + len(request_inputs)])
+                offset += len(request_inputs)
+
+
+class ModelPool:
+    """The process's pooled models, created on first use."""
+
+    def __init__(self, loader: Callable[[str], Any] = _load_sentence_transformer):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._models: Dict[str, PooledModel] = {}
+        self._required: List[str] = []
+
+    def get(self, name: str) -> PooledModel:
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                model = self._models[name] = PooledModel(
+                    name,
+                    model_source(name),
+                    loader=self._loader,
+                    max_batch_size=int(_env_number("MODEL_POOL_MAX_BATCH_SIZE", DEFAULT_MAX_BATCH_SIZE)),
+                    batch_wait_ms=_env_number("MODEL_POOL_BATCH_WAIT_MS", DEFAULT_BATCH_WAIT_MS)
+                )
+            return model
+
+    def warm(self, names: Sequence[str]) -> None:
+        """Start loading ``names`` in the background; readiness waits until each has loaded or failed."""
+        for name in names:
+            self.get(name).start_loading()
+            if name not in self._required:
+                self._required.append(name)
+
+    def warm_from_env(self) -> None:
+        """Warm the models listed in ``MODEL_POOL_WARMUP`` (comma-separated, empty for none)."""
+        names = [name.strip() for name in os.getenv("MODEL_POOL_WARMUP", DEFAULT_WARMUP).split(",") if name.strip()]
+        if names and not sentence_transformers_available():
+            logger.warning(f"sentence-transformers not installed, not warming models {names}")
+            return
+        self.warm(names)
+
+    def ready(self) -> bool:
+        return all(self.get(name).state in (STATE_READY, STATE_FAILED) for name in self._required)
+
+    def failed(self) -> List[str]:
+        """Warmed models that could not be loaded."""
+        return [name for name in self._required if self.get(name).state == STATE_FAILED]
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            models = dict(self._models)
+        return {
+            "ready": self.ready(),
+            "degraded": self.failed(),
+            "required": list(self._required),
+            "models": {name: model.status() for name, model in models.items()}
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            models = list(self._models.values())
+        for model in models:
+            model.close()
+
+
+model_pool = ModelPool()
@@ -0,0 +1,328 @@
+"""
+Prompt Cache Accounting
+=======================
+
+Providers bill input tokens served from their prompt cache at a discount
+(``TokenCostManager.calculate_cost`` halves them) and answer sooner, but a
+prefix is only cached when it is identical from one call to the next. This
+module measures both sides per stage and model:
+
+- tokens: ``stage_token_usage`` sums the ``ctx.llm_usage`` entries a stage
+  added into input, cached input and output tokens. The executor keeps the
+  result in ``ctx.stage_token_usage`` and the API persists it on the
+  ``PipelineStage`` row (``STAGE_TOKEN_COLUMNS``), with the model the stage
+  called most
+- prefix stability: while ``record_stage_prompts(stage)`` is open (the
+  executor opens it around every stage) the instrumented provider
+  transports hand each chat request to ``observe_chat_request``, which
+  compares the request's prompt (tools, then messages) with the previous
+  request of the same stage and model. Shared prefix lengths and an excerpt
+  of where the prompts first differed are kept in this process for
+  ``prefix_stability_report``. This runs before every chat call, on the
+  event loop for async clients, so inline images are replaced by a digest
+  in the raw body before it is parsed, bodies over ``MAX_OBSERVED_BODY_BYTES``
+  are not compared, and only the first ``MAX_TRACKED_PREFIX_CHARS`` of each
+  prompt are kept
+
+``GET /api/v1/admin/prompt-cache`` combines the persisted token totals of
+recent runs with the in-process prefix stability.
+"""
+
+import contextlib
+import contextvars
+import hashlib
+import json
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .prompt_templates import cached_prompt_tokens
+
+logger = logging.getLogger(__name__)
+
+# OpenAI caches prompts of at least 1024 tokens, in 128-token steps
+MIN_CACHEABLE_PREFIX_TOKENS = 1024
+# Rough size of a token, used to estimate token counts of prompt text
+CHARS_PER_TOKEN = 4
+# Characters shown on each side of the point where two prompts diverge
+DIVERGENCE_EXCERPT_CHARS = 60
+# Prompt characters kept per stage and model, far past the cache minimum
+MAX_TRACKED_PREFIX_CHARS = 32 * 1024
+# Request bodies larger than this (after images are digested) are only counted
+MAX_OBSERVED_BODY_BYTES = 1024 * 1024
+# Inline data URIs shorter than this are left in the body
+MIN_DIGESTED_DATA_URI_BYTES = 256
+# Bytes from each end of a data URI that go into its digest
+DATA_URI_DIGEST_SAMPLE_BYTES = 4096
+
+
+def estimate_tokens(chars: float) -> int:
+    return int(chars / CHARS_PER_TOKEN)
+
+
+class StagePromptRecord:
+    """Chat calls made by one stage execution."""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.models: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, model: str) -> None:
+        with self._lock:
+            self.models[model] += 1
+
+    @property
+    def model_id(self) -> Optional[str]:
+        """The model called most often, None when the stage made no chat calls."""
+        with self._lock:
+            return self.models.most_common(1)[0][0] if self.models else None
+
+
+_current_record: contextvars.ContextVar[Optional[StagePromptRecord]] = contextvars.ContextVar(
+    "churns_stage_prompt_record", default=None
+)
+
+
+@contextlib.contextmanager
+def record_stage_prompts(stage: str) -> Iterator[StagePromptRecord]:
+    """Attribute chat requests made inside the block (and threads it starts) to ``stage``."""
+    record = StagePromptRecord(stage)
+    token = _current_record.set(record)
+    try:
+        yield record
+    finally:
+        _current_record.reset(token)
+
+
+def current_stage_prompts() -> Optional[StagePromptRecord]:
+    return _current_record.get()
+
+
+def stage_token_usage(usage_entries: Iterable[Any], model_id: Optional[str] = None) -> Dict[str, Any]:
+    """Input, cached input and output tokens of a stage's ``ctx.llm_usage`` entries."""
+    input_tokens = cached_input_tokens = output_tokens = 0
+    for usage in usage_entries:
+        if not isinstance(usage, dict):
+            continue
+        input_tokens += usage.get("prompt_tokens") or 0
+        cached_input_tokens += cached_prompt_tokens(usage)
+        output_tokens += usage.get("completion_tokens") or 0
+    return {
+        "model_id": model_id,
+        "input_tokens": input_tokens,
+        "cached_input_tokens": cached_input_tokens,
+        "output_tokens": output_tokens,
+    }
+
+
+def _content_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if not isinstance(content, list):
+        return json.dumps(content, sort_keys=True, default=str)
+    parts = []
+    for part in content:
+        if not isinstance(part, dict):
+            parts.append(str(part))
+        elif part.get("type") == "text":
+            parts.append(part.get("text") or "")
+        else:
+            # Images and other parts are compared by digest instead of their (base64) payload
+            digest = hashlib.sha1(json.dumps(part, sort_keys=True, default=str).encode()).hexdigest()[:12]
+            parts.append(f"[{part.get('type', 'part')}:{digest}]")
+    return "\n".join(parts)
+
+
+def prompt_text(payload: Dict[str, Any]) -> str:
+    """The cache-relevant part of a chat request, in the order providers hash it."""
+    sections = []
+    if payload.get("tools"):
+        sections.append("tools: " + json.dumps(payload["tools"], sort_keys=True))
+    for message in payload.get("messages") or []:
+        if isinstance(message, dict):
+            sections.append(f"{message.get('role')}: {_content_text(message.get('content'))}")
+    return "\n".join(sections)
+
+
+def _shared_prefix_length(a: str, b: str) -> int:
+    limit = min(len(a), len(b))
+    low, high = 0, limit
+    # Binary search on prefix equality (slice comparisons run in C)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[:mid] == b[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+class _PrefixStats:
+    def __init__(self):
+        self.requests = 0
+        self.compared = 0
+        self.prompt_chars = 0
+        self.shared_prefix_chars = 0
+        self.min_shared_prefix_chars: Optional[int] = None
+        self.last_prompt: Optional[str] = None
+        self.last_divergence: Optional[Dict[str, Any]] = None
+
+
+class PrefixStabilityTracker:
+    """How much of each request's prompt repeats the previous request of its stage and model."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], _PrefixStats] = {}
+
+    def observe(self, stage: str, model: str, prompt: str) -> Optional[int]:
+        """
+        Record one request; returns the characters it shares with the previous
+        one (at most ``MAX_TRACKED_PREFIX_CHARS``).
+        """
+        prompt_chars = len(prompt)
+        prompt = prompt[:MAX_TRACKED_PREFIX_CHARS]
+        with self._lock:
+            stats = self._stats.setdefault((stage, model), _PrefixStats())
+            previous = stats.last_prompt
+            stats.requests += 1
+            stats.last_prompt = prompt
+            if previous is None:
+                return None
+            shared = _shared_prefix_length(previous, prompt)
+            stats.compared += 1
+            stats.prompt_chars += prompt_chars
+            stats.shared_prefix_chars += shared
+            if stats.min_shared_prefix_chars is None or shared < stats.min_shared_prefix_chars:
+                stats.min_shared_prefix_chars = shared
+            if shared < max(len(previous), len(prompt)):
+                start = max(0, shared - DIVERGENCE_EXCERPT_CHARS)
+                end = shared + DIVERGENCE_EXCERPT_CHARS
+                stats.last_divergence = {
+                    "offset_chars": shared,
+                    "previous": previous[start:end],
+                    "current": prompt[start:end],
+                }
+            return shared
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Per stage and model, least stable prefixes first."""
+        with self._lock:
+            rows = []
+            for (stage, model), stats in self._stats.items():
+                mean_prompt = stats.prompt_chars / stats.compared if stats.compared else 0.0
+                mean_shared = stats.shared_prefix_chars / stats.compared if stats.compared else 0.0
+                rows.append({
+                    "stage": stage,
+                    "model": model,
+                    "requests": stats.requests,
+                    "compared_requests": stats.compared,
+                    "mean_prompt_tokens": estimate_tokens(mean_prompt),
+                    "mean_shared_prefix_tokens": estimate_tokens(mean_shared),
+                    "min_shared_prefix_tokens": (
+                        estimate_tokens(stats.min_shared_prefix_chars)
+                        if stats.min_shared_prefix_chars is not None else None
+                    ),
+                    "shared_prefix_ratio": round(mean_shared / mean_prompt, 4) if mean_prompt else None,
+                    # Long enough to cache, yet consecutive prompts part before the cache minimum
+                    "unstable_prefix": bool(
+                        stats.compared
+                        and estimate_tokens(mean_prompt) >= MIN_CACHEABLE_PREFIX_TOKENS
+                        and estimate_tokens(mean_shared) < MIN_CACHEABLE_PREFIX_TOKENS
+                    ),
+                    "last_divergence": stats.last_divergence,
+                })
+        rows.sort(key=lambda row: (not row["unstable_prefix"], row["shared_prefix_ratio"] or 0.0))
+        return rows
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+prefix_stability = PrefixStabilityTracker()
+
+
+def _digest_data_uris(body: bytes) -> bytes:
+    """``body`` with each long ``"data:..."`` JSON string replaced by a short digest."""
+    parts = []
+    position = 0
+    while True:
+        start = body.find(b'"data:', position)
+        if start < 0:
+            break
+        # Base64 holds no quotes or escapes, so the next quote ends the string
+        end = body.find(b'"', start + 1)
+        if end < 0:
+            break
+        if end - start > MIN_DIGESTED_DATA_URI_BYTES:
+            # Length and both ends tell images apart without hashing megabytes
+            sample = DATA_URI_DIGEST_SAMPLE_BYTES
+            digest = hashlib.sha1(b"%d" % (end - start) + body[start:start + sample] + body[end - sample:end])
+            parts += [body[position:start], b'"[data:', digest.hexdigest()[:12].encode(), b']"']
+        else:
+            parts.append(body[position:end + 1])
+        position = end + 1
+    if not parts:
+        return body
+    parts.append(body[position:])
+    return b"".join(parts)
+
+
+def observe_chat_request(model: str, body: bytes) -> None:
+    """Record a chat completion request body for the current stage, if any."""
+    record = _current_record.get()
+    if record is None:
+        return
+    record.add(model)
+    if not isinstance(body, bytes):
+        return
+    # Images are compared by digest, so their base64 is never decoded as JSON
+    body = _digest_data_uris(body)
+    if len(body) > MAX_OBSERVED_BODY_BYTES:
+        return
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return
+    if isinstance(payload, dict):
+        prefix_stability.observe(record.stage, model, prompt_text(payload))
+
+
+def prefix_stability_report() -> List[Dict[str, Any]]:
+    return prefix_stability.report()
+
+
+def summarize_stage_token_rows(rows: Iterable[Any]) -> List[Dict[str, Any]]:
+    """
+    Cached versus uncached input tokens per stage and model from
+    ``PipelineStage`` rows (or anything with the same attributes).
+    """
+    totals: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for row in rows:
+        input_tokens = getattr(row, "input_tokens", None)
+        if not input_tokens:
+            continue
+        model = getattr(row, "model_id", None) or "unknown"
+        entry = totals.setdefault((row.stage_name, model), {
+            "stage": row.stage_name,
+            "model": model,
+            "stage_runs": 0,
+            "input_tokens": 0,
+            "cached_input_tokens": 0,
+            "output_tokens": 0,
+        })
+        entry["stage_runs"] += 1
+        entry["input_tokens"] += input_tokens
+        entry["cached_input_tokens"] += getattr(row, "cached_input_tokens", None) or 0
+        entry["output_tokens"] += getattr(row, "output_tokens", None) or 0
+
+    summary = []
+    for entry in totals.values():
+        entry["uncached_input_tokens"] = entry["input_tokens"] - entry["cached_input_tokens"]
+        entry["cache_hit_rate"] = round(entry["cached_input_tokens"] / entry["input_tokens"], 4)
+        summary.append(entry)
+    summary.sort(key=lambda entry: (entry["cache_hit_rate"], -entry["input_tokens"]))
+    return summary
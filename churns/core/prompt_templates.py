@@ -0,0 +1,137 @@
+"""
+Prompt Templates
+================
+
+Stage system prompts are several KB of text assembled from fixed sections
+and a handful of flags (creativity level, reference image, text rendering,
+language, instructor mode). ``prompt_template`` memoizes such a builder per
+flag combination, so each variant is assembled once per process:
+
+    @prompt_template("style_guide")
+    def _build_style_guider_system_prompt(creativity_level, task_type, ...):
+        ...
+
+Builders take only hashable flags; anything that changes per request (the
+visual concept, strategies) belongs in the user prompt or is appended after
+the template. Builders keep the sections that no flag touches first: OpenAI
+caches prompt prefixes (reported as ``cached_tokens``), so the longer the
+prefix shared by every variant, the more input tokens are billed at the
+cached rate.
+
+Two kinds of hit rate are reported per stage:
+
+- ``template_cache_stats()``: renders served from the memo versus built,
+  also exported as ``churns_prompt_template_renders_total``
+- provider prompt caching: ``cached_prompt_tokens`` reads a usage entry's
+  cached tokens; ``observe_stage_usage`` counts them as
+  ``churns_llm_tokens_total{kind="cached"}`` next to ``kind="prompt"``
+"""
+
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# Variants kept per template; flags are low-cardinality, task types and platforms bound the rest
+MAX_VARIANTS_PER_TEMPLATE = 128
+
+
+class PromptCache:
+    """Bounded memo of rendered prompts, grouped by stage."""
+
+    def __init__(self, max_variants: int = MAX_VARIANTS_PER_TEMPLATE):
+        self.max_variants = max_variants
+        self._lock = threading.Lock()
+        self._variants: Dict[str, "OrderedDict[Hashable, str]"] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def get(self, stage: str, key: Hashable, build: Callable[[], str]) -> str:
+        """The prompt cached for ``(stage, key)``, calling ``build`` on a miss."""
+        with self._lock:
+            variants = self._variants.setdefault(stage, OrderedDict())
+            stats = self._stats.setdefault(stage, {"hits": 0, "builds": 0})
+            if key in variants:
+                variants.move_to_end(key)
+                stats["hits"] += 1
+                _count_render(stage, "hit")
+                return variants[key]
+
+        prompt = build()
+        with self._lock:
+            variants = self._variants.setdefault(stage, OrderedDict())
+            variants[key] = prompt
+            while len(variants) > self.max_variants:
+                variants.popitem(last=False)
+            self._stats[stage]["builds"] += 1
+        _count_render(stage, "build")
+        return prompt
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hits, builds, hit rate and cached variants per stage."""
+        with self._lock:
+            report = {}
+            for stage, stats in self._stats.items():
+                renders = stats["hits"] + stats["builds"]
+                report[stage] = {
+                    **stats,
+                    "hit_rate": round(stats["hits"] / renders, 4) if renders else 0.0,
+                    "variants": len(self._variants.get(stage, ())),
+                }
+            return report
+
+    def clear(self) -> None:
+        with self._lock:
+            self._variants.clear()
+            self._stats.clear()
+
+
+_prompt_cache = PromptCache()
+
+
+def _count_render(stage: str, result: str) -> None:
+    from .service_metrics import PROMPT_TEMPLATE_RENDERS
+
+    PROMPT_TEMPLATE_RENDERS.labels(stage=stage, result=result).inc()
+
+
+def prompt_template(stage: str) -> Callable[[Callable[..., str]], Callable[..., str]]:
+    """Memoize a prompt builder per combination of its (hashable) arguments."""
+    def decorator(build: Callable[..., str]) -> Callable[..., str]:
+        @functools.wraps(build)
+        def render(*args: Any, **kwargs: Any) -> str:
+            key: Tuple[Any, ...] = (build.__qualname__, args, tuple(sorted(kwargs.items())))
+            return _prompt_cache.get(stage, key, lambda: build(*args, **kwargs))
+
+        render.uncached = build
+        return render
+
+    return decorator
+
+
+def cached_prompt(stage: str, key: Hashable, build: Callable[[], str]) -> str:
+    """Memoized prompt for builders that are not plain functions (e.g. methods)."""
+    return _prompt_cache.get(stage, key, build)
+
+
+def template_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Memo hits and builds per stage since the process started."""
+    return _prompt_cache.stats()
+
+
+def clear_template_cache() -> None:
+    _prompt_cache.clear()
+
+
+def cached_prompt_tokens(usage: Optional[Dict[str, Any]]) -> int:
+    """
+    Input tokens served from the provider's prompt cache in a ``ctx.llm_usage``
+    entry: ``cached_tokens`` as stages record it, or the OpenAI usage dump's
+    ``prompt_tokens_details.cached_tokens``.
+    """
+    if not isinstance(usage, dict):
+        return 0
+    cached = usage.get("cached_tokens")
+    if cached is None:
+        details = usage.get("prompt_tokens_details")
+        cached = details.get("cached_tokens") if isinstance(details, dict) else None
+    return cached or 0
@@ -0,0 +1,392 @@
+"""
+Provider Cassette
+=================
+
+Record/replay of provider HTTP traffic, for reproducing a pipeline run without
+calling the paid APIs again.
+
+With ``PROVIDER_CASSETTE_MODE=record`` every request the executor's clients
+(LLM, image generation and image editing; OpenAI, OpenRouter and Gemini) send
+during ``PipelineExecutor.run_async`` is stored with its response and latency
+in a run-scoped cassette:
+
+    data/runs/{run_id}/cassettes/{pipeline_mode}_{ctx.run_id}.jsonl
+
+The first line is a header holding a snapshot of the pipeline context taken
+just before the first stage. Every further line is one interaction: endpoint,
+request fingerprint, status, headers, body and latency. Failed calls (429s,
+5xx) are recorded as well, so SDK retries replay exactly.
+
+``replay_cassette`` in ``churns.pipeline.executor`` rebuilds the context and
+re-runs ``run_async`` with every provider call answered from the cassette,
+either with the recorded latency (``latency="original"``) or none at all
+(``latency="zero"``). Requests are matched on endpoint plus a fingerprint of
+method, path and body; when no body matches (e.g. a prompt containing a
+timestamp) the next unused interaction of the same endpoint is returned.
+
+The cassette transport wraps the real transport, or the stub transport when
+``USE_STUB_PROVIDERS`` is on, and is only installed (by
+``churns.core.provider_http``) when ``PROVIDER_CASSETTE_MODE`` is ``record``
+or ``replay``. The active cassette is
+selected per run through a context variable, so concurrent runs sharing the
+same clients never mix their traffic.
+"""
+
+import asyncio
+import base64
+import contextlib
+import contextvars
+import datetime
+import hashlib
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from pydantic import BaseModel
+
+from .stub_provider import provider_endpoint
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_DIRNAME = "cassettes"
+CASSETTE_FORMAT_VERSION = 1
+
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+LATENCY_ORIGINAL = "original"
+LATENCY_ZERO = "zero"
+
+# Headers that describe the original transfer rather than the decoded body
+_TRANSFER_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie"}
+
+# Context fields that are not restored on replay
+_SNAPSHOT_EXCLUDED_FIELDS = {"logs", "output_directory"}
+_MODEL_MARKER = "__pydantic_model__"
+
+_active_cassette: contextvars.ContextVar[Optional["ProviderCassette"]] = contextvars.ContextVar(
+    "provider_cassette", default=None
+)
+
+
+def provider_cassette_mode() -> str:
+    """``record``, ``replay`` or ``off``, from ``PROVIDER_CASSETTE_MODE``."""
+    mode = os.getenv("PROVIDER_CASSETTE_MODE", MODE_OFF).strip().lower()
+    return mode if mode in (MODE_RECORD, MODE_REPLAY) else MODE_OFF
+
+
+def cassette_path_for_run(output_directory: os.PathLike, pipeline_mode: str, run_timestamp: str) -> Path:
+    """Cassette file for one executor run inside a run's output directory."""
+    return Path(output_directory) / CASSETTE_DIRNAME / f"{pipeline_mode}_{run_timestamp}.jsonl"
+
+
+def request_fingerprint(request: httpx.Request) -> str:
+    """
+    Stable hash of a request's method, path and body.
+
+    JSON bodies are canonicalized and multipart boundaries (random per
+    request) are normalized, so identical calls hash identically.
+    """
+    body = request.content
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/json"):
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode("utf-8")
+        except ValueError:
+            pass
+    elif "boundary=" in content_type:
+        boundary = content_type.split("boundary=", 1)[1].split(";", 1)[0].strip('"')
+        body = body.replace(boundary.encode("latin-1"), b"BOUNDARY")
+
+    digest = hashlib.sha256(f"{request.method} {request.url.path}\n".encode("utf-8"))
+    digest.update(body)
+    return digest.hexdigest()
+
+
+# --- Context snapshots ---
+
+def snapshot_context(ctx: Any) -> Dict[str, Any]:
+    """JSON-safe copy of a pipeline context's fields (clients and logs excluded)."""
+    snapshot: Dict[str, Any] = {}
+    for name, value in vars(ctx).items():
+        if name in _SNAPSHOT_EXCLUDED_FIELDS or name.endswith("_client"):
+            continue
+        if isinstance(value, BaseModel):
+            value = {
+                _MODEL_MARKER: f"{type(value).__module__}.{type(value).__qualname__}",
+                "data": value.model_dump(mode="json"),
+            }
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            logger.debug(f"Context field '{name}' is not JSON serializable; not stored in cassette")
+            continue
+        snapshot[name] = value
+    return snapshot
+
+
+def apply_context_snapshot(ctx: Any, snapshot: Dict[str, Any]) -> Any:
+    """Restore fields saved by ``snapshot_context`` onto a fresh context."""
+    for name, value in snapshot.items():
+        if isinstance(value, dict) and _MODEL_MARKER in value:
+            module_name, _, class_name = value[_MODEL_MARKER].rpartition(".")
+            model_class = getattr(importlib.import_module(module_name), class_name)
+            value = model_class.model_validate(value["data"])
+        setattr(ctx, name, value)
+    return ctx
+
+
+# --- Cassette ---
+
+class ProviderCassette:
+    """One run's recorded provider interactions, opened for recording or replay."""
+
+    def __init__(
+        self,
+        path: os.PathLike,
+        mode: str,
+        latency: str = LATENCY_ORIGINAL,
+        header: Optional[Dict[str, Any]] = None,
+        interactions: Optional[List[Dict[str, Any]]] = None
+    ):
+        self.path = Path(path)
+        self.mode = mode
+        self.latency = latency
+        self.header = header or {}
+        self.interactions = interactions or []
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+        # Replay lookup tables: interaction indices in recorded order
+        self._used: set = set()
+        self._by_fingerprint: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+        self._by_endpoint: Dict[str, List[int]] = defaultdict(list)
+        for index, entry in enumerate(self.interactions):
+            self._by_fingerprint[(entry["endpoint"], entry["fingerprint"])].append(index)
+            self._by_endpoint[entry["endpoint"]].append(index)
+
+    @classmethod
+    def start_recording(cls, path: os.PathLike, ctx: Any, pipeline_mode: str) -> "ProviderCassette":
+        """Create a new cassette and write its header with the context snapshot."""
+        header = {
+            "type": "header",
+            "version": CASSETTE_FORMAT_VERSION,
+            "pipeline_mode": pipeline_mode,
+            "recorded_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "source_output_directory": ctx.output_directory,
+            "context": snapshot_context(ctx),
+        }
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        candidate, suffix = path, 1
+        while True:
+            # Several executor runs can share a run directory and timestamp (e.g. captions)
+            try:
+                with open(candidate, "x", encoding="utf-8") as f:
+                    f.write(json.dumps(header, ensure_ascii=False) + "\n")
+                break
+            except FileExistsError:
+                candidate = path.with_name(f"{path.stem}_{suffix}{path.suffix}")
+                suffix += 1
+        return cls(candidate, MODE_RECORD, header=header)
+
+    @classmethod
+    def load(cls, path: os.PathLike, latency: str = LATENCY_ORIGINAL) -> "ProviderCassette":
+        """Open a recorded cassette for replay."""
+        if latency not in (LATENCY_ORIGINAL, LATENCY_ZERO):
+            raise ValueError(f"Unknown replay latency '{latency}' (expected '{LATENCY_ORIGINAL}' or '{LATENCY_ZERO}')")
+
+        header: Dict[str, Any] = {}
+        interactions: List[Dict[str, Any]] = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A run killed mid-write leaves a truncated last line
+                    logger.warning(f"Skipping unreadable line {line_number} of cassette {path}")
+                    continue
+                if entry.get("type") == "header":
+                    header = entry
+                else:
+                    interactions.append(entry)
+
+        if not header:
+            raise ValueError(f"Cassette {path} has no header")
+        return cls(path, MODE_REPLAY, latency=latency, header=header, interactions=interactions)
+
+    @property
+    def pipeline_mode(self) -> str:
+        return self.header.get("pipeline_mode", "generation")
+
+    @property
+    def context_snapshot(self) -> Dict[str, Any]:
+        return self.header.get("context", {})
+
+    # --- Recording ---
+
+    def record(self, request: httpx.Request, response: httpx.Response, duration_seconds: float) -> httpx.Response:
+        """Append one interaction and return a replayable copy of the response."""
+        endpoint = provider_endpoint(request.url.path) or request.url.path
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in _TRANSFER_HEADERS}
+        entry: Dict[str, Any] = {
+            "type": "interaction",
+            "endpoint": endpoint,
+            "method": request.method,
+            "url": str(request.url.copy_with(query=None)),
+            "fingerprint": request_fingerprint(request),
+            "request_bytes": len(request.content),
+            "status": response.status_code,
+            "headers": headers,
+            "duration_ms": round(duration_seconds * 1000, 3),
+        }
+        try:
+            entry["body"] = response.content.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["body_b64"] = base64.b64encode(response.content).decode("ascii")
+
+        with self._lock:
+            entry["seq"] = len(self.interactions)
+            entry["offset_ms"] = round((time.perf_counter() - self._started) * 1000 - entry["duration_ms"], 3)
+            self.interactions.append(entry)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+        return _response_from_entry(entry, request)
+
+    # --- Replay ---
+
+    def _take(self, endpoint: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        for candidates in (self._by_fingerprint.get((endpoint, fingerprint), []), self._by_endpoint.get(endpoint, [])):
+            for index in candidates:
+                if index not in self._used:
+                    self._used.add(index)
+                    return self.interactions[index]
+        return None
+
+    def replay(self, request: httpx.Request) -> Tuple[float, httpx.Response]:
+        """Recorded response for a request and how long to wait before returning it."""
+        endpoint = provider_endpoint(request.url.path) or request.url.path
+        with self._lock:
+            entry = self._take(endpoint, request_fingerprint(request))
+            if entry is None:
+                self.misses += 1
+
+        if entry is None:
+            logger.warning(f"No recorded {endpoint} interaction left in cassette {self.path.name}")
+            return 0.0, httpx.Response(
+                404,
+                json={"error": {"message": f"Cassette {self.path.name} has no recorded response for {endpoint}"}},
+                request=request,
+            )
+
+        delay = entry["duration_ms"] / 1000.0 if self.latency == LATENCY_ORIGINAL else 0.0
+        return delay, _response_from_entry(entry, request)
+
+    def replay_stats(self) -> Dict[str, int]:
+        """Recorded, replayed and unmatched interaction counts."""
+        with self._lock:
+            return {
+                "recorded": len(self.interactions),
+                "replayed": len(self._used),
+                "unused": len(self.interactions) - len(self._used),
+                "misses": self.misses,
+            }
+
+
+def _response_from_entry(entry: Dict[str, Any], request: httpx.Request) -> httpx.Response:
+    if "body_b64" in entry:
+        content = base64.b64decode(entry["body_b64"])
+    else:
+        content = entry.get("body", "").encode("utf-8")
+    return httpx.Response(entry["status"], headers=entry.get("headers", {}), content=content, request=request)
+
+
+def get_active_cassette() -> Optional[ProviderCassette]:
+    """Cassette of the run executing in the current context, if any."""
+    return _active_cassette.get()
+
+
+@contextlib.contextmanager
+def use_cassette(cassette: Optional[ProviderCassette]) -> Iterator[Optional[ProviderCassette]]:
+    """Route provider calls made in this context (and threads it spawns) through a cassette."""
+    token = _active_cassette.set(cassette)
+    try:
+        yield cassette
+    finally:
+        _active_cassette.reset(token)
+
+
+# --- Transports ---
+
+class CassetteTransport(httpx.BaseTransport):
+    """Records or replays through the active cassette; passes through otherwise."""
+
+    def __init__(self, inner: httpx.BaseTransport):
+        self.inner = inner
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        cassette = _active_cassette.get()
+        if cassette is None:
+            return self.inner.handle_request(request)
+
+        request.read()
+        if cassette.mode == MODE_REPLAY:
+            delay, response = cassette.replay(request)
+            if delay:
+                time.sleep(delay)
+            return response
+
+        started = time.perf_counter()
+        response = self.inner.handle_request(request)
+        try:
+            response.read()
+        finally:
+            response.close()
+        return cassette.record(request, response, time.perf_counter() - started)
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of ``CassetteTransport`` for ``httpx.AsyncClient`` users."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport):
+        self.inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        cassette = _active_cassette.get()
+        if cassette is None:
+            return await self.inner.handle_async_request(request)
+
+        await request.aread()
+        if cassette.mode == MODE_REPLAY:
+            delay, response = cassette.replay(request)
+            if delay:
+                await asyncio.sleep(delay)
+            return response
+
+        started = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+        # Fingerprinting, encoding and the file append stay off the event loop
+        return await asyncio.to_thread(cassette.record, request, response, time.perf_counter() - started)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
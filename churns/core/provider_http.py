@@ -0,0 +1,54 @@
+"""
+Provider HTTP Clients
+=====================
+
+``httpx`` clients handed to the provider SDKs: the OpenAI/OpenRouter clients
+and the Gemini client built by ``ClientConfig``, and the refinement stages'
+pydantic-ai agents. Every request passes through, outermost first:
+
+1. ``InstrumentedTransport``: latency metrics and tracing spans
+   (``churns.core.service_metrics``)
+2. ``CassetteTransport``: record/replay, when ``PROVIDER_CASSETTE_MODE`` is set
+3. the stub transport (``USE_STUB_PROVIDERS``) or the real network transport
+
+Timeouts and connection limits match the OpenAI SDK's default client.
+"""
+
+import httpx
+
+from .provider_cassette import MODE_OFF, AsyncCassetteTransport, CassetteTransport, provider_cassette_mode
+from .service_metrics import AsyncInstrumentedTransport, InstrumentedTransport
+from .stub_provider import AsyncStubTransport, get_stub_transport, stub_providers_enabled
+
+PROVIDER_HTTP_LIMITS = httpx.Limits(max_connections=1000, max_keepalive_connections=100)
+PROVIDER_HTTP_TIMEOUT = httpx.Timeout(600.0, connect=5.0)
+
+
+def build_provider_http_client() -> httpx.Client:
+    """``httpx.Client`` for the provider SDKs."""
+    if stub_providers_enabled():
+        transport: httpx.BaseTransport = get_stub_transport()
+    else:
+        transport = httpx.HTTPTransport(limits=PROVIDER_HTTP_LIMITS)
+    if provider_cassette_mode() != MODE_OFF:
+        transport = CassetteTransport(transport)
+    return httpx.Client(
+        transport=InstrumentedTransport(transport),
+        timeout=PROVIDER_HTTP_TIMEOUT,
+        follow_redirects=True
+    )
+
+
+def build_provider_async_http_client() -> httpx.AsyncClient:
+    """``httpx.AsyncClient`` counterpart of ``build_provider_http_client``."""
+    if stub_providers_enabled():
+        transport: httpx.AsyncBaseTransport = AsyncStubTransport(get_stub_transport())
+    else:
+        transport = httpx.AsyncHTTPTransport(limits=PROVIDER_HTTP_LIMITS)
+    if provider_cassette_mode() != MODE_OFF:
+        transport = AsyncCassetteTransport(transport)
+    return httpx.AsyncClient(
+        transport=AsyncInstrumentedTransport(transport),
+        timeout=PROVIDER_HTTP_TIMEOUT,
+        follow_redirects=True
+    )
@@ -0,0 +1,221 @@
+"""
+Refinements Index
+=================
+
+Per-run record of completed refinements, stored as an append-only JSONL log
+with a periodically compacted snapshot.
+
+Files in ``data/runs/{run_id}/``:
+- ``refinements.jsonl``: one JSON object per completed refinement, appended
+  under an ``flock`` (O(1) per refinement, safe for concurrent jobs)
+- ``refinements.json``: compacted snapshot in the original index format
+  (``refinements``, ``total_cost``, ``total_refinements``) plus
+  ``log_offset``, the byte position in the log that the snapshot covers
+
+Compaction holds the log's ``flock``, writes the snapshot atomically and then
+truncates the log, so the log only ever holds the entries since the last
+compaction. Log entries whose job is already in the snapshot are skipped,
+which covers a crash between the snapshot write and the truncation.
+
+Readers load the snapshot once, then only parse log lines appended since the
+last read. Runs that only have a legacy ``refinements.json`` (no log) are read
+as a snapshot with ``log_offset`` 0.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from .artifact_writer import write_bytes_atomic
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOG_FILENAME = "refinements.jsonl"
+SNAPSHOT_FILENAME = "refinements.json"
+
+# Rewrite the snapshot once this many entries have accumulated in the log tail
+COMPACT_EVERY = 50
+
+_lock = threading.RLock()
+
+
+@dataclass
+class RefinementsIndex:
+    """In-memory view of a run's refinements index."""
+    entries: List[Dict[str, Any]] = field(default_factory=list)
+    total_cost: float = 0.0
+    by_job_id: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    log_offset: int = 0  # Log bytes consumed so far
+    pending_compaction: int = 0  # Entries read from the log but not yet in the snapshot
+
+    @property
+    def total_refinements(self) -> int:
+        return len(self.entries)
+
+    def add(self, entry: Dict[str, Any]) -> bool:
+        """Add an entry; returns False if its job is already indexed."""
+        job_id = entry.get("job_id")
+        if job_id and job_id in self.by_job_id:
+            return False
+        self.entries.append(entry)
+        self.total_cost += entry.get("cost_usd") or 0.0
+        if job_id:
+            self.by_job_id[job_id] = entry
+        return True
+
+
+# run directory -> ((log inode, snapshot signature), index)
+_cache: Dict[str, Tuple[Tuple[Optional[int], Optional[Tuple[int, int]]], RefinementsIndex]] = {}
+
+
+@contextlib.contextmanager
+def _locked_log(run_dir: Path) -> Iterator[BinaryIO]:
+    """Open the log for appending under an exclusive ``flock``."""
+    with open(run_dir / LOG_FILENAME, "ab") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield f
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _load_snapshot(run_dir: Path) -> RefinementsIndex:
+    index = RefinementsIndex()
+    snapshot_path = run_dir / SNAPSHOT_FILENAME
+    if not snapshot_path.exists():
+        return index
+    try:
+        with open(snapshot_path, "r") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read refinements snapshot {snapshot_path}: {e}")
+        return index
+
+    for entry in snapshot.get("refinements", []):
+        index.add(entry)
+    index.log_offset = int(snapshot.get("log_offset", 0))
+    return index
+
+
+def _read_log_tail(log_path: Path, index: RefinementsIndex) -> None:
+    """Parse complete lines appended after ``index.log_offset``."""
+    with open(log_path, "rb") as f:
+        f.seek(index.log_offset)
+        data = f.read()
+
+    # A trailing line without newline is still being written; pick it up next time
+    complete = data[:data.rfind(b"\n") + 1]
+    for line in complete.splitlines():
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError as e:
+            logger.warning(f"Skipping corrupt line in {log_path}: {e}")
+            continue
+        if index.add(entry):
+            index.pending_compaction += 1
+    index.log_offset += len(complete)
+
+
+def read_refinements(run_dir: os.PathLike) -> RefinementsIndex:
+    """
+    Return the run's refinements, reading only log lines added since the last call.
+
+    The returned object is shared; treat it as read-only.
+    """
+    run_dir = Path(run_dir)
+    log_path = run_dir / LOG_FILENAME
+    cache_key = str(run_dir.resolve())
+
+    with _lock:
+        try:
+            stat = os.stat(log_path)
+            log_inode, log_size = stat.st_ino, stat.st_size
+        except FileNotFoundError:
+            log_inode, log_size = None, 0
+        try:
+            stat = os.stat(run_dir / SNAPSHOT_FILENAME)
+            snapshot_signature = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            snapshot_signature = None
+
+        # A rewritten snapshot means the log was compacted (and truncated)
+        signature = (log_inode, snapshot_signature)
+        cached = _cache.get(cache_key)
+        index = cached[1] if cached else None
+        if index is None or cached[0] != signature or log_size < index.log_offset:
+            index = _load_snapshot(run_dir)
+
+        if log_size > index.log_offset:
+            _read_log_tail(log_path, index)
+
+        _cache[cache_key] = (signature, index)
+        return index
+
+
+def get_refinement_entry(run_dir: os.PathLike, job_id: str) -> Optional[Dict[str, Any]]:
+    """Return the index entry for a refinement job, if it has completed."""
+    return read_refinements(run_dir).by_job_id.get(job_id)
+
+
+def append_refinement(run_dir: os.PathLike, entry: Dict[str, Any]) -> None:
+    """
+    Append a completed refinement to the run's log.
+
+    Blocking; call via ``asyncio.to_thread`` from async code. Compacts the
+    snapshot once ``COMPACT_EVERY`` entries have accumulated in the log.
+    """
+    run_dir = Path(run_dir)
+    run_dir.mkdir(parents=True, exist_ok=True)
+    line = (json.dumps(entry, default=str) + "\n").encode("utf-8")
+
+    with _lock:
+        with _locked_log(run_dir) as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+        if read_refinements(run_dir).pending_compaction >= COMPACT_EVERY:
+            compact_refinements(run_dir)
+
+
+def compact_refinements(run_dir: os.PathLike) -> RefinementsIndex:
+    """
+    Fold the log into the snapshot and truncate the log.
+
+    Both happen under the log's ``flock``, so no append lands between the
+    snapshot being written and the log being emptied.
+    """
+    run_dir = Path(run_dir)
+    run_dir.mkdir(parents=True, exist_ok=True)
+    with _lock:
+        with _locked_log(run_dir) as f:
+            index = read_refinements(run_dir)
+            snapshot = {
+                "refinements": index.entries,
+                "total_cost": index.total_cost,
+                "total_refinements": index.total_refinements,
+                "log_offset": 0,
+            }
+            write_bytes_atomic(json.dumps(snapshot, indent=2, default=str).encode("utf-8"),
+                               run_dir / SNAPSHOT_FILENAME)
+            f.truncate(0)
+            os.fsync(f.fileno())
+
+        _cache.pop(str(run_dir.resolve()), None)
+        index = read_refinements(run_dir)
+        logger.info(f"Compacted refinements index for {run_dir} ({index.total_refinements} entries)")
+        return index
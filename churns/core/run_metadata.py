@@ -0,0 +1,255 @@
+"""
+Run Metadata Store
+==================
+
+A run's metadata (inputs, settings and everything the stages produced) is
+stored in sections so that readers decode only what they use:
+
+    settings     every top-level key except processing_context
+                 (user_inputs, pipeline_settings, request_details, ...)
+    strategies   image_analysis_result, suggested_marketing_strategies,
+                 style_guidance_sets, style_adaptation_context
+    concepts     generated_image_prompts, final_assembled_prompts
+    results      generated_image_results, image_assessment and any other
+                 stage output
+    costs        cost_summary
+    usage        llm_call_usage (per-call token and cost records, which no
+                 endpoint reads back)
+
+Each section holds part of the document in the shape of the former
+``pipeline_metadata.json``, and loading several sections merges them back,
+so ``load_run_metadata(run_dir, ["concepts"])`` returns
+``{"processing_context": {"generated_image_prompts": ..., ...}}``.
+
+All sections live in one file, ``{run_dir}/pipeline_metadata.sections``: a
+one-line JSON header giving each section's offset and length, then the
+section payloads. A reader opens and reads one file and decodes only the
+byte ranges it asked for. (A file per section cost an open per section plus
+one for the index, which made every endpoint slower than reading the whole
+legacy file; see ``scripts/benchmark_serialization.py``.) Payloads are zstd
+frames when the ``zstandard`` package is installed and
+``RUN_METADATA_COMPRESSION`` asks for ``zstd``; the default is uncompressed,
+which reads faster once the file is in the page cache. The file is replaced
+atomically. Runs saved before keep a single ``pipeline_metadata.json``, which
+readers fall back to (``scripts/utilities/migrate_run_metadata.py`` converts
+them).
+"""
+
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Union
+
+from .artifact_writer import write_bytes_atomic
+from .serialization import dumps, loads
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+METADATA_FORMAT = 2
+METADATA_FILENAME = "pipeline_metadata.sections"
+LEGACY_METADATA_FILENAME = "pipeline_metadata.json"
+
+SECTIONS = ("settings", "strategies", "concepts", "results", "costs", "usage")
+PROCESSING_SECTION_KEYS = {
+    "image_analysis_result": "strategies",
+    "suggested_marketing_strategies": "strategies",
+    "style_guidance_sets": "strategies",
+    "style_adaptation_context": "strategies",
+    "generated_image_prompts": "concepts",
+    "final_assembled_prompts": "concepts",
+    "generated_image_results": "results",
+    "image_assessment": "results",
+    "llm_call_usage": "usage",
+    "cost_summary": "costs",
+}
+DEFAULT_PROCESSING_SECTION = "results"
+# What refinements use of the parent run's metadata
+REFINEMENT_SECTIONS = ("settings", "strategies", "concepts", "results")
+
+DEFAULT_COMPRESSION = "none"
+ZSTD_LEVEL = 3
+
+PathLike = Union[str, "os.PathLike[str]"]
+
+# zstd contexts are costly to create but not thread-safe: one pair per thread
+_zstd_local = threading.local()
+
+
+def _compression(requested: Optional[str] = None) -> Optional[str]:
+    """Compression to write with: "zstd" when requested and available, else None."""
+    choice = (requested or os.getenv("RUN_METADATA_COMPRESSION", DEFAULT_COMPRESSION)).strip().lower()
+    if choice in ("", "none", "off", "false"):
+        return None
+    if choice != "zstd":
+        logger.warning(f"Unknown RUN_METADATA_COMPRESSION '{choice}', writing metadata uncompressed")
+        return None
+    if zstandard is None:
+        logger.debug("zstandard not installed, writing metadata uncompressed")
+        return None
+    return "zstd"
+
+
+def _zstd(kind: str):
+    context = getattr(_zstd_local, kind, None)
+    if context is None:
+        if kind == "compressor":
+            context = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        else:
+            context = zstandard.ZstdDecompressor()
+        setattr(_zstd_local, kind, context)
+    return context
+
+
+def _encode(section: Dict[str, Any], compression: Optional[str]) -> bytes:
+    data = dumps(section)
+    if compression == "zstd":
+        return _zstd("compressor").compress(data)
+    return data
+
+
+def _decode(data: bytes, compression: Optional[str]) -> Any:
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Run metadata is zstd-compressed but the zstandard package is not installed")
+        data = _zstd("decompressor").decompress(data)
+    return loads(data)
+
+
+def split_metadata(document: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Split a metadata document into its sections (empty sections are kept)."""
+    sections: Dict[str, Dict[str, Any]] = {name: {} for name in SECTIONS}
+    for key, value in document.items():
+        if key != "processing_context" or not isinstance(value, dict):
+            sections["settings"][key] = value
+            continue
+        for context_key, context_value in value.items():
+            section = PROCESSING_SECTION_KEYS.get(context_key, DEFAULT_PROCESSING_SECTION)
+            sections[section].setdefault("processing_context", {})[context_key] = context_value
+    return sections
+
+
+def _run_dir(location: PathLike) -> str:
+    """Run directory for a run dir or one of its metadata files."""
+    # Plain string handling: pathlib costs as much as parsing a small section
+    path = os.fspath(location)
+    name = os.path.basename(path)
+    if name == METADATA_FILENAME or name.endswith(".json"):
+        return os.path.dirname(path)
+    return path
+
+
+def run_metadata_path(location: PathLike) -> Path:
+    return Path(_run_dir(location), METADATA_FILENAME)
+
+
+def has_run_metadata(location: PathLike) -> bool:
+    """Whether a run has metadata in either layout."""
+    run_dir = _run_dir(location)
+    return (
+        os.path.exists(os.path.join(run_dir, METADATA_FILENAME))
+        or os.path.exists(os.path.join(run_dir, LEGACY_METADATA_FILENAME))
+    )
+
+
+def write_run_metadata(
+    run_dir: PathLike,
+    document: Dict[str, Any],
+    compression: Optional[str] = None
+) -> Path:
+    """Write ``document`` as a sectioned metadata file; returns its path."""
+    compression = _compression(compression)
+    header: Dict[str, Any] = {"format": METADATA_FORMAT, "compression": compression, "sections": {}}
+    payloads = []
+    offset = 0
+    for name, section in split_metadata(document).items():
+        if not section:
+            continue
+        data = _encode(section, compression)
+        header["sections"][name] = [offset, len(data)]
+        payloads.append(data)
+        offset += len(data)
+
+    path = run_metadata_path(run_dir)
+    write_bytes_atomic(b"".join([dumps(header), b"\n", *payloads]), path)
+    return path
+
+
+def load_run_metadata(location: PathLike, sections: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Load a run's metadata, or only the named ``sections`` of it.
+
+    ``location`` may be the run directory or either metadata file (e.g.
+    ``PipelineRun.metadata_file_path``). Legacy runs are read whole. Raises
+    FileNotFoundError when the run has no metadata.
+    """
+    wanted = SECTIONS if sections is None else tuple(sections)
+    unknown = set(wanted) - set(SECTIONS)
+    if unknown:
+        raise ValueError(f"Unknown run metadata sections: {sorted(unknown)}")
+
+    run_dir = _run_dir(location)
+    try:
+        with open(os.path.join(run_dir, METADATA_FILENAME), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        with open(os.path.join(run_dir, LEGACY_METADATA_FILENAME), "rb") as f:
+            return loads(f.read())
+
+    header_end = data.index(b"\n")
+    header = loads(data[:header_end])
+    if header.get("format") != METADATA_FORMAT:
+        raise ValueError(f"Unsupported run metadata format: {header.get('format')}")
+    payload = memoryview(data)[header_end + 1:]
+
+    document: Dict[str, Any] = {}
+    for name in wanted:
+        entry = header["sections"].get(name)
+        if not entry:
+            continue
+        offset, length = entry
+        section = _decode(payload[offset:offset + length], header.get("compression"))
+        for key, value in section.items():
+            if key == "processing_context":
+                document.setdefault("processing_context", {}).update(value)
+            else:
+                document[key] = value
+    return document
+
+
+def migrate_run_metadata(
+    run_dir: PathLike,
+    compression: Optional[str] = None,
+    keep_legacy: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    Convert a run's ``pipeline_metadata.json`` to a sectioned metadata file.
+
+    Returns sizes before and after, or None when there is nothing to migrate.
+    The legacy file is removed once the new one is written unless
+    ``keep_legacy`` is set.
+    """
+    run_dir = Path(run_dir)
+    legacy_path = run_dir / LEGACY_METADATA_FILENAME
+    if not legacy_path.exists():
+        return None
+    with open(legacy_path, "rb") as f:
+        raw = f.read()
+    document = loads(raw)
+    if not isinstance(document, dict):
+        raise ValueError(f"{legacy_path} does not hold a metadata document")
+
+    path = write_run_metadata(run_dir, document, compression)
+    if not keep_legacy:
+        legacy_path.unlink()
+    return {
+        "run_dir": str(run_dir),
+        "metadata_path": str(path),
+        "legacy_bytes": len(raw),
+        "sectioned_bytes": path.stat().st_size,
+    }
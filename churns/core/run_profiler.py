@@ -0,0 +1,280 @@
+"""
+Run Profiler
+============
+
+On-demand profiling of single background jobs (generation runs,
+refinements, captions) in a running service.
+
+An operator arms the profiler through ``POST /api/v1/admin/profiling``
+(only when ``PROFILING_ENABLED`` is set). The next matching job(s) picked up
+by ``PipelineTaskProcessor`` run under one of:
+
+- ``sample``: wall-clock sampling of every thread's Python stack (default
+  every 5 ms), written as collapsed stacks (``.folded``) for flamegraph.pl,
+  speedscope or inferno. Idle threads are left out.
+- ``cprofile``: deterministic ``cProfile`` of the event-loop thread, written
+  as a pstats file (``.prof``) for snakeviz or flameprof. Work handed to
+  ``asyncio.to_thread`` is not included.
+
+Profiles go to ``{run_dir}/profiles/`` next to the run's other artifacts
+(the directory the run's trace points at, see ``churns.core.tracing``).
+Both profilers see the whole process, so concurrent jobs show up in the same
+profile; only one job is profiled at a time.
+"""
+
+import asyncio
+import collections
+import cProfile
+import datetime
+import functools
+import inspect
+import logging
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+from .tracing import current_span, trace_output_directory
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIRNAME = "profiles"
+DEFAULT_PROFILE_DIRECTORY = "./data/profiles"
+
+MODE_SAMPLE = "sample"
+MODE_CPROFILE = "cprofile"
+PROFILE_MODES = (MODE_SAMPLE, MODE_CPROFILE)
+
+KIND_ANY = "any"
+JOB_KINDS = ("generation", "refinement", "caption")
+
+DEFAULT_SAMPLE_INTERVAL_MS = 5.0
+RECENT_PROFILES_KEPT = 20
+
+# Innermost frames of threads that are blocked waiting for work
+_IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("run_profiler.py", "_run"),
+}
+
+
+def profiling_enabled() -> bool:
+    return os.getenv("PROFILING_ENABLED", "false").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples all threads' stacks from a background thread."""
+
+    extension = "folded"
+
+    def __init__(self, interval_ms: float = DEFAULT_SAMPLE_INTERVAL_MS, include_idle: bool = False):
+        self.interval = interval_ms / 1000
+        self.include_idle = include_idle
+        self.samples: collections.Counter = collections.Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="run-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write(self, path: Path) -> None:
+        lines = [f"{stack} {count}" for stack, count in self.samples.most_common()]
+        path.write_text("\n".join(lines) + ("\n" if lines else ""))
+
+
+class DeterministicProfiler:
+    """``cProfile`` of the thread that starts it (the event loop)."""
+
+    extension = "prof"
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def start(self) -> None:
+        self._profile.enable()
+
+    def stop(self) -> None:
+        self._profile.disable()
+
+    def write(self, path: Path) -> None:
+        self._profile.dump_stats(str(path))
+
+
+class ProfilerControl:
+    """Armed profile requests, the active profile and recently written ones."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._armed: List[Dict[str, Any]] = []
+        self._active: Optional[Dict[str, Any]] = None
+        self._recent: Deque[Dict[str, Any]] = collections.deque(maxlen=RECENT_PROFILES_KEPT)
+
+    def arm(
+        self,
+        kind: str = KIND_ANY,
+        mode: str = MODE_SAMPLE,
+        count: int = 1,
+        target_id: Optional[str] = None,
+        interval_ms: float = DEFAULT_SAMPLE_INTERVAL_MS
+    ) -> Dict[str, Any]:
+        """Profile the next ``count`` jobs of ``kind`` (or the job ``target_id``)."""
+        if kind != KIND_ANY and kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind '{kind}', expected one of {(KIND_ANY,) + JOB_KINDS}")
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}', expected one of {PROFILE_MODES}")
+        request = {
+            "kind": kind,
+            "mode": mode,
+            "remaining": count,
+            "target_id": target_id,
+            "interval_ms": interval_ms,
+            "armed_at": datetime.datetime.utcnow().isoformat()
+        }
+        with self._lock:
+            self._armed.append(request)
+        logger.info(f"Profiler armed: {request}")
+        return dict(request)
+
+    def disarm(self) -> int:
+        with self._lock:
+            cleared = len(self._armed)
+            self._armed.clear()
+        return cleared
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "armed": [dict(request) for request in self._armed],
+                "active": dict(self._active) if self._active else None,
+                "recent": list(self._recent)
+            }
+
+    def _claim(self, kind: str, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if self._active is not None:
+                return None
+            for request in self._armed:
+                if request["target_id"] is not None:
+                    matches = request["target_id"] == job_id
+                else:
+                    matches = request["kind"] in (KIND_ANY, kind)
+                if not matches:
+                    continue
+                request["remaining"] -= 1
+                if request["remaining"] <= 0:
+                    self._armed.remove(request)
+                self._active = {
+                    "kind": kind,
+                    "job_id": job_id,
+                    "mode": request["mode"],
+                    "started_at": datetime.datetime.utcnow().isoformat()
+                }
+                return request
+        return None
+
+    def _finish(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._active = None
+            self._recent.appendleft(entry)
+
+    async def run_profiled(self, kind: str, job_id: str, func, /, *args, **kwargs):
+        """Await ``func(*args, **kwargs)``, profiled if an armed request matches the job."""
+        request = self._claim(kind, job_id) if self._armed else None
+        if request is None:
+            return await func(*args, **kwargs)
+
+        if request["mode"] == MODE_CPROFILE:
+            profiler = DeterministicProfiler()
+        else:
+            profiler = SamplingProfiler(request["interval_ms"])
+        started = datetime.datetime.now()
+        profiler.start()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            profiler.stop()
+            entry = {
+                "kind": kind,
+                "job_id": job_id,
+                "mode": request["mode"],
+                "started_at": started.isoformat(),
+                "duration_seconds": round((datetime.datetime.now() - started).total_seconds(), 3),
+                "path": None
+            }
+            try:
+                path = _profile_path(kind, job_id, started, profiler.extension)
+                # Dumps run to megabytes; keep the event loop free while they are written
+                await asyncio.to_thread(_write_profile, profiler, path)
+                entry["path"] = str(path)
+                span = current_span()
+                if span is not None:
+                    span.set_attribute("profile_path", str(path))
+                logger.info(f"Wrote {request['mode']} profile of {kind} job {job_id} to {path}")
+            except OSError as e:
+                entry["error"] = str(e)
+                logger.warning(f"Could not write profile of {kind} job {job_id}: {e}")
+            self._finish(entry)
+
+
+def _write_profile(profiler: Any, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profiler.write(path)
+
+
+def _profile_path(kind: str, job_id: str, started: datetime.datetime, extension: str) -> Path:
+    # The executor points the run's trace at the run directory
+    run_dir = trace_output_directory()
+    base = Path(run_dir) / PROFILE_DIRNAME if run_dir else Path(DEFAULT_PROFILE_DIRECTORY)
+    return base / f"{kind}_{job_id}_{started.strftime('%Y%m%d_%H%M%S')}.{extension}"
+
+
+profiler_control = ProfilerControl()
+
+
+def profiled_run(kind: str, id_param: str):
+    """
+    Decorator profiling an async job entry point when the profiler is armed for it.
+
+    Apply inside ``traced_run`` so the profile lands in the run's directory.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            job_id = signature.bind_partial(*args, **kwargs).arguments.get(id_param)
+            return await profiler_control.run_profiled(kind, str(job_id), func, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,123 @@
+"""
+Serialization
+=============
+
+JSON encoding for run data that is serialized on hot paths: WebSocket
+messages, stage ``output_data`` columns and the metadata files of runs,
+refinements and captions.
+
+Encoding uses ``orjson`` when it is installed (several times faster on the
+large nested dicts a pipeline produces) and falls back to the stdlib ``json``
+module otherwise, or for the rare value orjson rejects (e.g. integers over
+64 bits). Both paths accept the same values:
+
+- pydantic models (``model_dump()``) and dataclasses
+- datetime/date/time as ISO 8601 strings
+- numpy arrays and scalars as lists and numbers
+- enums by value, sets as lists, paths as strings
+- anything else via ``str()``, like the ``default=str`` used before
+
+Output is UTF-8 without ASCII escaping; ``indent=True`` pretty-prints with
+two spaces. Decoding accepts ``bytes`` or ``str`` and still reads older
+files written by the stdlib (which may contain ``NaN``).
+
+Prompts sent to LLMs keep using ``json.dumps`` directly: their exact text
+is part of the prompt cache key and must not change with this module.
+"""
+
+import dataclasses
+import datetime
+import enum
+import json
+import os
+from typing import Any, Union
+
+from .artifact_writer import write_bytes_atomic
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+PathLike = Union[str, "os.PathLike[str]"]
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj: Any) -> Any:
+    """Convert a value the encoder does not know into one it does."""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, os.PathLike):
+        return os.fspath(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if type(obj).__module__ == "numpy" and hasattr(obj, "tolist"):
+        # Arrays become lists, numpy scalars plain Python numbers
+        return obj.tolist()
+    return str(obj)
+
+
+def _stdlib_dumps(obj: Any, indent: bool, sort_keys: bool) -> bytes:
+    return json.dumps(
+        obj, default=_default, ensure_ascii=False, sort_keys=sort_keys,
+        indent=2 if indent else None
+    ).encode("utf-8")
+
+
+def dumps(obj: Any, *, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """Encode ``obj`` as UTF-8 JSON bytes."""
+    if orjson is not None:
+        options = _ORJSON_OPTIONS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        if sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=_default, option=options)
+        except orjson.JSONEncodeError:
+            pass
+    return _stdlib_dumps(obj, indent, sort_keys)
+
+
+def dumps_str(obj: Any, *, indent: bool = False, sort_keys: bool = False) -> str:
+    """Encode ``obj`` as a JSON string (DB text columns, WebSocket text frames)."""
+    return dumps(obj, indent=indent, sort_keys=sort_keys).decode("utf-8")
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Decode JSON. Raises ``json.JSONDecodeError`` (a ValueError) when invalid."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # NaN/Infinity from files written by the stdlib; re-raises if truly invalid
+            pass
+    if not isinstance(data, str):
+        data = bytes(data).decode("utf-8")
+    return json.loads(data)
+
+
+def to_jsonable(obj: Any) -> Any:
+    """Plain JSON-compatible copy of ``obj`` (dicts, lists, strings, numbers)."""
+    return loads(dumps(obj))
+
+
+def read_json_file(path: PathLike) -> Any:
+    """Load a JSON file."""
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def write_json_file(obj: Any, path: PathLike, *, indent: bool = True) -> int:
+    """Atomically write ``obj`` as JSON to ``path``; returns the bytes written."""
+    data = dumps(obj, indent=indent)
+    write_bytes_atomic(data, path)
+    return len(data)
@@ -0,0 +1,397 @@
+"""
+Service Metrics
+===============
+
+Prometheus metrics for the API process, exposed at ``GET /metrics`` from a
+``prometheus_client`` registry (``REGISTRY``); values live in this process
+only. Instrumentation points:
+
+- ``PipelineExecutor.run_async``: stage duration by stage, mode and status,
+  active runs, LLM tokens per stage (with provider-cached prompt tokens),
+  images produced
+- ``churns.core.prompt_templates``: prompt template memo hits and builds
+- provider HTTP clients (``InstrumentedTransport``): call latency by
+  provider, model, endpoint and status, measured until the response body
+  has been read and its stream closed (so streamed replies count in full);
+  the same interval is charged to the running stage's provider wait
+  (``churns.core.stage_resources``) and chat prompts feed the prefix
+  stability report (``churns.core.prompt_cache_accounting``)
+- background tasks: queued runs and estimated cost per stage
+- ``retry_db_operation``: SQLite lock retries
+- WebSocket manager: open connections
+- ``EventLoopLagMonitor``: event-loop lag sampled while the API runs, and
+  stalls attributed by ``churns.core.loop_watchdog``
+"""
+
+import asyncio
+import contextlib
+import logging
+import re
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+import httpx
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.exposition import choose_encoder
+from prometheus_client.registry import Collector
+
+from .prompt_cache_accounting import observe_chat_request
+from .stage_resources import provider_wait
+from .tracing import open_span, set_span_error
+
+logger = logging.getLogger(__name__)
+
+STAGE_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+PROVIDER_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Seconds between event-loop lag samples
+EVENT_LOOP_LAG_INTERVAL_SECONDS = 0.5
+
+_MODEL_JSON_RE = re.compile(rb'"model"\s*:\s*"([^"]{1,200})"')
+_MODEL_MULTIPART_RE = re.compile(rb'name="model"\r\n\r\n([^\r\n]{1,200})')
+_GEMINI_MODEL_RE = re.compile(r"/models/([^/:]+):")
+
+_PROVIDER_HOSTS = {
+    "api.openai.com": "openai",
+    "openrouter.ai": "openrouter",
+    "generativelanguage.googleapis.com": "gemini",
+}
+
+REGISTRY = CollectorRegistry()
+
+FunctionGaugeValues = Callable[[], Dict[Tuple[str, ...], float]]
+
+
+class FunctionGauge(Collector):
+    """
+    Labelled gauge computed at scrape time.
+
+    ``prometheus_client`` only supports ``set_function`` on unlabelled
+    gauges; here the callable returns a dict of label-value tuples to numbers.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 registry: Optional[CollectorRegistry] = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = list(labelnames)
+        self._function: Optional[FunctionGaugeValues] = None
+        if registry is not None:
+            registry.register(self)
+
+    def set_function(self, function: Optional[FunctionGaugeValues]) -> None:
+        self._function = function
+
+    def describe(self) -> Iterable[GaugeMetricFamily]:
+        return [GaugeMetricFamily(self.name, self.documentation, labels=self.labelnames)]
+
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        family = GaugeMetricFamily(self.name, self.documentation, labels=self.labelnames)
+        values: Dict[Tuple[str, ...], float] = {}
+        if self._function is not None:
+            try:
+                values = self._function()
+            except Exception as e:
+                logger.warning(f"Gauge function for {self.name} failed: {e}")
+        for key, value in sorted(values.items()):
+            family.add_metric([str(v) for v in key], value)
+        yield family
+
+
+# --- Application metrics ---
+
+STAGE_DURATION = Histogram(
+    "churns_stage_duration_seconds", "Wall time of pipeline stages.",
+    ["stage", "mode", "status"], buckets=STAGE_DURATION_BUCKETS, registry=REGISTRY
+)
+PROVIDER_REQUEST_DURATION = Histogram(
+    "churns_provider_request_duration_seconds", "Latency of provider API calls until the response body is received.",
+    ["provider", "model", "endpoint", "status"], buckets=PROVIDER_LATENCY_BUCKETS, registry=REGISTRY
+)
+LLM_TOKENS = Counter(
+    "churns_llm_tokens_total", "LLM tokens reported by provider usage, per stage (cached is part of prompt).",
+    ["stage", "mode", "kind"], registry=REGISTRY
+)
+PROMPT_TEMPLATE_RENDERS = Counter(
+    "churns_prompt_template_renders_total", "Stage prompt renders served from the template memo (hit) or built.",
+    ["stage", "result"], registry=REGISTRY
+)
+CAPTION_BRIEF_CACHE = Counter(
+    "churns_caption_brief_cache_total", "Caption analyst briefs served from the brief cache (hit), generated (miss) or refreshed on request.",
+    ["result"], registry=REGISTRY
+)
+IMAGES = Counter(
+    "churns_images_total", "Images produced by generation and refinement stages.",
+    ["stage", "mode", "status"], registry=REGISTRY
+)
+COST_USD = Counter(
+    "churns_cost_usd_total", "Estimated provider cost in USD.",
+    ["mode", "stage"], registry=REGISTRY
+)
+RUNS_ACTIVE = Gauge(
+    "churns_runs_active", "Executor runs currently executing stages.",
+    ["mode"], registry=REGISTRY
+)
+RUNS_QUEUED = FunctionGauge(
+    "churns_runs_queued", "Background runs accepted but not yet executing stages.",
+    ["mode"]
+)
+RUNS_FINISHED = Counter(
+    "churns_runs_finished_total", "Executor runs that finished all stages.",
+    ["mode"], registry=REGISTRY
+)
+WEBSOCKET_CONNECTIONS = Gauge(
+    "churns_websocket_connections", "Open WebSocket connections.", registry=REGISTRY
+)
+DB_LOCK_RETRIES = Counter(
+    "churns_db_lock_retries_total", "Database operations retried after a SQLite lock error.", registry=REGISTRY
+)
+EVENT_LOOP_LAG = Histogram(
+    "churns_event_loop_lag_seconds", "Delay of scheduled event-loop wakeups beyond their deadline.",
+    buckets=LOOP_LAG_BUCKETS, registry=REGISTRY
+)
+EVENT_LOOP_BLOCKS = Counter(
+    "churns_event_loop_blocks_total", "Event-loop stalls above the watchdog threshold, by stage and function.",
+    ["stage", "function"], registry=REGISTRY
+)
+
+
+def render_metrics(accept: Optional[str] = None) -> Tuple[bytes, str]:
+    """
+    Exposition of every registered metric in the format the scraper's
+    ``Accept`` header asks for; returns the body and its content type.
+    """
+    encoder, content_type = choose_encoder(accept or "")
+    return encoder(REGISTRY), content_type
+
+
+def observe_stage_usage(stage: str, mode: str, token_usage: Dict[str, Any]) -> None:
+    """
+    Count a stage's prompt, provider-cached prompt and completion tokens from
+    its ``stage_token_usage`` totals (``churns.core.prompt_cache_accounting``).
+    """
+    for kind, key in (("prompt", "input_tokens"), ("cached", "cached_input_tokens"), ("completion", "output_tokens")):
+        tokens = token_usage.get(key) or 0
+        if tokens:
+            LLM_TOKENS.labels(stage=stage, mode=mode, kind=kind).inc(tokens)
+
+
+def observe_costs(mode: str, stage_costs: Iterable[Dict[str, Any]]) -> None:
+    """Add a finished run's per-stage cost entries (``stage_name``/``cost_usd``)."""
+    for entry in stage_costs:
+        cost = entry.get("cost_usd") or 0.0
+        if cost > 0:
+            COST_USD.labels(mode=mode, stage=entry.get("stage_name", "unknown")).inc(cost)
+
+
+# --- Provider call instrumentation ---
+
+def _provider_name(host: str) -> str:
+    for suffix, name in _PROVIDER_HOSTS.items():
+        if host == suffix or host.endswith("." + suffix):
+            return name
+    return host or "unknown"
+
+
+def _request_model(request: httpx.Request) -> str:
+    match = _GEMINI_MODEL_RE.search(request.url.path)
+    if match:
+        return match.group(1)
+    try:
+        body = request.content
+    except httpx.RequestNotRead:
+        return "unknown"
+    match = _MODEL_JSON_RE.search(body) or _MODEL_MULTIPART_RE.search(body)
+    return match.group(1).decode("utf-8", "replace") if match else "unknown"
+
+
+def _provider_labels(request: httpx.Request) -> Dict[str, str]:
+    from .stub_provider import provider_endpoint
+
+    return {
+        "provider": _provider_name(request.url.host),
+        "model": _request_model(request),
+        "endpoint": provider_endpoint(request.url.path) or "other",
+    }
+
+
+def _observe_chat_prompt(request: httpx.Request, labels: Dict[str, str]) -> None:
+    if labels["endpoint"] != "chat.completions":
+        return
+    try:
+        body = request.content
+    except httpx.RequestNotRead:
+        return
+    observe_chat_request(labels["model"], body)
+
+
+class _ProviderCall:
+    """
+    Latency, tracing span and stage provider wait of one provider call.
+
+    Started before the request is sent and finished when the response stream
+    is closed (or the request fails), so the body transfer is included.
+    """
+
+    def __init__(self, request: httpx.Request):
+        self.labels = _provider_labels(request)
+        _observe_chat_prompt(request, self.labels)
+        # The OpenAI SDK numbers its own retries in this header
+        self.span = open_span(
+            f"provider.{self.labels['endpoint']}",
+            retry_count=request.headers.get("x-stainless-retry-count"),
+            **self.labels
+        )
+        self._wait = contextlib.ExitStack()
+        self._wait.enter_context(provider_wait())
+        self.started = time.perf_counter()
+        self.status: Optional[str] = None
+
+    def response_started(self, response: httpx.Response) -> None:
+        self.status = str(response.status_code)
+        self.span.set_attribute("http.status_code", response.status_code)
+        if response.status_code >= 400:
+            set_span_error(self.span, f"HTTP {response.status_code}")
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        if self._wait is None:
+            return
+        status = "error" if error is not None or self.status is None else self.status
+        PROVIDER_REQUEST_DURATION.labels(status=status, **self.labels).observe(time.perf_counter() - self.started)
+        if error is not None:
+            set_span_error(self.span, f"{type(error).__name__}: {error}")
+        self.span.end()
+        wait, self._wait = self._wait, None
+        wait.close()
+
+
+class _InstrumentedStream(httpx.SyncByteStream):
+    def __init__(self, inner: httpx.SyncByteStream, call: _ProviderCall):
+        self.inner = inner
+        self.call = call
+
+    def __iter__(self) -> Iterator[bytes]:
+        try:
+            yield from self.inner
+        except BaseException as e:
+            self.call.finish(e)
+            raise
+
+    def close(self) -> None:
+        try:
+            self.inner.close()
+        finally:
+            self.call.finish()
+
+
+class _AsyncInstrumentedStream(httpx.AsyncByteStream):
+    def __init__(self, inner: httpx.AsyncByteStream, call: _ProviderCall):
+        self.inner = inner
+        self.call = call
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self.inner:
+                yield chunk
+        except BaseException as e:
+            self.call.finish(e)
+            raise
+
+    async def aclose(self) -> None:
+        try:
+            await self.inner.aclose()
+        finally:
+            self.call.finish()
+
+
+class InstrumentedTransport(httpx.BaseTransport):
+    """
+    Records provider call latency and a tracing span around another
+    transport, from sending the request until the response stream closes.
+    """
+
+    def __init__(self, inner: httpx.BaseTransport):
+        self.inner = inner
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        call = _ProviderCall(request)
+        try:
+            response = self.inner.handle_request(request)
+        except BaseException as e:
+            call.finish(e)
+            raise
+        call.response_started(response)
+        if isinstance(response.stream, httpx.ByteStream):
+            # Body already in memory (stub provider): nothing left to wait for
+            call.finish()
+        else:
+            response.stream = _InstrumentedStream(response.stream, call)
+        return response
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class AsyncInstrumentedTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of ``InstrumentedTransport``."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport):
+        self.inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        call = _ProviderCall(request)
+        try:
+            response = await self.inner.handle_async_request(request)
+        except BaseException as e:
+            call.finish(e)
+            raise
+        call.response_started(response)
+        if isinstance(response.stream, httpx.ByteStream):
+            # Body already in memory (stub provider): nothing left to wait for
+            call.finish()
+        else:
+            response.stream = _AsyncInstrumentedStream(response.stream, call)
+        return response
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+# --- Event loop lag ---
+
+class EventLoopLagMonitor:
+    """Background task that samples how late the event loop wakes up."""
+
+    def __init__(self, interval: float = EVENT_LOOP_LAG_INTERVAL_SECONDS):
+        self.interval = interval
+        self.last_lag_seconds = 0.0
+        self.beat_started = time.perf_counter()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            self.beat_started = started
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self.last_lag_seconds = lag
+            EVENT_LOOP_LAG.observe(lag)
+            self._on_sample(lag)
+
+    def _on_sample(self, lag: float) -> None:
+        """Hook called on the loop after each lag sample."""
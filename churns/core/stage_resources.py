@@ -0,0 +1,270 @@
+"""
+Stage Resource Accounting
+=========================
+
+Measures what each pipeline stage costs the process beyond wall-clock time:
+
+- ``cpu_seconds``: process CPU time (user + system) spent during the stage
+- ``peak_memory_delta_bytes``: highest memory reached during the stage above
+  where it started. Uses ``tracemalloc`` when it is tracing (Python heap
+  only; enable with ``STAGE_TRACEMALLOC=true``), otherwise samples the
+  process RSS every ``STAGE_RSS_SAMPLE_INTERVAL_MS`` (default 50 ms)
+- ``io_read_bytes`` / ``io_write_bytes``: storage I/O from ``psutil`` or
+  ``/proc/self/io`` (``None`` where neither is available)
+- ``provider_wait_seconds``: wall time with at least one provider HTTP call
+  in flight, reported by the instrumented transports in
+  ``churns.core.service_metrics``; parallel calls are not double counted
+- ``local_compute_seconds``: the rest of the stage's wall time
+
+CPU, memory and I/O are process-wide counters, so stages of concurrent runs
+are charged for each other's work; provider wait is tracked per stage.
+The executor stores one ``StageResourceMeter.stop()`` dict per stage in
+``ctx.stage_resources`` and the API persists it on the ``PipelineStage`` row.
+"""
+
+import contextlib
+import contextvars
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, Optional, Set, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RSS_SAMPLE_INTERVAL_MS = 50.0
+
+_PROC_IO_PATH = "/proc/self/io"
+_PROC_STATM_PATH = "/proc/self/statm"
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def process_cpu_seconds() -> float:
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_utime + usage.ru_stime
+    return time.process_time()
+
+
+def process_rss_bytes() -> Optional[int]:
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open(_PROC_STATM_PATH) as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def process_io_bytes() -> Optional[Tuple[int, int]]:
+    """(read_bytes, write_bytes) of storage I/O done by the process so far."""
+    if psutil is not None:
+        try:
+            counters = psutil.Process().io_counters()
+            return counters.read_bytes, counters.write_bytes
+        except (AttributeError, psutil.Error):
+            pass
+    try:
+        with open(_PROC_IO_PATH) as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["read_bytes"]), int(fields["write_bytes"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+class ProviderWaitTracker:
+    """Union of the intervals during which provider calls were in flight."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._busy_since = 0.0
+        self._total = 0.0
+
+    def enter(self) -> None:
+        with self._lock:
+            if self._in_flight == 0:
+                self._busy_since = time.perf_counter()
+            self._in_flight += 1
+
+    def exit(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._total += time.perf_counter() - self._busy_since
+
+    def total_seconds(self) -> float:
+        with self._lock:
+            if self._in_flight:
+                return self._total + time.perf_counter() - self._busy_since
+            return self._total
+
+
+_current_wait_tracker: contextvars.ContextVar[Optional[ProviderWaitTracker]] = contextvars.ContextVar(
+    "churns_provider_wait_tracker", default=None
+)
+
+
+@contextlib.contextmanager
+def provider_wait():
+    """Count the enclosed provider call towards the current stage's provider wait."""
+    tracker = _current_wait_tracker.get()
+    if tracker is None:
+        yield
+        return
+    tracker.enter()
+    try:
+        yield
+    finally:
+        tracker.exit()
+
+
+class _RssSampler:
+    """One background thread raising the RSS peak of every active meter."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meters: Set["StageResourceMeter"] = set()
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup = threading.Event()
+
+    def add(self, meter: "StageResourceMeter") -> None:
+        with self._lock:
+            self._meters.add(meter)
+            self._wakeup.clear()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stage-rss-sampler", daemon=True)
+                self._thread.start()
+
+    def remove(self, meter: "StageResourceMeter") -> None:
+        with self._lock:
+            self._meters.discard(meter)
+            if not self._meters:
+                self._wakeup.set()
+
+    def _run(self) -> None:
+        interval = _rss_sample_interval()
+        while True:
+            self._wakeup.wait(interval)
+            with self._lock:
+                if not self._meters:
+                    self._thread = None
+                    return
+                meters = list(self._meters)
+            rss = process_rss_bytes()
+            if rss is None:
+                continue
+            for meter in meters:
+                meter._observe_rss(rss)
+
+
+def _rss_sample_interval() -> float:
+    try:
+        return float(os.getenv("STAGE_RSS_SAMPLE_INTERVAL_MS", DEFAULT_RSS_SAMPLE_INTERVAL_MS)) / 1000
+    except ValueError:
+        return DEFAULT_RSS_SAMPLE_INTERVAL_MS / 1000
+
+
+_rss_sampler = _RssSampler()
+
+
+def enable_tracemalloc_from_env() -> None:
+    """Start ``tracemalloc`` when ``STAGE_TRACEMALLOC`` is set."""
+    if _env_flag("STAGE_TRACEMALLOC", False) and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        logger.info("tracemalloc enabled for stage memory accounting")
+
+
+class StageResourceMeter:
+    """Context manager measuring the resources used while a stage runs."""
+
+    def __init__(self):
+        self.wait_tracker = ProviderWaitTracker()
+        self._token: Optional[contextvars.Token] = None
+        self._started = 0.0
+        self._cpu_start = 0.0
+        self._io_start: Optional[Tuple[int, int]] = None
+        self._use_tracemalloc = False
+        self._memory_start: Optional[int] = None
+        self._memory_peak: Optional[int] = None
+        self._usage: Optional[Dict[str, Any]] = None
+
+    def __enter__(self) -> "StageResourceMeter":
+        self._token = _current_wait_tracker.set(self.wait_tracker)
+        self._started = time.perf_counter()
+        self._cpu_start = process_cpu_seconds()
+        self._io_start = process_io_bytes()
+        self._use_tracemalloc = tracemalloc.is_tracing()
+        if self._use_tracemalloc:
+            # reset_peak is process-wide; overlapping stages share the peak
+            tracemalloc.reset_peak()
+            self._memory_start = tracemalloc.get_traced_memory()[0]
+        else:
+            self._memory_start = process_rss_bytes()
+            if self._memory_start is not None:
+                self._memory_peak = self._memory_start
+                _rss_sampler.add(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+    def _observe_rss(self, rss: int) -> None:
+        if self._memory_peak is None or rss > self._memory_peak:
+            self._memory_peak = rss
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop measuring and return the stage's usage (idempotent)."""
+        if self._usage is not None:
+            return self._usage
+        wall = time.perf_counter() - self._started
+        cpu = process_cpu_seconds() - self._cpu_start
+
+        peak_delta = None
+        if self._use_tracemalloc and tracemalloc.is_tracing():
+            peak_delta = tracemalloc.get_traced_memory()[1] - self._memory_start
+        elif self._memory_start is not None:
+            _rss_sampler.remove(self)
+            rss = process_rss_bytes()
+            if rss is not None:
+                self._observe_rss(rss)
+            peak_delta = self._memory_peak - self._memory_start
+
+        io_read = io_write = None
+        io_end = process_io_bytes() if self._io_start is not None else None
+        if io_end is not None:
+            io_read = io_end[0] - self._io_start[0]
+            io_write = io_end[1] - self._io_start[1]
+
+        provider_wait_seconds = min(self.wait_tracker.total_seconds(), wall)
+        if self._token is not None:
+            _current_wait_tracker.reset(self._token)
+            self._token = None
+
+        self._usage = {
+            "cpu_seconds": round(cpu, 4),
+            "peak_memory_delta_bytes": max(0, peak_delta) if peak_delta is not None else None,
+            "io_read_bytes": io_read,
+            "io_write_bytes": io_write,
+            "provider_wait_seconds": round(provider_wait_seconds, 4),
+            "local_compute_seconds": round(wall - provider_wait_seconds, 4)
+        }
+        return self._usage
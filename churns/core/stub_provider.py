@@ -0,0 +1,542 @@
+"""
+Stub Provider
+=============
+
+In-process stand-in for the OpenAI, OpenRouter and Gemini HTTP APIs, used to
+load-test the pipeline offline and without spending money.
+
+The stub is an ``httpx`` transport plugged into the real SDK clients built by
+``ClientConfig``, so instructor patching, retries and response parsing run
+exactly as they do against the live services. It answers:
+
+- ``POST .../chat/completions``: when the request carries an instructor tool
+  schema (or its prompt names one of the pipeline's Pydantic models or quotes
+  all of its required fields) the reply is a schema-valid instance of that
+  model; otherwise plain text. ``stream: true`` requests get the same reply
+  as server-sent ``chat.completion.chunk`` events
+- ``POST .../images/generations`` and ``.../images/edits``: a PNG as ``b64_json``
+- ``POST .../models/{model}:generateContent``: a Gemini candidate with an
+  ``inlineData`` PNG part
+
+Enable with ``USE_STUB_PROVIDERS=true`` in ``.env``. Behaviour is tuned with:
+
+- ``STUB_LATENCY_MS`` / ``STUB_IMAGE_LATENCY_MS``: median latency per call
+- ``STUB_LATENCY_SIGMA``: log-normal spread (0 gives a fixed latency)
+- ``STUB_STREAM_FIRST_TOKEN_FRACTION``: share of a streamed call's latency
+  spent before the first chunk; the rest is spread over the chunks
+- ``STUB_ERROR_RATE``: fraction of calls that fail with HTTP 500
+- ``STUB_RATE_LIMIT_RATE``: fraction of calls rejected with HTTP 429
+- ``STUB_RETRY_AFTER_MS``: retry hint sent with 429 responses
+- ``STUB_SEED``: seed for reproducible latencies, failures and payloads
+"""
+
+import asyncio
+import base64
+import io
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import httpx
+
+STUB_API_KEY = "stub-key"
+
+# Number of items generated for array fields without explicit bounds
+STUB_ARRAY_LENGTH = 3
+
+# Characters of content per streamed chunk
+STUB_STREAM_CHUNK_CHARS = 16
+
+_DEFAULT_IMAGE_SIZE = (1024, 1024)
+
+_GEMINI_PATH_RE = re.compile(r"/models/([^/:]+):generateContent$")
+_MULTIPART_SIZE_RE = re.compile(rb'name="size"\r\n\r\n(\d+x\d+)')
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def provider_endpoint(path: str) -> Optional[str]:
+    """Short name of the provider API a request path targets, or None if unknown."""
+    if path.endswith("/chat/completions"):
+        return "chat.completions"
+    if path.endswith("/images/generations"):
+        return "images.generate"
+    if path.endswith("/images/edits"):
+        return "images.edit"
+    if _GEMINI_PATH_RE.search(path):
+        return "gemini.generate_content"
+    return None
+
+
+def stub_providers_enabled() -> bool:
+    """Whether ``USE_STUB_PROVIDERS`` selects the stub over the real APIs."""
+    return _env_flag("USE_STUB_PROVIDERS")
+
+
+@dataclass
+class StubProviderSettings:
+    """Latency and failure profile for the stub transport."""
+    latency_ms: float = 800.0
+    image_latency_ms: float = 8000.0
+    latency_sigma: float = 0.35
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after_ms: float = 200.0
+    stream_first_token_fraction: float = 0.2
+    seed: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "StubProviderSettings":
+        seed = os.getenv("STUB_SEED")
+        return cls(
+            latency_ms=_env_float("STUB_LATENCY_MS", cls.latency_ms),
+            image_latency_ms=_env_float("STUB_IMAGE_LATENCY_MS", cls.image_latency_ms),
+            latency_sigma=_env_float("STUB_LATENCY_SIGMA", cls.latency_sigma),
+            error_rate=_env_float("STUB_ERROR_RATE", cls.error_rate),
+            rate_limit_rate=_env_float("STUB_RATE_LIMIT_RATE", cls.rate_limit_rate),
+            retry_after_ms=_env_float("STUB_RETRY_AFTER_MS", cls.retry_after_ms),
+            stream_first_token_fraction=_env_float("STUB_STREAM_FIRST_TOKEN_FRACTION", cls.stream_first_token_fraction),
+            seed=int(seed) if seed and seed.strip().lstrip("-").isdigit() else None,
+        )
+
+
+# --- Schema-driven payloads ---
+
+_response_models: Optional[Dict[str, Dict[str, Any]]] = None
+
+
+def _known_response_models() -> Dict[str, Dict[str, Any]]:
+    """JSON schemas of the pipeline's Pydantic models, keyed by class name."""
+    global _response_models
+    if _response_models is None:
+        from pydantic import BaseModel
+        from .. import models as pipeline_models
+
+        _response_models = {
+            name: obj.model_json_schema()
+            for name, obj in vars(pipeline_models).items()
+            if isinstance(obj, type) and issubclass(obj, BaseModel) and obj is not BaseModel
+        }
+    return _response_models
+
+
+def _find_prompt_schema(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Schema of the pipeline model a manual-JSON prompt asks for.
+
+    Prefers the longest model name mentioned in the prompt; otherwise picks the
+    model whose required fields are all quoted in it (prompts often spell out
+    the fields instead of naming the model).
+    """
+    models = _known_response_models()
+    named = [name for name in models if re.search(rf"\b{name}\b", text)]
+    if named:
+        return models[max(named, key=len)]
+
+    best_schema, best_score = None, 0
+    for schema in models.values():
+        quoted = {field for field in _schema_field_names(schema) if re.search(rf"[`'\"]{field}[`'\"]", text)}
+        required = set(schema.get("required", []))
+        # Nested fields count too, so a wrapper model beats the item model it contains
+        if required and required <= quoted and len(quoted) > best_score:
+            best_schema, best_score = schema, len(quoted)
+    return best_schema
+
+
+def _schema_field_names(schema: Dict[str, Any], defs: Optional[Dict[str, Any]] = None) -> set:
+    """Property names of a schema and of every model nested inside it."""
+    defs = defs if defs is not None else schema.get("$defs", {})
+    names = set(schema.get("properties", {}))
+    for ref in re.findall(r'"\$ref": "#/\$defs/(\w+)"', json.dumps(schema.get("properties", {}))):
+        names |= set(defs.get(ref, {}).get("properties", {}))
+    return names
+
+
+def generate_from_schema(schema: Dict[str, Any], rng: Optional[random.Random] = None,
+                         defs: Optional[Dict[str, Any]] = None, name: str = "value") -> Any:
+    """
+    Build a value that validates against a (Pydantic-generated) JSON schema.
+
+    Every declared property is filled in, optional fields take their non-null
+    variant, and arrays get ``STUB_ARRAY_LENGTH`` items within any min/max bounds.
+    """
+    rng = rng or random.Random()
+    defs = defs if defs is not None else schema.get("$defs", schema.get("definitions", {}))
+
+    if "$ref" in schema:
+        ref_name = schema["$ref"].rsplit("/", 1)[-1]
+        return generate_from_schema(defs[ref_name], rng, defs, name)
+    for key in ("anyOf", "oneOf"):
+        if key in schema:
+            options = [s for s in schema[key] if s.get("type") != "null"] or schema[key]
+            return generate_from_schema(options[0], rng, defs, name)
+    if "allOf" in schema:
+        return generate_from_schema(schema["allOf"][0], rng, defs, name)
+    if "const" in schema:
+        return schema["const"]
+    if "enum" in schema:
+        return schema["enum"][0]
+
+    schema_type = schema.get("type")
+    if isinstance(schema_type, list):
+        schema_type = next((t for t in schema_type if t != "null"), "null")
+
+    if schema_type == "object" or "properties" in schema:
+        result = {
+            prop: generate_from_schema(prop_schema, rng, defs, prop)
+            for prop, prop_schema in schema.get("properties", {}).items()
+        }
+        extra = schema.get("additionalProperties")
+        if not schema.get("properties") and isinstance(extra, dict):
+            for i in range(STUB_ARRAY_LENGTH):
+                result[f"{name}_{i + 1}"] = generate_from_schema(extra, rng, defs, name)
+        return result
+    if schema_type == "array":
+        count = max(schema.get("minItems", 0), min(schema.get("maxItems", STUB_ARRAY_LENGTH), STUB_ARRAY_LENGTH))
+        item_schema = schema.get("items", {"type": "string"})
+        return [generate_from_schema(item_schema, rng, defs, f"{name} {i + 1}") for i in range(count)]
+    if schema_type == "integer":
+        if name.endswith("index"):
+            return 0
+        low = int(schema.get("minimum", 1))
+        return rng.randint(low, max(low, int(schema.get("maximum", low + 4))))
+    if schema_type == "number":
+        low = float(schema.get("minimum", 0.0))
+        return round(rng.uniform(low, float(schema.get("maximum", low + 1.0))), 3)
+    if schema_type == "boolean":
+        return False
+    if schema_type == "null":
+        return None
+
+    text = f"Stub {name.replace('_', ' ')}"
+    if len(text) < schema.get("minLength", 0):
+        text = text.ljust(schema["minLength"], ".")
+    return text
+
+
+def _stub_text(rng: random.Random) -> str:
+    words = ["fresh", "golden", "crispy", "handmade", "seasonal", "local", "bold", "cozy", "vibrant", "savory"]
+    sentence = " ".join(rng.choice(words) for _ in range(12))
+    return f"{sentence.capitalize()}. Stub caption for load testing. #stub #loadtest"
+
+
+_png_cache: Dict[Tuple[int, int], str] = {}
+
+
+def _stub_png_b64(size: Tuple[int, int]) -> str:
+    """Base64 PNG of the requested size (cached; large enough to pass size checks)."""
+    if size not in _png_cache:
+        from PIL import Image
+
+        width, height = size
+        gradient = Image.linear_gradient("L").resize((width, height))
+        image = Image.merge("RGB", (gradient, gradient.rotate(90), gradient.transpose(Image.FLIP_LEFT_RIGHT)))
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        _png_cache[size] = base64.b64encode(buffer.getvalue()).decode("ascii")
+    return _png_cache[size]
+
+
+def _parse_size(value: Any) -> Tuple[int, int]:
+    if isinstance(value, bytes):
+        value = value.decode("ascii", "ignore")
+    if isinstance(value, str) and re.fullmatch(r"\d+x\d+", value):
+        width, height = value.split("x")
+        return int(width), int(height)
+    return _DEFAULT_IMAGE_SIZE
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _message_text(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for message in messages or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts.extend(item.get("text", "") for item in content if isinstance(item, dict))
+    return "\n".join(parts)
+
+
+class StubTransport(httpx.BaseTransport):
+    """``httpx`` transport that answers provider API calls locally."""
+
+    def __init__(self, settings: Optional[StubProviderSettings] = None):
+        self.settings = settings or StubProviderSettings.from_env()
+        self._rng = random.Random(self.settings.seed)
+        self._rng_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"requests": 0, "errors": 0, "rate_limited": 0})
+
+    # --- Behaviour model ---
+
+    def _draw(self) -> Tuple[float, float]:
+        with self._rng_lock:
+            return self._rng.random(), self._rng.gauss(0.0, 1.0)
+
+    def _latency_seconds(self, median_ms: float, z: float) -> float:
+        if median_ms <= 0:
+            return 0.0
+        return median_ms * math.exp(self.settings.latency_sigma * z) / 1000.0
+
+    def _count(self, endpoint: str, outcome: str) -> None:
+        with self._stats_lock:
+            self.stats[endpoint][outcome] += 1
+
+    # --- Transport ---
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        plan = self.plan(request)
+        if isinstance(plan, httpx.Response):
+            return plan
+        delay, respond = plan
+        time.sleep(delay)
+        return respond()
+
+    def plan(self, request: httpx.Request) -> Union[httpx.Response, Tuple[float, Callable[[], httpx.Response]]]:
+        """
+        Decide how to answer a request: a latency to wait and a response factory.
+
+        Unknown routes are answered immediately with a 404 response. The
+        request body must already be read.
+        """
+        path = request.url.path
+        endpoint = provider_endpoint(path)
+        if endpoint is None:
+            return httpx.Response(404, json={"error": {"message": f"Stub provider has no route for {path}"}})
+        gemini_match = _GEMINI_PATH_RE.search(path)
+        median_ms = self.settings.latency_ms if endpoint == "chat.completions" else self.settings.image_latency_ms
+
+        self._count(endpoint, "requests")
+        roll, z = self._draw()
+        delay = self._latency_seconds(median_ms, z)
+
+        is_gemini = gemini_match is not None
+        if roll < self.settings.rate_limit_rate:
+            self._count(endpoint, "rate_limited")
+            return delay, lambda: self._error_response(429, is_gemini)
+        if roll < self.settings.rate_limit_rate + self.settings.error_rate:
+            self._count(endpoint, "errors")
+            return delay, lambda: self._error_response(500, is_gemini)
+
+        if endpoint == "chat.completions":
+            payload = json.loads(request.content)
+            if payload.get("stream"):
+                first_token_delay = delay * self.settings.stream_first_token_fraction
+                return first_token_delay, lambda: self._chat_completion_stream(payload, delay - first_token_delay)
+
+        def respond() -> httpx.Response:
+            if endpoint == "chat.completions":
+                return httpx.Response(200, json=self._chat_completion(json.loads(request.content)))
+            if endpoint == "images.generate":
+                payload = json.loads(request.content)
+                return httpx.Response(200, json=self._images_response(_parse_size(payload.get("size"))))
+            if endpoint == "images.edit":
+                size_match = _MULTIPART_SIZE_RE.search(request.content)
+                return httpx.Response(200, json=self._images_response(_parse_size(size_match and size_match.group(1))))
+            return httpx.Response(200, json=self._gemini_response(gemini_match.group(1)))
+
+        return delay, respond
+
+    def _error_response(self, status_code: int, is_gemini: bool) -> httpx.Response:
+        headers = {}
+        if status_code == 429:
+            headers["retry-after-ms"] = str(int(self.settings.retry_after_ms))
+            message = "Rate limit exceeded (stub provider)"
+            error_type, gemini_status = "rate_limit_error", "RESOURCE_EXHAUSTED"
+        else:
+            message = "Internal server error (stub provider)"
+            error_type, gemini_status = "server_error", "INTERNAL"
+
+        if is_gemini:
+            body = {"error": {"code": status_code, "message": message, "status": gemini_status}}
+        else:
+            body = {"error": {"message": message, "type": error_type, "code": error_type}}
+        return httpx.Response(status_code, json=body, headers=headers)
+
+    # --- Payloads ---
+
+    def _chat_completion(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        prompt_text = _message_text(payload.get("messages", []))
+        message: Dict[str, Any] = {"role": "assistant", "content": None}
+
+        tools = payload.get("tools") or []
+        if tools:
+            function = tools[0].get("function", {})
+            with self._rng_lock:
+                arguments = generate_from_schema(function.get("parameters", {}), self._rng)
+            message["tool_calls"] = [{
+                "id": f"call_stub_{int(time.time() * 1000)}",
+                "type": "function",
+                "function": {"name": function.get("name", "response"), "arguments": json.dumps(arguments)},
+            }]
+            output_text = message["tool_calls"][0]["function"]["arguments"]
+            finish_reason = "tool_calls"
+        else:
+            schema = _find_prompt_schema(prompt_text)
+            with self._rng_lock:
+                output_text = json.dumps(generate_from_schema(schema, self._rng)) if schema else _stub_text(self._rng)
+            message["content"] = output_text
+            finish_reason = "stop"
+
+        prompt_tokens = _estimate_tokens(prompt_text)
+        completion_tokens = _estimate_tokens(output_text)
+        return {
+            "id": f"chatcmpl-stub-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub-model"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": 0},
+            },
+        }
+
+    def _chat_completion_stream(self, payload: Dict[str, Any], duration: float) -> httpx.Response:
+        """The completion as SSE chunks spread over ``duration`` seconds."""
+        completion = self._chat_completion(payload)
+        choice = completion["choices"][0]
+        content = choice["message"]["content"] or ""
+        base = {key: completion[key] for key in ("id", "created", "model")}
+        base["object"] = "chat.completion.chunk"
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> Dict[str, Any]:
+            return {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+        parts = [content[i:i + STUB_STREAM_CHUNK_CHARS] for i in range(0, len(content), STUB_STREAM_CHUNK_CHARS)]
+        events = [chunk({"role": "assistant", "content": ""})]
+        events.extend(chunk({"content": part}) for part in parts)
+        events.append(chunk({}, choice["finish_reason"]))
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            events.append({**base, "choices": [], "usage": completion["usage"]})
+        body = [f"data: {json.dumps(event)}\n\n".encode() for event in events] + [b"data: [DONE]\n\n"]
+        return httpx.Response(
+            200, headers={"content-type": "text/event-stream"},
+            stream=_PacedByteStream(body, duration / max(1, len(parts)))
+        )
+
+    def _images_response(self, size: Tuple[int, int]) -> Dict[str, Any]:
+        return {
+            "created": int(time.time()),
+            "data": [{"b64_json": _stub_png_b64(size)}],
+            "usage": {
+                "input_tokens": 50,
+                "output_tokens": 4160,
+                "total_tokens": 4210,
+                "input_tokens_details": {"text_tokens": 50, "image_tokens": 0},
+            },
+        }
+
+    def _gemini_response(self, model_id: str) -> Dict[str, Any]:
+        return {
+            "candidates": [{
+                "content": {
+                    "role": "model",
+                    "parts": [{"inlineData": {"mimeType": "image/png", "data": _stub_png_b64(_DEFAULT_IMAGE_SIZE)}}],
+                },
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {"promptTokenCount": 50, "candidatesTokenCount": 1290, "totalTokenCount": 1340},
+            "modelVersion": model_id,
+        }
+
+
+class _PacedByteStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """Response body that yields its parts ``interval`` seconds apart."""
+
+    def __init__(self, parts: List[bytes], interval: float):
+        self.parts = parts
+        self.interval = interval
+
+    def _delays(self):
+        # Paced against a deadline so per-sleep overhead does not stretch the total
+        started = time.perf_counter()
+        for i in range(len(self.parts)):
+            yield max(0.0, started + i * self.interval - time.perf_counter())
+
+    def __iter__(self):
+        for part, delay in zip(self.parts, self._delays()):
+            if delay:
+                time.sleep(delay)
+            yield part
+
+    async def __aiter__(self):
+        for part, delay in zip(self.parts, self._delays()):
+            if delay:
+                await asyncio.sleep(delay)
+            yield part
+
+
+class AsyncStubTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of ``StubTransport`` for ``httpx.AsyncClient`` users."""
+
+    def __init__(self, stub: StubTransport):
+        self.stub = stub
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        plan = self.stub.plan(request)
+        if isinstance(plan, httpx.Response):
+            return plan
+        delay, respond = plan
+        await asyncio.sleep(delay)
+        return respond()
+
+
+_shared_transport: Optional[StubTransport] = None
+_shared_transport_lock = threading.Lock()
+
+
+def get_stub_transport() -> StubTransport:
+    """Process-wide stub transport, so stats cover every configured client."""
+    global _shared_transport
+    with _shared_transport_lock:
+        if _shared_transport is None:
+            _shared_transport = StubTransport()
+        return _shared_transport
+
+
+def build_stub_http_client() -> httpx.Client:
+    """``httpx.Client`` routed through the shared stub transport."""
+    return httpx.Client(transport=get_stub_transport(), timeout=httpx.Timeout(600.0))
+
+
+def build_stub_async_http_client() -> httpx.AsyncClient:
+    """``httpx.AsyncClient`` routed through the shared stub transport."""
+    return httpx.AsyncClient(transport=AsyncStubTransport(get_stub_transport()), timeout=httpx.Timeout(600.0))
+
+
+def get_stub_stats() -> Dict[str, Dict[str, int]]:
+    """Per-endpoint request, error and 429 counters of the shared transport."""
+    transport = _shared_transport
+    if transport is None:
+        return {}
+    with transport._stats_lock:
+        return {endpoint: dict(counts) for endpoint, counts in transport.stats.items()}
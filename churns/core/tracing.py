@@ -0,0 +1,386 @@
+"""
+Run Tracing
+===========
+
+OpenTelemetry spans for pipeline runs. A background run opens a root span
+(``start_trace``); the executor, stages, provider calls, retries, JSON
+parsing and file writes open child spans (``start_span``) which attach to
+whatever span is current. The current span lives in the OpenTelemetry
+context (a ``ContextVar``), so it follows ``asyncio`` tasks and
+``asyncio.to_thread`` calls. ``start_span`` outside a trace is a no-op.
+
+Spans are produced by an ``opentelemetry-sdk`` tracer provider owned by this
+module and handed to the configured span processors:
+
+- ``json``: Chrome trace-event file (open in ``chrome://tracing`` or
+  https://ui.perfetto.dev) under ``{run_dir}/traces/``, written when the
+  root span ends
+- ``otlp``: ``opentelemetry-exporter-otlp`` OTLP/HTTP exporter behind a
+  batch processor
+
+Exporters are chosen with ``TRACE_EXPORTERS`` (comma separated, empty by
+default); the OTLP exporter reads the standard ``OTEL_EXPORTER_OTLP_*``
+variables and the resource takes ``OTEL_SERVICE_NAME``. Trace IDs are
+generated either way and sent with WebSocket messages and run metadata.
+"""
+
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from opentelemetry import context as otel_context
+from opentelemetry import trace as otel_trace
+from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.trace import SpanKind, Status, StatusCode, format_span_id, format_trace_id
+
+try:
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+except ImportError:
+    OTLPSpanExporter = None
+
+logger = logging.getLogger(__name__)
+
+TRACE_DIRNAME = "traces"
+DEFAULT_TRACE_DIRECTORY = "./data/traces"
+DEFAULT_SERVICE_NAME = "churns"
+
+# Returned by start_span/open_span outside a trace; accepts and drops everything
+NOOP_SPAN = otel_trace.INVALID_SPAN
+
+# A finished span and the thread it started on
+ThreadedSpan = Tuple[ReadableSpan, Optional[int]]
+
+
+def _attribute_value(value: Any) -> Any:
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def _attributes(attributes: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: _attribute_value(value) for key, value in attributes.items() if value is not None}
+
+
+def _span_kind(name: str) -> SpanKind:
+    # Outbound provider calls are client spans
+    return SpanKind.CLIENT if name.startswith("provider.") else SpanKind.INTERNAL
+
+
+def set_span_error(span: Any, message: Optional[str] = None) -> None:
+    """Mark a span as failed."""
+    span.set_status(Status(StatusCode.ERROR, message))
+
+
+# --- Tracer provider ---
+
+_provider: Optional[TracerProvider] = None
+_processors: Optional[List[SpanProcessor]] = None
+_provider_lock = threading.Lock()
+
+
+def processors_from_env() -> List[SpanProcessor]:
+    """Build the span processors listed in ``TRACE_EXPORTERS``."""
+    processors: List[SpanProcessor] = []
+    for name in os.getenv("TRACE_EXPORTERS", "").split(","):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name == "json":
+            processors.append(ChromeTraceExporter(os.getenv("TRACE_DIRECTORY", DEFAULT_TRACE_DIRECTORY)))
+        elif name == "otlp":
+            if OTLPSpanExporter is None:
+                logger.warning("TRACE_EXPORTERS lists otlp but opentelemetry-exporter-otlp is not installed")
+                continue
+            processors.append(BatchSpanProcessor(OTLPSpanExporter()))
+        else:
+            logger.warning(f"Unknown trace exporter '{name}' in TRACE_EXPORTERS (expected json or otlp)")
+    return processors
+
+
+def _tracer() -> otel_trace.Tracer:
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = TracerProvider(
+                resource=Resource.create({SERVICE_NAME: os.getenv("OTEL_SERVICE_NAME", DEFAULT_SERVICE_NAME)})
+            )
+            processors = _processors if _processors is not None else processors_from_env()
+            for processor in processors:
+                _provider.add_span_processor(processor)
+        return _provider.get_tracer(__name__)
+
+
+def configure_tracing(processors: Optional[List[SpanProcessor]] = None) -> None:
+    """Replace the span processors; ``None`` re-reads ``TRACE_EXPORTERS`` on the next span."""
+    global _processors
+    shutdown_tracing()
+    _processors = processors
+
+
+def shutdown_tracing() -> None:
+    """Flush and stop the span processors (the next span starts a new provider)."""
+    global _provider
+    with _provider_lock:
+        provider, _provider = _provider, None
+    if provider is not None:
+        try:
+            provider.shutdown()
+        except Exception as e:
+            logger.warning(f"Trace provider failed to shut down: {e}")
+
+
+# --- Traces and spans ---
+
+@dataclass
+class _TraceState:
+    """What this process knows about a trace while its root span is open."""
+
+    root_name: str
+    output_directory: Optional[str] = None
+
+
+_traces: Dict[int, _TraceState] = {}
+_traces_lock = threading.Lock()
+
+
+def _trace_state(trace_id: int) -> Optional[_TraceState]:
+    with _traces_lock:
+        return _traces.get(trace_id)
+
+
+def current_span() -> Optional[otel_trace.Span]:
+    """The current span, or None outside a trace."""
+    span = otel_trace.get_current_span()
+    return span if span.get_span_context().is_valid else None
+
+
+def current_trace_id() -> Optional[str]:
+    span = current_span()
+    return format_trace_id(span.get_span_context().trace_id) if span is not None else None
+
+
+def trace_output_directory() -> Optional[str]:
+    """Run directory the current trace is written into, if one was set."""
+    span = current_span()
+    state = _trace_state(span.get_span_context().trace_id) if span is not None else None
+    return state.output_directory if state is not None else None
+
+
+def set_trace_output_directory(output_directory: Optional[str]) -> None:
+    """Direct the current trace's file export into a run directory (first caller wins)."""
+    span = current_span()
+    state = _trace_state(span.get_span_context().trace_id) if span is not None else None
+    if state is not None and output_directory and not state.output_directory:
+        state.output_directory = str(output_directory)
+
+
+def add_span_event(name: str, **attributes: Any) -> None:
+    """Record an instant event on the current span, if any."""
+    otel_trace.get_current_span().add_event(name, _attributes(attributes))
+
+
+@contextmanager
+def start_span(name: str, **attributes: Any) -> Iterator[otel_trace.Span]:
+    """Child span of the current span; yields ``NOOP_SPAN`` outside a trace."""
+    if current_span() is None:
+        yield NOOP_SPAN
+        return
+    with _tracer().start_as_current_span(name, kind=_span_kind(name), attributes=_attributes(attributes)) as span:
+        yield span
+
+
+def open_span(name: str, **attributes: Any) -> otel_trace.Span:
+    """
+    Child span of the current span that does not become current.
+
+    For operations that end outside the caller's block (e.g. a response
+    stream closed later); the caller must call ``span.end()``. Returns
+    ``NOOP_SPAN`` outside a trace.
+    """
+    if current_span() is None:
+        return NOOP_SPAN
+    return _tracer().start_span(name, kind=_span_kind(name), attributes=_attributes(attributes))
+
+
+@contextmanager
+def start_trace(name: str, output_directory: Optional[str] = None, **attributes: Any) -> Iterator[otel_trace.Span]:
+    """
+    Root span of a new trace.
+
+    Inside an existing trace this opens a child span instead, so nested
+    entry points (the background task and ``run_async``) share one trace.
+    """
+    if current_span() is not None:
+        with start_span(name, **attributes) as span:
+            set_trace_output_directory(output_directory)
+            yield span
+        return
+
+    root = _tracer().start_span(name, context=otel_context.Context(), attributes=_attributes(attributes))
+    trace_id = root.get_span_context().trace_id
+    with _traces_lock:
+        _traces[trace_id] = _TraceState(name, str(output_directory) if output_directory else None)
+    try:
+        with otel_trace.use_span(root, end_on_exit=True):
+            yield root
+    finally:
+        # After the root has ended, so exporters still see the state
+        with _traces_lock:
+            _traces.pop(trace_id, None)
+
+
+def traced_run(name: str, id_param: str):
+    """
+    Decorator running an async entry point inside ``start_trace(name)``.
+
+    The argument named ``id_param`` (e.g. ``run_id``) becomes a root attribute.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            run_ref = signature.bind_partial(*args, **kwargs).arguments.get(id_param)
+            with start_trace(name, **{id_param: run_ref}):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- Chrome trace export ---
+
+class ChromeTraceExporter(SpanProcessor):
+    """
+    Span processor writing one Chrome trace-event JSON file per trace.
+
+    Spans are collected while their trace's root is open (``start_trace`` in
+    this process) and written when the root ends; spans ending later are
+    dropped. Roots often end on the event loop, so the file is serialized and
+    written by a worker thread, as ``BatchSpanProcessor`` does for OTLP.
+    """
+
+    def __init__(self, directory: str = DEFAULT_TRACE_DIRECTORY):
+        self.directory = directory
+        self._spans: Dict[int, List[ThreadedSpan]] = {}
+        self._threads: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._exports: "queue.Queue[Optional[Tuple[List[ThreadedSpan], _TraceState]]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+
+    def on_start(self, span: Any, parent_context: Optional[otel_context.Context] = None) -> None:
+        with self._lock:
+            self._threads[span.get_span_context().span_id] = threading.get_ident()
+
+    def on_end(self, span: ReadableSpan) -> None:
+        trace_id = span.context.trace_id
+        state = _trace_state(trace_id)
+        with self._lock:
+            thread_id = self._threads.pop(span.context.span_id, None)
+            if state is None:
+                return
+            self._spans.setdefault(trace_id, []).append((span, thread_id))
+            if span.parent is not None:
+                return
+            spans = self._spans.pop(trace_id)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="chrome-trace-exporter", daemon=True)
+                self._worker.start()
+        self._exports.put((spans, state))
+
+    def _run(self) -> None:
+        while True:
+            item = self._exports.get()
+            try:
+                if item is None:
+                    return
+                spans, state = item
+                try:
+                    self.export(spans, state)
+                except Exception as e:
+                    trace_id = format_trace_id(spans[0][0].context.trace_id)
+                    logger.warning(f"Chrome trace export failed for trace {trace_id}: {e}")
+            finally:
+                self._exports.task_done()
+
+    def path_for(self, trace_id: int, state: _TraceState) -> Path:
+        base = Path(state.output_directory) / TRACE_DIRNAME if state.output_directory else Path(self.directory)
+        return base / f"{state.root_name}_{format_trace_id(trace_id)}.json"
+
+    def export(self, spans: List[ThreadedSpan], state: _TraceState) -> None:
+        from .artifact_writer import write_bytes_atomic
+
+        trace_id = spans[0][0].context.trace_id
+        path = self.path_for(trace_id, state)
+        write_bytes_atomic(json.dumps(chrome_trace_events(spans)).encode("utf-8"), path)
+        logger.debug(f"Wrote trace {format_trace_id(trace_id)} to {path}")
+
+    def shutdown(self) -> None:
+        """Write the traces already queued, then stop the worker."""
+        with self._lock:
+            self._spans.clear()
+            self._threads.clear()
+            worker, self._worker = self._worker, None
+        if worker is not None:
+            self._exports.put(None)
+            worker.join()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        """Wait until the queued traces are written."""
+        flushed = threading.Event()
+        threading.Thread(target=lambda: (self._exports.join(), flushed.set()), daemon=True).start()
+        return flushed.wait(timeout_millis / 1000)
+
+
+def chrome_trace_events(spans: List[ThreadedSpan]) -> Dict[str, Any]:
+    """
+    Chrome trace-event document for ``(span, thread_id)`` pairs of one
+    trace; timestamps are in microseconds.
+    """
+    pid = os.getpid()
+    events = []
+    for span, thread_id in sorted(spans, key=lambda item: item[0].start_time):
+        tid = thread_id or 0
+        args = dict(
+            span.attributes or {},
+            span_id=format_span_id(span.context.span_id),
+            parent_id=format_span_id(span.parent.span_id) if span.parent is not None else None,
+            status="error" if span.status.status_code is StatusCode.ERROR else "ok"
+        )
+        if span.status.description:
+            args["status_message"] = span.status.description
+        events.append({
+            "name": span.name,
+            "cat": span.name.split(".", 1)[0],
+            "ph": "X",
+            "ts": span.start_time / 1000,
+            "dur": (span.end_time - span.start_time) / 1000,
+            "pid": pid,
+            "tid": tid,
+            "args": args
+        })
+        for event in span.events:
+            events.append({
+                "name": event.name,
+                "cat": "event",
+                "ph": "i",
+                "s": "t",
+                "ts": event.timestamp / 1000,
+                "pid": pid,
+                "tid": tid,
+                "args": dict(event.attributes or {})
+            })
+    return {
+        "traceEvents": events,
+        "displayTimeUnit": "ms",
+        "otherData": {"trace_id": format_trace_id(spans[0][0].context.trace_id) if spans else None}
+    }
@@ -19,6 +19,8 @@ class BrandKitInput(BaseModel):
     colors: Optional[List[BrandColor]] = Field(None, description="A list of brand colors with semantic roles")
     brand_voice_description: Optional[str] = Field(None, description="Brand voice description")
     logo_file_base64: Optional[str] = Field(None, description="Base64 encoded logo file")
+    logo_blob_sha256: Optional[str] = Field(None, description="SHA-256 of the logo in the blob store (replaces logo_file_base64 once stored)")
+    logo_content_type: Optional[str] = Field(None, description="Media type of the stored logo")
     # Runtime fields - populated during processing
     saved_logo_path_in_run_dir: Optional[str] = Field(None, description="Path to saved logo in run directory")
     logo_analysis: Optional[Dict[str, Any]] = Field(None, description="Logo analysis result from image_eval stage")
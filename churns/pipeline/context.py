@@ -80,6 +80,8 @@ class PipelineContext:
     # Usage tracking
     llm_usage: Dict[str, Any] = field(default_factory=dict)
     cost_summary: Optional[Dict[str, Any]] = None
+    stage_resources: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # CPU, memory, I/O, provider wait per stage
+    stage_token_usage: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # Model, input/cached/output tokens per stage
     
     # Logs and output
     logs: List[str] = field(default_factory=list)
@@ -107,6 +109,9 @@ class PipelineContext:
     # Image generation client (for future use)
     image_generation_client: Optional[Any] = None
     
+    # Receives streamed LLM output as it arrives (set by the API, may be called from worker threads)
+    partial_output_callback: Optional[Any] = None
+    
     def log(self, message: str) -> None:
         """Add a log message with timestamp."""
         timestamp = datetime.datetime.now().strftime("%H:%M:%S.%f")[:-3]
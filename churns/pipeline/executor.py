@@ -5,15 +5,40 @@ This replaces the monolithic run_full_pipeline() function with a modular,
 configurable stage-based executor.
 """
 
+import contextlib
+import datetime
+import functools
+import os
 import time
 import yaml
 import importlib
 from pathlib import Path
 import logging
-from typing import List, Dict, Any, Optional, Callable, Awaitable
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Iterator, Tuple, Union
 from .context import PipelineContext
 from .preset_loader import PresetLoader
-from ..core.client_config import get_configured_clients
+from ..core.client_config import get_client_config, get_configured_clients
+from ..core.service_metrics import (
+    IMAGES,
+    RUNS_ACTIVE,
+    RUNS_FINISHED,
+    STAGE_DURATION,
+    observe_stage_usage,
+)
+from ..core.prompt_cache_accounting import current_stage_prompts, record_stage_prompts, stage_token_usage
+from ..core.stage_resources import StageResourceMeter
+from ..core.tracing import add_span_event, set_span_error, start_span, start_trace
+from ..core.provider_cassette import (
+    LATENCY_ORIGINAL,
+    MODE_RECORD,
+    MODE_REPLAY,
+    ProviderCassette,
+    apply_context_snapshot,
+    cassette_path_for_run,
+    get_active_cassette,
+    provider_cassette_mode,
+    use_cassette,
+)
 from ..api.database import StageStatus
 
 # Setup Logger
@@ -23,6 +48,42 @@ logging.basicConfig(
 )
 logger = logging.getLogger("executor")
 
+# Refinement stages that produce one edited image
+REFINEMENT_IMAGE_STAGES = ("subject_repair", "text_repair", "prompt_refine")
+
+DEFAULT_STAGE_ORDER_PATH = Path(__file__).parent.parent / "configs" / "stage_order.yml"
+
+
+@functools.lru_cache(maxsize=None)
+def _read_stage_order_config(config_path: str) -> Dict[str, Any]:
+    """Parsed stage order YAML; each file is read once per process."""
+    with open(config_path, 'r') as f:
+        return yaml.safe_load(f)
+
+
+def _stage_order_from_config(config_path: Path, mode: str) -> List[str]:
+    """Stage order for ``mode`` from the config file, falling back to the built-in order."""
+    try:
+        config = _read_stage_order_config(str(config_path))
+        
+        # Try to get stages for specific mode first
+        if mode in config:
+            return list(config[mode])
+        
+        # Fallback to legacy 'stages' key (for generation mode)
+        if 'stages' in config:
+            return list(config['stages'])
+            
+    except Exception as e:
+        print(f"Warning: Could not load stage config from {config_path}: {e}")
+    
+    # Final fallback to hardcoded order
+    if mode == "refinement":
+        return ['load_base_image', 'conditional_stage', 'save_outputs']
+    else:
+        return ['image_eval', 'strategy', 'style_guide', 'creative_expert', 'prompt_assembly', 'image_generation']
+
+
 class PipelineExecutor:
     """Executes pipeline stages in configurable order."""
     
@@ -32,7 +93,7 @@ class PipelineExecutor:
         
         if stages_config_path is None:
             # Default to stage_order.yml in configs directory
-            self.config_path = Path(__file__).parent.parent / "configs" / "stage_order.yml"
+            self.config_path = DEFAULT_STAGE_ORDER_PATH
         else:
             self.config_path = Path(stages_config_path)
         
@@ -53,32 +114,7 @@ class PipelineExecutor:
     
     def _load_stage_config(self) -> List[str]:
         """Load stage execution order from YAML config based on mode."""
-        try:
-            with open(self.config_path, 'r') as f:
-                config = yaml.safe_load(f)
-                
-                # Try to get stages for specific mode first
-                if self.mode in config:
-                    return config[self.mode]
-                
-                # Fallback to legacy 'stages' key (for generation mode)
-                if 'stages' in config:
-                    return config['stages']
-                
-                # Final fallback to hardcoded order
-                return self._get_fallback_stages()
-                
-        except Exception as e:
-            print(f"Warning: Could not load stage config from {self.config_path}: {e}")
-            return self._get_fallback_stages()
-    
-    def _get_fallback_stages(self) -> List[str]:
-        """Get fallback stage order based on mode."""
-        if self.mode == "refinement":
-            return ['load_base_image', 'conditional_stage', 'save_outputs']
-        else:
-            # Default generation stages
-            return ['image_eval', 'strategy', 'style_guide', 'creative_expert', 'prompt_assembly', 'image_generation']
+        return _stage_order_from_config(self.config_path, self.mode)
     
     def get_client_summary(self) -> Dict[str, str]:
         """Get a summary of configured clients."""
@@ -266,33 +302,71 @@ class PipelineExecutor:
         """Run the StyleAdaptation stage."""
         stage_name = "style_adaptation"
         stage_start_time = time.time()
-        
+
         logger.info(f"--- Stage {stage_order}: {stage_name} ---")
-        
+
         # Send stage starting notification
         if progress_callback:
             await progress_callback(
                 stage_name, int(stage_order), StageStatus.RUNNING, 
                 f"Starting stage {stage_name}...", None, None, None
             )
-        
-        try:
-            # Dynamically import and run the style adaptation stage
-            stage_module = importlib.import_module(f"churns.stages.{stage_name}")
-            
-            # Inject clients into stage
-            self._inject_clients_into_stage(stage_module, ctx)
-            
-            # Run the stage
-            await stage_module.run(ctx)
-            
-            stage_duration = time.time() - stage_start_time
-            
-            # Check if the stage set an error state
-            if hasattr(ctx, 'stage_error') and ctx.stage_error:
-                error_msg = ctx.stage_error
-                logger.error(f"Stage {stage_name} failed: {error_msg}")
-                
+
+        usage_before = dict(ctx.llm_usage or {})
+        with self._stage_scope(stage_name, stage_order) as (stage_span, meter):
+            try:
+                # Dynamically import and run the style adaptation stage
+                stage_module = importlib.import_module(f"churns.stages.{stage_name}")
+
+                # Inject clients into stage
+                self._inject_clients_into_stage(stage_module, ctx)
+
+                # Run the stage
+                await stage_module.run(ctx)
+
+                stage_duration = time.time() - stage_start_time
+
+                # Check if the stage set an error state
+                if hasattr(ctx, 'stage_error') and ctx.stage_error:
+                    error_msg = ctx.stage_error
+                    logger.error(f"Stage {stage_name} failed: {error_msg}")
+                    set_span_error(stage_span, error_msg)
+                    self._record_stage_resources(ctx, stage_name, meter, stage_span)
+                    self._record_stage_metrics(ctx, stage_name, StageStatus.FAILED, stage_duration, usage_before)
+
+                    # Send stage error notification
+                    if progress_callback:
+                        await progress_callback(
+                            stage_name, int(stage_order), StageStatus.FAILED, 
+                            f"Stage {stage_name} failed", 
+                            None, error_msg, stage_duration
+                        )
+                    # Clear the error state for next stages
+                    ctx.stage_error = None
+                else:
+                    logger.info(f"Stage {stage_name} completed in {stage_duration:.2f}s")
+                    self._record_stage_resources(ctx, stage_name, meter, stage_span)
+                    self._record_stage_metrics(ctx, stage_name, StageStatus.COMPLETED, stage_duration, usage_before)
+
+                    # Extract output data for the completed stage
+                    output_data = self._extract_stage_output(ctx, stage_name)
+
+                    # Send stage completion notification
+                    if progress_callback:
+                        await progress_callback(
+                            stage_name, int(stage_order), StageStatus.COMPLETED, 
+                            f"Stage {stage_name} completed successfully", 
+                            output_data, None, stage_duration
+                        )
+
+            except Exception as e:
+                stage_duration = time.time() - stage_start_time
+                error_msg = f"ERROR in stage {stage_name}: {e}"
+                logger.error(error_msg)
+                set_span_error(stage_span, str(e))
+                self._record_stage_resources(ctx, stage_name, meter, stage_span)
+                self._record_stage_metrics(ctx, stage_name, StageStatus.FAILED, stage_duration, usage_before)
+
                 # Send stage error notification
                 if progress_callback:
                     await progress_callback(
@@ -300,47 +374,114 @@ class PipelineExecutor:
                         f"Stage {stage_name} failed", 
                         None, error_msg, stage_duration
                     )
-                # Clear the error state for next stages
-                ctx.stage_error = None
-            else:
-                logger.info(f"Stage {stage_name} completed in {stage_duration:.2f}s")
-                
-                # Extract output data for the completed stage
-                output_data = self._extract_stage_output(ctx, stage_name)
-                
-                # Send stage completion notification
-                if progress_callback:
-                    await progress_callback(
-                        stage_name, int(stage_order), StageStatus.COMPLETED, 
-                        f"Stage {stage_name} completed successfully", 
-                        output_data, None, stage_duration
-                    )
-            
-        except Exception as e:
-            stage_duration = time.time() - stage_start_time
-            error_msg = f"ERROR in stage {stage_name}: {e}"
-            logger.error(error_msg)
-            
-            # Send stage error notification
-            if progress_callback:
-                await progress_callback(
-                    stage_name, int(stage_order), StageStatus.FAILED, 
-                    f"Stage {stage_name} failed", 
-                    None, error_msg, stage_duration
-                )
-            
-            # Don't raise exception - let the pipeline continue
-    
+
+                # Don't raise exception - let the pipeline continue
+
     async def run_async(
         self, 
         ctx: PipelineContext, 
         progress_callback: Optional[Callable[[str, int, StageStatus, str, Optional[Dict], Optional[str], Optional[float]], Awaitable[None]]] = None,
         session: Optional[Any] = None
     ) -> PipelineContext:
-        """Execute all stages in order with async support and progress callbacks."""
+        """
+        Execute all stages in order with async support and progress callbacks.
+        
+        With ``PROVIDER_CASSETTE_MODE=record`` every provider call made by the
+        stages is captured in a cassette under the run's output directory
+        (see ``churns.core.provider_cassette``). The run and each stage are
+        traced as spans (see ``churns.core.tracing``), and each stage's CPU
+        time, memory, I/O and provider wait land in ``ctx.stage_resources``
+        (see ``churns.core.stage_resources``), its model and input, cached
+        and output tokens in ``ctx.stage_token_usage`` (see
+        ``churns.core.prompt_cache_accounting``).
+        """
         logger.info(f"Starting async {self.mode} pipeline execution with {len(self.stages)} stages : {self.stages}")
         
-        # Handle preset loading if preset_id is provided
+        run_dir = ctx.output_directory or getattr(ctx, 'base_run_dir', None)
+        with start_trace("pipeline.run", output_directory=run_dir, mode=self.mode, run_id=ctx.run_id, stages=len(self.stages)):
+            with start_span("pipeline.apply_preset", preset_id=ctx.preset_id):
+                await self._apply_preset(ctx, session)
+            
+            active_runs = RUNS_ACTIVE.labels(mode=self.mode)
+            active_runs.inc()
+            try:
+                cassette = self._start_cassette_recording(ctx)
+                if cassette is None:
+                    await self._run_stages_async(ctx, progress_callback)
+                else:
+                    with use_cassette(cassette):
+                        await self._run_stages_async(ctx, progress_callback)
+            finally:
+                active_runs.dec()
+        
+        RUNS_FINISHED.labels(mode=self.mode).inc()
+        return ctx
+    
+    def _record_stage_metrics(
+        self,
+        ctx: PipelineContext,
+        stage_name: str,
+        status: StageStatus,
+        duration_seconds: float,
+        usage_before: Dict[str, Any]
+    ) -> None:
+        """Publish a finished stage's duration, token usage and produced images; keep its tokens on the context."""
+        STAGE_DURATION.labels(stage=stage_name, mode=self.mode, status=status.value).observe(duration_seconds)
+        
+        # Stages add (or replace) their own ctx.llm_usage entries
+        usage_after = ctx.llm_usage or {}
+        stage_usage = [usage for key, usage in usage_after.items() if usage_before.get(key) is not usage]
+        prompts = current_stage_prompts()
+        tokens = stage_token_usage(stage_usage, prompts.model_id if prompts else None)
+        ctx.stage_token_usage[stage_name] = tokens
+        observe_stage_usage(stage_name, self.mode, tokens)
+        if tokens["input_tokens"]:
+            ctx.log(f"Prompt cache ({stage_name}): {tokens['cached_input_tokens']}/{tokens['input_tokens']} input tokens cached "
+                    f"({tokens['cached_input_tokens'] / tokens['input_tokens']:.0%})")
+        
+        if stage_name == "image_generation":
+            for result in ctx.generated_image_results or []:
+                IMAGES.labels(stage=stage_name, mode=self.mode, status=result.get("status", "unknown")).inc()
+        elif stage_name in REFINEMENT_IMAGE_STAGES and ctx.refinement_result:
+            IMAGES.labels(stage=stage_name, mode=self.mode, status=ctx.refinement_result.get("status", "unknown")).inc()
+    
+    @contextlib.contextmanager
+    def _stage_scope(self, stage_name: str, stage_order: float) -> Iterator[Tuple[Any, StageResourceMeter]]:
+        """Tracing span, resource meter and prompt recording around one stage."""
+        with contextlib.ExitStack() as stack:
+            stage_span = stack.enter_context(start_span(f"stage.{stage_name}", stage=stage_name, order=stage_order))
+            meter = stack.enter_context(StageResourceMeter())
+            stack.enter_context(record_stage_prompts(stage_name))
+            yield stage_span, meter
+    
+    def _record_stage_resources(self, ctx: PipelineContext, stage_name: str, meter: StageResourceMeter, stage_span: Any) -> None:
+        """Stop the stage's resource meter and keep its usage on the context and span."""
+        usage = meter.stop()
+        ctx.stage_resources[stage_name] = usage
+        for key, value in usage.items():
+            if value is not None:
+                stage_span.set_attribute(key, value)
+    
+    def _start_cassette_recording(self, ctx: PipelineContext) -> Optional[ProviderCassette]:
+        """Open a recording cassette for this run when record mode is enabled."""
+        if get_active_cassette() is not None:
+            # Already inside a replay (or an outer recording)
+            return None
+        run_dir = ctx.output_directory or getattr(ctx, 'base_run_dir', None)
+        if provider_cassette_mode() != MODE_RECORD or not run_dir:
+            return None
+        
+        path = cassette_path_for_run(run_dir, self.mode, ctx.run_id)
+        try:
+            cassette = ProviderCassette.start_recording(path, ctx, self.mode)
+        except OSError as e:
+            logger.warning(f"Could not start provider cassette at {path}: {e}")
+            return None
+        logger.info(f"Recording provider calls to {path}")
+        return cassette
+    
+    async def _apply_preset(self, ctx: PipelineContext, session: Optional[Any]) -> None:
+        """Load and apply the context's brand preset, if any."""
         if ctx.preset_id and session:
             try:
                 logger.info(f"Loading preset {ctx.preset_id} with template_overrides: {ctx.template_overrides}")
@@ -365,13 +506,19 @@ class PipelineExecutor:
             logger.warning(f"Preset {ctx.preset_id} specified but no database session provided")
         else:
             logger.info("No preset specified, continuing with normal pipeline execution")
-        
+    
+    async def _run_stages_async(
+        self,
+        ctx: PipelineContext,
+        progress_callback: Optional[Callable[[str, int, StageStatus, str, Optional[Dict], Optional[str], Optional[float]], Awaitable[None]]] = None
+    ) -> PipelineContext:
+        """Run the configured stages in order, reporting progress per stage."""
         overall_start_time = time.time()
-        
+
         for stage_order, stage_name in enumerate(self.stages, 1):
             stage_start_time = time.time()
             logger.info(f"--- Stage {stage_order}: {stage_name} ---")
-            
+
             # Handle conditional stage resolution for refinements
             actual_stage_name = stage_name
             if stage_name == "conditional_stage" and self.mode == "refinement":
@@ -382,10 +529,12 @@ class PipelineExecutor:
                 else:
                     logger.warning(f"Warning: Could not resolve conditional stage for refinement type: {getattr(ctx, 'refinement_type', 'unknown')}")
                     continue
-            
+
             # Check if stage should be skipped due to preset configuration
             if actual_stage_name in ctx.skip_stages:
                 logger.info(f"Skipping stage {actual_stage_name} due to preset configuration")
+                add_span_event("stage.skipped", stage=actual_stage_name, order=stage_order)
+                STAGE_DURATION.labels(stage=actual_stage_name, mode=self.mode, status=StageStatus.SKIPPED.value).observe(0.0)
                 if progress_callback:
                     await progress_callback(
                         actual_stage_name, stage_order, StageStatus.SKIPPED, 
@@ -393,69 +542,76 @@ class PipelineExecutor:
                         None, None, 0.0
                     )
                 continue
-            
+
             # Check if we need to run StyleAdaptation before prompt_assembly
             if actual_stage_name == "prompt_assembly" and self._needs_style_adaptation(ctx):
                 logger.info("Running StyleAdaptation stage before prompt_assembly")
                 await self._run_style_adaptation_stage(ctx, progress_callback, stage_order - 0.5)
-            
+
             # Send stage starting notification
             if progress_callback:
                 await progress_callback(
                     actual_stage_name, stage_order, StageStatus.RUNNING, 
                     f"Starting stage {actual_stage_name}...", None, None, None
                 )
-                
+
                 # Small delay to ensure database update is committed before stage execution
                 import asyncio
                 await asyncio.sleep(0.05)
-            
-            try:
-                # Dynamically import stage module
-                stage_module = importlib.import_module(f"churns.stages.{actual_stage_name}")
-                
-                # Inject clients into stage
-                self._inject_clients_into_stage(stage_module, ctx)
-                
-                # Stage is async, call directly (all stages should be async)
-                
-                await stage_module.run(ctx)
-                
-                stage_duration = time.time() - stage_start_time
-                logger.info(f"Stage {actual_stage_name} completed in {stage_duration:.2f}s")
-                
-                # Send stage completion notification
-                if progress_callback:
-                    # Extract output data based on stage
-                    output_data = self._extract_stage_output(ctx, actual_stage_name)
-                    await progress_callback(
-                        actual_stage_name, stage_order, StageStatus.COMPLETED, 
-                        f"Stage {actual_stage_name} completed successfully", 
-                        output_data, None, stage_duration
-                    )
-                
-            except Exception as e:
-                stage_duration = time.time() - stage_start_time
-                error_msg = f"ERROR in stage {actual_stage_name}: {e}"
-                logger.error(error_msg)
-                logger.info(f"Stage {actual_stage_name} failed after {stage_duration:.2f}s")
-                
-                # Send stage error notification
-                if progress_callback:
-                    await progress_callback(
-                        actual_stage_name, stage_order, StageStatus.FAILED, 
-                        f"Stage {actual_stage_name} failed", 
-                        None, str(e), stage_duration
-                    )
-                
-                # For now, continue with next stage rather than stopping
-                # In production, you might want to halt on critical failures
-        
+
+            usage_before = dict(ctx.llm_usage or {})
+            with self._stage_scope(actual_stage_name, stage_order) as (stage_span, meter):
+                try:
+                    # Dynamically import stage module
+                    stage_module = importlib.import_module(f"churns.stages.{actual_stage_name}")
+
+                    # Inject clients into stage
+                    self._inject_clients_into_stage(stage_module, ctx)
+
+                    # Stage is async, call directly (all stages should be async)
+
+                    await stage_module.run(ctx)
+
+                    stage_duration = time.time() - stage_start_time
+                    logger.info(f"Stage {actual_stage_name} completed in {stage_duration:.2f}s")
+                    self._record_stage_resources(ctx, actual_stage_name, meter, stage_span)
+                    self._record_stage_metrics(ctx, actual_stage_name, StageStatus.COMPLETED, stage_duration, usage_before)
+
+                    # Send stage completion notification
+                    if progress_callback:
+                        # Extract output data based on stage
+                        output_data = self._extract_stage_output(ctx, actual_stage_name)
+                        await progress_callback(
+                            actual_stage_name, stage_order, StageStatus.COMPLETED, 
+                            f"Stage {actual_stage_name} completed successfully", 
+                            output_data, None, stage_duration
+                        )
+
+                except Exception as e:
+                    stage_duration = time.time() - stage_start_time
+                    error_msg = f"ERROR in stage {actual_stage_name}: {e}"
+                    logger.error(error_msg)
+                    logger.info(f"Stage {actual_stage_name} failed after {stage_duration:.2f}s")
+                    set_span_error(stage_span, str(e))
+                    self._record_stage_resources(ctx, actual_stage_name, meter, stage_span)
+                    self._record_stage_metrics(ctx, actual_stage_name, StageStatus.FAILED, stage_duration, usage_before)
+
+                    # Send stage error notification
+                    if progress_callback:
+                        await progress_callback(
+                            actual_stage_name, stage_order, StageStatus.FAILED, 
+                            f"Stage {actual_stage_name} failed", 
+                            None, str(e), stage_duration
+                        )
+
+                    # For now, continue with next stage rather than stopping
+                    # In production, you might want to halt on critical failures
+
         overall_duration = time.time() - overall_start_time
         logger.info(f"{self.mode.capitalize()} pipeline execution completed in {overall_duration:.2f}s")
-        
+
         return ctx
-    
+
     def _extract_stage_output(self, ctx: PipelineContext, stage_name: str) -> Optional[Dict[str, Any]]:
         """Extract relevant output data for a completed stage."""
         # Extract stage-specific outputs using context properties
@@ -519,31 +675,69 @@ class PipelineExecutor:
         
         return ctx
 
+async def replay_cassette(
+    cassette: Union[str, os.PathLike, ProviderCassette],
+    latency: str = LATENCY_ORIGINAL,
+    output_directory: Optional[str] = None,
+    progress_callback: Optional[Callable[[str, int, StageStatus, str, Optional[Dict], Optional[str], Optional[float]], Awaitable[None]]] = None
+) -> PipelineContext:
+    """
+    Re-execute a recorded run from its provider cassette.
+    
+    The context is rebuilt from the cassette header and ``run_async`` runs
+    with every provider call answered from the recording, with the original
+    latency or none (``latency="zero"``). Outputs go to ``output_directory``,
+    by default ``{run_dir}/replays/{cassette}_{timestamp}`` so the original
+    artifacts are left untouched. Requires ``PROVIDER_CASSETTE_MODE=replay``
+    when the API clients are configured.
+    """
+    if not isinstance(cassette, ProviderCassette):
+        cassette = ProviderCassette.load(cassette, latency=latency)
+    
+    client_mode = get_client_config().provider_cassette_mode
+    if client_mode != MODE_REPLAY:
+        raise RuntimeError(
+            f"Provider clients were configured with PROVIDER_CASSETTE_MODE={client_mode}; "
+            "set PROVIDER_CASSETTE_MODE=replay before creating the executor to replay a cassette"
+        )
+    
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    if output_directory is None:
+        output_directory = str(cassette.path.parent.parent / "replays" / f"{cassette.path.stem}_{timestamp}")
+    Path(output_directory).mkdir(parents=True, exist_ok=True)
+    
+    ctx = apply_context_snapshot(PipelineContext(), cassette.context_snapshot)
+    ctx.output_directory = output_directory
+    if cassette.pipeline_mode == "refinement":
+        # Refinement stages write under the parent run by job ID; keep the original outputs intact
+        ctx.run_id = f"{ctx.run_id}_replay_{timestamp}"
+    
+    executor = get_pipeline_executor(cassette.pipeline_mode)
+    logger.info(f"Replaying {cassette.path} ({len(cassette.interactions)} interactions, latency={cassette.latency}) into {output_directory}")
+    with use_cassette(cassette):
+        await executor.run_async(ctx, progress_callback)
+    
+    stats = cassette.replay_stats()
+    if stats["misses"] or stats["unused"]:
+        logger.warning(f"Replay of {cassette.path.name} diverged from the recording: {stats}")
+    return ctx
+
 def load_stage_order(mode: str = "generation") -> List[str]:
     """Load stage execution order from YAML config (standalone function for compatibility)."""
-    config_path = Path(__file__).parent.parent / "configs" / "stage_order.yml"
-    try:
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
-            
-            # Try to get stages for specific mode first
-            if mode in config:
-                return config[mode]
-            
-            # Fallback to legacy 'stages' key (for generation mode)
-            if 'stages' in config:
-                return config['stages']
-            
-            # Final fallback to hardcoded order
-            if mode == "refinement":
-                return ['load_base_image', 'conditional_stage', 'save_outputs']
-            else:
-                return ['image_eval', 'strategy', 'style_guide', 'creative_expert', 'prompt_assembly', 'image_generation']
-                
-    except Exception as e:
-        print(f"Warning: Could not load stage config from {config_path}: {e}")
-        # Fallback to hardcoded order
-        if mode == "refinement":
-            return ['load_base_image', 'conditional_stage', 'save_outputs']
-        else:
-            return ['image_eval', 'strategy', 'style_guide', 'creative_expert', 'prompt_assembly', 'image_generation'] 
\ No newline at end of file
+    return _stage_order_from_config(DEFAULT_STAGE_ORDER_PATH, mode)
+
+
+_executors: Dict[str, PipelineExecutor] = {}
+
+
+def get_pipeline_executor(mode: str = "generation") -> PipelineExecutor:
+    """
+    Shared executor for ``mode``, created on first use.
+    
+    The API's lifespan and the background tasks' fallbacks use this registry,
+    so each mode's stage order and client summary are built once per process.
+    """
+    executor = _executors.get(mode)
+    if executor is None:
+        executor = _executors[mode] = PipelineExecutor(mode=mode)
+    return executor
@@ -27,6 +27,8 @@ from churns.core.json_parser import (
     should_use_manual_parsing
 )
 from churns.core.brand_kit_utils import build_brand_palette_prompt
+from churns.core.prompt_templates import prompt_template
+from churns.core.llm_streaming import create_chat_completion, partial_output_publisher
 
 # Global variables for API clients and configuration (injected by pipeline executor)
 instructor_client_creative_expert = None
@@ -40,6 +42,9 @@ INSTRUCTOR_TOOL_MODE_PROBLEM_MODELS = []
 # Initialize centralized JSON parser for this stage
 _json_parser = RobustJSONParser(debug_mode=False)
 
+# Typical size (characters) of a concept reply; far longer streamed replies are treated as runaway
+CONCEPT_EXPECTED_CHARS = 4000
+
 
 # Old manual JSON extraction function removed - now using centralized parser
 
@@ -87,9 +92,27 @@ def _get_creative_expert_system_prompt(
     language: str = 'en'
 ) -> str:
     """Returns the system prompt for the Creative Expert agent."""
-    
-    # Clean platform name to remove aspect ratio information
-    clean_platform_name = _clean_platform_name(platform_name)
+    use_instructor_format = bool(use_instructor_parsing and CREATIVE_EXPERT_MODEL_ID not in INSTRUCTOR_TOOL_MODE_PROBLEM_MODELS)
+    return _build_creative_expert_system_prompt(
+        creativity_level, task_type, use_instructor_format, has_reference, has_instruction,
+        render_text_flag, apply_branding_flag, _clean_platform_name(platform_name), target_model_family, language
+    )
+
+
+@prompt_template("creative_expert")
+def _build_creative_expert_system_prompt(
+    creativity_level: int,
+    task_type: str,
+    use_instructor_format: bool,
+    has_reference: bool,
+    has_instruction: bool,
+    render_text_flag: bool,
+    apply_branding_flag: bool,
+    clean_platform_name: str,
+    target_model_family: str,
+    language: str
+) -> str:
+    """Builds one variant of the Creative Expert system prompt, flag-independent sections first."""
     
     base_persona_ce = """
 You are an expert Creative Director and Digital Marketing Strategist specializing in F&B social media visuals.
@@ -255,7 +278,7 @@ Ensure concepts are memorable while aligning with the marketing strategy and tas
     
     # Output format instructions
     adherence_ce = ""
-    if use_instructor_parsing and CREATIVE_EXPERT_MODEL_ID not in INSTRUCTOR_TOOL_MODE_PROBLEM_MODELS:
+    if use_instructor_format:
         adherence_ce = "Adhere strictly to the requested Pydantic JSON output format (`ImageGenerationPrompt` containing `VisualConceptDetails`). Note that `main_subject`, `promotional_text_visuals`, and `logo_visuals` are optional and should be omitted (set to null) if the specific scenario instructs it. The `suggested_alt_text` field is mandatory. Ensure all other required descriptions are detailed enough to guide image generation effectively."
     else:
         adherence_ce = """
@@ -282,10 +305,11 @@ JSON Structure:
 Ensure all descriptions are detailed enough to guide image generation effectively.
 """
     
+    # Shared by every variant first (cacheable prefix), then from least to most varying
     prompt_parts_ce = [
-        base_persona_ce, lang_note, input_refinement_ce, core_task_ce, task_type_awareness_ce,
-        creativity_instruction_ce, image_ref_handling_ce, text_branding_field_instruction_ce,
-        reasoning_ce, alt_text_ce, adherence_ce
+        base_persona_ce, input_refinement_ce, core_task_ce, reasoning_ce, alt_text_ce,
+        adherence_ce, creativity_instruction_ce, image_ref_handling_ce,
+        task_type_awareness_ce, text_branding_field_instruction_ce, lang_note
     ]
     
     if target_model_family == "qwen":
@@ -560,7 +584,15 @@ async def _generate_visual_concept_for_strategy(
             if "tool_choice" in llm_args_ce: 
                 del llm_args_ce["tool_choice"]
 
-        completion_ce = await asyncio.to_thread(effective_client_ce.chat.completions.create, **llm_args_ce)
+        if actually_use_instructor_parsing_ce or effective_client_ce is not base_llm_client_creative_expert:
+            completion_ce = await asyncio.to_thread(effective_client_ce.chat.completions.create, **llm_args_ce)
+        else:  # Manual parse through the plain client, which can stream
+            completion_ce = await asyncio.to_thread(
+                create_chat_completion, effective_client_ce, llm_args_ce,
+                expect_json=True,
+                expected_chars=CONCEPT_EXPECTED_CHARS,
+                on_partial=partial_output_publisher(ctx, f"creative_expert_{strategy_index}")
+            )
 
         if actually_use_instructor_parsing_ce:
             prompt_data_ce = completion_ce.model_dump()
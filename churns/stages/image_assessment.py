@@ -25,6 +25,8 @@ from ..pipeline.context import PipelineContext
 from ..models import ImageAssessmentResult
 from ..core.constants import IMAGE_ASSESSMENT_MODEL_ID
 from ..core.token_cost_manager import get_token_cost_manager
+from ..core.tracing import start_span
+from ..core.prompt_templates import cached_prompt
 from ..core.json_parser import (
     RobustJSONParser, 
     JSONExtractionError,
@@ -171,7 +173,8 @@ class ImageAssessor:
                 if attempt < max_retries - 1:
                     # Shorter wait time to fail faster
                     wait_time = min(1.0, 0.5 * (attempt + 1))
-                    await asyncio.sleep(wait_time)
+                    with start_span("llm.retry", model=self.model_id, attempt=attempt + 1, error=type(e).__name__, delay_seconds=wait_time):
+                        await asyncio.sleep(wait_time)
                     continue
                 else:
                     break
@@ -464,12 +467,23 @@ Begin your assessment now."""
     ) -> str:
         """Create the detailed prompt for image assessment."""
         
+        # Scale, criteria and format depend only on flags: memoized, and first so
+        # they form the provider-cached prefix; the per-image parts follow
+        criteria_level = 1 if creativity_level == 1 else 2
+        fixed_sections = cached_prompt(
+            "image_assessment",
+            (has_reference_image, render_text_enabled, criteria_level, is_problematic_model),
+            lambda: "\n\n".join([
+                self._create_scoring_scale_section(),
+                self._create_assessment_criteria_section(has_reference_image, render_text_enabled, criteria_level),
+                self._create_json_format_section(has_reference_image, render_text_enabled, is_problematic_model),
+            ])
+        )
+        
         sections = [
+            fixed_sections,
             self._create_role_and_context_section(task_type, platform, creativity_level),
-            self._create_scoring_scale_section(),
-            self._create_assessment_criteria_section(has_reference_image, render_text_enabled, creativity_level),
             self._create_visual_concept_section(visual_concept),
-            self._create_json_format_section(has_reference_image, render_text_enabled, is_problematic_model),
             self._create_final_instructions_section(is_problematic_model)
         ]
         
@@ -1047,21 +1061,9 @@ async def run(ctx: PipelineContext) -> None:
         if hasattr(ctx, 'output_directory') and ctx.output_directory:
             image_path = os.path.join(ctx.output_directory, image_filename)
         else:
-            # Fallback: try to find the output directory from any previous stage
-            data_dir = os.path.join(os.getcwd(), "data", "runs")
-            if os.path.exists(data_dir):
-                for dir_name in os.listdir(data_dir):
-                    run_dir_path = os.path.join(data_dir, dir_name)
-                    if os.path.isdir(run_dir_path):
-                        potential_image_path = os.path.join(run_dir_path, image_filename)
-                        if os.path.exists(potential_image_path):
-                            image_path = potential_image_path
-                            ctx.log(f"Found image in run directory: {image_path}")
-                            break
-            
-            # If still not found, try filename as-is (relative to current directory)
-            if image_path is None:
-                image_path = image_filename
+            # No output directory recorded (image_generation sets it for every run);
+            # treat the filename as relative to the current directory
+            image_path = image_filename
         
         # Find corresponding visual concept
         image_index = image_result.get("index", 0)
@@ -1295,8 +1297,9 @@ async def _calculate_consistency_metrics(ctx: PipelineContext, assessment_result
                     ctx.log(f"Warning: Generated image not found at {image_path}")
                     continue
                 
-                # Calculate consistency metrics
-                metrics = calculate_consistency_metrics(
+                # Calculate consistency metrics (CLIP encoding and image decoding off the event loop)
+                metrics = await asyncio.to_thread(
+                    calculate_consistency_metrics,
                     original_image_path=original_image_path,
                     new_image_path=image_path,
                     original_recipe=ctx.preset_data
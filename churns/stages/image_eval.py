@@ -140,6 +140,11 @@ def simulate_image_evaluation_fallback(user_has_provided_instruction: bool) -> D
         return {"error": f"Fallback creation failed: {e}", "main_subject": "Error"}
 
 
+def _read_file_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
 async def run(ctx: PipelineContext) -> None:
     """Performs image analysis using VLM, updates pipeline context."""
     # Run logo analysis first if applicable. This operates independently of the main image analysis.
@@ -173,6 +178,14 @@ async def run(ctx: PipelineContext) -> None:
         image_ref["image_content_base64"] = image_content_base64
         # Remove the temporary bytes data to save memory
         del image_ref["_image_data_bytes"]
+    elif not image_content_base64 and image_ref.get("saved_image_path_in_run_dir"):
+        ctx.log("Encoding uploaded image from the run directory...")
+        try:
+            image_data_bytes = await asyncio.to_thread(_read_file_bytes, image_ref["saved_image_path_in_run_dir"])
+            image_content_base64 = base64.b64encode(image_data_bytes).decode('utf-8')
+            image_ref["image_content_base64"] = image_content_base64
+        except OSError as e:
+            ctx.log(f"WARNING: Could not read uploaded image: {e}")
 
     task_type = ctx.task_type or "N/A"
     platform = ctx.target_platform.get("name") if ctx.target_platform else "N/A"
@@ -16,7 +16,6 @@ import datetime
 import traceback
 import asyncio
 from typing import Optional, Dict, Any, Tuple
-import requests
 import tiktoken
 from PIL import Image
 
@@ -24,6 +23,9 @@ from ..pipeline.context import PipelineContext
 from ..core.token_cost_manager import get_token_cost_manager
 from ..core.aspect_ratio_utils import resolveAspectRatio
 from ..core.constants import IMAGE_GENERATION_PROVIDER as CONFIGURED_PROVIDER, get_image_generation_model_id
+from ..core.artifact_writer import write_base64_artifact, download_artifact, ArtifactWriteError
+from ..core.image_derivatives import schedule_pregeneration
+from ..core.image_registry import register_image, KIND_ORIGINAL
 
 # Global variables for API clients and configuration (injected by pipeline executor)
 image_gen_client = None  # Backward compatibility (OpenAI)
@@ -486,25 +488,15 @@ async def _process_image_response(
 
     if response and response.data and len(response.data) > 0:
         image_data = response.data[0]
-        saved_filepath = None
 
         if image_data.b64_json:
             log_msg(f"✅ Image {operation_type} successful (received base64 data).")
             try:
-                image_bytes = base64.b64decode(image_data.b64_json)
-                timestamp_img = datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')
-
-                if operation_type == "editing":
-                    local_filename = f"edited_image_strategy_{strategy_index}_{timestamp_img}.png"
-                elif operation_type == "multimodal":
-                    local_filename = f"edited_image_strategy_{strategy_index}_{timestamp_img}.png"
-                else:  # Covers "generation"
-                    local_filename = f"generated_image_strategy_{strategy_index}_{timestamp_img}.png"
-
-                saved_filepath = os.path.join(run_directory, local_filename)
-                with open(saved_filepath, "wb") as f:
-                    f.write(image_bytes)
-                log_msg(f"   Saved image to: {saved_filepath}")
+                saved_filepath = os.path.join(run_directory, _build_output_filename(operation_type, strategy_index))
+                artifact = await write_base64_artifact(image_data.b64_json, saved_filepath)
+                log_msg(f"   Saved image to: {saved_filepath} ({artifact.size_bytes} bytes, sha256 {artifact.sha256[:12]})")
+                schedule_pregeneration(saved_filepath)
+                await _register_generated_image(run_directory, strategy_index, operation_type, artifact, log_msg)
 
                 return "success", saved_filepath, prompt_tokens_for_image_gen
             except Exception as decode_save_err:
@@ -514,23 +506,13 @@ async def _process_image_response(
             log_msg(f"✅ Image {operation_type} successful (received URL). Downloading...")
             image_url = image_data.url
             try:
-                img_response_download = await asyncio.to_thread(requests.get, image_url, stream=True, timeout=30)
-                img_response_download.raise_for_status()
-                timestamp_img_url = datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')
-                if operation_type == "editing":
-                    url_filename = f"edited_image_strategy_{strategy_index}_{timestamp_img_url}.png"
-                elif operation_type == "multimodal":
-                    url_filename = f"edited_image_strategy_{strategy_index}_{timestamp_img_url}.png"
-                else:
-                    url_filename = f"generated_image_strategy_{strategy_index}_{timestamp_img_url}.png"
-
-                saved_filepath = os.path.join(run_directory, url_filename)
-                with open(saved_filepath, "wb") as f:
-                    for chunk in img_response_download.iter_content(chunk_size=8192): 
-                        f.write(chunk)
-                log_msg(f"   Saved downloaded image to: {saved_filepath}")
+                saved_filepath = os.path.join(run_directory, _build_output_filename(operation_type, strategy_index))
+                artifact = await download_artifact(image_url, saved_filepath)
+                log_msg(f"   Saved downloaded image to: {saved_filepath} ({artifact.size_bytes} bytes, sha256 {artifact.sha256[:12]})")
+                schedule_pregeneration(saved_filepath)
+                await _register_generated_image(run_directory, strategy_index, operation_type, artifact, log_msg)
                 return "success", saved_filepath, prompt_tokens_for_image_gen
-            except requests.exceptions.RequestException as req_err:
+            except ArtifactWriteError as req_err:
                 return "error", f"Error downloading image URL {image_url}: {req_err}", prompt_tokens_for_image_gen
         else:
             return "error", f"Image API response format mismatch for {operation_type}. No b64_json or URL.", prompt_tokens_for_image_gen
@@ -538,6 +520,32 @@ async def _process_image_response(
         return "error", "Image API response did not contain expected data structure.", prompt_tokens_for_image_gen
 
 
+async def _register_generated_image(run_directory: str, strategy_index: int, operation_type: str, artifact, log_msg) -> None:
+    """Record the saved image in the run's image registry (non-fatal on failure)."""
+    try:
+        await asyncio.to_thread(
+            register_image,
+            run_directory,
+            KIND_ORIGINAL,
+            strategy_index,
+            artifact.path,
+            size_bytes=artifact.size_bytes,
+            sha256=artifact.sha256,
+            generation_index=strategy_index,
+            operation_type=operation_type
+        )
+    except Exception as registry_err:
+        log_msg(f"⚠️  Could not register image in run registry: {registry_err}")
+
+
+def _build_output_filename(operation_type: str, strategy_index: int) -> str:
+    """Build the timestamped output filename for a generated or edited image."""
+    timestamp_img = datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')
+    if operation_type in ("editing", "multimodal"):
+        return f"edited_image_strategy_{strategy_index}_{timestamp_img}.png"
+    return f"generated_image_strategy_{strategy_index}_{timestamp_img}.png"  # Covers "generation"
+
+
 def _handle_image_api_error(
     e: Exception,
     operation_type: str,
@@ -1056,21 +1064,6 @@ async def run(ctx: PipelineContext) -> None:
         output_directory = os.path.dirname(saved_image_path)
         ctx.log(f"Using run-specific output directory derived from image path: {output_directory}")
     
-    # Alternative fallback: try to derive from pipeline timestamp if available
-    if not output_directory and hasattr(ctx, 'data') and ctx.data:
-        pipeline_settings = ctx.data.get("pipeline_settings", {})
-        run_timestamp = pipeline_settings.get("run_timestamp")
-        if run_timestamp:
-            # Try to find the run directory based on timestamp pattern
-            data_dir = os.path.join(os.getcwd(), "data", "runs")
-            if os.path.exists(data_dir):
-                for dir_name in os.listdir(data_dir):
-                    run_dir_path = os.path.join(data_dir, dir_name)
-                    if os.path.isdir(run_dir_path):
-                        output_directory = run_dir_path
-                        ctx.log(f"Using run-specific output directory found in data/runs: {output_directory}")
-                        break
-    
     # Final fallback to default directory if nothing else works
     if not output_directory:
         output_directory = os.path.join(os.getcwd(), 'output')
@@ -1080,6 +1073,9 @@ async def run(ctx: PipelineContext) -> None:
     # Ensure the directory exists
     os.makedirs(output_directory, exist_ok=True)
     
+    # Record the resolved directory so later stages resolve result paths without scanning
+    ctx.output_directory = output_directory
+    
     ctx.log(f"Generating images for {len(assembled_prompts)} assembled prompts...")
     
     # Prepare tasks for parallel execution
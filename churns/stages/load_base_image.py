@@ -15,6 +15,9 @@ from typing import Dict, Any, Optional
 from PIL import Image
 from ..pipeline.context import PipelineContext
 from ..models import PipelineCostSummary, CostDetail
+from ..core.serialization import read_json_file
+from ..core.run_metadata import REFINEMENT_SECTIONS, load_run_metadata, run_metadata_path
+from ..core.image_registry import lookup_image_path, run_directory, KIND_ORIGINAL, KIND_REFINEMENT
 
 # Setup Logger
 logging.basicConfig(
@@ -90,74 +93,33 @@ def _resolve_base_image_path(ctx: PipelineContext) -> str:
     Resolve the full path to the base image based on context.
     
     Logic:
-    - If parent_image_type is "original", look for generated images in run directory
-    - If parent_image_type is "refinement", look for specific refinement job
-    - Use generation_index for original images
+    - Images are resolved through the parent run's image registry
+    - If parent_image_type is "original", look up by generation_index
+    - If parent_image_type is "refinement", look up by refinement job ID
     """
     
+    base_path = run_directory(ctx.parent_run_id)
+    
     if ctx.parent_image_type == "original":
         # Original generated image
         if ctx.generation_index is None:
             raise ValueError("generation_index required for original image type")
         
-        base_path = Path(f"./data/runs/{ctx.parent_run_id}")
         logger.info(f"Resolving base image path for original image {ctx.generation_index} in {base_path}")
-        
-        # Updated patterns to match actual file structure
-        patterns = [
-            f"edited_image_strategy_{ctx.generation_index}_*.png",
-            f"generated_image_strategy_{ctx.generation_index}_*.png",
-            f"image_{ctx.generation_index}*.png",  # Fallback pattern
-        ]
-
-        all_matches = []
-        for pattern in patterns:
-            matches = list(base_path.glob(pattern))
-            logger.info(f"Pattern '{pattern}' found matches: {matches}")
-            all_matches.extend(matches)
-
-        if all_matches:
-            # Sort all matches by modification time (newest first)
-            all_matches.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-            newest_file = all_matches[0]
-            if newest_file.exists():
-                logger.info(f"Found original image at: {newest_file}")
-                return str(newest_file)
-            else:
-                logger.warning(f"File matched but does not exist: {newest_file}")
+        image_path = lookup_image_path(base_path, KIND_ORIGINAL, ctx.generation_index)
+        if image_path:
+            logger.info(f"Found original image at: {image_path}")
+            return str(image_path)
 
         raise FileNotFoundError(f"Original image not found for index {ctx.generation_index} in {base_path}")
     
     elif ctx.parent_image_type == "refinement":
         # Previously refined image
         # parent_image_id should be a refinement job ID
-        base_path = Path(f"./data/runs/{ctx.parent_run_id}")
-        
-        # Try different naming patterns for refinement images
-        possible_paths = [
-            base_path / "refinements" / f"{ctx.parent_image_id}_from_*.png",
-            base_path / "refinements" / f"refinement_{ctx.parent_image_id}.png",
-        ]
-        
-        # Check for glob patterns first
-        for pattern_path in possible_paths:
-            if "*" in str(pattern_path):
-                # Use glob for patterns with wildcards
-                parent_dir = pattern_path.parent
-                pattern = pattern_path.name
-                matches = list(parent_dir.glob(pattern))
-                if matches:
-                    # Sort by modification time (newest first)
-                    matches.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-                    path = matches[0]
-                    if path.exists():
-                        logger.info(f"Found refinement image at: {path}")
-                        return str(path)
-            else:
-                # Direct path check
-                if pattern_path.exists():
-                    logger.info(f"Found refinement image at: {pattern_path}")
-                    return str(pattern_path)
+        image_path = lookup_image_path(base_path, KIND_REFINEMENT, ctx.parent_image_id)
+        if image_path:
+            logger.info(f"Found refinement image at: {image_path}")
+            return str(image_path)
         
         raise FileNotFoundError(f"Refinement image not found for job {ctx.parent_image_id} in {base_path}")
     
@@ -180,7 +142,9 @@ def _load_original_pipeline_metadata(ctx: PipelineContext) -> Dict[str, Any]:
     # Look for pipeline metadata file
     base_path = Path(f"./data/runs/{ctx.parent_run_id}")
     
+    sectioned_file = run_metadata_path(base_path)
     possible_metadata_files = [
+        sectioned_file,
         base_path / "pipeline_metadata.json",
         base_path / "metadata.json",
         base_path / f"{ctx.parent_run_id}_metadata.json"
@@ -189,44 +153,46 @@ def _load_original_pipeline_metadata(ctx: PipelineContext) -> Dict[str, Any]:
     for metadata_file in possible_metadata_files:
         if metadata_file.exists():
             try:
-                with open(metadata_file, 'r') as f:
-                    metadata = json.load(f)
-                    logger.info(f"Loaded pipeline metadata from: {metadata_file}")
-                    
-                    # Validate and ensure required structure exists
-                    if not isinstance(metadata, dict):
-                        logger.warning(f"Invalid metadata format in {metadata_file}, using fallback")
-                        continue
-                    
-                    # Ensure processing_context exists with required structure
-                    if 'processing_context' not in metadata:
-                        metadata['processing_context'] = {}
-                    
-                    processing_context = metadata['processing_context']
-                    
-                    # Ensure all required fields exist with defaults
-                    if 'suggested_marketing_strategies' not in processing_context:
-                        processing_context['suggested_marketing_strategies'] = []
-                    if 'style_guidance_sets' not in processing_context:
-                        processing_context['style_guidance_sets'] = []
-                    if 'generated_image_prompts' not in processing_context:
-                        processing_context['generated_image_prompts'] = []
-                    if 'final_assembled_prompts' not in processing_context:
-                        processing_context['final_assembled_prompts'] = []
-                    if 'image_analysis_result' not in processing_context:
-                        processing_context['image_analysis_result'] = {}
-                    
-                    # Ensure user_inputs exists (important for refinement utilities)
-                    if 'user_inputs' not in metadata:
-                        metadata['user_inputs'] = {}
-                    
-                    # Validate user_inputs structure
-                    user_inputs = metadata['user_inputs']
-                    if not isinstance(user_inputs, dict):
-                        metadata['user_inputs'] = {}
-                    
-                    logger.info("Pipeline metadata validated and normalized successfully")
-                    return metadata
+                if metadata_file == sectioned_file:
+                    metadata = load_run_metadata(base_path, REFINEMENT_SECTIONS)
+                else:
+                    metadata = read_json_file(metadata_file)
+                logger.info(f"Loaded pipeline metadata from: {metadata_file}")
+                
+                # Validate and ensure required structure exists
+                if not isinstance(metadata, dict):
+                    logger.warning(f"Invalid metadata format in {metadata_file}, using fallback")
+                    continue
+                
+                # Ensure processing_context exists with required structure
+                if 'processing_context' not in metadata:
+                    metadata['processing_context'] = {}
+                
+                processing_context = metadata['processing_context']
+                
+                # Ensure all required fields exist with defaults
+                if 'suggested_marketing_strategies' not in processing_context:
+                    processing_context['suggested_marketing_strategies'] = []
+                if 'style_guidance_sets' not in processing_context:
+                    processing_context['style_guidance_sets'] = []
+                if 'generated_image_prompts' not in processing_context:
+                    processing_context['generated_image_prompts'] = []
+                if 'final_assembled_prompts' not in processing_context:
+                    processing_context['final_assembled_prompts'] = []
+                if 'image_analysis_result' not in processing_context:
+                    processing_context['image_analysis_result'] = {}
+                
+                # Ensure user_inputs exists (important for refinement utilities)
+                if 'user_inputs' not in metadata:
+                    metadata['user_inputs'] = {}
+                
+                # Validate user_inputs structure
+                user_inputs = metadata['user_inputs']
+                if not isinstance(user_inputs, dict):
+                    metadata['user_inputs'] = {}
+                
+                logger.info("Pipeline metadata validated and normalized successfully")
+                return metadata
                     
             except json.JSONDecodeError as e:
                 logger.warning(f"Failed to parse JSON from {metadata_file}: {e}")
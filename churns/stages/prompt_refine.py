@@ -12,6 +12,7 @@ IMPLEMENTATION GUIDANCE:
 - Use balanced approach for consistent results
 """
 
+import io
 import os
 import asyncio
 from pathlib import Path
@@ -19,6 +20,7 @@ from PIL import Image
 from typing import Dict, Any, Optional, List, Tuple
 import logging
 from ..pipeline.context import PipelineContext
+from ..core.artifact_writer import write_bytes_atomic
 
 from .refinement_utils import (
     validate_refinement_inputs,
@@ -32,10 +34,10 @@ from .refinement_utils import (
     get_image_ctx_and_main_object,
     get_uploaded_reference_image_path,
     get_original_reference_image_path,
+    get_agent_model,
     RefinementError
 )
 from pydantic import BaseModel, Field
-from pydantic_ai import Agent, BinaryContent
 
 # Setup Logger
 logging.basicConfig(
@@ -322,10 +324,11 @@ def _crop_image_with_mask(base_image_path: str, mask_path: str) -> Optional[Tupl
 
 async def _refine_user_prompt(ctx: PipelineContext) -> str:
     logger.info("-----Performing prompt refinement-----")
+    from pydantic_ai import Agent, BinaryContent
     
     # Create Object Identification Agent
     prompt_identify_agent = Agent(
-        'openai:gpt-4.1-mini',
+        get_agent_model(),
         retries=3,
         system_prompt="""
         You are an object identification assistant with vision capabilities.
@@ -347,7 +350,7 @@ async def _refine_user_prompt(ctx: PipelineContext) -> str:
     
     # Create Prompt Refinement Agent
     prompt_refinement_agent = Agent(
-        'openai:gpt-4.1-mini',
+        get_agent_model(),
         retries=3,
         system_prompt="""
         You are a prompt refinement assistant with vision capabilities.
@@ -458,7 +461,9 @@ def _convert_region_alpha(mask_path: str) -> None:
             if r == 255 and g == 255 and b == 255:  # If pixel is black
                 pixels[x, y] = (255, 255, 255, 0)  # Set alpha to 0 (fully transparent)
     
-    # Save the modified image
-    image.save(mask_path)
+    # Save the modified image under a new inode: the mask may be a hard link into the blob store
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    write_bytes_atomic(buffer.getvalue(), mask_path)
     logger.info(f"Converted mask to fully transparent regions: {mask_path}")
 
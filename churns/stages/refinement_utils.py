@@ -7,11 +7,9 @@ to maintain consistency and reduce duplication.
 """
 
 import os
-import base64
 import datetime
 import traceback
 import asyncio
-import json
 import shutil
 from pathlib import Path
 from typing import Dict, Any, Optional, Tuple
@@ -20,11 +18,40 @@ from openai import OpenAI
 from ..pipeline.context import PipelineContext
 from ..core.constants import MODEL_PRICING, IMAGE_REFINEMENT_MODEL_ID
 from ..core.token_cost_manager import TokenCostManager, TokenUsage, CostBreakdown
+from ..core.artifact_writer import write_base64_artifact, ArtifactTooSmallError
+from ..core.serialization import write_json_file
+from ..core.image_registry import register_image, run_directory, KIND_REFINEMENT
+from ..core.stub_provider import STUB_API_KEY
+from ..core.provider_http import build_provider_async_http_client
 from ..models import CostDetail
 
+# Decoded refinement outputs smaller than this are treated as corrupt
+MIN_REFINEMENT_IMAGE_BYTES = 1000
+
+# Model used by the pydantic-ai helper agents (prompt refinement, text analysis)
+REFINEMENT_AGENT_MODEL = "openai:gpt-4.1-mini"
+
 # Global variables for API clients and configuration (injected by pipeline executor)
 # These will be set by the pipeline executor before stage execution
 
+def get_agent_model(model_name: str = REFINEMENT_AGENT_MODEL) -> Any:
+    """
+    Model argument for the refinement stages' pydantic-ai agents.
+    
+    An OpenAI model backed by the shared provider HTTP client, so agent calls
+    are timed in the provider metrics, served by the local stub when
+    ``USE_STUB_PROVIDERS`` is enabled, and recorded into (or replayed from)
+    the run's cassette when ``PROVIDER_CASSETTE_MODE`` is set.
+    """
+    from openai import AsyncOpenAI
+    from pydantic_ai.models.openai import OpenAIModel
+    from pydantic_ai.providers.openai import OpenAIProvider
+    
+    api_key = os.getenv("OPENAI_API_KEY") or STUB_API_KEY  # No real key is needed for stub or replay calls
+    agent_client = AsyncOpenAI(api_key=api_key, http_client=build_provider_async_http_client())
+    return OpenAIModel(model_name.split(":", 1)[-1], provider=OpenAIProvider(openai_client=agent_client))
+
+
 def get_original_reference_image_path(ctx: PipelineContext) -> Optional[str]:
     """
     Get the original reference image path from the parent pipeline run.
@@ -401,16 +428,15 @@ async def call_openai_images_edit(
         
         # Decode and save the result image
         try:
-            image_bytes = base64.b64decode(image_data.b64_json)
-            if len(image_bytes) < 1000:  # Very small file, likely corrupt
-                raise RefinementError(
-                    "invalid_image_data", 
-                    "Generated image data appears to be corrupted",
-                    "The API returned image data but it appears invalid. Please try again.",
-                    is_retryable=True
-                )
-            output_path = save_refinement_result(ctx, image_bytes)
+            output_path = await save_refinement_result(ctx, image_data.b64_json)
             return output_path
+        except ArtifactTooSmallError:  # Very small file, likely corrupt
+            raise RefinementError(
+                "invalid_image_data", 
+                "Generated image data appears to be corrupted",
+                "The API returned image data but it appears invalid. Please try again.",
+                is_retryable=True
+            )
         except Exception as decode_error:
             raise RefinementError(
                 "image_decode_error", 
@@ -486,27 +512,52 @@ async def call_openai_images_edit(
             )
 
 
-def save_refinement_result(ctx: PipelineContext, image_bytes: bytes) -> str:
+async def save_refinement_result(ctx: PipelineContext, image_b64: str) -> str:
     """
     Save refinement result using hybrid approach:
     1. Create dedicated refinement directory with rich metadata
     2. Save output image, reference image, and metadata.json
     3. Return path for backward compatibility with centralized index
+    
+    The output image is decoded and written atomically off the event loop.
     """
     
     # Create refinement-specific directory
     refinement_dir = Path(f"./data/runs/{ctx.parent_run_id}/refinements/{ctx.run_id}")
-    refinement_dir.mkdir(parents=True, exist_ok=True)
     
     # Save output image
     output_path = refinement_dir / "output.png"
     try:
-        with open(output_path, "wb") as f:
-            f.write(image_bytes)
-        ctx.log(f"Saved refinement output: {output_path}")
+        artifact = await write_base64_artifact(image_b64, output_path, min_bytes=MIN_REFINEMENT_IMAGE_BYTES)
+        ctx.log(f"Saved refinement output: {output_path} ({artifact.size_bytes} bytes, sha256 {artifact.sha256[:12]})")
+    except ArtifactTooSmallError:
+        raise
     except Exception as e:
         raise RuntimeError(f"Failed to save refinement output: {e}")
     
+    # Index the output so later refinements can resolve it without scanning
+    try:
+        await asyncio.to_thread(
+            register_image,
+            run_directory(ctx.parent_run_id),
+            KIND_REFINEMENT,
+            ctx.run_id,
+            output_path,
+            size_bytes=artifact.size_bytes,
+            sha256=artifact.sha256,
+            parent_image_id=ctx.parent_image_id,
+            parent_image_type=ctx.parent_image_type,
+            generation_index=ctx.generation_index
+        )
+    except Exception as e:
+        ctx.log(f"Warning: Could not register refinement output in image registry: {e}")
+    
+    return await asyncio.to_thread(_finalize_refinement_files, ctx, refinement_dir, output_path)
+
+
+def _finalize_refinement_files(ctx: PipelineContext, refinement_dir: Path, output_path: Path) -> str:
+    """Preserve the reference image, write metadata and the legacy symlink for a saved output."""
+    
     # Check if reference image already exists in job directory (hybrid structure)
     # With the new API structure, reference images are already saved directly to job directories
     if hasattr(ctx, 'reference_image_path') and ctx.reference_image_path and os.path.exists(ctx.reference_image_path):
@@ -604,6 +655,8 @@ def _save_refinement_metadata(ctx: PipelineContext, refinement_dir: Path) -> Non
             "refined_prompt": getattr(ctx, 'refined_prompt', None),
             "mask_coordinates": getattr(ctx, 'mask_coordinates', None),  # Legacy
             "mask_file_path": getattr(ctx, 'mask_file_path', None),  # New approach
+            "mask_sha256": getattr(ctx, 'mask_sha256', None),
+            "reference_image_sha256": getattr(ctx, 'reference_image_sha256', None),
             "creativity_level": getattr(ctx, 'creativity_level', None),
         }
         
@@ -687,8 +740,7 @@ def _save_refinement_metadata(ctx: PipelineContext, refinement_dir: Path) -> Non
         
         # Save metadata with error handling
         metadata_path = refinement_dir / "metadata.json"
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f, indent=2, default=str)
+        write_json_file(metadata, metadata_path)
         ctx.log("Saved refinement metadata successfully")
         
     except Exception as e:
@@ -705,8 +757,7 @@ def _save_refinement_metadata(ctx: PipelineContext, refinement_dir: Path) -> Non
                 }
             }
             metadata_path = refinement_dir / "metadata.json"
-            with open(metadata_path, 'w') as f:
-                json.dump(minimal_metadata, f, indent=2, default=str)
+            write_json_file(minimal_metadata, metadata_path)
             ctx.log("Saved minimal fallback metadata")
         except Exception as fallback_error:
             ctx.log(f"Failed to save even minimal metadata: {fallback_error}")
@@ -19,6 +19,7 @@ from typing import Dict, Any, Optional
 from datetime import datetime
 from ..pipeline.context import PipelineContext
 from ..models import CostDetail
+from ..core.image_derivatives import schedule_pregeneration
 
 # Setup Logger
 logging.basicConfig(
@@ -61,6 +62,8 @@ async def run(ctx: PipelineContext) -> None:
     output_path = ctx.refinement_result.get("output_path")
     if output_path and os.path.exists(output_path):
         logger.info(f"Refinement output file found: {output_path}")
+        # Warm gallery previews for the new image in the background
+        schedule_pregeneration(output_path)
     else:
         logger.info("No refinement output file generated")
     
@@ -22,6 +22,7 @@ from churns.core.json_parser import (
     should_use_manual_parsing
 )
 from churns.core.brand_kit_utils import build_brand_palette_prompt
+from churns.core.prompt_templates import prompt_template
 
 # Global variables for API clients and configuration (injected by pipeline executor)
 instructor_client_style_guide = None
@@ -43,13 +44,33 @@ def _get_style_guider_system_prompt(
     target_model_family: Optional[str] = "openai"
 ) -> str:
     """Generate the system prompt for the Style Guider agent."""
+    use_instructor_format = bool(use_instructor_parsing and STYLE_GUIDER_MODEL_ID not in INSTRUCTOR_TOOL_MODE_PROBLEM_MODELS)
+    return _build_style_guider_system_prompt(
+        creativity_level, task_type, num_strategies, use_instructor_format, target_model_family
+    )
+
+
+@prompt_template("style_guide")
+def _build_style_guider_system_prompt(
+    creativity_level: int,
+    task_type: str,
+    num_strategies: int,
+    use_instructor_format: bool,
+    target_model_family: Optional[str]
+) -> str:
+    """Builds one variant of the Style Guider system prompt, flag-independent sections first."""
     creativity_desc_sg = {1: "focused and conventional", 2: "impressionistic and stylized", 3: "abstract and illustrative"}
     
-    base_persona_sg = f"""
+    base_persona_sg = """
 You are an expert Art Director and Style Consultant specializing in F&B social media visuals.
-Your task is to generate {num_strategies} distinct and varied sets of high-level style guidance, each uniquely tailored to its corresponding marketing strategy and the task type: '{task_type}'.
-The creativity level is {creativity_level} ({creativity_desc_sg.get(creativity_level, 'balanced')}). Styles must strictly adhere to the defined artistic boundaries for this level, ensuring a clear progression from photorealistic (Level 1) to impressionistic/stylized (Level 2) to abstract/illustrative (Level 3).
+Your task is to generate distinct and varied sets of high-level style guidance, each uniquely tailored to its corresponding marketing strategy and the task type.
+Styles must strictly adhere to the artistic boundaries of the creativity level, ensuring a clear progression from photorealistic (Level 1) to impressionistic/stylized (Level 2) to abstract/illustrative (Level 3).
 Each style guidance set must include a specific artistic constraint or reference to guide the Creative Expert, a detailed 2-3 sentence description, and an explanation of marketing impact for shareability, engagement, or brand recall.
+"""
+    
+    request_sg = f"""
+**This Request:** Generate {num_strategies} style guidance sets for the task type: '{task_type}'.
+The creativity level is {creativity_level} ({creativity_desc_sg.get(creativity_level, 'balanced')}).
 """
     
     style_diversification_sg = """
@@ -87,7 +108,7 @@ Styles must be visually appealing, marketable, and distinct from photorealism, w
     marketing_impact_sg = "**Marketing Impact:** For each style, include a 'marketing_impact' field explaining how it supports social media marketing goals (e.g., 'vibrant colors drive engagement on Instagram', 'authentic style fosters trust on Xiaohongshu')."
 
     output_format_sg = ""
-    if use_instructor_parsing and STYLE_GUIDER_MODEL_ID not in INSTRUCTOR_TOOL_MODE_PROBLEM_MODELS:
+    if use_instructor_format:
         output_format_sg = "Output a list of JSON objects, each conforming to the `StyleGuidance` Pydantic model (fields: `style_keywords`, `style_description`, `marketing_impact`, `source_strategy_index`). Ensure `style_description` is 2-3 sentences, specifying artistic references or constraints. Styles must be distinct for each strategy."
     else:  # Manual JSON parsing or if model is problematic with instructor's tool mode
         output_format_sg = """
@@ -96,9 +117,10 @@ This key should contain a list of objects, each with 'style_keywords' (list of 3
 Do not include any other text or formatting outside this JSON structure.
 """
     
+    # Shared by every variant first (cacheable prefix), then from least to most varying
     prompt_parts_sg = [
-        base_persona_sg, style_diversification_sg, creativity_instruction_sg,
-        task_type_awareness_sg, image_ref_context_sg, marketing_impact_sg, output_format_sg
+        base_persona_sg, style_diversification_sg, image_ref_context_sg, marketing_impact_sg,
+        output_format_sg, creativity_instruction_sg, request_sg, task_type_awareness_sg
     ]
     if target_model_family == "qwen": 
         prompt_parts_sg.append("   /no_thinking   ")  # Qwen specific
@@ -26,9 +26,9 @@ from .refinement_utils import (
     get_original_reference_image_path,
     get_user_inputs,
     get_assessment_result,
+    get_agent_model,
     RefinementError
 )
-from pydantic_ai import Agent
 
 # Setup Logger
 logging.basicConfig(
@@ -423,8 +423,9 @@ def _get_text_assessment_result(ctx: PipelineContext) -> str:
     
 
 async def _create_text_improvement_prompt(ctx: PipelineContext, score_justification: str) -> str:
+    from pydantic_ai import Agent
     prompt_refinement_agent = Agent(
-        'openai:gpt-4.1-mini',
+        get_agent_model(),
         retries=3,
         system_prompt="""
         You are a prompt refinement assistant.
@@ -14,12 +14,10 @@ IMPLEMENTATION GUIDANCE:
 
 import os
 import re
-import asyncio
 import logging
 import time
 from pathlib import Path
 from typing import Dict, Any, Optional, List
-from pydantic_ai import Agent, BinaryContent
 from ..pipeline.context import PipelineContext
 from ..api.schemas import ImageAnalysisResult
 
@@ -32,9 +30,10 @@ from .refinement_utils import (
     track_refinement_cost,
     get_image_ctx_and_main_object,
     get_reference_image_path,
+    get_agent_model,
     RefinementError
 )
-from sentence_transformers import SentenceTransformer, util
+from ..core.model_pool import MODEL_TEXT_SIMILARITY, model_pool
 
 # Setup Logger
 logging.basicConfig(
@@ -43,63 +42,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger("text_repair")
 
-# Async model loading machinery
-sentence_transformer_model = None
-# Event to signal when model loading is complete
-model_loaded_event = asyncio.Event()
-
-async def async_load_sentence_transformer():
-    """
-    Asynchronously load the SentenceTransformer model in a background thread.
-    This prevents blocking the event loop during model initialization.
-    """
-    global sentence_transformer_model
-    try:
-        model_path = './churns/stages/artifacts/model'
-        logger.info(f"(Background) Attempting to load model from: {os.path.abspath(model_path)}")
-        
-        if not os.path.exists(model_path):
-            logger.error(f"Model path does not exist: {os.path.abspath(model_path)}")
-            raise FileNotFoundError(f"Model directory not found: {os.path.abspath(model_path)}")
-            
-        sentence_transformer_model = await asyncio.to_thread(
-            SentenceTransformer, model_path
-        )
-        logger.info("(Background) SentenceTransformer model loaded successfully")
-    except Exception as e:
-        logger.exception(f"Failed to load SentenceTransformer model: {e}")
-        raise
-    finally:
-        model_loaded_event.set()
-
-async def get_sentence_transformer_model():
-    """
-    Await until the model is loaded and ready for inference.
-    Returns:
-        The loaded SentenceTransformer model.
-    """
-    global sentence_transformer_model
-    
-    if sentence_transformer_model is None:
-        if model_loaded_event.is_set():
-            # If event is set but model is None, there was an error loading
-            raise RuntimeError("Failed to load SentenceTransformer model")
-            
-        logger.info("(Background) SentenceTransformer model not loaded yet, loading now...")
-        # If we get here, we need to load the model
-        await async_load_sentence_transformer()
-        
-    return sentence_transformer_model
-
-# Initialize model loading in a way that works for both sync and async contexts
-try:
-    # If we're in an async context with a running loop
-    loop = asyncio.get_running_loop()
-    loop.create_task(async_load_sentence_transformer())
-except RuntimeError:
-    # If no running loop, we'll use lazy loading when first requested
-    logger.info("No running event loop - model will be loaded on first request")
-
 # Setup Image Generation Clients (injected by PipelineExecutor)
 image_gen_client = None  # Legacy compatibility
 image_refinement_client = None  # Dedicated refinement client
@@ -290,9 +232,10 @@ def _validate_text_repair_inputs(ctx: PipelineContext) -> None:
 
 async def _perform_text_analysis(ctx: PipelineContext):
     logger.info("-----Performing text analysis-----")
+    from pydantic_ai import Agent, BinaryContent
     try:
         analysis_agent = Agent(
-            'openai:gpt-4.1-mini',
+            get_agent_model(),
             result_type=ImageAnalysisResult,  
             retries=5,
         )
@@ -376,9 +319,11 @@ async def _perform_similarity_check(ctx: PipelineContext, analysis_result: Dict)
     logger.info(f"Processed Task Desc = {task_description}")
     
     if task_description and detected_img_txt:
-        model = await get_sentence_transformer_model()
-        emb1 = model.encode(task_description, convert_to_tensor=True)
-        emb2 = model.encode(detected_img_txt, convert_to_tensor=True)
+        from sentence_transformers import util
+        # Shared, pre-warmed model; concurrent refinements are encoded in one batch
+        emb1, emb2 = await model_pool.get(MODEL_TEXT_SIMILARITY).encode_async(
+            [task_description, detected_img_txt], convert_to_tensor=True
+        )
 
         cosine_sim = util.pytorch_cos_sim(emb1, emb2).item()
     else:
@@ -390,8 +335,9 @@ async def _perform_similarity_check(ctx: PipelineContext, analysis_result: Dict)
 
 async def _perform_text_rephrase(ctx: PipelineContext, analysis_result: Dict):
     logger.info("-----Performing text rephrasing-----")
+    from pydantic_ai import Agent
     rephrase_agent = Agent(
-        'openai:gpt-4.1-mini',
+        get_agent_model(),
         retries=5,
     )
     
@@ -0,0 +1,127 @@
+"""
+Tests for the shared async artifact writer.
+==========================================
+
+Covers chunked base64 decoding, atomic writes, content hashing and the
+streaming download path used by image generation and refinement stages.
+"""
+
+import base64
+import hashlib
+import os
+
+import httpx
+import pytest
+
+from churns.core import artifact_writer
+from churns.core.artifact_writer import (
+    ArtifactTooSmallError,
+    ArtifactWriteError,
+    download_artifact,
+    write_base64_artifact,
+    write_bytes_artifact,
+)
+
+
+def _leftover_parts(directory):
+    return [name for name in os.listdir(directory) if name.endswith(".part")]
+
+
+@pytest.mark.asyncio
+async def test_write_base64_artifact_decodes_in_chunks(tmp_path, monkeypatch):
+    """Payloads larger than one decode slice are reassembled byte-for-byte."""
+    monkeypatch.setattr(artifact_writer, "B64_DECODE_CHUNK_SIZE", 16)
+    payload = os.urandom(1000)
+    dest = tmp_path / "image.png"
+
+    info = await write_base64_artifact(base64.b64encode(payload).decode(), dest)
+
+    assert dest.read_bytes() == payload
+    assert info.path == str(dest)
+    assert info.size_bytes == len(payload)
+    assert info.sha256 == hashlib.sha256(payload).hexdigest()
+    assert _leftover_parts(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_write_base64_artifact_accepts_line_wrapped_data(tmp_path, monkeypatch):
+    """Whitespace is stripped per slice without losing quantum alignment."""
+    monkeypatch.setattr(artifact_writer, "B64_DECODE_CHUNK_SIZE", 16)
+    payload = os.urandom(1000)
+    encoded = base64.b64encode(payload).decode()
+    wrapped = "\r\n".join(encoded[i:i + 7] for i in range(0, len(encoded), 7)) + "\n"
+    dest = tmp_path / "image.png"
+
+    info = await write_base64_artifact(wrapped, dest)
+
+    assert dest.read_bytes() == payload
+    assert info.size_bytes == len(payload)
+
+
+@pytest.mark.asyncio
+async def test_write_base64_artifact_rejects_invalid_data(tmp_path):
+    dest = tmp_path / "image.png"
+
+    with pytest.raises(ArtifactWriteError):
+        await write_base64_artifact("not*valid*base64", dest)
+
+    assert not dest.exists()
+    assert _leftover_parts(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_min_bytes_guard_leaves_no_file(tmp_path):
+    dest = tmp_path / "output.png"
+
+    with pytest.raises(ArtifactTooSmallError):
+        await write_bytes_artifact(b"tiny", dest, min_bytes=1000)
+
+    assert not dest.exists()
+    assert _leftover_parts(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_write_replaces_existing_file_atomically(tmp_path):
+    dest = tmp_path / "nested" / "output.png"
+    await write_bytes_artifact(b"first", dest)
+
+    info = await write_bytes_artifact(b"second", dest)
+
+    assert dest.read_bytes() == b"second"
+    assert info.size_bytes == 6
+
+
+@pytest.mark.asyncio
+async def test_download_artifact_streams_to_disk(tmp_path, monkeypatch):
+    payload = os.urandom(200_000)
+
+    def handler(request):
+        if request.url.path == "/missing.png":
+            return httpx.Response(404)
+        return httpx.Response(200, content=payload)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(artifact_writer, "get_http_client", lambda: client)
+
+    dest = tmp_path / "downloaded.png"
+    info = await download_artifact("https://images.example/ok.png", dest)
+    assert dest.read_bytes() == payload
+    assert info.sha256 == hashlib.sha256(payload).hexdigest()
+
+    with pytest.raises(ArtifactWriteError):
+        await download_artifact("https://images.example/missing.png", tmp_path / "missing.png")
+    assert not (tmp_path / "missing.png").exists()
+    assert _leftover_parts(tmp_path) == []
+
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_http_client_is_pooled_per_loop():
+    first = artifact_writer.get_http_client()
+    assert artifact_writer.get_http_client() is first
+
+    await artifact_writer.close_http_client()
+    assert first.is_closed
+    assert artifact_writer.get_http_client() is not first
+    await artifact_writer.close_http_client()
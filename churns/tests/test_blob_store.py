@@ -0,0 +1,352 @@
+"""
+Tests for the content-addressed blob store.
+"""
+
+import asyncio
+import base64
+import hashlib
+import io
+import json
+
+import pytest
+from fastapi import APIRouter, FastAPI, File, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+from starlette.datastructures import Headers
+
+from churns.api import routers, uploads
+from churns.api.schemas import BrandPresetUpdateRequest
+from sqlmodel import Session, SQLModel, select
+
+from churns.api.database import (
+    BrandPreset,
+    PipelineRun,
+    PipelineStage,
+    PresetType,
+    RefinementJob,
+    RefinementType,
+    _brand_kit_with_stored_logo,
+    create_sync_engine,
+    delete_run_rows,
+)
+from churns.core import blob_store
+from churns.core.blob_store import (
+    BlobNotFoundError,
+    BlobTooLargeError,
+    BlobUpload,
+    blob_refcount,
+    brand_kit_logo_hash,
+    get_blob,
+    link_blob,
+    put_blob,
+    read_blob,
+    release_blob,
+    release_blobs,
+    store_brand_kit_logo,
+)
+
+LOGO = b"\x89PNG\r\n\x1a\nlogo-bytes"
+LOGO_URI = "data:image/png;base64," + base64.b64encode(LOGO).decode()
+
+
+@pytest.fixture(autouse=True)
+def blob_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "BLOB_STORE_DIR", str(tmp_path / "blobs"))
+    return tmp_path / "blobs"
+
+
+def test_identical_content_is_stored_once_and_counted():
+    first = put_blob(LOGO, "image/png")
+    second = put_blob(LOGO)
+
+    assert first.sha256 == second.sha256 == hashlib.sha256(LOGO).hexdigest()
+    assert blob_refcount(first.sha256) == 2
+    assert get_blob(first.sha256).content_type == "image/png"
+    assert read_blob(first.sha256) == LOGO
+
+
+def test_last_release_deletes_the_content():
+    sha = put_blob(LOGO).sha256
+    put_blob(LOGO)
+
+    assert release_blob(sha) == 1 and get_blob(sha) is not None
+    assert release_blob(sha) == 0
+    assert get_blob(sha) is None
+    with pytest.raises(BlobNotFoundError):
+        read_blob(sha)
+    assert release_blob(sha) == 0
+
+
+def test_linked_copy_has_the_blob_content(tmp_path):
+    sha = put_blob(LOGO).sha256
+    dest = link_blob(sha, tmp_path / "run" / "logo.png")
+
+    assert dest.read_bytes() == LOGO
+    with pytest.raises(BlobNotFoundError):
+        link_blob("0" * 64, tmp_path / "run" / "missing.png")
+
+
+def test_inline_logo_is_moved_into_the_store():
+    stored = store_brand_kit_logo({"colors": [], "logo_file_base64": LOGO_URI})
+
+    assert "logo_file_base64" not in stored
+    assert stored["logo_blob_sha256"] == hashlib.sha256(LOGO).hexdigest()
+    assert stored["logo_content_type"] == "image/png"
+    assert blob_refcount(stored["logo_blob_sha256"]) == 1
+
+    # A kit that already names a stored logo takes another reference
+    assert store_brand_kit_logo(stored) == stored
+    assert blob_refcount(stored["logo_blob_sha256"]) == 2
+
+
+def test_unknown_logo_hash_is_rejected():
+    with pytest.raises(ValueError):
+        store_brand_kit_logo({"logo_blob_sha256": "f" * 64})
+    assert store_brand_kit_logo({"colors": []}) == {"colors": []}
+
+
+def test_migration_keeps_the_column_encoding():
+    kit = {"brand_voice_description": "Warm", "logo_file_base64": LOGO_URI}
+
+    double_encoded = _brand_kit_with_stored_logo(json.dumps(json.dumps(kit)))
+    migrated = json.loads(json.loads(double_encoded))
+    assert migrated["logo_blob_sha256"] == hashlib.sha256(LOGO).hexdigest()
+    assert "logo_file_base64" not in migrated
+
+    assert "logo_blob_sha256" in json.loads(_brand_kit_with_stored_logo(json.dumps(kit)))
+    assert _brand_kit_with_stored_logo(json.dumps(json.dumps({"colors": []}))) is None
+
+
+def test_logo_hash_is_read_from_any_kit_encoding():
+    kit = {"logo_blob_sha256": "a" * 64}
+
+    assert brand_kit_logo_hash(kit) == "a" * 64
+    assert brand_kit_logo_hash(json.dumps(kit)) == "a" * 64
+    assert brand_kit_logo_hash(json.dumps(json.dumps(kit))) == "a" * 64
+    assert brand_kit_logo_hash(None) is None and brand_kit_logo_hash("not json") is None
+
+
+def test_deleting_a_run_releases_its_blobs(tmp_path):
+    engine = create_sync_engine(f"sqlite:///{tmp_path / 'runs.db'}")
+    SQLModel.metadata.create_all(engine)
+    image = put_blob(b"run-image").sha256
+    kit = store_brand_kit_logo({"logo_file_base64": LOGO_URI})
+    mask, reference = put_blob(b"mask").sha256, put_blob(b"reference").sha256
+    shared = put_blob(b"run-image").sha256  # still referenced by another run
+
+    with Session(engine) as session:
+        run = PipelineRun(mode="easy_mode", image_blob_sha256=image, brand_kit=json.dumps(kit))
+        session.add(run)
+        session.commit()
+        session.add(PipelineStage(run_id=run.id, stage_name="image_eval", stage_order=1))
+        session.add(RefinementJob(
+            parent_run_id=run.id,
+            refinement_type=RefinementType.SUBJECT,
+            mask_blob_sha256=mask,
+            reference_blob_sha256=reference,
+        ))
+        session.commit()
+
+        hashes = delete_run_rows(session, run)
+        session.commit()
+        release_blobs(hashes)
+
+        assert session.exec(select(PipelineRun)).all() == []
+        assert session.exec(select(PipelineStage)).all() == []
+        assert session.exec(select(RefinementJob)).all() == []
+
+    for sha256 in (kit["logo_blob_sha256"], mask, reference):
+        assert get_blob(sha256) is None
+    assert shared == image and blob_refcount(image) == 1
+
+
+def test_startup_migration_backfills_run_image_hashes(tmp_path, monkeypatch):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from churns.api import database
+
+    engine = create_sync_engine(f"sqlite:///{tmp_path / 'runs.db'}")
+    SQLModel.metadata.create_all(engine)
+    run_dir = tmp_path / "runs" / "old"
+    run_dir.mkdir(parents=True)
+    (run_dir / "input_photo.png").write_bytes(b"old-run-image")
+    with Session(engine) as session:
+        session.add(PipelineRun(id="old", mode="easy_mode", image_filename="photo.png", output_directory=str(run_dir)))
+        session.add(PipelineRun(id="gone", mode="easy_mode", image_filename="lost.png",
+                                output_directory=str(tmp_path / "runs" / "gone")))
+        session.commit()
+    monkeypatch.setattr(database, "engine", create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'runs.db'}"))
+
+    asyncio.run(database.migrate_pipeline_runs_blob_fields())
+
+    with Session(engine) as session:
+        hashes = {run.id: run.image_blob_sha256 for run in session.exec(select(PipelineRun)).all()}
+    assert hashes == {"old": hashlib.sha256(b"old-run-image").hexdigest(), "gone": None}
+    assert blob_refcount(hashes["old"]) == 1 and get_blob(hashes["old"]).content_type == "image/png"
+    assert (run_dir / "input_photo.png").read_bytes() == b"old-run-image"
+
+    # Backfilled runs are not counted twice on the next start
+    asyncio.run(database.migrate_pipeline_runs_blob_fields())
+    assert blob_refcount(hashes["old"]) == 1
+
+
+class _PresetSession:
+    """Just enough of an AsyncSession for update_brand_preset."""
+
+    def __init__(self, preset, commit_error=None):
+        self.preset, self.commit_error = preset, commit_error
+
+    async def execute(self, statement):
+        return type("Result", (), {"scalar_one_or_none": lambda _: self.preset})()
+
+    async def commit(self):
+        if self.commit_error:
+            raise self.commit_error
+
+    async def refresh(self, instance):
+        pass
+
+
+@pytest.mark.parametrize("commit_fails", [False, True])
+def test_preset_update_releases_a_logo_only_after_commit(commit_fails):
+    old_kit = store_brand_kit_logo({"logo_file_base64": LOGO_URI})
+    preset = BrandPreset(name="Kit", user_id="dev_user_1", preset_type=PresetType.INPUT_TEMPLATE,
+                         preset_source_type="brand-kit", pipeline_version="1.0", brand_kit=json.dumps(old_kit))
+    new_logo = b"\x89PNG\r\n\x1a\nnew-logo"
+    request = BrandPresetUpdateRequest(version=preset.version, brand_kit={
+        "logo_file_base64": "data:image/png;base64," + base64.b64encode(new_logo).decode()
+    })
+    session = _PresetSession(preset, RuntimeError("disk I/O error") if commit_fails else None)
+
+    if commit_fails:
+        with pytest.raises(RuntimeError):
+            asyncio.run(routers.update_brand_preset(preset.id, request, session))
+    else:
+        asyncio.run(routers.update_brand_preset(preset.id, request, session))
+
+    # Whichever logo the stored row still names keeps its only reference
+    old_kept, new_kept = (1, 0) if commit_fails else (0, 1)
+    assert blob_refcount(old_kit["logo_blob_sha256"]) == old_kept
+    assert blob_refcount(hashlib.sha256(new_logo).hexdigest()) == new_kept
+
+
+def _png(size=(8, 6), mode="RGB"):
+    buffer = io.BytesIO()
+    Image.new(mode, size).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _upload(data, content_type="image/png"):
+    return UploadFile(io.BytesIO(data), filename="upload.png", headers=Headers({"content-type": content_type}))
+
+
+def _stored_files(blob_dir):
+    return sorted(p.name for p in blob_dir.rglob("*") if p.is_file() and p.name != blob_store.LOCK_FILENAME)
+
+
+def test_streamed_upload_is_hashed_and_deduplicated(blob_dir):
+    existing = put_blob(LOGO)
+    upload = BlobUpload(max_bytes=len(LOGO))
+    for start in range(0, len(LOGO), 4):
+        upload.write(LOGO[start:start + 4])
+
+    assert upload.commit("image/png").sha256 == existing.sha256
+    assert blob_refcount(existing.sha256) == 2
+    assert _stored_files(blob_dir) == [existing.sha256, f"{existing.sha256}.json"]
+
+
+def test_streamed_upload_stops_at_the_limit(blob_dir):
+    upload = BlobUpload(max_bytes=4)
+    upload.write(b"1234")
+    with pytest.raises(BlobTooLargeError):
+        upload.write(b"5")
+    upload.abort()
+
+    assert _stored_files(blob_dir) == []
+
+
+def test_image_upload_is_stored_after_its_header_is_checked(monkeypatch, blob_dir):
+    monkeypatch.setattr(routers, "UPLOAD_CHUNK_BYTES", 16)
+    data = _png()
+
+    blob = asyncio.run(routers._ingest_image_upload(_upload(data), 1024, "Image file"))
+
+    assert blob.sha256 == hashlib.sha256(data).hexdigest() and blob.size_bytes == len(data)
+    assert read_blob(blob.sha256) == data
+
+
+@pytest.mark.parametrize("data, max_bytes, detail", [
+    (_png(), 32, "too large"),
+    (b"not an image" * 10, 1024, "not a readable image"),
+])
+def test_rejected_uploads_leave_nothing_behind(blob_dir, data, max_bytes, detail):
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(routers._ingest_image_upload(_upload(data), max_bytes, "Image file"))
+
+    assert exc.value.status_code == 400 and detail in exc.value.detail
+    assert _stored_files(blob_dir) == []
+
+
+def test_mask_header_is_validated_before_storing(blob_dir):
+    def validate(image_format, size, mode):
+        if size != (8, 6):
+            raise HTTPException(status_code=400, detail="Mask dimensions must match")
+
+    blob = asyncio.run(routers._ingest_image_upload(_upload(_png(mode="L")), 1024, "Mask file", validate))
+    assert get_blob(blob.sha256) is not None
+
+    with pytest.raises(HTTPException):
+        asyncio.run(routers._ingest_image_upload(_upload(_png(size=(4, 4))), 1024, "Mask file", validate))
+    assert len(_stored_files(blob_dir)) == 2
+
+
+def _upload_app(calls):
+    router = APIRouter(route_class=uploads.BlobUploadRoute)
+
+    @router.post("/upload")
+    async def upload(image_file: UploadFile = File(...), ignored: UploadFile = File(None)):
+        calls.append(type(image_file))
+        blob = await routers._ingest_image_upload(image_file, 1024, "Image file")
+        return {"sha256": blob.sha256}
+
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+def test_route_hashes_file_parts_as_they_arrive(blob_dir):
+    calls = []
+    data = _png()
+
+    response = _upload_app(calls).post(
+        "/upload",
+        files={"image_file": ("a.png", data, "image/png"), "ignored": ("b.png", b"unused", "image/png")},
+    )
+
+    assert response.status_code == 200 and calls == [uploads.BlobUploadFile]
+    sha256 = hashlib.sha256(data).hexdigest()
+    assert response.json() == {"sha256": sha256}
+    # The part the endpoint did not store is dropped when the form is closed
+    assert _stored_files(blob_dir) == [sha256, f"{sha256}.json"]
+
+
+def test_route_rejects_oversized_part_while_parsing(monkeypatch, blob_dir):
+    monkeypatch.setattr(uploads, "MAX_IMAGE_UPLOAD_BYTES", 32)
+    calls = []
+
+    response = _upload_app(calls).post("/upload", files={"image_file": ("a.png", _png(), "image/png")})
+
+    assert response.status_code == 400 and "too large" in response.json()["detail"]
+    assert calls == [] and _stored_files(blob_dir) == []
+
+
+def test_route_limits_file_parts_per_request(monkeypatch, blob_dir):
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_FILES", 1)
+    calls = []
+
+    response = _upload_app(calls).post(
+        "/upload",
+        files={"image_file": ("a.png", _png(), "image/png"), "ignored": ("b.png", b"unused", "image/png")},
+    )
+
+    assert response.status_code == 400 and calls == [] and _stored_files(blob_dir) == []
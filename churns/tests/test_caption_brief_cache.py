@@ -0,0 +1,115 @@
+"""
+Tests for the persistent caption brief cache.
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from churns.core import caption_brief_cache
+from churns.core.caption_brief_cache import brief_cache_key, load_cached_brief, store_brief
+from churns.models import CaptionSettings
+from churns.pipeline.context import PipelineContext
+from churns.stages import caption
+
+PLATFORM = "Instagram Post (1:1 Square)"
+BRIEF = {
+    "core_message": "Slow mornings start with a hand-poured latte.",
+    "key_themes_to_include": ["craft", "morning ritual"],
+    "seo_keywords": ["latte", "specialty coffee"],
+    "target_emotion": "Cozy",
+    "tone_of_voice": "Friendly & Casual",
+    "platform_optimizations": {PLATFORM: {"caption_structure": "Hook first", "style_notes": "Short lines"}},
+    "primary_call_to_action": "Drop by this morning",
+    "hashtags": ["#latte"],
+    "emoji_suggestions": ["☕"],
+}
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(caption_brief_cache, "CAPTION_BRIEF_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def analyst_calls(monkeypatch):
+    calls = []
+
+    def create(**llm_args):
+        calls.append(llm_args)
+        message = SimpleNamespace(content=json.dumps(BRIEF))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=None)
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(caption, "base_llm_client_caption", client)
+    monkeypatch.setattr(caption, "instructor_client_caption", None)
+    monkeypatch.setattr(caption, "should_use_manual_parsing", lambda model_id: True)
+    monkeypatch.setattr(caption, "CAPTION_MODEL_ID", "gpt-4.1-mini")
+    monkeypatch.setenv("LLM_STREAMING", "false")
+    return calls
+
+
+def _context(run_id, main_subject="Oat latte"):
+    ctx = PipelineContext(run_id=run_id)
+    ctx.generated_image_prompts = [{"visual_concept": {"main_subject": main_subject}}]
+    ctx.suggested_marketing_strategies = [{"target_audience": "Commuters", "target_objective": "Awareness"}]
+    return ctx
+
+
+def _analyst(ctx, settings=None, prompt_index=0):
+    visual_concept = ctx.generated_image_prompts[prompt_index]["visual_concept"]
+    return asyncio.run(caption._run_analyst(
+        ctx, settings or CaptionSettings(), PLATFORM, ctx.suggested_marketing_strategies[0],
+        visual_concept, "Generated image", prompt_index=prompt_index
+    ))
+
+
+def test_key_follows_model_and_messages():
+    messages = [{"role": "user", "content": "brief inputs"}]
+    assert brief_cache_key("model-a", messages) == brief_cache_key("model-a", [dict(messages[0])])
+    assert brief_cache_key("model-b", messages) != brief_cache_key("model-a", messages)
+
+
+def test_store_and_load_round_trip(cache_dir):
+    key = brief_cache_key("model-a", [])
+    assert load_cached_brief(key) is None
+
+    store_brief(key, BRIEF, "model-a")
+    assert load_cached_brief(key) == BRIEF
+
+    (cache_dir / key[:2] / f"{key}.json").write_text("{truncated")
+    assert load_cached_brief(key) is None
+
+
+def test_identical_inputs_reuse_the_brief_across_runs(analyst_calls):
+    first = _analyst(_context("run-a"))
+    second = _analyst(_context("run-b"))
+
+    assert len(analyst_calls) == 1
+    assert second == first
+
+
+def test_brief_inputs_miss_the_cache_and_processing_mode_does_not(analyst_calls):
+    _analyst(_context("run-a"))
+    _analyst(_context("run-a"), CaptionSettings(processing_mode="Fast"))
+    assert len(analyst_calls) == 1
+
+    _analyst(_context("run-a"), CaptionSettings(tone="Witty & Playful", generation_mode="Custom"))
+    _analyst(_context("run-a", main_subject="Iced mocha"))
+    zh = _context("run-a")
+    zh.language = "zh"
+    _analyst(zh)
+    assert len(analyst_calls) == 4
+
+
+def test_refresh_requests_a_new_brief_and_updates_the_cache(analyst_calls):
+    _analyst(_context("run-a"))
+    refresh = _context("run-a")
+    refresh.refresh_caption_brief = True
+    _analyst(refresh)
+    _analyst(_context("run-b"))
+
+    assert len(analyst_calls) == 2
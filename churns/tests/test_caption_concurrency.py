@@ -0,0 +1,99 @@
+"""
+Tests for concurrent per-image caption generation in pipeline mode.
+"""
+
+import asyncio
+
+from churns.models import CaptionBrief
+from churns.pipeline.context import PipelineContext
+from churns.stages import caption
+
+
+def _brief(index):
+    return CaptionBrief(
+        core_message=f"Message {index}",
+        key_themes_to_include=["coffee"],
+        seo_keywords=["latte"],
+        target_emotion="Warm",
+        platform_optimizations={"Instagram Post (1:1 Square)": {"caption_structure": "Hook first", "style_notes": "Short"}},
+        primary_call_to_action="Visit us",
+        hashtags=["#coffee"],
+        emoji_suggestions=["☕"],
+        task_type_notes=None,
+        tone_of_voice="Friendly",
+    )
+
+
+def _context(num_images, events):
+    ctx = PipelineContext(run_id="caption-concurrency-test")
+    ctx.generated_image_prompts = [
+        {"source_strategy_index": 0, "visual_concept": {"main_subject": f"Latte {i}", "suggested_alt_text": "Latte"}}
+        for i in range(num_images)
+    ]
+    ctx.suggested_marketing_strategies = [{"target_audience": "Commuters", "target_objective": "Awareness"}]
+    ctx.target_platform = {"name": "Instagram Post (1:1 Square)"}
+    ctx.caption_settings = {}
+    ctx.partial_output_callback = events.append
+    return ctx
+
+
+def test_images_are_captioned_concurrently_and_stored_in_order(monkeypatch):
+    monkeypatch.setenv("CAPTION_CONCURRENCY", "2")
+    running, peak, events = 0, 0, []
+
+    async def analyst(ctx, settings, platform_name, strategy, visual_concept, alt_text, prompt_index=None):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        # Later images finish first
+        await asyncio.sleep(0.01 * (4 - prompt_index))
+        running -= 1
+        settings.tone = f"Tone {prompt_index}"
+        return _brief(prompt_index)
+
+    async def writer(ctx, brief, prompt_index=None):
+        return f"Caption {prompt_index}"
+
+    monkeypatch.setattr(caption, "_run_analyst", analyst)
+    monkeypatch.setattr(caption, "_run_writer", writer)
+    ctx = _context(4, events)
+
+    asyncio.run(caption.run(ctx))
+
+    assert peak == 2
+    assert [c["text"] for c in ctx.generated_captions] == [f"Caption {i}" for i in range(4)]
+    # Settings refined by one image do not leak into the others
+    assert [c["settings_used"]["tone"] for c in ctx.generated_captions] == [f"Tone {i}" for i in range(4)]
+    assert ctx.cached_caption_brief.core_message == "Message 3"
+    done = [e for e in events if e["source"] == "caption"]
+    # Published as each image finishes: image 1 overtakes image 0
+    assert [e["image_index"] for e in done][:2] == [1, 0] and all(e["done"] for e in done)
+    assert sorted(e["image_index"] for e in done) == [0, 1, 2, 3]
+
+
+def test_failed_image_does_not_drop_the_others(monkeypatch):
+    async def analyst(ctx, settings, platform_name, strategy, visual_concept, alt_text, prompt_index=None):
+        if prompt_index == 1:
+            raise RuntimeError("provider error")
+        return _brief(prompt_index)
+
+    async def writer(ctx, brief, prompt_index=None):
+        return None if prompt_index == 2 else f"Caption {prompt_index}"
+
+    monkeypatch.setattr(caption, "_run_analyst", analyst)
+    monkeypatch.setattr(caption, "_run_writer", writer)
+    ctx = _context(4, [])
+
+    asyncio.run(caption.run(ctx))
+
+    assert [c["text"] for c in ctx.generated_captions] == ["Caption 0", "Caption 3"]
+
+
+def test_streamed_output_is_tagged_with_the_image_index():
+    events = []
+    ctx = PipelineContext(run_id="caption-tag-test")
+    ctx.partial_output_callback = events.append
+
+    caption._image_output_publisher(ctx, "caption_writer", 2)({"text": "Hel", "done": False})
+
+    assert events == [{"source": "caption_writer", "image_index": 2, "text": "Hel", "done": False}]
@@ -0,0 +1,136 @@
+"""
+Tests for the per-image caption manifest (version allocation and listing).
+"""
+
+import json
+import threading
+
+import pytest
+
+from churns.core.caption_index import (
+    MANIFEST_FILENAME,
+    STATUS_PENDING,
+    get_caption_version,
+    list_caption_versions,
+    record_caption_result,
+    release_caption_version,
+    reserve_caption_version,
+    settings_hash,
+)
+
+
+@pytest.fixture
+def caption_dir(tmp_path):
+    return tmp_path / "captions" / "image_0"
+
+
+def _result(version, text="A caption", model_id="openai/gpt-4.1", settings=None):
+    return {
+        "text": text,
+        "version": version,
+        "settings_used": settings or {"tone": "Friendly & Casual"},
+        "brief_used": {"core_message": "msg"},
+        "created_at": "2025-01-01T00:00:00+00:00",
+        "model_id": model_id,
+        "usage_summary": {"total_cost_usd": 0.001},
+    }
+
+
+def _complete(caption_dir, version, result, caption_id=None):
+    """What the caption task does: write the result file, then record it."""
+    (caption_dir / f"v{version}_result.json").write_text(json.dumps(result))
+    record_caption_result(caption_dir, version, result, caption_id=caption_id)
+
+
+def test_reserve_then_record_lists_completed_versions(caption_dir):
+    v0 = reserve_caption_version(caption_dir, caption_id="c0", model_id="m", settings={"tone": "x"})
+    v1 = reserve_caption_version(caption_dir, caption_id="c1")
+    assert (v0, v1) == (0, 1)
+
+    # Pending versions are not listed
+    assert list_caption_versions(caption_dir) == []
+    assert get_caption_version(caption_dir, 0)["status"] == STATUS_PENDING
+    assert get_caption_version(caption_dir, 0)["settings_hash"] == settings_hash({"tone": "x"})
+
+    _complete(caption_dir, 1, _result(1, text="second"), caption_id="c1")
+    _complete(caption_dir, 0, _result(0, text="first"), caption_id="c0")
+
+    listed = list_caption_versions(caption_dir)
+    assert [entry["version"] for entry in listed] == [0, 1]
+    assert listed[1]["text"] == "second" and listed[1]["brief_used"] == {"core_message": "msg"}
+    assert listed[0]["model_id"] == "openai/gpt-4.1"
+
+
+def test_manifest_keeps_only_status_and_file_pointers(caption_dir):
+    version = reserve_caption_version(caption_dir, caption_id="c0")
+    _complete(caption_dir, version, _result(version, text="long caption " * 200), caption_id="c0")
+
+    entry = json.loads((caption_dir / MANIFEST_FILENAME).read_text())["versions"]["0"]
+    assert entry["result_file"] == "v0_result.json" and entry["status"] == "completed"
+    assert not {"text", "brief_used", "settings_used", "usage_summary"} & set(entry)
+    assert get_caption_version(caption_dir, 0)["model_id"] == "openai/gpt-4.1"
+
+
+def test_full_entries_of_older_manifests_are_slimmed_on_the_next_write(caption_dir):
+    caption_dir.mkdir(parents=True)
+    (caption_dir / "v0_result.json").write_text(json.dumps(_result(0, text="kept")))
+    old_entry = {"version": 0, "status": "completed", "model_id": "m", "text": "kept", "brief_used": {}}
+    (caption_dir / MANIFEST_FILENAME).write_text(json.dumps({"next_version": 1, "versions": {"0": old_entry}}))
+
+    assert reserve_caption_version(caption_dir) == 1
+
+    entry = json.loads((caption_dir / MANIFEST_FILENAME).read_text())["versions"]["0"]
+    assert entry == {"version": 0, "status": "completed", "model_id": "m", "result_file": "v0_result.json"}
+    assert list_caption_versions(caption_dir)[0]["text"] == "kept"
+
+
+def test_concurrent_reservations_get_unique_versions(caption_dir):
+    versions = []
+    lock = threading.Lock()
+
+    def reserve():
+        version = reserve_caption_version(caption_dir)
+        with lock:
+            versions.append(version)
+
+    threads = [threading.Thread(target=reserve) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(versions) == list(range(20))
+
+
+def test_release_reuses_latest_failed_version(caption_dir):
+    reserve_caption_version(caption_dir)
+    failed = reserve_caption_version(caption_dir)
+
+    release_caption_version(caption_dir, failed)
+    assert get_caption_version(caption_dir, failed) is None
+    assert reserve_caption_version(caption_dir) == failed
+
+
+def test_release_ignores_completed_versions(caption_dir):
+    version = reserve_caption_version(caption_dir)
+    _complete(caption_dir, version, _result(version))
+
+    release_caption_version(caption_dir, version)
+    assert len(list_caption_versions(caption_dir)) == 1
+
+
+def test_legacy_result_files_are_indexed_once(caption_dir):
+    caption_dir.mkdir(parents=True)
+    for version in (0, 2):
+        (caption_dir / f"v{version}_result.json").write_text(json.dumps(_result(version, text=f"v{version}")))
+    (caption_dir / "v0.txt").write_text("v0")
+
+    listed = list_caption_versions(caption_dir)
+    assert [entry["text"] for entry in listed] == ["v0", "v2"]
+    assert (caption_dir / MANIFEST_FILENAME).exists()
+    assert reserve_caption_version(caption_dir) == 3
+
+
+def test_missing_directory_lists_nothing(caption_dir):
+    assert list_caption_versions(caption_dir) == []
+    assert not caption_dir.exists()
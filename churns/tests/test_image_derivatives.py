@@ -0,0 +1,167 @@
+"""
+Tests for image derivatives (thumbnails) and their file-serving endpoint.
+"""
+
+import uuid
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from churns.api.main import app
+from churns.api.database import get_session
+from churns.core import image_derivatives
+from churns.core.image_derivatives import (
+    DerivativeError,
+    get_or_create_derivative,
+    normalize_params,
+    pregenerate_derivatives,
+)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run each test from an isolated directory so ./data stays clean."""
+    monkeypatch.chdir(tmp_path)
+    image_derivatives._source_hash_cache.clear()
+    return tmp_path
+
+
+def _make_image(path, size=(1600, 900)):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", size, (200, 40, 40)).save(path, format="PNG")
+    return path
+
+
+def test_normalize_params_defaults_and_validation():
+    assert normalize_params("thumb") == ("thumb", "webp", 80)
+    assert normalize_params("small", "JPG", 60) == ("small", "jpeg", 60)
+
+    with pytest.raises(DerivativeError):
+        normalize_params("huge")
+    with pytest.raises(DerivativeError):
+        normalize_params("thumb", "gif")
+    with pytest.raises(DerivativeError):
+        normalize_params("thumb", "webp", 0)
+
+
+@pytest.mark.asyncio
+async def test_derivative_is_resized_and_cached(workdir):
+    source = _make_image(workdir / "source.png")
+
+    first = await get_or_create_derivative(source, "thumb", "webp")
+    with Image.open(first.path) as img:
+        assert img.format == "WEBP"
+        assert max(img.size) == 256
+        assert img.size == (256, 144)
+    assert first.media_type == "image/webp"
+
+    second = await get_or_create_derivative(source, "thumb", "webp")
+    assert second.path == first.path
+    assert second.etag == first.etag
+
+    # Different parameters produce a different cache entry and ETag
+    other = await get_or_create_derivative(source, "thumb", "webp", quality=50)
+    assert other.path != first.path
+    assert other.etag != first.etag
+
+
+@pytest.mark.asyncio
+async def test_changed_source_gets_new_derivative(workdir):
+    source = _make_image(workdir / "source.png")
+    before = await get_or_create_derivative(source, "small", "jpeg")
+
+    Image.new("RGB", (800, 800), (0, 0, 255)).save(source, format="PNG")
+    after = await get_or_create_derivative(source, "small", "jpeg")
+
+    assert after.etag != before.etag
+
+
+@pytest.mark.asyncio
+async def test_pregenerate_creates_configured_previews(workdir):
+    source = _make_image(workdir / "source.png")
+    await pregenerate_derivatives(source)
+
+    cached = list((workdir / "data" / "derivatives").rglob("*.webp"))
+    assert len(cached) == len(image_derivatives.IMAGE_DERIVATIVE_PREGENERATE)
+
+
+def test_source_hash_cache_is_bounded(workdir, monkeypatch):
+    monkeypatch.setattr(image_derivatives, "MAX_SOURCE_HASHES", 2)
+    paths = []
+    for name in ("a", "b", "c"):
+        paths.append(workdir / f"{name}.png")
+        paths[-1].write_bytes(name.encode())
+    image_derivatives.file_sha256(paths[0])
+    image_derivatives.file_sha256(paths[1])
+    image_derivatives.file_sha256(paths[0])  # Now the most recently used
+    image_derivatives.file_sha256(paths[2])
+
+    assert list(image_derivatives._source_hash_cache) == [str(paths[0]), str(paths[2])]
+
+
+@pytest.mark.asyncio
+async def test_run_derivatives_are_removed_with_the_run(workdir):
+    run_image = _make_image(workdir / "data" / "runs" / "run-1" / "image_001.png")
+    other = _make_image(workdir / "data" / "runs" / "run-2" / "image_001.png", size=(900, 1600))
+    await pregenerate_derivatives(run_image)
+    kept = await get_or_create_derivative(other, "thumb", "webp")
+
+    removed = image_derivatives.remove_run_derivatives(workdir / "data" / "runs" / "run-1")
+
+    assert removed == len(image_derivatives.IMAGE_DERIVATIVE_PREGENERATE)
+    assert list((workdir / "data" / "derivatives").rglob("*.*")) == [workdir / kept.path]
+    assert image_derivatives.remove_run_derivatives(workdir / "data" / "runs" / "missing") == 0
+
+
+class TestRunFileDerivatives:
+
+    def setup_method(self):
+        self.run_id = str(uuid.uuid4())
+        mock_session = Mock()
+        mock_session.get = AsyncMock(return_value=Mock())
+        app.dependency_overrides[get_session] = lambda: mock_session
+        self.client = TestClient(app)
+
+    def teardown_method(self):
+        app.dependency_overrides.clear()
+
+    def test_thumbnail_with_etag_and_304(self, workdir):
+        _make_image(workdir / "data" / "runs" / self.run_id / "generated_image_strategy_0_1.png")
+        url = f"/api/v1/files/{self.run_id}/generated_image_strategy_0_1.png"
+
+        response = self.client.get(url, params={"size": "thumb", "format": "webp"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/webp"
+        assert "immutable" in response.headers["cache-control"]
+        etag = response.headers["etag"]
+
+        cached = self.client.get(url, params={"size": "thumb", "format": "webp"},
+                                 headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+
+    def test_original_supports_conditional_requests(self, workdir):
+        _make_image(workdir / "data" / "runs" / self.run_id / "image.png")
+        url = f"/api/v1/files/{self.run_id}/image.png"
+
+        response = self.client.get(url)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/png"
+        etag = response.headers["etag"]
+
+        assert self.client.get(url, headers={"If-None-Match": etag}).status_code == 304
+        assert self.client.get(url, headers={"If-None-Match": '"other"'}).status_code == 200
+
+    def test_invalid_derivative_params_rejected(self, workdir):
+        run_dir = workdir / "data" / "runs" / self.run_id
+        _make_image(run_dir / "image.png")
+        (run_dir / "pipeline_metadata.json").write_text("{}")
+
+        bad_size = self.client.get(f"/api/v1/files/{self.run_id}/image.png", params={"size": "huge"})
+        assert bad_size.status_code == 400
+
+        not_image = self.client.get(f"/api/v1/files/{self.run_id}/pipeline_metadata.json",
+                                    params={"size": "thumb"})
+        assert not_image.status_code == 400
@@ -0,0 +1,124 @@
+"""
+Tests for the run-local image registry used to resolve base and parent images.
+"""
+
+import json
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from churns.core import image_registry
+from churns.core.image_registry import (
+    KIND_ORIGINAL,
+    KIND_REFINEMENT,
+    REGISTRY_FILENAME,
+    ensure_registry,
+    lookup_image,
+    lookup_image_path,
+    register_image,
+)
+
+
+@pytest.fixture
+def run_dir(tmp_path):
+    image_registry._manifest_cache.clear()
+    directory = tmp_path / "run-1"
+    directory.mkdir()
+    return directory
+
+
+def _touch(path, content=b"png-bytes", mtime=None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_register_and_lookup_original(run_dir):
+    image = _touch(run_dir / "generated_image_strategy_0_20250101.png")
+
+    entry = register_image(run_dir, KIND_ORIGINAL, 0, image, sha256="abc", generation_index=0)
+
+    assert entry["path"] == "generated_image_strategy_0_20250101.png"
+    assert entry["size_bytes"] == len(b"png-bytes")
+    assert lookup_image(run_dir, KIND_ORIGINAL, 0)["sha256"] == "abc"
+    assert lookup_image_path(run_dir, KIND_ORIGINAL, 0) == image
+    assert lookup_image_path(run_dir, KIND_ORIGINAL, 1) is None
+
+
+def test_later_registration_replaces_entry(run_dir):
+    first = _touch(run_dir / "generated_image_strategy_0_1.png")
+    second = _touch(run_dir / "edited_image_strategy_0_2.png")
+
+    register_image(run_dir, KIND_ORIGINAL, 0, first)
+    register_image(run_dir, KIND_ORIGINAL, 0, second)
+
+    assert lookup_image_path(run_dir, KIND_ORIGINAL, 0) == second
+    manifest = json.loads((run_dir / REGISTRY_FILENAME).read_text())
+    assert list(manifest["images"]) == ["original:0"]
+
+
+def test_refinement_entry_keeps_parent_details(run_dir):
+    output = _touch(run_dir / "refinements" / "job-1" / "output.png")
+
+    register_image(run_dir, KIND_REFINEMENT, "job-1", output,
+                   parent_image_id="image_0", parent_image_type="original", generation_index=0)
+
+    entry = lookup_image(run_dir, KIND_REFINEMENT, "job-1")
+    assert entry["path"] == "refinements/job-1/output.png"
+    assert entry["parent_image_id"] == "image_0"
+
+
+def test_lookups_do_not_list_directories(run_dir, monkeypatch):
+    register_image(run_dir, KIND_ORIGINAL, 0, _touch(run_dir / "generated_image_strategy_0_1.png"))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("directory listing during lookup")
+
+    monkeypatch.setattr(image_registry.Path, "iterdir", fail)
+    monkeypatch.setattr(image_registry.Path, "glob", fail)
+    assert lookup_image_path(run_dir, KIND_ORIGINAL, 0) is not None
+
+
+def test_backfill_indexes_legacy_run_once(run_dir):
+    now = time.time()
+    _touch(run_dir / "generated_image_strategy_0_100.png", mtime=now - 100)
+    newest = _touch(run_dir / "edited_image_strategy_0_200.png", mtime=now)
+    _touch(run_dir / "generated_image_strategy_1_100.png")
+    _touch(run_dir / "input_photo.png")
+    _touch(run_dir / "refinements" / "job-new" / "output.png")
+    _touch(run_dir / "refinements" / "job-old_from_0_20250101.png")
+
+    images = ensure_registry(run_dir)
+
+    assert set(images) == {"original:0", "original:1", "refinement:job-new", "refinement:job-old"}
+    assert lookup_image_path(run_dir, KIND_ORIGINAL, 0) == newest
+    assert lookup_image(run_dir, KIND_REFINEMENT, "job-new")["path"] == "refinements/job-new/output.png"
+    assert (run_dir / REGISTRY_FILENAME).exists()
+
+
+def test_missing_run_directory_returns_empty(tmp_path):
+    assert ensure_registry(tmp_path / "does-not-exist") == {}
+    assert lookup_image_path(tmp_path / "does-not-exist", KIND_ORIGINAL, 0) is None
+
+
+def _register_many(run_dir, worker):
+    for index in range(10):
+        register_image(run_dir, KIND_REFINEMENT, f"job-{worker}-{index}", run_dir / f"{worker}-{index}.png")
+
+
+@pytest.mark.skipif(image_registry.fcntl is None, reason="flock not available")
+def test_concurrent_processes_do_not_lose_entries(run_dir):
+    register_image(run_dir, KIND_ORIGINAL, 0, run_dir / "image_0.png")
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_register_many, args=(run_dir, worker)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+
+    images = json.loads((run_dir / REGISTRY_FILENAME).read_text())["images"]
+    assert len(images) == 41
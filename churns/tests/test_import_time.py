@@ -0,0 +1,66 @@
+"""
+Import graph checks.
+
+Runs ``python -X importtime`` in a fresh interpreter so the API's imports are
+seen without anything the test process already imported. Heavy optional
+dependencies (torch, transformers, cv2, pydantic-ai) and the stage modules
+must stay out of the API's import graph. The import time itself is tracked by
+``scripts/benchmark_pipeline.py``.
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from churns.pipeline import executor as executor_module
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+HEAVY_MODULES = ("torch", "transformers", "sentence_transformers", "cv2", "pydantic_ai")
+
+
+def import_times(statement):
+    """{module: cumulative microseconds} for everything ``statement`` imports."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=REPO_ROOT, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def _heavy(times):
+    return sorted(name for name in times if name.split(".")[0] in HEAVY_MODULES)
+
+
+def test_api_import_avoids_heavy_dependencies_and_stages():
+    times = import_times("import churns.api.main")
+
+    assert _heavy(times) == []
+    assert [name for name in times if name.startswith("churns.stages")] == []
+
+
+@pytest.mark.parametrize("module", ["churns.core.metrics", "churns.stages.text_repair", "churns.stages.prompt_refine"])
+def test_modules_defer_heavy_dependencies_until_used(module):
+    assert _heavy(import_times(f"import {module}")) == []
+
+
+def test_executor_registry_shares_executors_and_stage_config(monkeypatch):
+    monkeypatch.setattr(executor_module, "_executors", {})
+    executor_module._read_stage_order_config.cache_clear()
+
+    first = executor_module.get_pipeline_executor("generation")
+    refinement = executor_module.get_pipeline_executor("refinement")
+
+    assert executor_module.get_pipeline_executor("generation") is first
+    assert refinement.mode == "refinement" and refinement is not first
+    assert executor_module._read_stage_order_config.cache_info().misses == 1
+    assert first.stages == executor_module.load_stage_order("generation")
@@ -8,6 +8,9 @@ and edge cases that occur across different pipeline stages.
 
 import pytest
 import json
+import os
+import time
+from pathlib import Path
 from typing import Dict, Any
 from pydantic import BaseModel, ValidationError
 
@@ -19,6 +22,12 @@ from churns.core.json_parser import (
     should_use_manual_parsing
 )
 
+SCRIPTS_DIR = Path(__file__).resolve().parents[2] / "scripts"
+STAGE_RESPONSES_PATH = Path(__file__).resolve().parent / "fixtures" / "stage_responses.json"
+
+# Generous so slow CI machines pass; re-parsing every candidate costs several times this
+CORPUS_PARSE_BUDGET_MS = float(os.getenv("JSON_PARSER_BUDGET_MS", "2000"))
+
 
 # Test Pydantic models
 class TestAssessmentModel(BaseModel):
@@ -424,5 +433,87 @@ class TestIntegrationWithConstants:
         assert parser.should_use_manual_parsing("definitely-not-problematic-model") is False
 
 
+
+def _caption_brief_corpus():
+    """Caption briefs the analyst LLM returned in the caption benchmark runs."""
+    briefs = []
+    for path in sorted(SCRIPTS_DIR.glob("caption_benchmark_results_*.json")):
+        briefs.extend(result["brief"] for result in json.loads(path.read_text(encoding="utf-8"))
+                      if isinstance(result, dict) and result.get("brief"))
+    return briefs
+
+
+def _stage_response_corpus():
+    """Creative expert concepts and image assessments in the shape the stages receive them."""
+    samples = json.loads(STAGE_RESPONSES_PATH.read_text(encoding="utf-8"))
+    return [sample["value"] for sample in samples]
+
+
+# (envelope, most JSON decodes allowed per response)
+RESPONSE_ENVELOPES = [
+    ("Here is the JSON:\n```json\n{json}\n```", 1),
+    ("{json}", 1),
+    ("{json}\n\nThis leans on the seasonal promotion mentioned in the task.", 3),
+    ("Sure. Based on the image analysis, this is the brief {json} which keeps the brand voice.", 3),
+]
+
+
+class TestLLMResponseCorpus:
+    """Correctness and speed on caption briefs, creative concepts and image assessments."""
+    
+    @pytest.fixture(scope="class")
+    def corpus(self):
+        return _caption_brief_corpus() + _stage_response_corpus()
+    
+    @staticmethod
+    def _responses(values):
+        for value in values:
+            for indent in (None, 2):
+                text = json.dumps(value, indent=indent, ensure_ascii=False)
+                for envelope, max_decodes in RESPONSE_ENVELOPES:
+                    yield value, text, envelope.replace("{json}", text), max_decodes
+    
+    def test_covers_every_response_kind(self, corpus):
+        assert any("visual_concept" in value for value in corpus)
+        assert any("assessment_scores" in value for value in corpus)
+
+    def test_extracts_each_response_with_its_span(self, corpus):
+        parser = RobustJSONParser()
+        for value, text, response, _ in self._responses(corpus):
+            extraction = parser.extract_json(response)
+            assert extraction is not None, response[:200]
+            assert extraction.value == value
+            assert extraction.text == text
+            assert response[extraction.start:extraction.end] == text
+            assert parser.extract_and_parse(response) == value
+    
+    def test_each_response_is_decoded_at_most_a_few_times(self, corpus, monkeypatch):
+        decodes = []
+        raw_decode = json.JSONDecoder.raw_decode
+        
+        def counting_raw_decode(self, s, idx=0):
+            decodes.append(idx)
+            return raw_decode(self, s, idx)
+        
+        monkeypatch.setattr(json.JSONDecoder, "raw_decode", counting_raw_decode)
+        parser = RobustJSONParser()
+        for _, _, response, max_decodes in self._responses(corpus):
+            decodes.clear()
+            parser.extract_and_parse(response)
+            assert len(decodes) <= max_decodes, response[:200]
+    
+    def test_corpus_parses_within_budget(self, corpus):
+        parser = RobustJSONParser()
+        responses = [response for _, _, response, _ in self._responses(corpus)]
+        started = time.perf_counter()
+        for _ in range(5):
+            for response in responses:
+                parser.extract_and_parse(response)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        assert elapsed_ms < CORPUS_PARSE_BUDGET_MS, (
+            f"{len(responses) * 5} responses parsed in {elapsed_ms:.0f}ms (budget {CORPUS_PARSE_BUDGET_MS:.0f}ms)"
+        )
+
+
 if __name__ == "__main__":
     pytest.main([__file__]) 
\ No newline at end of file
@@ -0,0 +1,206 @@
+"""
+Tests for streamed LLM calls and the incremental JSON parser.
+"""
+
+import asyncio
+import json
+import random
+
+import httpx
+import pytest
+from openai import OpenAI
+
+from churns.api.websocket import ConnectionManager, WSMessageType
+from churns.core.json_parser import RobustJSONParser
+from churns.core.llm_streaming import IncrementalJSONParser, MalformedJSONError, create_chat_completion
+from churns.core.stub_provider import StubProviderSettings, StubTransport
+
+BRIEF = {
+    "core_message": "Handmade soy milk, \"pressed\" fresh every morning",
+    "key_themes_to_include": ["freshness", "craft"],
+    "platform_optimizations": {"Instagram": {"caption_structure": "Hook\nBody\nCTA"}},
+    "primary_call_to_action": "Visit us today ☕",
+}
+
+
+def _feed_in_chunks(parser, text, rng):
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, 12)
+        parser.feed(text[i:i + size])
+        i += size
+
+
+def test_parser_tracks_fields_across_arbitrary_chunks():
+    rng = random.Random(7)
+    text = "Here is the brief:\n```json\n" + json.dumps(BRIEF, indent=2) + "\n```"
+    for _ in range(20):
+        parser = IncrementalJSONParser()
+        _feed_in_chunks(parser, text, rng)
+        assert parser.complete
+        assert parser.fields == {
+            "core_message": BRIEF["core_message"],
+            "platform_optimizations.Instagram.caption_structure": "Hook\nBody\nCTA",
+            "primary_call_to_action": BRIEF["primary_call_to_action"],
+        }
+
+    parser = IncrementalJSONParser()
+    parser.feed('{"core_message": "Handmade so')
+    assert parser.fields == {"core_message": "Handmade so"} and not parser.complete
+
+
+@pytest.mark.parametrize("text", ['{"a": [1, 2}', '{"a": {"b": 1]]', '{{"a": 1}}'])
+def test_parser_rejects_output_that_cannot_parse(text):
+    with pytest.raises(MalformedJSONError):
+        IncrementalJSONParser().feed(text)
+
+
+@pytest.mark.parametrize("text", [
+    "{'core_message': 'single quotes', 'tags': ['a', 'b',],}",
+    '{core_message: "unquoted key", ready: yes}',
+    '{"a": 1}\n\nThe brief above uses [brackets} loosely.',
+])
+def test_parser_accepts_what_the_final_parse_can_repair(text):
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    assert parser.complete
+    assert RobustJSONParser().extract_and_parse(text)
+
+
+def _sse(content, finish_reason="stop", usage=True):
+    events = [{"choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]}]
+    events += [
+        {"choices": [{"index": 0, "delta": {"content": content[i:i + 5]}, "finish_reason": None}]}
+        for i in range(0, len(content), 5)
+    ]
+    events.append({"choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]})
+    if usage:
+        events.append({"choices": [], "usage": {"prompt_tokens": 10, "completion_tokens": 7, "total_tokens": 17}})
+    body = "".join(
+        f"data: {json.dumps({'id': 'c1', 'object': 'chat.completion.chunk', 'created': 1, 'model': 'm', **event})}\n\n"
+        for event in events
+    )
+    return body + "data: [DONE]\n\n"
+
+
+class ScriptedTransport(httpx.BaseTransport):
+    """Answers each streamed call with the next scripted SSE body."""
+
+    def __init__(self, *bodies):
+        self.bodies = list(bodies)
+        self.requests = []
+
+    def handle_request(self, request):
+        self.requests.append(json.loads(request.read()))
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, text=self.bodies.pop(0))
+
+
+def _client(transport):
+    return OpenAI(api_key="stub-key", max_retries=0, http_client=httpx.Client(transport=transport))
+
+
+def _call(transport, **kwargs):
+    llm_args = {"model": "m", "messages": [{"role": "user", "content": "brief"}], "max_tokens": 1000}
+    return create_chat_completion(_client(transport), llm_args, stream=True, **kwargs)
+
+
+def test_stream_returns_a_regular_completion_and_publishes_partials(monkeypatch):
+    monkeypatch.setenv("LLM_STREAM_PARTIAL_INTERVAL_MS", "0")
+    text = json.dumps(BRIEF)
+    transport = ScriptedTransport(_sse(text))
+    partials = []
+
+    completion = _call(transport, expect_json=True, on_partial=partials.append)
+
+    assert completion.choices[0].message.content == text
+    assert completion.choices[0].finish_reason == "stop"
+    assert completion.usage.total_tokens == 17
+    assert transport.requests[0]["stream"] is True
+    assert transport.requests[0]["stream_options"] == {"include_usage": True}
+    messages = [p["fields"].get("core_message", "") for p in partials]
+    assert messages == sorted(messages, key=len) and 1 < len(set(messages))
+    assert partials[-1]["done"] and partials[-1]["fields"]["core_message"] == BRIEF["core_message"]
+
+
+def test_malformed_stream_is_aborted_and_retried():
+    transport = ScriptedTransport(_sse('{"core_message": "a", "tags": ["b"}' + " filler" * 50), _sse(json.dumps(BRIEF)))
+
+    completion = _call(transport, expect_json=True)
+
+    assert json.loads(completion.choices[0].message.content) == BRIEF
+    assert len(transport.requests) == 2
+    assert transport.requests[1]["max_tokens"] == 1000
+
+
+def test_aborted_attempts_are_added_to_the_returned_usage():
+    malformed = '{"core_message": "a", "tags": ["b"}' + " filler" * 50
+    transport = ScriptedTransport(_sse(malformed), _sse(json.dumps(BRIEF)))
+
+    usage = _call(transport, expect_json=True).usage
+
+    # The aborted attempt never got its usage chunk: "brief" is 5 characters
+    # of prompt, and the reply stopped after the 5-character chunk holding "}"
+    received = (malformed.index("}") // 5 + 1) * 5
+    assert usage.prompt_tokens == 10 + 5 // 4
+    assert usage.completion_tokens == 7 + received // 4
+    assert usage.total_tokens == usage.prompt_tokens + usage.completion_tokens
+
+
+def test_runaway_stream_is_aborted_and_retried_with_capped_max_tokens():
+    transport = ScriptedTransport(_sse('{"core_message": "' + "very " * 400), _sse(json.dumps(BRIEF)))
+
+    completion = _call(transport, expect_json=True, expected_chars=200)
+
+    assert json.loads(completion.choices[0].message.content) == BRIEF
+    assert transport.requests[1]["max_tokens"] == 256
+
+
+def test_truncated_stream_is_retried_with_more_tokens_and_returned_when_retries_run_out():
+    truncated = _sse('{"core_message": "cut', finish_reason="length")
+    transport = ScriptedTransport(truncated, truncated)
+
+    completion = _call(transport, expect_json=True)
+
+    assert [r["max_tokens"] for r in transport.requests] == [1000, 1500]
+    assert completion.choices[0].finish_reason == "length"
+    assert completion.choices[0].message.content == '{"core_message": "cut'
+    # Truncated streams run to the end, so both attempts' reported usage counts
+    assert completion.usage.total_tokens == 2 * 17
+
+
+def test_runaway_attempt_is_billed_when_retries_run_out(monkeypatch):
+    monkeypatch.setenv("LLM_STREAM_MAX_RETRIES", "0")
+    transport = ScriptedTransport(_sse('{"core_message": "' + "very " * 400))
+
+    completion = _call(transport, expect_json=True, expected_chars=200)
+
+    chars = len(completion.choices[0].message.content)
+    assert completion.usage.completion_tokens == chars // 4 and chars > 800
+
+
+def test_stub_provider_streams_and_partials_reach_the_websocket():
+    client = _client(StubTransport(StubProviderSettings(latency_ms=50, latency_sigma=0)))
+    manager = ConnectionManager()
+    sent = []
+
+    class FakeSocket:
+        async def send_text(self, text):
+            sent.append(json.loads(text))
+
+    async def run():
+        manager.active_connections["run-1"] = {FakeSocket()}
+        forward = manager.partial_output_forwarder("run-1", caption_id="cap-1")
+        llm_args = {"model": "m", "messages": [{"role": "user", "content": "Write a caption"}]}
+        completion = await asyncio.to_thread(
+            create_chat_completion, client, llm_args, stream=True,
+            on_partial=lambda partial: forward({"source": "caption_writer", **partial})
+        )
+        await asyncio.sleep(0.05)
+        return completion
+
+    completion = asyncio.run(run())
+
+    assert completion.choices[0].message.content.startswith(sent[-1]["data"]["text"][:10])
+    assert all(message["type"] == WSMessageType.PARTIAL_OUTPUT for message in sent)
+    assert sent[-1]["data"]["done"] and sent[-1]["data"]["caption_id"] == "cap-1"
+    assert sent[-1]["data"]["text"] == completion.choices[0].message.content
@@ -0,0 +1,66 @@
+"""
+Tests for the event-loop watchdog.
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+from churns.core import loop_watchdog
+from churns.core.loop_watchdog import EventLoopWatchdog, describe_blocking_frame
+from churns.core.service_metrics import REGISTRY
+
+
+def _stage_function(source_name, body):
+    """Compile ``body`` as if it lived in churns/stages/{source_name}.py."""
+    namespace = {"time": time, "sys": sys}
+    code = compile(body, os.path.join(loop_watchdog._STAGES_DIR, f"{source_name}.py"), "exec")
+    exec(code, namespace)
+    return namespace
+
+
+async def _run_with_watchdog(watchdog, blocking_call):
+    watchdog.start()
+    await asyncio.sleep(watchdog.interval * 2)
+    blocking_call()
+    await asyncio.sleep(watchdog.interval * 2)
+    await watchdog.stop()
+
+
+def test_describe_blocking_frame_names_stage_and_function():
+    namespace = _stage_function("strategy", "def run_llm():\n    return sys._getframe()\n")
+    info = describe_blocking_frame(namespace["run_llm"]())
+    assert info["stage"] == "strategy"
+    assert info["function"] == "strategy.run_llm"
+    assert "run_llm" in info["stack"]
+
+
+def test_block_is_attributed_to_stage_with_stack_capture(caplog):
+    namespace = _stage_function("caption", "def create_caption():\n    time.sleep(0.25)\n")
+    def blocks():
+        labels = {"stage": "caption", "function": "caption.create_caption"}
+        return REGISTRY.get_sample_value("churns_event_loop_blocks_total", labels) or 0
+
+    before = blocks()
+    watchdog = EventLoopWatchdog(threshold_ms=80, capture_stacks=True)
+
+    asyncio.run(_run_with_watchdog(watchdog, namespace["create_caption"]))
+
+    (block,) = [b for b in watchdog.recent_blocks if b["stage"] == "caption"]
+    assert block["function"] == "caption.create_caption"
+    assert block["lag_seconds"] >= 0.08
+    assert blocks() == before + 1
+    assert any("in stage caption at caption.create_caption" in r.getMessage() for r in caplog.records)
+
+
+def test_block_without_stack_capture_is_still_counted():
+    watchdog = EventLoopWatchdog(threshold_ms=80, capture_stacks=False)
+    asyncio.run(_run_with_watchdog(watchdog, lambda: time.sleep(0.25)))
+    assert [b["function"] for b in watchdog.recent_blocks] == ["unknown"]
+
+
+def test_short_pauses_are_not_reported():
+    watchdog = EventLoopWatchdog(threshold_ms=200, capture_stacks=True)
+    asyncio.run(_run_with_watchdog(watchdog, lambda: time.sleep(0.01)))
+    assert not watchdog.recent_blocks
@@ -0,0 +1,139 @@
+"""
+Tests for the shared embedding model pool.
+"""
+
+import asyncio
+import os
+import threading
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from churns.core.model_pool import (
+    MODEL_CLIP,
+    MODEL_TEXT_SIMILARITY,
+    STATE_FAILED,
+    STATE_READY,
+    ModelPool,
+    PooledModel,
+    model_source,
+)
+
+
+class FakeModel:
+    def __init__(self, source):
+        self.source = source
+        self.calls = []
+
+    def encode(self, inputs, normalize=False):
+        self.calls.append((list(inputs), normalize))
+        return np.array([[len(str(item)), float(normalize)] for item in inputs])
+
+
+def test_concurrent_requests_share_one_encode_call():
+    release = threading.Event()
+    models = []
+
+    def loader(source):
+        release.wait(5)
+        models.append(FakeModel(source))
+        return models[-1]
+
+    model = PooledModel("text", "/models/text", loader=loader, batch_wait_ms=20)
+
+    async def run():
+        requests = [model.encode_async(["a" * n, "b"]) for n in range(1, 6)]
+        tasks = [asyncio.ensure_future(request) for request in requests]
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(run())
+
+    assert model.state == STATE_READY
+    assert len(models[0].calls) == 1 and len(models[0].calls[0][0]) == 10
+    for n, embeddings in enumerate(results, 1):
+        assert embeddings[:, 0].tolist() == [n, 1]
+
+
+def test_requests_with_different_encode_options_are_not_mixed():
+    model = PooledModel("text", "/models/text", loader=FakeModel, batch_wait_ms=50)
+    plain = model.submit(["x"])
+    normalized = model.submit(["y"], normalize=True)
+
+    assert plain.result(5)[0, 1] == 0.0
+    assert normalized.result(5)[0, 1] == 1.0
+    assert model.batches == 2
+
+
+def test_failed_load_is_reported_and_fails_requests():
+    def loader(source):
+        raise FileNotFoundError(f"Model directory not found: {source}")
+
+    pool = ModelPool(loader=loader)
+    pool.warm([MODEL_TEXT_SIMILARITY])
+    model = pool.get(MODEL_TEXT_SIMILARITY)
+
+    assert model.wait_ready(5) is False
+    assert model.state == STATE_FAILED and "not found" in model.error
+    with pytest.raises(RuntimeError, match="failed to load"):
+        model.encode(["text"])
+    # A failed model is degraded, not loading: readiness does not wait on it
+    assert pool.ready() is True
+    assert pool.status()["degraded"] == [MODEL_TEXT_SIMILARITY]
+
+
+def test_model_paths_are_absolute_and_configurable(monkeypatch, tmp_path):
+    monkeypatch.delenv("TEXT_SIMILARITY_MODEL_PATH", raising=False)
+    default = model_source(MODEL_TEXT_SIMILARITY)
+    assert os.path.isabs(default) and default.endswith(os.path.join("churns", "stages", "artifacts", "model"))
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("TEXT_SIMILARITY_MODEL_PATH", "models/minilm")
+    assert model_source(MODEL_TEXT_SIMILARITY) == str(tmp_path / "models" / "minilm")
+    monkeypatch.setenv("CLIP_MODEL_NAME", "clip-ViT-L-14")
+    assert model_source(MODEL_CLIP) == "clip-ViT-L-14"
+
+
+def test_readiness_endpoint_waits_for_warmed_models(monkeypatch):
+    from churns.api import main
+
+    release = threading.Event()
+
+    def loader(source):
+        release.wait(5)
+        return FakeModel(source)
+
+    pool = ModelPool(loader=loader)
+    monkeypatch.setattr(main, "model_pool", pool)
+    pool.warm([MODEL_CLIP])
+    client = TestClient(main.app)
+
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["models"][MODEL_CLIP]["state"] == "loading"
+
+    release.set()
+    assert pool.get(MODEL_CLIP).wait_ready(5)
+    response = client.get("/health/ready")
+    assert response.status_code == 200 and response.json()["status"] == "ready"
+    pool.shutdown()
+
+
+def test_readiness_endpoint_reports_failed_models_as_degraded(monkeypatch):
+    from churns.api import main
+
+    def loader(source):
+        raise FileNotFoundError(f"Model directory not found: {source}")
+
+    pool = ModelPool(loader=loader)
+    monkeypatch.setattr(main, "model_pool", pool)
+    pool.warm([MODEL_TEXT_SIMILARITY])
+    assert pool.get(MODEL_TEXT_SIMILARITY).wait_ready(5) is False
+
+    response = TestClient(main.app).get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "degraded"
+    assert response.json()["degraded"] == [MODEL_TEXT_SIMILARITY]
+    pool.shutdown()
@@ -0,0 +1,156 @@
+"""
+Tests for per-stage prompt cache accounting and the prefix stability report.
+"""
+
+import asyncio
+import json
+import sys
+import types
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import OpenAI
+
+from churns.api.database import STAGE_TOKEN_COLUMNS, PipelineStage
+from churns.core import prompt_cache_accounting
+from churns.core.prompt_cache_accounting import (
+    PrefixStabilityTracker,
+    observe_chat_request,
+    prefix_stability,
+    prefix_stability_report,
+    prompt_text,
+    record_stage_prompts,
+    stage_token_usage,
+    summarize_stage_token_rows,
+)
+from churns.core.service_metrics import InstrumentedTransport
+from churns.core.stub_provider import StubProviderSettings, StubTransport
+from churns.pipeline.context import PipelineContext
+from churns.pipeline.executor import PipelineExecutor
+
+SYSTEM = "You are a meticulous F&B art director. " * 200  # ~2000 tokens
+
+
+@pytest.fixture(autouse=True)
+def fresh_tracker():
+    prefix_stability.clear()
+    yield
+    prefix_stability.clear()
+
+
+def _stub_client():
+    transport = InstrumentedTransport(StubTransport(StubProviderSettings(latency_ms=0, image_latency_ms=0, latency_sigma=0)))
+    return OpenAI(api_key="stub-key", max_retries=0, http_client=httpx.Client(transport=transport))
+
+
+def test_stable_system_prompt_is_shared_and_dynamic_preamble_is_flagged():
+    tracker = PrefixStabilityTracker()
+    for subject in ("ramen", "bubble tea", "croissant"):
+        tracker.observe("stable", "gpt-4.1", f"system: {SYSTEM}\nuser: Concept for {subject}")
+        tracker.observe("unstable", "gpt-4.1", f"system: Today's subject is {subject}. {SYSTEM}")
+
+    rows = {row["stage"]: row for row in tracker.report()}
+    assert not rows["stable"]["unstable_prefix"] and rows["stable"]["shared_prefix_ratio"] > 0.99
+    assert rows["unstable"]["unstable_prefix"]
+    assert rows["unstable"]["requests"] == 3 and rows["unstable"]["compared_requests"] == 2
+    assert rows["unstable"]["last_divergence"]["offset_chars"] == len("system: Today's subject is ")
+    assert tracker.report()[0]["stage"] == "unstable"
+
+
+def test_prompt_text_compares_images_by_digest():
+    image = {"type": "image_url", "image_url": {"url": "data:image/png;base64," + "A" * 10000}}
+    payload = {"messages": [{"role": "user", "content": [{"type": "text", "text": "Assess"}, image]}]}
+
+    text = prompt_text(payload)
+    assert text.startswith("user: Assess\n[image_url:") and len(text) < 100
+
+
+def test_request_bodies_are_observed_without_their_image_payloads(monkeypatch):
+    monkeypatch.setattr(prompt_cache_accounting, "MAX_OBSERVED_BODY_BYTES", 4096)
+    image = "data:image/png;base64," + "A" * 100_000
+
+    def body(text, url=image):
+        content = [{"type": "text", "text": text}, {"type": "image_url", "image_url": {"url": url}}]
+        return json.dumps({"model": "gpt-4.1", "messages": [{"role": "user", "content": content}]}).encode()
+
+    with record_stage_prompts("image_eval"):
+        observe_chat_request("gpt-4.1", body("Assess"))
+        observe_chat_request("gpt-4.1", body("Assess", image.replace("A", "B")))
+        observe_chat_request("gpt-4.1", body("Assess " + "x" * 5000))  # Over the cap once digested
+
+    row = prefix_stability_report()[0]
+    assert row["requests"] == 2 and row["compared_requests"] == 1
+    # Different images still make the prompts diverge, at the digest
+    divergence = row["last_divergence"]
+    assert divergence["offset_chars"] > len("user: Assess") and len(divergence["current"]) < 200
+
+
+def test_only_a_bounded_prefix_of_each_prompt_is_kept(monkeypatch):
+    monkeypatch.setattr(prompt_cache_accounting, "MAX_TRACKED_PREFIX_CHARS", 100)
+    tracker = PrefixStabilityTracker()
+    prompt = "system: " + "x" * 1000
+
+    tracker.observe("stage", "gpt-4.1", prompt)
+    assert tracker.observe("stage", "gpt-4.1", prompt + " changed") == 100
+
+    assert len(tracker._stats[("stage", "gpt-4.1")].last_prompt) == 100
+    assert tracker.report()[0]["mean_prompt_tokens"] == (len(prompt) + 8) // 4
+
+
+def test_instrumented_calls_are_attributed_to_the_open_stage():
+    client = _stub_client()
+    messages = [{"role": "system", "content": SYSTEM}, {"role": "user", "content": "hi"}]
+
+    client.chat.completions.create(model="gpt-4.1", messages=messages)  # Outside any stage
+    with record_stage_prompts("style_guide") as record:
+        for _ in range(2):
+            client.chat.completions.create(model="gpt-4.1", messages=messages)
+        client.chat.completions.create(model="gpt-4.1-mini", messages=messages)
+
+    assert record.model_id == "gpt-4.1"
+    rows = {(row["stage"], row["model"]): row for row in prefix_stability_report()}
+    assert set(rows) == {("style_guide", "gpt-4.1"), ("style_guide", "gpt-4.1-mini")}
+    assert rows[("style_guide", "gpt-4.1")]["shared_prefix_ratio"] == 1.0
+
+
+def test_stage_token_usage_and_summary_split_cached_input():
+    usage = stage_token_usage([
+        {"prompt_tokens": 3000, "completion_tokens": 200, "prompt_tokens_details": {"cached_tokens": 2048}},
+        {"prompt_tokens": 1000, "completion_tokens": 100, "cached_tokens": 0},
+    ], model_id="gpt-4.1")
+    assert usage == {"model_id": "gpt-4.1", "input_tokens": 4000, "cached_input_tokens": 2048, "output_tokens": 300}
+    assert set(usage) == set(STAGE_TOKEN_COLUMNS) and set(usage) <= set(PipelineStage.model_fields)
+
+    rows = [
+        SimpleNamespace(stage_name="creative_expert", **usage),
+        SimpleNamespace(stage_name="creative_expert", model_id="gpt-4.1", input_tokens=2000, cached_input_tokens=0, output_tokens=50),
+        SimpleNamespace(stage_name="strategy", model_id=None, input_tokens=None, cached_input_tokens=None, output_tokens=None),
+    ]
+    assert summarize_stage_token_rows(rows) == [{
+        "stage": "creative_expert", "model": "gpt-4.1", "stage_runs": 2,
+        "input_tokens": 6000, "cached_input_tokens": 2048, "output_tokens": 350,
+        "uncached_input_tokens": 3952, "cache_hit_rate": 0.3413,
+    }]
+
+
+def test_executor_keeps_stage_token_usage_with_the_called_model(monkeypatch):
+    client = _stub_client()
+    stage = types.ModuleType("churns.stages.prompt_cache_probe")
+
+    async def run(ctx):
+        completion = await asyncio.to_thread(
+            client.chat.completions.create, model="gpt-4.1", messages=[{"role": "user", "content": "hi"}]
+        )
+        ctx.llm_usage["prompt_cache_probe"] = completion.usage.model_dump()
+
+    stage.run = run
+    monkeypatch.setitem(sys.modules, "churns.stages.prompt_cache_probe", stage)
+    executor = PipelineExecutor(mode="generation")
+    executor.stages = ["prompt_cache_probe"]
+
+    ctx = asyncio.run(executor.run_async(PipelineContext(run_id="prompt-cache-test")))
+
+    usage = ctx.stage_token_usage["prompt_cache_probe"]
+    assert usage["model_id"] == "gpt-4.1"
+    assert usage["input_tokens"] > 0 and usage["cached_input_tokens"] == 0
@@ -0,0 +1,123 @@
+"""
+Tests for memoized stage prompt templates and prompt-cache reporting.
+"""
+
+import pytest
+
+from churns.core.prompt_templates import (
+    PromptCache,
+    cached_prompt_tokens,
+    clear_template_cache,
+    prompt_template,
+    template_cache_stats,
+)
+from churns.core.prompt_cache_accounting import stage_token_usage
+from churns.core.service_metrics import REGISTRY, observe_stage_usage
+from churns.stages import creative_expert, style_guide
+from churns.stages.caption import _get_analyst_system_prompt
+from churns.stages.image_assessment import ImageAssessor
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    clear_template_cache()
+    yield
+    clear_template_cache()
+
+
+def _creative_expert_prompt(**overrides):
+    flags = dict(
+        creativity_level=2, task_type="1. Product Photography", use_instructor_parsing=False,
+        has_reference=False, has_instruction=False, render_text_flag=True, apply_branding_flag=True,
+        platform_name="Instagram Post (1:1 Square)", language="en"
+    )
+    flags.update(overrides)
+    return creative_expert._get_creative_expert_system_prompt(**flags)
+
+
+def test_prompt_template_builds_each_variant_once():
+    calls = []
+
+    @prompt_template("test_stage")
+    def build(level, language="en"):
+        calls.append((level, language))
+        return f"prompt {level} {language}"
+
+    assert build(1) == build(1) == "prompt 1 en"
+    assert build(1, language="zh") == "prompt 1 zh"
+    assert calls == [(1, "en"), (1, "zh")]
+    assert template_cache_stats()["test_stage"] == {"hits": 1, "builds": 2, "hit_rate": 0.3333, "variants": 2}
+
+
+def test_prompt_cache_evicts_least_recently_used_variant():
+    cache = PromptCache(max_variants=2)
+    cache.get("s", "a", lambda: "A")
+    cache.get("s", "b", lambda: "B")
+    cache.get("s", "a", lambda: "unused")
+    cache.get("s", "c", lambda: "C")
+
+    assert cache.get("s", "a", lambda: "rebuilt") == "A"
+    assert cache.get("s", "b", lambda: "rebuilt") == "rebuilt"
+
+
+def test_creative_expert_variants_share_a_long_prefix():
+    variants = [
+        _creative_expert_prompt(),
+        _creative_expert_prompt(creativity_level=3, has_reference=True, language="zh"),
+        _creative_expert_prompt(task_type="4. Menu Spotlights", render_text_flag=False),
+    ]
+
+    assert _creative_expert_prompt() is variants[0]
+    prefix = variants[0]
+    for variant in variants[1:]:
+        while not variant.startswith(prefix):
+            prefix = prefix[:-1]
+    assert "Alt Text Generation" in prefix and len(prefix) > 2000
+    assert "SIMPLIFIED CHINESE" in variants[1] and "4. Menu Spotlights" in variants[2]
+
+
+def test_creative_expert_output_format_follows_problem_model_list(monkeypatch):
+    monkeypatch.setattr(creative_expert, "CREATIVE_EXPERT_MODEL_ID", "model-x")
+    monkeypatch.setattr(creative_expert, "INSTRUCTOR_TOOL_MODE_PROBLEM_MODELS", [])
+    assert "Pydantic JSON output format" in _creative_expert_prompt(use_instructor_parsing=True)
+
+    monkeypatch.setattr(creative_expert, "INSTRUCTOR_TOOL_MODE_PROBLEM_MODELS", ["model-x"])
+    assert "JSON Structure:" in _creative_expert_prompt(use_instructor_parsing=True)
+
+
+def test_style_guider_and_analyst_keep_request_details_after_the_shared_prefix():
+    first = style_guide._get_style_guider_system_prompt(1, "1. Product Photography", 3, False)
+    second = style_guide._get_style_guider_system_prompt(3, "4. Menu Spotlights", 2, False)
+    shared = first.split("**Style Guidance (Level")[0]
+    assert second.startswith(shared) and "'4. Menu Spotlights'" not in shared
+
+    english, chinese = _get_analyst_system_prompt("en"), _get_analyst_system_prompt("zh")
+    assert chinese.startswith(english.split("**Language Consistency:**")[0])
+    assert chinese.endswith("MUST be generated in SIMPLIFIED CHINESE.")
+
+
+def test_assessment_prompt_puts_per_image_details_after_memoized_sections():
+    assessor = ImageAssessor.__new__(ImageAssessor)
+    first = assessor._create_assessment_prompt({"main_subject": "burger"}, 2, True, True, "Task A", "Instagram", False)
+    second = assessor._create_assessment_prompt({"main_subject": "noodles"}, 3, True, True, "Task B", "Pinterest", False)
+
+    shared = first.split("# ROLE & CONTEXT")[0]
+    assert second.startswith(shared) and "## 5. NOISE & GRAIN ASSESSMENT" in shared
+    assert "noodles" in second and "Task B for Pinterest" in second
+    assert template_cache_stats()["image_assessment"]["hits"] == 1
+
+
+def test_stage_usage_reports_provider_cached_tokens():
+    assert cached_prompt_tokens({"prompt_tokens_details": {"cached_tokens": 1024}}) == 1024
+    assert cached_prompt_tokens({"cached_tokens": 512}) == 512
+    assert cached_prompt_tokens({"prompt_tokens": 10}) == 0
+
+    totals = stage_token_usage([
+        {"prompt_tokens": 2000, "completion_tokens": 100, "prompt_tokens_details": {"cached_tokens": 1536}},
+        {"prompt_tokens": 500, "completion_tokens": 50, "cached_tokens": 0},
+    ])
+    observe_stage_usage("prompt_cache_test", "generation", totals)
+
+    assert (totals["input_tokens"], totals["cached_input_tokens"], totals["output_tokens"]) == (2500, 1536, 150)
+    labels = {"stage": "prompt_cache_test", "mode": "generation", "kind": "cached"}
+    assert REGISTRY.get_sample_value("churns_llm_tokens_total", labels) == 1536
@@ -0,0 +1,149 @@
+"""
+Tests for provider record/replay cassettes.
+"""
+
+import asyncio
+import json
+import threading
+
+import httpx
+import pytest
+from openai import AsyncOpenAI, NotFoundError, OpenAI, RateLimitError
+
+from churns.core.provider_cassette import (
+    LATENCY_ZERO,
+    AsyncCassetteTransport,
+    CassetteTransport,
+    ProviderCassette,
+    apply_context_snapshot,
+    cassette_path_for_run,
+    snapshot_context,
+    use_cassette,
+)
+from churns.core.stub_provider import AsyncStubTransport, StubProviderSettings, StubTransport
+from churns.models import CaptionBrief
+from churns.pipeline.context import PipelineContext
+
+
+def _client(**settings):
+    stub = StubTransport(StubProviderSettings(latency_ms=0, image_latency_ms=0, seed=3, **settings))
+    client = OpenAI(api_key="stub-key", max_retries=0, http_client=httpx.Client(transport=CassetteTransport(stub)))
+    return client, stub
+
+
+def _chat(client, text):
+    completion = client.chat.completions.create(model="m", messages=[{"role": "user", "content": text}])
+    return completion.choices[0].message.content
+
+
+@pytest.fixture
+def recording(tmp_path):
+    ctx = PipelineContext(prompt="a burger", output_directory=str(tmp_path))
+    path = cassette_path_for_run(tmp_path, "generation", ctx.run_id)
+    return ProviderCassette.start_recording(path, ctx, "generation")
+
+
+def test_recorded_calls_replay_without_reaching_provider(recording):
+    client, stub = _client()
+    with use_cassette(recording):
+        first, second = _chat(client, "one"), _chat(client, "two")
+        image = client.images.edit(model="gpt-image-1", prompt="p", image=[("in.png", b"png")], size="1536x1024")
+
+    lines = recording.path.read_text().splitlines()
+    assert json.loads(lines[0])["context"]["prompt"] == "a burger"
+    assert [json.loads(line)["endpoint"] for line in lines[1:]] == ["chat.completions", "chat.completions", "images.edit"]
+
+    replay = ProviderCassette.load(recording.path, latency=LATENCY_ZERO)
+    with use_cassette(replay):
+        # Matched by fingerprint, not by order (multipart boundaries differ per request)
+        edited = client.images.edit(model="gpt-image-1", prompt="p", image=[("in.png", b"png")], size="1536x1024")
+        assert _chat(client, "two") == second
+        assert _chat(client, "one") == first
+
+    assert edited.data[0].b64_json == image.data[0].b64_json
+    assert stub.stats["chat.completions"]["requests"] == 2
+    assert replay.replay_stats() == {"recorded": 3, "replayed": 3, "unused": 0, "misses": 0}
+
+
+def test_async_recording_appends_off_the_event_loop(recording, monkeypatch):
+    writers = []
+    record = ProviderCassette.record
+    monkeypatch.setattr(ProviderCassette, "record",
+                        lambda self, *args: (writers.append(threading.get_ident()), record(self, *args))[1])
+    stub = StubTransport(StubProviderSettings(latency_ms=0, image_latency_ms=0, seed=3))
+    client = AsyncOpenAI(api_key="stub-key", max_retries=0,
+                         http_client=httpx.AsyncClient(transport=AsyncCassetteTransport(AsyncStubTransport(stub))))
+
+    async def run():
+        with use_cassette(recording):
+            await client.chat.completions.create(model="m", messages=[{"role": "user", "content": "hi"}])
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+
+    assert writers and writers[0] != loop_thread
+    assert json.loads(recording.path.read_text().splitlines()[1])["endpoint"] == "chat.completions"
+
+
+def test_unmatched_body_falls_back_to_endpoint_order_then_misses(recording):
+    client, _ = _client()
+    with use_cassette(recording):
+        recorded = _chat(client, "prompt at 10:00")
+
+    replay = ProviderCassette.load(recording.path, latency=LATENCY_ZERO)
+    with use_cassette(replay):
+        assert _chat(client, "prompt at 10:05") == recorded
+        with pytest.raises(NotFoundError):
+            _chat(client, "one call too many")
+    assert replay.replay_stats()["misses"] == 1
+
+
+def test_failed_calls_are_recorded_and_replayed(recording):
+    client, _ = _client(rate_limit_rate=1.0)
+    with use_cassette(recording), pytest.raises(RateLimitError):
+        _chat(client, "hi")
+
+    replay = ProviderCassette.load(recording.path, latency=LATENCY_ZERO)
+    with use_cassette(replay), pytest.raises(RateLimitError):
+        _chat(client, "hi")
+
+
+def test_without_active_cassette_requests_pass_through(tmp_path):
+    client, stub = _client()
+    _chat(client, "hi")
+    assert stub.stats["chat.completions"]["requests"] == 1
+    assert not (tmp_path / "cassettes").exists()
+
+
+def test_truncated_last_line_is_ignored(recording):
+    client, _ = _client()
+    with use_cassette(recording):
+        _chat(client, "hi")
+    with open(recording.path, "a") as f:
+        f.write('{"type": "interaction", "endp')
+
+    assert len(ProviderCassette.load(recording.path).interactions) == 1
+
+
+def test_context_snapshot_round_trip():
+    brief = CaptionBrief(
+        core_message="msg", key_themes_to_include=["a"], seo_keywords=["b"], target_emotion="joy", tone_of_voice="Warm",
+        platform_optimizations={}, primary_call_to_action="Buy", hashtags=["#x"], emoji_suggestions=["x"],
+        task_type_notes=None
+    )
+    ctx = PipelineContext(prompt="p", num_variants=2, skip_stages=["strategy"], output_directory="/tmp/x")
+    ctx.cached_caption_brief = brief
+    ctx.logs.append("log line")
+
+    snapshot = json.loads(json.dumps(snapshot_context(ctx)))
+    restored = apply_context_snapshot(PipelineContext(), snapshot)
+
+    assert (restored.prompt, restored.num_variants, restored.skip_stages) == ("p", 2, ["strategy"])
+    assert restored.run_id == ctx.run_id
+    assert restored.cached_caption_brief == brief
+    assert restored.logs == [] and restored.output_directory is None
+
+
+def test_load_rejects_unknown_latency(recording):
+    with pytest.raises(ValueError):
+        ProviderCassette.load(recording.path, latency="fast")
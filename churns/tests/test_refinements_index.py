@@ -0,0 +1,145 @@
+"""
+Tests for the append-only refinements index.
+"""
+
+import json
+import threading
+
+import pytest
+
+from churns.core import refinements_index
+from churns.core.refinements_index import (
+    LOG_FILENAME,
+    SNAPSHOT_FILENAME,
+    append_refinement,
+    compact_refinements,
+    get_refinement_entry,
+    read_refinements,
+)
+
+
+@pytest.fixture
+def run_dir(tmp_path):
+    refinements_index._cache.clear()
+    return tmp_path / "run-1"
+
+
+def _entry(job_id, cost=0.04):
+    return {"job_id": job_id, "parent_run_id": "run-1", "cost_usd": cost, "image_path": f"refinements/{job_id}/output.png"}
+
+
+def test_append_is_one_line_per_refinement(run_dir):
+    append_refinement(run_dir, _entry("job-1"))
+    append_refinement(run_dir, _entry("job-2", cost=None))
+
+    lines = (run_dir / LOG_FILENAME).read_text().splitlines()
+    assert [json.loads(line)["job_id"] for line in lines] == ["job-1", "job-2"]
+
+    index = read_refinements(run_dir)
+    assert index.total_refinements == 2
+    assert index.total_cost == pytest.approx(0.04)
+    assert get_refinement_entry(run_dir, "job-2")["image_path"] == "refinements/job-2/output.png"
+
+
+def test_reader_only_parses_new_lines(run_dir, monkeypatch):
+    append_refinement(run_dir, _entry("job-1"))
+    read_refinements(run_dir)
+
+    parsed = []
+    original_loads = refinements_index.json.loads
+    monkeypatch.setattr(refinements_index.json, "loads", lambda line: parsed.append(line) or original_loads(line))
+
+    append_refinement(run_dir, _entry("job-2"))
+    assert read_refinements(run_dir).total_refinements == 2
+    assert len(parsed) == 1
+
+
+def test_partial_trailing_line_is_deferred(run_dir):
+    append_refinement(run_dir, _entry("job-1"))
+    with open(run_dir / LOG_FILENAME, "a") as f:
+        f.write('{"job_id": "job-2"')
+
+    assert read_refinements(run_dir).total_refinements == 1
+
+    with open(run_dir / LOG_FILENAME, "a") as f:
+        f.write(', "cost_usd": 0.01}\n')
+    assert get_refinement_entry(run_dir, "job-2") is not None
+
+
+def test_concurrent_appends_do_not_lose_entries(run_dir):
+    threads = [
+        threading.Thread(target=append_refinement, args=(run_dir, _entry(f"job-{i}")))
+        for i in range(40)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    refinements_index._cache.clear()
+    assert read_refinements(run_dir).total_refinements == 40
+
+
+def test_compaction_writes_snapshot_and_reader_resumes_from_offset(run_dir, monkeypatch):
+    monkeypatch.setattr(refinements_index, "COMPACT_EVERY", 3)
+    for i in range(3):
+        append_refinement(run_dir, _entry(f"job-{i}"))
+
+    snapshot = json.loads((run_dir / SNAPSHOT_FILENAME).read_text())
+    assert snapshot["total_refinements"] == 3
+    assert snapshot["log_offset"] == 0
+    assert (run_dir / LOG_FILENAME).stat().st_size == 0
+
+    append_refinement(run_dir, _entry("job-3"))
+    refinements_index._cache.clear()
+    index = read_refinements(run_dir)
+    assert [e["job_id"] for e in index.entries] == ["job-0", "job-1", "job-2", "job-3"]
+    assert index.pending_compaction == 1
+
+    compact_refinements(run_dir)
+    assert json.loads((run_dir / SNAPSHOT_FILENAME).read_text())["total_refinements"] == 4
+    assert (run_dir / LOG_FILENAME).read_bytes() == b""
+
+
+def test_cached_reader_follows_truncation_and_new_appends(run_dir):
+    for i in range(3):
+        append_refinement(run_dir, _entry(f"job-{i}"))
+    assert read_refinements(run_dir).total_refinements == 3
+    stale_cache = dict(refinements_index._cache)
+
+    # Another worker compacts and appends past the old log offset
+    compact_refinements(run_dir)
+    for i in range(3, 8):
+        append_refinement(run_dir, _entry(f"job-{i}"))
+    refinements_index._cache.update(stale_cache)
+
+    index = read_refinements(run_dir)
+    assert [e["job_id"] for e in index.entries] == [f"job-{i}" for i in range(8)]
+
+
+def test_log_left_behind_by_interrupted_compaction_is_not_double_counted(run_dir):
+    for i in range(3):
+        append_refinement(run_dir, _entry(f"job-{i}"))
+    log = (run_dir / LOG_FILENAME).read_bytes()
+    compact_refinements(run_dir)
+    # Crash after the snapshot was written but before the log was truncated
+    (run_dir / LOG_FILENAME).write_bytes(log)
+
+    refinements_index._cache.clear()
+    index = read_refinements(run_dir)
+    assert index.total_refinements == 3
+    assert index.total_cost == pytest.approx(0.12)
+
+
+def test_legacy_snapshot_without_log_is_read(run_dir):
+    run_dir.mkdir(parents=True)
+    (run_dir / SNAPSHOT_FILENAME).write_text(json.dumps({
+        "refinements": [_entry("old-job", cost=0.1)],
+        "total_cost": 0.1,
+        "total_refinements": 1,
+    }))
+
+    append_refinement(run_dir, _entry("new-job"))
+    index = read_refinements(run_dir)
+    assert [e["job_id"] for e in index.entries] == ["old-job", "new-job"]
+    assert index.total_cost == pytest.approx(0.14)
@@ -0,0 +1,131 @@
+"""
+Tests for sectioned run metadata storage.
+"""
+
+import json
+
+import pytest
+
+from churns.core import run_metadata
+from churns.core.run_metadata import (
+    LEGACY_METADATA_FILENAME,
+    has_run_metadata,
+    load_run_metadata,
+    migrate_run_metadata,
+    run_metadata_path,
+    split_metadata,
+    write_run_metadata,
+)
+
+DOCUMENT = {
+    "user_inputs": {"platform_name": "Instagram Post (1:1 Square)", "prompt": "Matcha latte ☕"},
+    "pipeline_settings": {"run_timestamp": "2026-01-02T03:04:05", "creativity_level": 2},
+    "request_details": {"task_type": "2. Promotional Graphics & Announcements"},
+    "processing_context": {
+        "image_analysis_result": {"main_subject": "Latte"},
+        "suggested_marketing_strategies": [{"target_audience": "Students"}],
+        "style_guidance_sets": [{"style_keywords": ["warm"]}],
+        "generated_image_prompts": [{"visual_concept": {"main_subject": "Latte"}}],
+        "final_assembled_prompts": [{"index": 0, "prompt": "A latte"}],
+        "generated_image_results": [{"index": 0, "status": "success", "result_path": "image_0.png"}],
+        "image_assessment": [{"image_index": 0, "general_score": 4.5}],
+        "llm_call_usage": {"creative_expert": {"total_tokens": 3932}},
+        "cost_summary": {"total_pipeline_cost_usd": 0.0984},
+        "unknown_stage_output": {"kept": True},
+    },
+}
+
+
+@pytest.fixture(params=["none", "zstd"])
+def compression(request):
+    if request.param == "zstd":
+        pytest.importorskip("zstandard")
+    return request.param
+
+
+def test_sections_merge_back_into_the_document(tmp_path, compression):
+    path = write_run_metadata(tmp_path, DOCUMENT, compression=compression)
+
+    assert path == run_metadata_path(tmp_path) == run_metadata_path(path)
+    assert [p.name for p in tmp_path.iterdir()] == [path.name]
+    assert load_run_metadata(tmp_path) == DOCUMENT
+    assert load_run_metadata(path) == DOCUMENT
+    assert load_run_metadata(str(path)) == DOCUMENT
+
+
+def test_selected_sections_hold_only_their_keys(tmp_path, compression):
+    write_run_metadata(tmp_path, DOCUMENT, compression=compression)
+
+    concepts = load_run_metadata(tmp_path, ["concepts"])
+    assert concepts == {"processing_context": {
+        "generated_image_prompts": DOCUMENT["processing_context"]["generated_image_prompts"],
+        "final_assembled_prompts": DOCUMENT["processing_context"]["final_assembled_prompts"],
+    }}
+
+    settings = load_run_metadata(tmp_path, ["settings", "costs"])
+    assert set(settings) == {"user_inputs", "pipeline_settings", "request_details", "processing_context"}
+    assert set(settings["processing_context"]) == {"cost_summary"}
+    assert load_run_metadata(tmp_path, ["usage"])["processing_context"] == {
+        "llm_call_usage": DOCUMENT["processing_context"]["llm_call_usage"]
+    }
+
+    with pytest.raises(ValueError):
+        load_run_metadata(tmp_path, ["everything"])
+
+
+def test_unmapped_stage_output_is_kept_with_the_results():
+    sections = split_metadata(DOCUMENT)
+
+    assert "unknown_stage_output" in sections["results"]["processing_context"]
+    assert sections["settings"]["user_inputs"] == DOCUMENT["user_inputs"]
+
+
+def test_header_locates_each_section(tmp_path):
+    path = write_run_metadata(tmp_path, {**DOCUMENT, "processing_context": {}}, compression="none")
+
+    header_line, payload = path.read_bytes().split(b"\n", 1)
+    header = json.loads(header_line)
+    assert header["format"] == run_metadata.METADATA_FORMAT and header["compression"] is None
+    # Empty sections are not written
+    assert list(header["sections"]) == ["settings"]
+    offset, length = header["sections"]["settings"]
+    assert json.loads(payload[offset:offset + length])["user_inputs"] == DOCUMENT["user_inputs"]
+
+    path.write_bytes(path.read_bytes().replace(b'"format":2', b'"format":9', 1))
+    with pytest.raises(ValueError):
+        load_run_metadata(tmp_path)
+
+
+def test_compression_falls_back_without_zstandard(tmp_path, monkeypatch):
+    monkeypatch.setattr(run_metadata, "zstandard", None)
+
+    path = write_run_metadata(tmp_path, DOCUMENT, compression="zstd")
+
+    assert json.loads(path.read_bytes().split(b"\n", 1)[0])["compression"] is None
+    assert load_run_metadata(tmp_path) == DOCUMENT
+
+
+def test_legacy_metadata_is_read_whole(tmp_path):
+    legacy_path = tmp_path / LEGACY_METADATA_FILENAME
+    legacy_path.write_text(json.dumps(DOCUMENT, indent=2))
+
+    assert has_run_metadata(legacy_path)
+    assert load_run_metadata(legacy_path, ["concepts"]) == DOCUMENT
+    with pytest.raises(FileNotFoundError):
+        load_run_metadata(tmp_path / "missing_run")
+    assert not has_run_metadata(tmp_path / "missing_run")
+
+
+def test_migration_replaces_the_legacy_file(tmp_path, compression):
+    legacy_path = tmp_path / LEGACY_METADATA_FILENAME
+    legacy_path.write_text(json.dumps(DOCUMENT, indent=2))
+    legacy_bytes = legacy_path.stat().st_size
+
+    result = migrate_run_metadata(tmp_path, compression=compression)
+
+    assert result["legacy_bytes"] == legacy_bytes and result["sectioned_bytes"] > 0
+    assert result["metadata_path"] == str(run_metadata_path(tmp_path))
+    assert not legacy_path.exists()
+    # The path stored for the run before migrating still resolves
+    assert load_run_metadata(legacy_path) == DOCUMENT
+    assert migrate_run_metadata(tmp_path) is None
@@ -0,0 +1,130 @@
+"""
+Tests for on-demand per-run profiling.
+"""
+
+import asyncio
+import pstats
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from churns.core.run_profiler import DeterministicProfiler, ProfilerControl, profiled_run, profiler_control
+from churns.core.tracing import configure_tracing, start_trace
+
+
+@pytest.fixture(autouse=True)
+def no_trace_export():
+    configure_tracing([])
+    yield
+    configure_tracing(None)
+    profiler_control.disarm()
+
+
+def _busy_json_repair(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(i * i for i in range(1000))
+
+
+def test_claims_follow_kind_target_and_count():
+    control = ProfilerControl()
+    control.arm(kind="caption", count=2)
+    control.arm(target_id="run-7")
+
+    assert control._claim("generation", "run-1") is None
+    assert control._claim("generation", "run-7")["target_id"] == "run-7"
+    # One profiled job at a time
+    assert control._claim("caption", "cap-1") is None
+    control._finish({"job_id": "run-7"})
+
+    assert control._claim("caption", "cap-1")["kind"] == "caption"
+    control._finish({"job_id": "cap-1"})
+    assert control._claim("caption", "cap-2") is not None
+    control._finish({"job_id": "cap-2"})
+    assert control.status()["armed"] == []
+    assert [entry["job_id"] for entry in control.status()["recent"]] == ["cap-2", "cap-1", "run-7"]
+
+
+def test_rejects_unknown_kind_and_mode():
+    control = ProfilerControl()
+    with pytest.raises(ValueError):
+        control.arm(kind="batch")
+    with pytest.raises(ValueError):
+        control.arm(mode="perf")
+
+
+def test_sampled_profile_is_written_into_run_directory(tmp_path):
+    @profiled_run("generation", "run_id")
+    async def execute(run_id):
+        await asyncio.to_thread(_busy_json_repair, 0.3)
+        return "done"
+
+    async def run():
+        with start_trace("run.generation", output_directory=str(tmp_path)):
+            return await execute("run-1")
+
+    profiler_control.arm(kind="generation", interval_ms=2)
+    assert asyncio.run(run()) == "done"
+
+    (entry,) = profiler_control.status()["recent"][:1]
+    assert entry["job_id"] == "run-1" and entry["mode"] == "sample"
+    (path,) = (tmp_path / "profiles").glob("generation_run-1_*.folded")
+    assert entry["path"] == str(path)
+
+    lines = path.read_text().splitlines()
+    busy = [line for line in lines if "_busy_json_repair" in line]
+    assert busy and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in busy) >= 10
+    # Idle waits (the event loop's selector) are dropped
+    assert not any(line.split(" ")[-2].startswith("select (selectors.py") for line in lines)
+
+
+def test_unarmed_jobs_are_not_profiled(tmp_path):
+    @profiled_run("caption", "caption_id")
+    async def execute(caption_id):
+        return caption_id
+
+    with start_trace("run.caption", output_directory=str(tmp_path)):
+        assert asyncio.run(execute("cap-1")) == "cap-1"
+    assert not (tmp_path / "profiles").exists()
+
+
+def test_cprofile_mode_writes_pstats_off_the_event_loop(tmp_path, monkeypatch):
+    writers = []
+    write = DeterministicProfiler.write
+    monkeypatch.setattr(DeterministicProfiler, "write",
+                        lambda self, path: (writers.append(threading.get_ident()), write(self, path)))
+
+    @profiled_run("refinement", "job_id")
+    async def execute(job_id):
+        _busy_json_repair(0.05)
+
+    async def run():
+        with start_trace("run.refinement", output_directory=str(tmp_path)):
+            await execute(job_id="job-1")
+        return threading.get_ident()
+
+    profiler_control.arm(kind="refinement", mode="cprofile")
+    loop_thread = asyncio.run(run())
+
+    (path,) = (tmp_path / "profiles").glob("refinement_job-1_*.prof")
+    functions = {func[2] for func in pstats.Stats(str(path)).stats}
+    assert "_busy_json_repair" in functions
+    assert writers and writers[0] != loop_thread
+
+
+def test_admin_endpoints_require_profiling_enabled(monkeypatch):
+    from churns.api.main import app
+
+    client = TestClient(app)
+    monkeypatch.delenv("PROFILING_ENABLED", raising=False)
+    assert client.post("/api/v1/admin/profiling", json={}).status_code == 403
+
+    monkeypatch.setenv("PROFILING_ENABLED", "true")
+    response = client.post("/api/v1/admin/profiling", json={"kind": "caption", "count": 2})
+    assert response.status_code == 200
+    assert response.json()["armed"][0]["kind"] == "caption"
+    assert client.post("/api/v1/admin/profiling", json={"mode": "perf"}).status_code == 422
+    assert client.delete("/api/v1/admin/profiling").json()["armed"] == []
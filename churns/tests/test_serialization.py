@@ -0,0 +1,103 @@
+"""
+Tests for the shared JSON serialization helpers.
+"""
+
+import datetime
+import json
+from enum import Enum
+from pathlib import Path
+
+import numpy as np
+import pytest
+from pydantic import BaseModel
+
+from churns.api.schemas import StageProgressUpdate
+from churns.api.database import StageStatus
+from churns.core import serialization
+from churns.core.serialization import dumps, dumps_str, loads, read_json_file, to_jsonable, write_json_file
+
+
+class Tone(str, Enum):
+    WARM = "warm"
+
+
+class Concept(BaseModel):
+    subject: str
+    created_at: datetime.datetime
+
+
+VALUE = {
+    "concept": Concept(subject="Matcha latte ☕", created_at=datetime.datetime(2026, 1, 2, 3, 4, 5, 678000)),
+    "tone": Tone.WARM,
+    "day": datetime.date(2026, 1, 2),
+    "score": np.float32(0.5),
+    "count": np.int64(3),
+    "embedding": np.arange(3),
+    "tags": {"coffee"},
+    "path": Path("data/runs/abc"),
+    7: "int key",
+}
+EXPECTED = {
+    "concept": {"subject": "Matcha latte ☕", "created_at": "2026-01-02T03:04:05.678000"},
+    "tone": "warm",
+    "day": "2026-01-02",
+    "score": 0.5,
+    "count": 3,
+    "embedding": [0, 1, 2],
+    "tags": ["coffee"],
+    "path": "data/runs/abc",
+    "7": "int key",
+}
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def backend(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(serialization, "orjson", None)
+    elif serialization.orjson is None:
+        pytest.skip("orjson not installed")
+    return request.param
+
+
+def test_both_backends_encode_extended_types_the_same(backend):
+    assert loads(dumps(VALUE)) == EXPECTED
+    assert to_jsonable(VALUE) == EXPECTED
+    assert json.loads(dumps_str(VALUE, indent=True)) == EXPECTED
+
+
+def test_unknown_values_fall_back_to_str(backend):
+    class Opaque:
+        def __str__(self):
+            return "opaque"
+
+    assert loads(dumps({"value": Opaque(), "big": 2 ** 70})) == {"value": "opaque", "big": 2 ** 70}
+
+
+def test_stdlib_files_with_nan_still_load(backend, tmp_path):
+    path = tmp_path / "pipeline_metadata.json"
+    path.write_text('{"score": NaN}')
+
+    assert np.isnan(read_json_file(path)["score"])
+    with pytest.raises(ValueError):
+        loads("{truncated")
+
+
+def test_metadata_files_are_written_atomically_as_utf8(backend, tmp_path):
+    path = tmp_path / "runs" / "pipeline_metadata.json"
+
+    size = write_json_file({"caption": "春日限定", "results": [1, 2]}, path)
+
+    assert size == path.stat().st_size
+    assert '"春日限定"' in path.read_text(encoding="utf-8")
+    assert read_json_file(path) == {"caption": "春日限定", "results": [1, 2]}
+    assert not [p for p in path.parent.iterdir() if p.name.endswith(".part")]
+
+
+def test_stage_update_encodes_like_pydantic(backend):
+    update = StageProgressUpdate(
+        stage_name="creative_expert", stage_order=4, status=StageStatus.COMPLETED,
+        started_at=datetime.datetime(2026, 1, 2, 3, 4, 5), message="Done",
+        output_data={"concepts": [{"main_subject": "Latte"}]}
+    )
+
+    assert loads(dumps(dict(update))) == json.loads(update.model_dump_json())
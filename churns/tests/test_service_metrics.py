@@ -0,0 +1,152 @@
+"""
+Tests for the Prometheus metrics registry, provider call instrumentation and /metrics.
+"""
+
+import asyncio
+import time
+
+import httpx
+from fastapi.testclient import TestClient
+from openai import OpenAI
+from prometheus_client import CollectorRegistry, generate_latest
+
+from churns.core.prompt_cache_accounting import stage_token_usage
+from churns.core.service_metrics import (
+    REGISTRY,
+    AsyncInstrumentedTransport,
+    FunctionGauge,
+    InstrumentedTransport,
+    observe_stage_usage,
+)
+from churns.core.stage_resources import StageResourceMeter
+from churns.core.stub_provider import StubProviderSettings, StubTransport
+
+BODY_DELAY_SECONDS = 0.2
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def _latency_count(**labels):
+    return _sample("churns_provider_request_duration_seconds_count", **labels)
+
+
+def _latency_sum(**labels):
+    return _sample("churns_provider_request_duration_seconds_sum", **labels)
+
+
+class _SlowBody(httpx.SyncByteStream):
+    def __iter__(self):
+        yield b'{"ok": '
+        time.sleep(BODY_DELAY_SECONDS)
+        yield b"true}"
+
+
+class _AsyncSlowBody(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        yield b'{"ok": '
+        await asyncio.sleep(BODY_DELAY_SECONDS)
+        yield b"true}"
+
+
+class _SlowBodyTransport(httpx.BaseTransport):
+    """Answers headers at once and trickles the body."""
+
+    def handle_request(self, request):
+        return httpx.Response(200, stream=_SlowBody())
+
+
+class _AsyncSlowBodyTransport(httpx.AsyncBaseTransport):
+    async def handle_async_request(self, request):
+        return httpx.Response(200, stream=_AsyncSlowBody())
+
+
+def test_function_gauge_is_evaluated_at_scrape_time():
+    registry = CollectorRegistry()
+    gauge = FunctionGauge("runs_queued", "Queued.", ["mode"], registry=registry)
+    queued = {"generation": 2}
+    gauge.set_function(lambda: {(mode,): count for mode, count in queued.items()})
+
+    assert registry.get_sample_value("runs_queued", {"mode": "generation"}) == 2
+    queued["caption"] = 1
+    assert 'runs_queued{mode="caption"} 1.0' in generate_latest(registry).decode()
+
+
+def test_function_gauge_survives_a_failing_function():
+    registry = CollectorRegistry()
+    gauge = FunctionGauge("runs_queued", "Queued.", ["mode"], registry=registry)
+    gauge.set_function(lambda: 1 / 0)
+
+    assert "# TYPE runs_queued gauge" in generate_latest(registry).decode()
+
+
+def test_instrumented_transport_labels_provider_and_model():
+    transport = InstrumentedTransport(StubTransport(StubProviderSettings(latency_ms=0, image_latency_ms=0)))
+    client = OpenAI(api_key="stub-key", max_retries=0, http_client=httpx.Client(transport=transport))
+    labels = dict(provider="openai", model="gpt-4.1-metrics-test", endpoint="chat.completions", status="200")
+    before = _latency_count(**labels)
+
+    client.chat.completions.create(model="gpt-4.1-metrics-test", messages=[{"role": "user", "content": "hi"}])
+    assert _latency_count(**labels) == before + 1
+
+
+def test_provider_latency_includes_the_response_body():
+    labels = dict(provider="openai", model="slow-body-test", endpoint="chat.completions", status="200")
+    before = _latency_sum(**labels)
+    client = httpx.Client(transport=InstrumentedTransport(_SlowBodyTransport()))
+
+    with StageResourceMeter() as meter:
+        response = client.post("https://api.openai.com/v1/chat/completions", json={"model": "slow-body-test"})
+    assert response.json() == {"ok": True}
+
+    assert _latency_sum(**labels) - before >= BODY_DELAY_SECONDS
+    assert meter.stop()["provider_wait_seconds"] >= BODY_DELAY_SECONDS
+
+
+def test_async_provider_latency_ends_when_the_stream_closes():
+    labels = dict(provider="openai", model="slow-stream-test", endpoint="chat.completions", status="200")
+    before = _latency_count(**labels), _latency_sum(**labels)
+
+    async def call():
+        async with httpx.AsyncClient(transport=AsyncInstrumentedTransport(_AsyncSlowBodyTransport())) as client:
+            async with client.stream(
+                "POST", "https://api.openai.com/v1/chat/completions", json={"model": "slow-stream-test"}
+            ) as response:
+                # Headers are in, the body is still streaming
+                assert _latency_count(**labels) == before[0]
+                await response.aread()
+        assert _latency_count(**labels) == before[0] + 1
+
+    asyncio.run(call())
+    assert _latency_sum(**labels) - before[1] >= BODY_DELAY_SECONDS
+
+
+def test_observe_stage_usage_counts_prompt_and_completion_tokens():
+    def tokens(kind):
+        return _sample("churns_llm_tokens_total", stage="metrics_test", mode="generation", kind=kind)
+
+    before = (tokens("prompt"), tokens("completion"))
+
+    observe_stage_usage("metrics_test", "generation", stage_token_usage([
+        {"prompt_tokens": 100, "completion_tokens": 20},
+        {"prompt_tokens": 5, "completion_tokens": None},
+        None,
+    ]))
+    assert (tokens("prompt") - before[0], tokens("completion") - before[1]) == (105, 20)
+
+
+def test_metrics_endpoint_serves_text_format():
+    from churns.api.main import app
+
+    client = TestClient(app)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+    openmetrics = client.get("/metrics", headers={"Accept": "application/openmetrics-text; version=1.0.0"})
+    assert openmetrics.headers["content-type"].startswith("application/openmetrics-text")
+    assert openmetrics.text.endswith("# EOF\n")
+    for name in ("churns_stage_duration_seconds", "churns_provider_request_duration_seconds",
+                 "churns_runs_queued", "churns_websocket_connections", "churns_event_loop_lag_seconds"):
+        assert f"# TYPE {name} " in response.text
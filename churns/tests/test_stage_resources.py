@@ -0,0 +1,104 @@
+"""
+Tests for per-stage resource accounting.
+"""
+
+import asyncio
+import sys
+import threading
+import types
+
+import httpx
+from openai import OpenAI
+
+from churns.api.database import STAGE_RESOURCE_COLUMNS, PipelineStage
+from churns.api.schemas import StageProgressUpdate
+from churns.core.service_metrics import InstrumentedTransport
+from churns.core.stage_resources import ProviderWaitTracker, StageResourceMeter, provider_wait
+from churns.core.stub_provider import StubProviderSettings, StubTransport
+from churns.pipeline.context import PipelineContext
+from churns.pipeline.executor import PipelineExecutor
+
+
+def _stub_client(latency_ms):
+    transport = InstrumentedTransport(StubTransport(StubProviderSettings(latency_ms=latency_ms, image_latency_ms=0, latency_sigma=0)))
+    return OpenAI(api_key="stub-key", max_retries=0, http_client=httpx.Client(transport=transport))
+
+
+def test_meter_splits_provider_wait_from_local_compute():
+    client = _stub_client(latency_ms=100)
+
+    async def stage():
+        await asyncio.to_thread(
+            client.chat.completions.create, model="gpt-4.1", messages=[{"role": "user", "content": "hi"}]
+        )
+        sum(i * i for i in range(200_000))
+
+    async def run():
+        with StageResourceMeter() as meter:
+            await stage()
+        return meter.stop()
+
+    usage = asyncio.run(run())
+    assert usage["provider_wait_seconds"] >= 0.1
+    assert usage["local_compute_seconds"] > 0
+    assert usage["cpu_seconds"] > 0
+    assert set(usage) == set(STAGE_RESOURCE_COLUMNS)
+
+
+def test_parallel_provider_calls_are_not_double_counted():
+    tracker = ProviderWaitTracker()
+    barrier = threading.Barrier(3)
+
+    def call():
+        tracker.enter()
+        barrier.wait()
+        threading.Event().wait(0.1)
+        tracker.exit()
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert 0.1 <= tracker.total_seconds() < 0.25
+
+
+def test_provider_wait_outside_a_stage_is_ignored():
+    with provider_wait():
+        pass
+    with StageResourceMeter() as meter:
+        pass
+    assert meter.stop()["provider_wait_seconds"] == 0
+
+
+def test_meter_records_peak_memory_of_released_allocations():
+    with StageResourceMeter() as meter:
+        block = bytearray(64 * 1024 * 1024)
+        block[::4096] = b"x" * len(block[::4096])
+        threading.Event().wait(0.15)
+        del block
+    assert meter.stop()["peak_memory_delta_bytes"] >= 32 * 1024 * 1024
+
+
+def test_executor_stores_stage_resources_and_reports_them(monkeypatch):
+    stage = types.ModuleType("churns.stages.resource_probe")
+
+    async def run(ctx):
+        ctx.log("probing")
+
+    stage.run = run
+    monkeypatch.setitem(sys.modules, "churns.stages.resource_probe", stage)
+    executor = PipelineExecutor(mode="generation")
+    executor.stages = ["resource_probe"]
+    updates = []
+
+    async def progress_callback(*args):
+        updates.append(args)
+
+    ctx = asyncio.run(executor.run_async(PipelineContext(run_id="resources-test"), progress_callback))
+
+    usage = ctx.stage_resources["resource_probe"]
+    assert usage["provider_wait_seconds"] == 0
+    assert usage["local_compute_seconds"] >= 0
+    # Every accounted value has a column and a field in the /runs/{id} stage payload
+    assert set(usage) <= set(PipelineStage.model_fields) & set(StageProgressUpdate.model_fields)
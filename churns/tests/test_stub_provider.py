@@ -0,0 +1,100 @@
+"""
+Tests for the offline stub provider used for load testing.
+"""
+
+import base64
+import io
+
+import httpx
+import pytest
+from openai import OpenAI, RateLimitError
+from PIL import Image
+
+from churns.core.stub_provider import (
+    StubProviderSettings,
+    StubTransport,
+    generate_from_schema,
+)
+from churns.models import (
+    CaptionBrief,
+    ImageAssessmentResult,
+    ImageGenerationPrompt,
+    RelevantNicheList,
+    StyleGuidanceList,
+)
+
+
+def _client(**settings):
+    transport = StubTransport(StubProviderSettings(latency_ms=0, image_latency_ms=0, seed=7, **settings))
+    client = OpenAI(api_key="stub-key", max_retries=0, http_client=httpx.Client(transport=transport))
+    return client, transport
+
+
+@pytest.mark.parametrize("model", [RelevantNicheList, ImageGenerationPrompt, CaptionBrief, ImageAssessmentResult])
+def test_generated_payloads_validate_against_stage_models(model):
+    payload = generate_from_schema(model.model_json_schema())
+    assert model.model_validate(payload)
+
+
+def test_tool_call_reply_matches_requested_schema():
+    client, _ = _client()
+    schema = RelevantNicheList.model_json_schema()
+    completion = client.chat.completions.create(
+        model="openai/gpt-4.1",
+        messages=[{"role": "user", "content": "Identify niches"}],
+        tools=[{"type": "function", "function": {"name": "RelevantNicheList", "parameters": schema}}],
+    )
+
+    arguments = completion.choices[0].message.tool_calls[0].function.arguments
+    assert RelevantNicheList.model_validate_json(arguments).relevant_niches
+    assert completion.usage.total_tokens > 0
+
+
+def test_manual_json_reply_uses_model_named_in_prompt():
+    client, _ = _client()
+    completion = client.chat.completions.create(
+        model="openai/gpt-4.1",
+        messages=[{"role": "system", "content": "Output ONLY the JSON object matching the Pydantic `CaptionBrief` model."}],
+    )
+    assert CaptionBrief.model_validate_json(completion.choices[0].message.content)
+
+
+def test_manual_json_reply_matches_fields_quoted_in_prompt():
+    client, _ = _client()
+    prompt = (
+        "Format your entire response only as a JSON object with a single key 'style_guidance_sets'. "
+        "Each object has 'style_keywords', 'style_description', 'marketing_impact' and 'source_strategy_index'."
+    )
+    completion = client.chat.completions.create(model="m", messages=[{"role": "system", "content": prompt}])
+    assert StyleGuidanceList.model_validate_json(completion.choices[0].message.content).style_guidance_sets
+
+
+def test_image_endpoints_return_png_of_requested_size():
+    client, transport = _client()
+    response = client.images.generate(model="gpt-image-1", prompt="burger", size="1024x1536")
+    image = Image.open(io.BytesIO(base64.b64decode(response.data[0].b64_json)))
+    assert image.size == (1024, 1536)
+
+    edited = client.images.edit(model="gpt-image-1", prompt="burger", image=[("in.png", b"png")], size="1536x1024")
+    assert Image.open(io.BytesIO(base64.b64decode(edited.data[0].b64_json))).size == (1536, 1024)
+    assert transport.stats["images.edit"]["requests"] == 1
+
+
+def test_rate_limit_rate_returns_429():
+    client, transport = _client(rate_limit_rate=1.0)
+    with pytest.raises(RateLimitError):
+        client.chat.completions.create(model="m", messages=[{"role": "user", "content": "hi"}])
+    assert transport.stats["chat.completions"]["rate_limited"] == 1
+
+
+def test_gemini_generate_content_returns_inline_image():
+    transport = StubTransport(StubProviderSettings(latency_ms=0, image_latency_ms=0))
+    with httpx.Client(transport=transport) as http:
+        response = http.post(
+            "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-image:generateContent",
+            json={"contents": [{"parts": [{"text": "burger"}]}]},
+        )
+
+    part = response.json()["candidates"][0]["content"]["parts"][0]
+    assert part["inlineData"]["mimeType"] == "image/png"
+    assert Image.open(io.BytesIO(base64.b64decode(part["inlineData"]["data"]))).format == "PNG"
@@ -0,0 +1,184 @@
+"""
+Tests for run tracing spans and exporters.
+"""
+
+import asyncio
+import json
+import threading
+
+import httpx
+import pytest
+from openai import OpenAI
+from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import SpanKind, StatusCode, format_span_id, format_trace_id
+
+from churns.api.websocket import WebSocketMessage, WSMessageType
+from churns.core.json_parser import RobustJSONParser
+from churns.core.service_metrics import InstrumentedTransport
+from churns.core.stub_provider import StubProviderSettings, StubTransport
+from churns.core.tracing import (
+    NOOP_SPAN,
+    ChromeTraceExporter,
+    configure_tracing,
+    current_trace_id,
+    processors_from_env,
+    set_span_error,
+    start_span,
+    start_trace,
+    trace_output_directory,
+    traced_run,
+)
+
+
+@pytest.fixture
+def exporter():
+    memory = InMemorySpanExporter()
+    configure_tracing([SimpleSpanProcessor(memory)])
+    yield memory
+    configure_tracing(None)
+
+
+def _by_name(exporter):
+    return {span.name: span for span in exporter.get_finished_spans()}
+
+
+def test_spans_nest_across_tasks_and_threads(exporter):
+    def provider_call():
+        with start_span("provider.call"):
+            return current_trace_id()
+
+    async def stage():
+        with start_span("stage.strategy"):
+            return await asyncio.to_thread(provider_call)
+
+    async def run():
+        with start_trace("run.generation", run_id="r1") as root:
+            thread_trace_id = await asyncio.create_task(stage())
+        return root, thread_trace_id
+
+    root, thread_trace_id = asyncio.run(run())
+
+    spans = _by_name(exporter)
+    assert thread_trace_id == format_trace_id(root.get_span_context().trace_id)
+    assert spans["run.generation"].parent is None
+    assert spans["stage.strategy"].parent.span_id == root.get_span_context().span_id
+    assert spans["provider.call"].parent.span_id == spans["stage.strategy"].context.span_id
+    assert spans["provider.call"].kind is SpanKind.CLIENT
+    assert spans["run.generation"].attributes["run_id"] == "r1"
+
+
+def test_nested_start_trace_joins_the_outer_trace(exporter):
+    with start_trace("run.generation"):
+        with start_trace("pipeline.run", output_directory="/tmp/run-dir"):
+            pass
+        assert trace_output_directory() == "/tmp/run-dir"
+    assert [span.name for span in exporter.get_finished_spans()] == ["pipeline.run", "run.generation"]
+    assert len({span.context.trace_id for span in exporter.get_finished_spans()}) == 1
+
+
+def test_start_span_outside_trace_is_noop(exporter):
+    with start_span("file.write") as span:
+        span.set_attribute("size_bytes", 1)
+        assert span is NOOP_SPAN
+    assert current_trace_id() is None
+    assert trace_output_directory() is None
+    assert exporter.get_finished_spans() == ()
+
+
+def test_exception_marks_span_as_error(exporter):
+    with pytest.raises(ValueError):
+        with start_trace("run.caption"):
+            with start_span("json.parse"):
+                raise ValueError("bad json")
+
+    spans = _by_name(exporter)
+    assert spans["json.parse"].status.status_code is StatusCode.ERROR
+    assert "bad json" in spans["json.parse"].status.description
+    assert spans["run.caption"].status.status_code is StatusCode.ERROR
+
+
+def test_provider_calls_and_json_parsing_are_traced(exporter):
+    transport = InstrumentedTransport(StubTransport(StubProviderSettings(latency_ms=0, image_latency_ms=0)))
+    client = OpenAI(api_key="stub-key", max_retries=0, http_client=httpx.Client(transport=transport))
+
+    with start_trace("run.generation"):
+        client.chat.completions.create(model="gpt-4.1", messages=[{"role": "user", "content": "hi"}])
+        RobustJSONParser().extract_and_parse("```json\n{'a': 1,}\n```")
+
+    spans = _by_name(exporter)
+    provider = spans["provider.chat.completions"]
+    assert (provider.attributes["provider"], provider.attributes["model"]) == ("openai", "gpt-4.1")
+    assert provider.attributes["http.status_code"] == 200
+    assert provider.parent.span_id == spans["run.generation"].context.span_id
+    assert spans["json.parse"].attributes["chars"] == len("```json\n{'a': 1,}\n```")
+
+
+def test_chrome_exporter_writes_trace_into_run_directory(tmp_path):
+    configure_tracing([ChromeTraceExporter(str(tmp_path / "default"))])
+    try:
+        with start_trace("run.generation", output_directory=str(tmp_path)) as root:
+            with start_span("stage.strategy", order=2) as span:
+                span.add_event("llm.retry", {"attempt": 1})
+                set_span_error(span, "HTTP 429")
+    finally:
+        configure_tracing(None)
+
+    trace_id = format_trace_id(root.get_span_context().trace_id)
+    path = tmp_path / "traces" / f"run.generation_{trace_id}.json"
+    document = json.loads(path.read_text())
+    events = {event["name"]: event for event in document["traceEvents"]}
+    assert document["otherData"]["trace_id"] == trace_id
+    assert events["stage.strategy"]["ph"] == "X"
+    assert events["stage.strategy"]["args"]["parent_id"] == format_span_id(root.get_span_context().span_id)
+    assert events["stage.strategy"]["args"]["status_message"] == "HTTP 429"
+    assert events["llm.retry"]["ph"] == "i"
+    assert events["run.generation"]["dur"] >= events["stage.strategy"]["dur"]
+    assert not (tmp_path / "default").exists()
+
+
+def test_chrome_exporter_writes_off_the_ending_thread(tmp_path):
+    writers = []
+
+    class RecordingExporter(ChromeTraceExporter):
+        def export(self, spans, state):
+            writers.append(threading.get_ident())
+            super().export(spans, state)
+
+    exporter = RecordingExporter(str(tmp_path))
+    configure_tracing([exporter])
+    try:
+        with start_trace("run.generation"):
+            pass
+        assert exporter.force_flush()
+        assert writers and writers[0] != threading.get_ident()
+        assert len(list(tmp_path.glob("run.generation_*.json"))) == 1
+    finally:
+        configure_tracing(None)
+
+
+def test_trace_exporters_env_selects_processors(monkeypatch, tmp_path):
+    monkeypatch.setenv("TRACE_EXPORTERS", "json, otlp, bogus")
+    monkeypatch.setenv("TRACE_DIRECTORY", str(tmp_path))
+
+    chrome, otlp = processors_from_env()
+    try:
+        assert isinstance(chrome, ChromeTraceExporter) and chrome.directory == str(tmp_path)
+        assert isinstance(otlp, BatchSpanProcessor)
+        assert isinstance(otlp.span_exporter, OTLPSpanExporter)
+    finally:
+        otlp.shutdown()
+
+
+def test_traced_run_and_websocket_messages_carry_trace_id(exporter):
+    @traced_run("run.caption", "caption_id")
+    async def execute(caption_id, data=None):
+        return WebSocketMessage(type=WSMessageType.CAPTION_UPDATE, run_id=caption_id, data={})
+
+    message = asyncio.run(execute("cap-1"))
+
+    (root,) = exporter.get_finished_spans()
+    assert root.attributes["caption_id"] == "cap-1"
+    assert json.loads(message.model_dump_json())["trace_id"] == format_trace_id(root.context.trace_id)
+    assert WebSocketMessage(type=WSMessageType.PING, run_id="x", data={}).trace_id is None
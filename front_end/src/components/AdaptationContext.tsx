@@ -47,6 +47,7 @@ const AdaptationContext: React.FC<AdaptationContextProps> = ({ run }) => {
               <ImageWithAuth
                 runId={run.parent_preset.source_run_id}
                 imagePath={run.parent_preset.image_url}
+                size="thumb"
                 sx={{
                   width: 48,
                   height: 48,
@@ -101,6 +102,7 @@ const AdaptationContext: React.FC<AdaptationContextProps> = ({ run }) => {
                   <ImageWithAuth
                     runId={run.id}
                     imagePath={subjectImagePath}
+                    size="thumb"
                     sx={{
                       width: 48,
                       height: 48,
@@ -62,7 +62,7 @@ export default function BrandKitPresetModal({
       // Filter to only show pure brand kit presets (brand kit data + minimal input_snapshot)
       const brandKitPresets = response.presets.filter(preset => 
         preset.preset_type === 'INPUT_TEMPLATE' && 
-        (preset.brand_kit?.colors?.length || preset.brand_kit?.brand_voice_description || preset.brand_kit?.logo_file_base64) &&
+        (preset.brand_kit?.colors?.length || preset.brand_kit?.brand_voice_description || (preset.brand_kit?.logo_file_base64 || preset.brand_kit?.logo_blob_sha256)) &&
         preset.preset_source_type === 'brand-kit' &&
         preset.input_snapshot?.platform_name === 'Brand Kit (Universal)'
       );
@@ -150,7 +150,7 @@ export default function BrandKitPresetModal({
                 {/* Brand kit preview (logo + colors) */}
                 <Box sx={{ display: 'flex', alignItems: 'center', gap: 1 }}>
                   {/* Logo preview */}
-                  {preset.brand_kit?.logo_file_base64 && (
+                  {(preset.brand_kit?.logo_file_base64 || preset.brand_kit?.logo_blob_sha256) && (
                     <Box sx={{ 
                       width: 32, 
                       height: 32, 
@@ -164,7 +164,7 @@ export default function BrandKitPresetModal({
                       backgroundColor: 'background.paper'
                     }}>
                       <img 
-                        src={preset.brand_kit.logo_file_base64} 
+                        src={PipelineAPI.getBrandKitLogoSrc(preset.brand_kit)} 
                         alt="Logo" 
                         style={{ 
                           maxWidth: '100%', 
@@ -218,7 +218,7 @@ export default function BrandKitPresetModal({
                   <Typography variant="body2" color="text.secondary" sx={{ mb: 0.5 }}>
                     {preset.brand_kit?.colors?.length || 0} colors
                     {preset.brand_kit?.brand_voice_description && ', voice guidelines'}
-                    {preset.brand_kit?.logo_file_base64 && ', logo'}
+                    {(preset.brand_kit?.logo_file_base64 || preset.brand_kit?.logo_blob_sha256) && ', logo'}
                   </Typography>
                   
                   {/* Voice preview (truncated) */}
@@ -1,10 +1,13 @@
 import React, { useState, useEffect } from 'react';
 import { Box, CircularProgress, Alert } from '@mui/material';
 import { PipelineAPI } from '@/lib/api';
+import { ImageDerivativeSize } from '@/types/api';
 
 interface ImageWithAuthProps {
   runId: string;
   imagePath: string;
+  // Resized derivative to load instead of the full-size file (thumbnails, galleries)
+  size?: ImageDerivativeSize;
   sx?: React.CSSProperties | object;
   onClick?: () => void;
   alt?: string;
@@ -13,6 +16,7 @@ interface ImageWithAuthProps {
 const ImageWithAuth: React.FC<ImageWithAuthProps> = ({ 
   runId, 
   imagePath, 
+  size,
   sx, 
   onClick, 
   alt = 'Generated image' 
@@ -29,7 +33,7 @@ const ImageWithAuth: React.FC<ImageWithAuthProps> = ({
         setLoading(true);
         setError(null);
         
-        const url = await PipelineAPI.getImageBlobUrl(runId, imagePath);
+        const url = await PipelineAPI.getImageBlobUrl(runId, imagePath, size);
         if (isMounted) {
           setBlobUrl(url);
         }
@@ -54,7 +58,7 @@ const ImageWithAuth: React.FC<ImageWithAuthProps> = ({
         URL.revokeObjectURL(blobUrl);
       }
     };
-  }, [runId, imagePath]);
+  }, [runId, imagePath, size]);
 
   // Clean up blob URL when component unmounts
   useEffect(() => {
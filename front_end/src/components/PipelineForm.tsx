@@ -95,6 +95,7 @@ const formSchema = z.object({
     })).optional(),
     brand_voice_description: z.string().nullable().optional(),
     logo_file_base64: z.string().nullable().optional(),
+    logo_blob_sha256: z.string().nullable().optional(),
     saved_logo_path_in_run_dir: z.string().nullable().optional(),
   }).optional(),
   image_file: z.any().optional(),
@@ -132,7 +133,7 @@ const formSchema = z.object({
     const hasBrandKitData = Boolean(
       data.brand_kit?.colors?.length || 
       data.brand_kit?.brand_voice_description?.trim() ||
-      data.brand_kit?.logo_file_base64
+      data.brand_kit?.logo_file_base64 || data.brand_kit?.logo_blob_sha256
     );
     if (!hasBrandKitData) {
       return false;
@@ -314,7 +315,7 @@ export default function PipelineForm({ onRunStarted }: PipelineFormProps) {
     // Check if this is a pure brand kit preset (brand kit data + minimal input_snapshot)
     const isBrandKitPreset = preset.preset_type === 'INPUT_TEMPLATE' && 
                             preset.brand_kit && 
-                            (preset.brand_kit.colors?.length || preset.brand_kit.brand_voice_description || preset.brand_kit.logo_file_base64) &&
+                            (preset.brand_kit.colors?.length || preset.brand_kit.brand_voice_description || preset.brand_kit.logo_file_base64 || preset.brand_kit.logo_blob_sha256) &&
                             preset.preset_source_type === 'brand-kit' &&
                             preset.input_snapshot?.platform_name === 'Brand Kit (Universal)';
     
@@ -351,13 +352,13 @@ export default function PipelineForm({ onRunStarted }: PipelineFormProps) {
         const hasExistingBrandKit = Boolean(
           currentBrandKit?.colors?.length || 
           currentBrandKit?.brand_voice_description?.trim() || 
-          currentBrandKit?.logo_file_base64
+          currentBrandKit?.logo_file_base64 || currentBrandKit?.logo_blob_sha256
         );
         
         const templateHasBrandKit = Boolean(
           inputData.brand_kit?.colors?.length || 
           inputData.brand_kit?.brand_voice_description?.trim() || 
-          inputData.brand_kit?.logo_file_base64
+          inputData.brand_kit?.logo_file_base64 || inputData.brand_kit?.logo_blob_sha256
         );
         
         // Migrate colors from old string[] format to new BrandColor[] format if needed
@@ -492,14 +493,14 @@ export default function PipelineForm({ onRunStarted }: PipelineFormProps) {
     const hasExistingBrandKit = Boolean(
       currentBrandKit?.colors?.length || 
       currentBrandKit?.brand_voice_description?.trim() || 
-      currentBrandKit?.logo_file_base64
+      currentBrandKit?.logo_file_base64 || currentBrandKit?.logo_blob_sha256
     );
     
     if (newPreset.preset_type === 'INPUT_TEMPLATE' && hasExistingBrandKit) {
       const templateHasBrandKit = Boolean(
         newPreset.input_snapshot?.brand_kit?.colors?.length || 
         newPreset.input_snapshot?.brand_kit?.brand_voice_description?.trim() || 
-        newPreset.input_snapshot?.brand_kit?.logo_file_base64
+        newPreset.input_snapshot?.brand_kit?.logo_file_base64 || newPreset.input_snapshot?.brand_kit?.logo_blob_sha256
       );
       
       if (!templateHasBrandKit) {
@@ -717,7 +718,7 @@ export default function PipelineForm({ onRunStarted }: PipelineFormProps) {
     return Boolean(
       brandKit?.colors?.length || 
       brandKit?.brand_voice_description?.trim() ||
-      brandKit?.logo_file_base64
+      brandKit?.logo_file_base64 || brandKit?.logo_blob_sha256
     );
   };
 
@@ -866,7 +867,7 @@ export default function PipelineForm({ onRunStarted }: PipelineFormProps) {
         const hasKitData = Boolean(
           brandKit?.colors?.length || 
           brandKit?.brand_voice_description?.trim() || 
-          brandKit?.logo_file_base64
+          brandKit?.logo_file_base64 || brandKit?.logo_blob_sha256
         );
         
         const applyBrandingCurrentValue = value.apply_branding;
@@ -903,7 +904,7 @@ export default function PipelineForm({ onRunStarted }: PipelineFormProps) {
           const hasBrandKitData = Boolean(
             brandKit?.colors?.length || 
             brandKit?.brand_voice_description?.trim() || 
-            brandKit?.logo_file_base64
+            brandKit?.logo_file_base64 || brandKit?.logo_blob_sha256
           );
           
           if (hasBrandKitData) {
@@ -1521,17 +1522,18 @@ export default function PipelineForm({ onRunStarted }: PipelineFormProps) {
                                 name="brand_kit"
                                 control={control}
                                 render={({ field }) => {
-                                  const hasLogo = field.value?.logo_file_base64;
+                                  const hasLogo = field.value?.logo_file_base64 || field.value?.logo_blob_sha256;
                                   
                                   return hasLogo ? (
                                     <CompactLogoDisplay
                                       logo={field.value.logo_analysis || {
-                                        preview_url: field.value.logo_file_base64,
+                                        preview_url: PipelineAPI.getBrandKitLogoSrc(field.value),
                                         filename: 'Brand Logo'
                                       }}
                                       onRemove={() => field.onChange({
                                         ...field.value,
                                         logo_file_base64: undefined,
+                                        logo_blob_sha256: undefined,
                                         logo_analysis: undefined
                                       })}
                                       showRemoveButton={true}
@@ -1543,12 +1545,14 @@ export default function PipelineForm({ onRunStarted }: PipelineFormProps) {
                                         field.onChange({
                                           ...field.value,
                                           logo_file_base64: analysis.preview_url, // Use analysis preview_url
+                                          logo_blob_sha256: undefined,
                                           logo_analysis: analysis // Store full analysis for details display
                                         });
                                       }}
                                       onLogoRemove={() => field.onChange({
                                         ...field.value,
                                         logo_file_base64: undefined,
+                                        logo_blob_sha256: undefined,
                                         logo_analysis: undefined
                                       })}
                                       currentLogo={null}
@@ -266,6 +266,19 @@ const PresetManagementModal = forwardRef<PresetManagementModalRef, PresetManagem
         },
         base64: preset.brand_kit.logo_file_base64
       };
+    } else if (preset.brand_kit?.logo_blob_sha256) {
+      // Stored logo: display it from the blob store and keep its hash on save
+      const format = preset.brand_kit.logo_content_type?.split('/')[1]?.toUpperCase() || 'Image';
+      
+      logoData = {
+        analysis: {
+          filename: `${preset.name}_logo.${format.toLowerCase()}`,
+          format: format,
+          ...(preset.brand_kit.logo_analysis || {}),
+          preview_url: PipelineAPI.getBlobUrl(preset.brand_kit.logo_blob_sha256),
+        },
+        blobSha256: preset.brand_kit.logo_blob_sha256
+      };
     }
     
     // Migrate colors from old string[] format to new BrandColor[] format if needed
@@ -307,7 +320,7 @@ const PresetManagementModal = forwardRef<PresetManagementModalRef, PresetManagem
     // Validate brand kit has at least one field defined
     const hasColors = brandKitData.colors.length > 0;
     const hasVoice = brandKitData.brandVoice.trim().length > 0;
-    const hasLogo = Boolean(brandKitData.logo?.base64);
+    const hasLogo = Boolean(brandKitData.logo?.base64 || brandKitData.logo?.blobSha256);
     
     if (!hasColors && !hasVoice && !hasLogo) {
       toast.error('Please add at least one brand element: colors, voice description, or logo');
@@ -337,8 +350,12 @@ const PresetManagementModal = forwardRef<PresetManagementModalRef, PresetManagem
       };
       
       // Include logo data if present, preserving analysis
-      if (brandKitData.logo?.base64) {
-        brandKitForSave.logo_file_base64 = brandKitData.logo.base64;
+      if (brandKitData.logo?.base64 || brandKitData.logo?.blobSha256) {
+        if (brandKitData.logo.base64) {
+          brandKitForSave.logo_file_base64 = brandKitData.logo.base64;
+        } else {
+          brandKitForSave.logo_blob_sha256 = brandKitData.logo.blobSha256;
+        }
         // Preserve logo analysis if available
         if (brandKitData.logo.analysis) {
           brandKitForSave.logo_analysis = brandKitData.logo.analysis;
@@ -545,7 +562,7 @@ const PresetManagementModal = forwardRef<PresetManagementModalRef, PresetManagem
   const renderBrandKitList = () => {
     const brandKitPresets = presets.filter(preset => 
       preset.preset_type === 'INPUT_TEMPLATE' && 
-      (preset.brand_kit?.colors?.length || preset.brand_kit?.brand_voice_description || preset.brand_kit?.logo_file_base64) &&
+      (preset.brand_kit?.colors?.length || preset.brand_kit?.brand_voice_description || preset.brand_kit?.logo_file_base64 || preset.brand_kit?.logo_blob_sha256) &&
       preset.preset_source_type === 'brand-kit' &&
       preset.input_snapshot?.platform_name === 'Brand Kit (Universal)'
     );
@@ -605,7 +622,7 @@ const PresetManagementModal = forwardRef<PresetManagementModalRef, PresetManagem
                     <Typography variant="body2" color="text.secondary">
                       Brand kit with {preset.brand_kit?.colors?.length || 0} colors
                       {preset.brand_kit?.brand_voice_description && ', voice guidelines'}
-                      {preset.brand_kit?.logo_file_base64 && ', logo'}
+                      {(preset.brand_kit?.logo_file_base64 || preset.brand_kit?.logo_blob_sha256) && ', logo'}
                     </Typography>
                     <Box display="flex" gap={2} mt={1}>
                       <Typography variant="caption" color="text.secondary">
@@ -617,7 +634,7 @@ const PresetManagementModal = forwardRef<PresetManagementModalRef, PresetManagem
                     </Box>
                     <Box sx={{ display: 'flex', alignItems: 'center', gap: 1, mt: 1 }}>
                       {/* Logo preview */}
-                      {preset.brand_kit?.logo_file_base64 && (
+                      {(preset.brand_kit?.logo_file_base64 || preset.brand_kit?.logo_blob_sha256) && (
                         <Box sx={{ 
                           width: 24, 
                           height: 24, 
@@ -631,7 +648,7 @@ const PresetManagementModal = forwardRef<PresetManagementModalRef, PresetManagem
                           backgroundColor: 'background.paper'
                         }}>
                           <img 
-                            src={preset.brand_kit.logo_file_base64} 
+                            src={PipelineAPI.getBrandKitLogoSrc(preset.brand_kit)} 
                             alt="Logo" 
                             style={{ 
                               maxWidth: '100%', 
@@ -752,7 +769,7 @@ const PresetManagementModal = forwardRef<PresetManagementModalRef, PresetManagem
                     <BusinessIcon />
                     Brand Kit ({presets.filter(preset => 
                       preset.preset_type === 'INPUT_TEMPLATE' && 
-                      (preset.brand_kit?.colors?.length || preset.brand_kit?.brand_voice_description || preset.brand_kit?.logo_file_base64) &&
+                      (preset.brand_kit?.colors?.length || preset.brand_kit?.brand_voice_description || preset.brand_kit?.logo_file_base64 || preset.brand_kit?.logo_blob_sha256) &&
                       preset.preset_source_type === 'brand-kit' &&
                       preset.input_snapshot?.platform_name === 'Brand Kit (Universal)'
                     ).length})
@@ -57,6 +57,7 @@ import Confetti from 'react-confetti';
 import { 
   PipelineRunDetail, 
   StageProgressUpdate,
+  PartialOutputUpdate,
   RunStatus,
   StageStatus,
   WebSocketMessage,
@@ -594,6 +595,9 @@ export default function RunResults({ runId, onNewRun }: RunResultsProps) {
   
   // Add caption error state management
   const [captionErrors, setCaptionErrors] = useState<Record<number, string>>({});
+  // Streamed output while stages run: concept fields by strategy, caption text by image
+  const [conceptStreams, setConceptStreams] = useState<Record<number, Record<string, string>>>({});
+  const [captionStreams, setCaptionStreams] = useState<Record<number, string>>({});
   
   // Save preset dialog state
   const [savePresetDialogOpen, setSavePresetDialogOpen] = useState(false);
@@ -707,7 +711,25 @@ export default function RunResults({ runId, onNewRun }: RunResultsProps) {
     }
   }, [runId, addLog]);
 
+  const handlePartialOutput = useCallback((partial: PartialOutputUpdate) => {
+    if (partial.source.startsWith('creative_expert_')) {
+      const strategyIndex = parseInt(partial.source.split('_').pop() || '0');
+      if (partial.fields && Object.keys(partial.fields).length > 0) {
+        setConceptStreams(prev => ({ ...prev, [strategyIndex]: partial.fields! }));
+      }
+    } else if ((partial.source === 'caption_writer' || partial.source === 'caption') && partial.image_id) {
+      const imageIndex = parseInt(partial.image_id.split('_')[1]);
+      setCaptionStreams(prev => ({ ...prev, [imageIndex]: partial.text }));
+    }
+  }, []);
+
   const handleWebSocketMessage = useCallback((message: WebSocketMessage) => {
+    // Streamed output arrives many times a second: update the previews without logging
+    if (message.type === 'partial_output') {
+      handlePartialOutput(message.data as PartialOutputUpdate);
+      return;
+    }
+    
     console.log('🔌 WebSocket message received:', {
       type: message.type,
       runId: message.run_id,
@@ -752,6 +774,11 @@ export default function RunResults({ runId, onNewRun }: RunResultsProps) {
           setTimeout(() => setLastStatusUpdate(null), 2000);
         }
         
+        // Streamed concepts are replaced by the stage output once it finishes
+        if (stageUpdate.stage_name === 'creative_expert' && stageUpdate.status !== 'RUNNING') {
+          setConceptStreams({});
+        }
+        
         // Special handling for image_assessment stage
         if (stageUpdate.stage_name === 'image_assessment') {
           // Extract assessment results from stage output
@@ -857,6 +884,7 @@ export default function RunResults({ runId, onNewRun }: RunResultsProps) {
           }, 500);
           // Stop the loading spinner and clear any error
           setCaptionGenerating(prev => ({ ...prev, [imageIndex]: false }));
+          setCaptionStreams(prev => ({ ...prev, [imageIndex]: '' }));
           setCaptionErrors(prev => ({ ...prev, [imageIndex]: '' }));
           toast.success(`Caption generated for Option ${imageIndex + 1}!`);
         }
@@ -876,6 +904,7 @@ export default function RunResults({ runId, onNewRun }: RunResultsProps) {
           addLog('error', `Caption generation failed for Option ${imageIndex + 1}: ${errorMessage}`);
           // Stop the loading spinner and show error
           setCaptionGenerating(prev => ({ ...prev, [imageIndex]: false }));
+          setCaptionStreams(prev => ({ ...prev, [imageIndex]: '' }));
           setCaptionErrors(prev => ({ ...prev, [imageIndex]: errorMessage }));
           toast.error(`Caption generation failed for Option ${imageIndex + 1}: ${errorMessage}`);
         }
@@ -904,7 +933,7 @@ export default function RunResults({ runId, onNewRun }: RunResultsProps) {
         toast.error(message.data.message || 'Noise assessment failed');
         break;
     }
-  }, [addLog, fetchRunDetails]);
+  }, [addLog, fetchRunDetails, handlePartialOutput]);
 
   const initializeWebSocket = useCallback(() => {
     // Prevent multiple connections for the same run ID
@@ -1933,6 +1962,7 @@ export default function RunResults({ runId, onNewRun }: RunResultsProps) {
                             <ImageWithAuth
                               runId={runId}
                               imagePath={result.image_path}
+                              size="small"
                               sx={{
                                 width: '100%',
                                 maxHeight: 350,
@@ -2108,8 +2138,8 @@ export default function RunResults({ runId, onNewRun }: RunResultsProps) {
                             </Box>
                           )}
 
-                          {/* Caption Loading Indicator */}
-                          {captionGenerating[result.strategy_index] && (!imageCaptions[result.strategy_index] || imageCaptions[result.strategy_index].length === 0) && (
+                          {/* Caption Loading Indicator (shows the writer's text as it streams) */}
+                          {captionGenerating[result.strategy_index] && (!imageCaptions[result.strategy_index] || imageCaptions[result.strategy_index].length === 0 || captionStreams[result.strategy_index]) && (
                             <Box sx={{ 
                               mt: 2, 
                               p: 2, 
@@ -2118,13 +2148,19 @@ export default function RunResults({ runId, onNewRun }: RunResultsProps) {
                               border: 1, 
                               borderColor: 'divider',
                               display: 'flex',
-                              alignItems: 'center',
+                              alignItems: captionStreams[result.strategy_index] ? 'flex-start' : 'center',
                               gap: 2
                             }}>
                               <CircularProgress size={20} />
-                              <Typography variant="body2" color="textSecondary">
-                                Generating caption... This may take a moment.
-                              </Typography>
+                              {captionStreams[result.strategy_index] ? (
+                                <Typography variant="body2" sx={{ whiteSpace: 'pre-wrap', lineHeight: 1.6 }}>
+                                  {captionStreams[result.strategy_index]}
+                                </Typography>
+                              ) : (
+                                <Typography variant="body2" color="textSecondary">
+                                  Generating caption... This may take a moment.
+                                </Typography>
+                              )}
                             </Box>
                           )}
 
@@ -2247,6 +2283,7 @@ export default function RunResults({ runId, onNewRun }: RunResultsProps) {
                                     <ImageWithAuth
                                       runId={runId}
                                       imagePath={originalImage.image_path}
+                                      size="thumb"
                                       sx={{
                                         width: 48,
                                         height: 48,
@@ -2321,6 +2358,7 @@ export default function RunResults({ runId, onNewRun }: RunResultsProps) {
                                                 <ImageWithAuth
                                                   runId={runId}
                                                   imagePath={refinement.image_path}
+                                                  size="small"
                                                   sx={{
                                                     width: '100%',
                                                     height: 200,
@@ -2592,6 +2630,7 @@ export default function RunResults({ runId, onNewRun }: RunResultsProps) {
                             <ImageWithAuth
                               runId={runId}
                               imagePath={image.image_path || ''}
+                              size="thumb"
                               sx={{
                                 width: '100%',
                                 height: 120,
@@ -2674,6 +2713,37 @@ export default function RunResults({ runId, onNewRun }: RunResultsProps) {
               )}
             </Grid>
             
+            {/* Creative concepts as they stream in */}
+            {Object.keys(conceptStreams).length > 0 && (
+              <Paper sx={{ p: 2, mb: 3, border: 1, borderColor: 'divider', backgroundColor: 'rgba(33, 150, 243, 0.04)' }}>
+                <Box sx={{ display: 'flex', alignItems: 'center', gap: 1, mb: 1.5 }}>
+                  <CircularProgress size={14} />
+                  <Typography variant="subtitle2" sx={{ fontWeight: 600 }}>
+                    Developing creative concepts
+                  </Typography>
+                </Box>
+                <Grid container spacing={2}>
+                  {Object.entries(conceptStreams)
+                    .sort(([a], [b]) => Number(a) - Number(b))
+                    .map(([strategyIndex, fields]) => (
+                      <Grid item xs={12} md={6} key={strategyIndex}>
+                        <Typography variant="caption" color="primary" sx={{ fontWeight: 600 }}>
+                          Concept {Number(strategyIndex) + 1}
+                        </Typography>
+                        {Object.entries(fields).map(([path, value]) => (
+                          <Typography key={path} variant="body2" sx={{ fontSize: '0.8rem', mt: 0.5 }}>
+                            <Box component="span" sx={{ fontWeight: 600, textTransform: 'capitalize' }}>
+                              {(path.split('.').pop() || path).replace(/_/g, ' ')}:
+                            </Box>{' '}
+                            {value}
+                          </Typography>
+                        ))}
+                      </Grid>
+                    ))}
+                </Grid>
+              </Paper>
+            )}
+            
             {/* Overall Progress Bar */}
             <LinearProgress 
               variant="determinate" 
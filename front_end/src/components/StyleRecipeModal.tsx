@@ -720,7 +720,7 @@ export default function StyleRecipeModal({
                               <Typography variant="caption" fontWeight="medium" sx={{ mb: 1, display: 'block' }}>
                                 Brand Logo
                               </Typography>
-                              {brandKit?.logo_file_base64 ? (
+                              {PipelineAPI.getBrandKitLogoSrc(brandKit) ? (
                                 <Paper 
                                   sx={{ 
                                     p: 1.5, 
@@ -749,7 +749,7 @@ export default function StyleRecipeModal({
                                       >
                                         <Box
                                           component="img"
-                                          src={brandKit.logo_file_base64}
+                                          src={PipelineAPI.getBrandKitLogoSrc(brandKit)}
                                           alt="Brand Logo"
                                           sx={{
                                             maxWidth: '100%',
@@ -773,7 +773,7 @@ export default function StyleRecipeModal({
                                     {/* Remove Button */}
                                     <Box sx={{ flexShrink: 0 }}>
                                       <IconButton 
-                                        onClick={() => setBrandKit(prev => ({...(prev || {}), logo_file_base64: undefined, logo_analysis: undefined}))}
+                                        onClick={() => setBrandKit(prev => ({...(prev || {}), logo_file_base64: undefined, logo_blob_sha256: undefined, logo_analysis: undefined}))}
                                         size="small"
                                         color="error"
                                         sx={{ p: 0.25 }}
@@ -787,9 +787,9 @@ export default function StyleRecipeModal({
                                 <Box sx={{ border: 1, borderColor: 'divider', borderRadius: 1, p: 1 }}>
                                   <LogoUploader
                                     onLogoUpload={(file, analysis) => {
-                                      setBrandKit(prev => ({...(prev || {}), logo_file_base64: analysis.preview_url, logo_analysis: analysis}));
+                                      setBrandKit(prev => ({...(prev || {}), logo_file_base64: analysis.preview_url, logo_blob_sha256: undefined, logo_analysis: analysis}));
                                     }}
-                                    onLogoRemove={() => setBrandKit(prev => ({...(prev || {}), logo_file_base64: undefined, logo_analysis: undefined}))}
+                                    onLogoRemove={() => setBrandKit(prev => ({...(prev || {}), logo_file_base64: undefined, logo_blob_sha256: undefined, logo_analysis: undefined}))}
                                     currentLogo={null}
                                   />
                                 </Box>
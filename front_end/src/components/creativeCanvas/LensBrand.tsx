@@ -28,6 +28,7 @@ import {
 import { motion, AnimatePresence } from 'framer-motion';
 import { Control, UseFormWatch, UseFormSetValue, FieldErrors, Controller } from 'react-hook-form';
 import { PipelineFormData } from '@/types/api';
+import { PipelineAPI } from '@/lib/api';
 import CompactColorPreview from '../CompactColorPreview';
 import CompactLogoDisplay from '../CompactLogoDisplay';
 import LogoUploader from '../LogoUploader';
@@ -76,7 +77,7 @@ function LensBrand({
   const hasLocalBrandKitData = Boolean(
     brandKit?.colors?.length || 
     brandKit?.brand_voice_description?.trim() ||
-    brandKit?.logo_file_base64
+    brandKit?.logo_file_base64 || brandKit?.logo_blob_sha256
   );
 
   return (
@@ -216,12 +217,12 @@ function LensBrand({
                           name="brand_kit"
                           control={control}
                           render={({ field }) => {
-                            const hasLogo = field.value?.logo_file_base64;
+                            const hasLogo = field.value?.logo_file_base64 || field.value?.logo_blob_sha256;
                             
                             return hasLogo ? (
                               <CompactLogoDisplay
                                 logo={field.value.logo_analysis || {
-                                  preview_url: field.value.logo_file_base64,
+                                  preview_url: PipelineAPI.getBrandKitLogoSrc(field.value),
                                   filename: 'Brand Logo'
                                 }}
                                 showRemoveButton={true}
@@ -229,6 +230,7 @@ function LensBrand({
                                   field.onChange({
                                     ...field.value,
                                     logo_file_base64: undefined,
+                                    logo_blob_sha256: undefined,
                                     logo_analysis: undefined
                                   });
                                 }}
@@ -239,6 +241,7 @@ function LensBrand({
                                   field.onChange({
                                     ...field.value,
                                     logo_file_base64: analysis.preview_url,
+                                    logo_blob_sha256: undefined,
                                     logo_analysis: analysis
                                   });
                                 }}
@@ -246,6 +249,7 @@ function LensBrand({
                                   field.onChange({
                                     ...field.value,
                                     logo_file_base64: undefined,
+                                    logo_blob_sha256: undefined,
                                     logo_analysis: undefined
                                   });
                                 }}
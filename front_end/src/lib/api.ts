@@ -24,6 +24,7 @@ import {
   // --- Added for brand kit sanitization ---
   BrandKitInput,
   BrandColor,
+  ImageDerivativeSize,
 } from '@/types/api';
 
 const API_BASE_URL = (process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000').replace(/\/+$/, '');
@@ -58,6 +59,7 @@ const sanitizeBrandKitInput = (kit?: BrandKitInput | null): BrandKitInput | unde
     // Pass-through fields
     brand_voice_description: kit.brand_voice_description || undefined,
     logo_file_base64: kit.logo_file_base64 || undefined,
+    logo_blob_sha256: kit.logo_blob_sha256 || undefined,
     saved_logo_path_in_run_dir: kit.saved_logo_path_in_run_dir || undefined,
     logo_analysis: kit.logo_analysis || undefined,
   };
@@ -228,16 +230,29 @@ export class PipelineAPI {
     }
   }
 
-  // Download file (for generated images)
-  static getFileUrl(runId: string, filename: string): string {
-    return `${API_BASE_URL}/api/v1/files/${runId}/${filename}`;
+  // Download file (for generated images); `size` requests a cached, resized derivative
+  static getFileUrl(runId: string, filename: string, size?: ImageDerivativeSize): string {
+    const url = `${API_BASE_URL}/api/v1/files/${runId}/${filename}`;
+    return size ? `${url}?size=${size}` : url;
+  }
+
+  // Get URL for a stored blob (logos, reference images, masks)
+  static getBlobUrl(sha256: string): string {
+    return `${API_BASE_URL}/api/v1/blobs/${sha256}`;
+  }
+
+  // Image source for a brand kit logo: a fresh upload (data URI) or the stored blob
+  static getBrandKitLogoSrc(brandKit?: BrandKitInput | null): string | undefined {
+    if (brandKit?.logo_file_base64) return brandKit.logo_file_base64;
+    return brandKit?.logo_blob_sha256 ? PipelineAPI.getBlobUrl(brandKit.logo_blob_sha256) : undefined;
   }
 
   // Get image as blob URL (works with ngrok by including headers)
-  static async getImageBlobUrl(runId: string, filename: string): Promise<string> {
+  static async getImageBlobUrl(runId: string, filename: string, size?: ImageDerivativeSize): Promise<string> {
     try {
       const response = await apiClient.get(`/files/${runId}/${filename}`, {
         responseType: 'blob',
+        params: size ? { size } : undefined,
       });
       return URL.createObjectURL(response.data);
     } catch (error) {
@@ -2,6 +2,8 @@
 
 export type RunStatus = 'PENDING' | 'RUNNING' | 'COMPLETED' | 'FAILED' | 'CANCELLED';
 export type StageStatus = 'PENDING' | 'RUNNING' | 'COMPLETED' | 'FAILED' | 'SKIPPED';
+// Resized image derivative presets served by /files/{run_id}/{path}?size=
+export type ImageDerivativeSize = 'thumb' | 'small' | 'medium' | 'large';
 
 export interface Platform {
   name: string;
@@ -55,6 +57,9 @@ export interface BrandKitInput {
   colors?: BrandColor[];
   brand_voice_description?: string;
   logo_file_base64?: string;
+  // Stored logo (content hash in the blob store), used once a logo has been saved
+  logo_blob_sha256?: string;
+  logo_content_type?: string;
   // Runtime fields - populated during processing
   saved_logo_path_in_run_dir?: string;
   logo_analysis?: Record<string, any>;
@@ -137,6 +142,19 @@ export interface StageProgressUpdate {
   error_message?: string;
 }
 
+// Streamed LLM output of a running stage ('partial_output' WebSocket message)
+export interface PartialOutputUpdate {
+  source: string; // e.g. 'creative_expert_0', 'caption_writer', 'caption'
+  text: string; // Reply so far (restarts when the call is retried)
+  fields?: Record<string, string>; // Completed string fields by dotted path (JSON replies)
+  chars: number;
+  attempt: number;
+  done: boolean;
+  image_index?: number;
+  caption_id?: string;
+  image_id?: string;
+}
+
 export interface PipelineRunResponse {
   id: string;
   status: RunStatus;
@@ -367,7 +385,7 @@ export interface RunListResponse {
 
 // WebSocket message types
 export interface WebSocketMessage {
-  type: 'stage_update' | 'run_complete' | 'run_error' | 'ping' | 'caption_update' | 'caption_complete' | 'caption_error' | 'noise_assessment_started' | 'noise_assessment_completed' | 'noise_assessment_error';
+  type: 'stage_update' | 'run_complete' | 'run_error' | 'ping' | 'caption_update' | 'caption_complete' | 'caption_error' | 'partial_output' | 'noise_assessment_started' | 'noise_assessment_completed' | 'noise_assessment_error';
   run_id: string;
   timestamp: string;
   data: Record<string, any>;
@@ -0,0 +1,458 @@
+#!/usr/bin/env python
+"""Pipeline Throughput Benchmark
+
+Drives the Churns API end to end (``POST /api/v1/runs``, refinements and
+captions) at a configurable concurrency and reports service performance:
+
+- p50/p95/p99 end-to-end latency for runs, refinements and captions
+- p50/p95/p99 latency per pipeline stage (from ``GET /api/v1/runs/{id}``)
+- completed runs per minute
+- event-loop lag, SQLite lock retries and RSS (in-process mode only)
+- cold import time of ``churns.api.main`` in a fresh interpreter
+
+By default the FastAPI app is started in-process inside a scratch working
+directory with ``USE_STUB_PROVIDERS=true``, so no provider is called and no
+money is spent. Pass ``--base-url`` to benchmark an already running server
+instead (server-side loop lag, DB retries and RSS are then not available).
+
+Results are written as JSON. ``--baseline`` compares them against a stored
+result file and exits with status 1 if a tracked metric regressed by more
+than ``--tolerance``.
+
+Usage
+-----
+$ python scripts/benchmark_pipeline.py --runs 20 --concurrency 5
+$ python scripts/benchmark_pipeline.py --runs 20 --concurrency 5 \\
+      --refinements-per-run 1 --captions-per-run 2 \\
+      --output bench.json --baseline scripts/benchmark_baseline.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+API_PREFIX = "/api/v1"
+TERMINAL_STATUSES = {"COMPLETED", "FAILED", "CANCELLED"}
+
+# Metrics compared against the baseline: (path in results, higher is better)
+TRACKED_METRICS = [
+    (("runs", "latency_seconds", "p50"), False),
+    (("runs", "latency_seconds", "p95"), False),
+    (("runs", "latency_seconds", "p99"), False),
+    (("refinements", "latency_seconds", "p95"), False),
+    (("captions", "latency_seconds", "p95"), False),
+    (("throughput", "runs_per_minute"), True),
+    (("event_loop_lag_ms", "p99"), False),
+    (("process", "peak_rss_mb"), False),
+    (("startup", "api_import_ms"), False),
+]
+
+
+def api_import_ms() -> Optional[float]:
+    """Cumulative ``import churns.api.main`` time in a fresh interpreter, in ms."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import churns.api.main"],
+        cwd=REPO_ROOT, capture_output=True, text=True, timeout=120
+    )
+    if result.returncode != 0:
+        return None
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and line.rstrip().endswith("| churns.api.main"):
+            return round(int(line.split("|")[1]) / 1000, 1)
+    return None
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Linear-interpolated percentile (``pct`` in 0-100), None for no samples."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: List[float]) -> Dict[str, Any]:
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 4) if values else None,
+        "p50": _round(percentile(values, 50)),
+        "p95": _round(percentile(values, 95)),
+        "p99": _round(percentile(values, 99)),
+        "max": _round(max(values) if values else None),
+    }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 4) if value is not None else None
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process from /proc (Linux only)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes elsewhere
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+class LoopLagMonitor:
+    """Samples event-loop lag as the overshoot of a periodic ``asyncio.sleep``."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples_ms: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _sample(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples_ms.append(max(0.0, (loop.time() - start - self.interval) * 1000))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._sample())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+class BenchmarkRecorder:
+    """Collects per-operation latencies and failures."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {"runs": [], "refinements": [], "captions": []}
+        self.failures: Dict[str, List[str]] = {"runs": [], "refinements": [], "captions": []}
+        self.stage_latencies: Dict[str, List[float]] = {}
+
+    def record(self, kind: str, started: float, error: Optional[str] = None) -> None:
+        if error:
+            self.failures[kind].append(error)
+        else:
+            self.latencies[kind].append(time.perf_counter() - started)
+
+    def record_stages(self, stages: List[Dict[str, Any]]) -> None:
+        for stage in stages:
+            if stage.get("duration_seconds") is not None:
+                self.stage_latencies.setdefault(stage["stage_name"], []).append(stage["duration_seconds"])
+
+
+#######################################################################
+# Workload ###########################################################
+#######################################################################
+
+async def _poll(client: httpx.AsyncClient, url: str, done, interval: float, timeout: float) -> Dict[str, Any]:
+    deadline = time.perf_counter() + timeout
+    while True:
+        response = await client.get(url)
+        response.raise_for_status()
+        body = response.json()
+        if done(body):
+            return body
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"Timed out waiting for {url}")
+        await asyncio.sleep(interval)
+
+
+async def run_pipeline(client: httpx.AsyncClient, args: argparse.Namespace, recorder: BenchmarkRecorder) -> Optional[str]:
+    started = time.perf_counter()
+    try:
+        response = await client.post(f"{API_PREFIX}/runs", data={
+            "platform_name": args.platform,
+            "creativity_level": "2",
+            "num_variants": str(args.num_variants),
+            "prompt": "A gourmet burger on a rustic wooden table",
+            "task_type": "1. Product Photography",
+            "task_description": "Weekend burger special",
+        })
+        response.raise_for_status()
+        run_id = response.json()["id"]
+        status = await _poll(client, f"{API_PREFIX}/runs/{run_id}/status",
+                             lambda body: body["status"] in TERMINAL_STATUSES,
+                             args.poll_interval, args.timeout)
+        if status["status"] != "COMPLETED":
+            recorder.record("runs", started, f"{run_id}: {status['status']} {status.get('error_message')}")
+            return None
+        recorder.record("runs", started)
+    except Exception as e:
+        recorder.record("runs", started, f"{type(e).__name__}: {e}")
+        return None
+
+    detail = await client.get(f"{API_PREFIX}/runs/{run_id}")
+    if detail.status_code == 200:
+        recorder.record_stages(detail.json().get("stages", []))
+    return run_id
+
+
+async def run_refinement(client: httpx.AsyncClient, run_id: str, index: int,
+                         args: argparse.Namespace, recorder: BenchmarkRecorder) -> None:
+    started = time.perf_counter()
+    try:
+        response = await client.post(f"{API_PREFIX}/runs/{run_id}/refine", data={
+            "refine_type": "prompt",
+            "parent_image_id": "image_0",
+            "parent_image_type": "original",
+            "generation_index": str(index % args.num_variants),
+            "prompt": "Make the lighting warmer",
+        })
+        response.raise_for_status()
+        job_id = response.json()["job_id"]
+        details = await _poll(client, f"{API_PREFIX}/refinements/{job_id}/details",
+                              lambda body: body["status"] in TERMINAL_STATUSES,
+                              args.poll_interval, args.timeout)
+        error = None if details["status"] == "COMPLETED" else f"{job_id}: {details['status']} {details.get('error_message')}"
+        recorder.record("refinements", started, error)
+    except Exception as e:
+        recorder.record("refinements", started, f"{type(e).__name__}: {e}")
+
+
+async def run_caption(client: httpx.AsyncClient, run_id: str, args: argparse.Namespace,
+                      recorder: BenchmarkRecorder) -> None:
+    started = time.perf_counter()
+    try:
+        response = await client.post(f"{API_PREFIX}/runs/{run_id}/images/image_0/caption", json={})
+        response.raise_for_status()
+        version = response.json()["version"]
+        await _poll(client, f"{API_PREFIX}/runs/{run_id}/images/image_0/captions",
+                    lambda body: any(c["version"] == version for c in body["captions"]),
+                    args.poll_interval, args.timeout)
+        recorder.record("captions", started)
+    except Exception as e:
+        recorder.record("captions", started, f"{type(e).__name__}: {e}")
+
+
+async def run_workload(client: httpx.AsyncClient, args: argparse.Namespace, recorder: BenchmarkRecorder) -> None:
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one_run(run_number: int) -> None:
+        async with semaphore:
+            run_id = await run_pipeline(client, args, recorder)
+            if run_id is None:
+                return
+            # Captions run sequentially per image so each gets its own version number
+            follow_ups = [run_refinement(client, run_id, i, args, recorder) for i in range(args.refinements_per_run)]
+            await asyncio.gather(*follow_ups)
+            for _ in range(args.captions_per_run):
+                await run_caption(client, run_id, args, recorder)
+            print(f"  ✅ Run {run_number + 1}/{args.runs} finished")
+
+    await asyncio.gather(*(one_run(i) for i in range(args.runs)))
+
+
+#######################################################################
+# Targets ############################################################
+#######################################################################
+
+@asynccontextmanager
+async def in_process_client(args: argparse.Namespace) -> AsyncIterator[httpx.AsyncClient]:
+    """Start the FastAPI app in this process with stubbed providers."""
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="churns-bench-"))
+    (workdir / "data" / "runs").mkdir(parents=True, exist_ok=True)
+    os.environ.setdefault("USE_STUB_PROVIDERS", "true")
+    os.chdir(workdir)  # The app resolves ./data relative to the working directory
+    sys.path.insert(0, str(REPO_ROOT))
+    print(f"📁 In-process benchmark working directory: {workdir}")
+
+    from churns.api.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=args.timeout) as client:
+            yield client
+
+
+@asynccontextmanager
+async def remote_client(args: argparse.Namespace) -> AsyncIterator[httpx.AsyncClient]:
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+        yield client
+
+
+async def benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    recorder = BenchmarkRecorder()
+    monitor = LoopLagMonitor()
+    in_process = not args.base_url
+    target = in_process_client(args) if in_process else remote_client(args)
+
+    async with target as client:
+        retries_before = 0
+        if in_process:
+            from churns.api.database import get_db_lock_retry_count
+            retries_before = get_db_lock_retry_count()
+        rss_before = current_rss_mb()
+
+        monitor.start()
+        wall_start = time.perf_counter()
+        await run_workload(client, args, recorder)
+        wall_seconds = time.perf_counter() - wall_start
+        await monitor.stop()
+
+        db_lock_retries = get_db_lock_retry_count() - retries_before if in_process else None
+        stub_stats = None
+        if in_process:
+            from churns.core.stub_provider import get_stub_stats
+            stub_stats = get_stub_stats()
+
+    completed_runs = len(recorder.latencies["runs"])
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "mode": "in-process" if in_process else "remote",
+            "base_url": args.base_url,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {
+                "runs": args.runs,
+                "concurrency": args.concurrency,
+                "num_variants": args.num_variants,
+                "refinements_per_run": args.refinements_per_run,
+                "captions_per_run": args.captions_per_run,
+                "stub_settings": {k: v for k, v in os.environ.items() if k.startswith("STUB_")},
+            },
+        },
+        "throughput": {
+            "wall_seconds": round(wall_seconds, 3),
+            "completed_runs": completed_runs,
+            "runs_per_minute": round(completed_runs / wall_seconds * 60, 3) if wall_seconds else None,
+        },
+        "runs": {"latency_seconds": summarize(recorder.latencies["runs"]), "failures": recorder.failures["runs"]},
+        "refinements": {"latency_seconds": summarize(recorder.latencies["refinements"]), "failures": recorder.failures["refinements"]},
+        "captions": {"latency_seconds": summarize(recorder.latencies["captions"]), "failures": recorder.failures["captions"]},
+        "stages": {name: summarize(values) for name, values in sorted(recorder.stage_latencies.items())},
+        "event_loop_lag_ms": summarize(monitor.samples_ms) if in_process else None,
+        "db_lock_retries": db_lock_retries,
+        "process": {
+            "rss_before_mb": rss_before if in_process else None,
+            "rss_after_mb": current_rss_mb() if in_process else None,
+            "peak_rss_mb": peak_rss_mb() if in_process else None,
+        },
+        "stub_provider": stub_stats,
+        "startup": {"api_import_ms": api_import_ms()},
+    }
+
+
+#######################################################################
+# Baseline comparison ################################################
+#######################################################################
+
+def _lookup(results: Dict[str, Any], path) -> Optional[float]:
+    value: Any = results
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value if isinstance(value, (int, float)) else None
+
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """Return tracked metrics that are worse than the baseline by more than ``tolerance``."""
+    regressions = []
+    for path, higher_is_better in TRACKED_METRICS:
+        current, previous = _lookup(results, path), _lookup(baseline, path)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        regressed = change < -tolerance if higher_is_better else change > tolerance
+        if regressed:
+            regressions.append({
+                "metric": ".".join(path),
+                "baseline": previous,
+                "current": current,
+                "change_pct": round(change * 100, 1),
+            })
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="End-to-end throughput benchmark for the Churns pipeline API")
+    parser.add_argument("--runs", type=int, default=10, help="Number of pipeline runs to start")
+    parser.add_argument("--concurrency", type=int, default=3, help="Runs in flight at the same time")
+    parser.add_argument("--num-variants", type=int, default=1, help="Strategies/images per run")
+    parser.add_argument("--refinements-per-run", type=int, default=0, help="Prompt refinements started after each run")
+    parser.add_argument("--captions-per-run", type=int, default=0, help="Captions generated after each run")
+    parser.add_argument("--platform", default="Instagram Post (1:1 Square)", help="Target platform name")
+    parser.add_argument("--base-url", default=None, help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--workdir", default=None, help="Working directory for the in-process app (default: temp dir)")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="Seconds between status polls")
+    parser.add_argument("--timeout", type=float, default=900.0, help="Per-operation timeout in seconds")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", default=None, help="Baseline results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression (0.15 = 15%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    output_path = Path(args.output).resolve()
+    baseline_path = Path(args.baseline).resolve() if args.baseline else None
+
+    print(f"🚀 Benchmarking {args.runs} runs at concurrency {args.concurrency}...")
+    results = asyncio.run(benchmark(args))
+
+    regressions = []
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        results["baseline_comparison"] = {
+            "baseline": str(baseline_path),
+            "tolerance": args.tolerance,
+            "regressions": regressions,
+        }
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(results, f, indent=2)
+
+    run_latency = results["runs"]["latency_seconds"]
+    print(f"\n📊 Runs: {results['throughput']['completed_runs']}/{args.runs} completed, "
+          f"{results['throughput']['runs_per_minute']} runs/min")
+    print(f"   Latency p50/p95/p99: {run_latency['p50']}s / {run_latency['p95']}s / {run_latency['p99']}s")
+    if results["event_loop_lag_ms"]:
+        print(f"   Event-loop lag p99: {results['event_loop_lag_ms']['p99']}ms, DB lock retries: {results['db_lock_retries']}")
+    if results["startup"]["api_import_ms"] is not None:
+        print(f"   API import: {results['startup']['api_import_ms']}ms")
+    print(f"💾 Results written to {output_path}")
+
+    if regressions:
+        print(f"❌ {len(regressions)} metric(s) regressed beyond {args.tolerance:.0%}:")
+        for regression in regressions:
+            print(f"   {regression['metric']}: {regression['baseline']} → {regression['current']} ({regression['change_pct']:+}%)")
+        return 1
+    if baseline_path:
+        print("✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
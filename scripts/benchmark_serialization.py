@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+"""Run Data Serialization Benchmark
+
+Times the JSON work done on a run's data with the stdlib ``json`` calls the
+API used before and with ``churns.core.serialization`` (orjson when
+installed), using real ``pipeline_metadata.json`` files:
+
+- metadata write: pretty-printed encode of the whole document
+- metadata read: decode of the file bytes
+- context copy: the sanitizing encode/decode round trip done before saving
+- stage updates: per ``processing_context`` section, the ``output_data``
+  column encode, the WebSocket message encode and the decode when a run is
+  fetched
+- results/caption/preset/refinement reads: reading and parsing the whole
+  ``pipeline_metadata.json`` with ``churns.core.serialization`` against
+  loading only the sections those readers use from the sectioned metadata
+  file (``churns.core.run_metadata``), uncompressed and, when ``zstandard``
+  is installed, zstd-compressed (the ``(zstd)`` rows)
+
+Pass metadata files explicitly or let the script pick up
+``data/runs/*/pipeline_metadata.json``. Without any, a synthetic document
+with the same layout is generated (``--synthetic-variants`` controls its
+size) so the script still runs on a fresh checkout. Its text is drawn from a
+word list rather than repeated, so it compresses about as well as real LLM
+output.
+
+Usage
+-----
+$ python scripts/benchmark_serialization.py
+$ python scripts/benchmark_serialization.py data/runs/<run_id>/pipeline_metadata.json --repeat 200
+$ python scripts/benchmark_serialization.py --output serialization_bench.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark JSON serialization of run data")
+    parser.add_argument("metadata_files", nargs="*",
+                        help="pipeline_metadata.json files (default: data/runs/*/pipeline_metadata.json)")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed repetitions per operation")
+    parser.add_argument("--synthetic-variants", type=int, default=6,
+                        help="Strategies/images in the synthetic document used when no files are found")
+    parser.add_argument("--output", default=None, help="Write the report as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def synthetic_metadata(variants: int) -> Dict[str, Any]:
+    """A document laid out like the metadata _process_pipeline_results writes."""
+    rng = random.Random(variants)
+    words = ("steam curls from a hand-thrown ceramic cup on sunlit oak counter with crema patterns catching "
+             "morning light warm rustic film grain audience brand voice inviting specialty coffee roast "
+             "texture shadow highlight foreground background composition palette mood subject framing "
+             "espresso saucer spoon table window soft natural golden hour shallow depth of field").split()
+
+    def paragraph() -> str:
+        return " ".join(rng.choice(words) for _ in range(90)).capitalize() + "."
+
+    strategies = [
+        {"target_audience": f"Audience {i}", "target_niche": "Specialty coffee", "target_objective": "Awareness",
+         "target_voice": "Warm and inviting", "reasoning": paragraph()}
+        for i in range(variants)
+    ]
+    return {
+        "user_inputs": {"platform_name": "Instagram Post (1:1 Square)", "prompt": paragraph(), "num_variants": variants,
+                        "brand_kit": {"colors": [{"hex": "#6B4F3A", "role": "primary"}], "brand_voice_description": paragraph()}},
+        "pipeline_settings": {"run_timestamp": "2026-01-02T03:04:05", "creativity_level": 2, "pipeline_mode": "generation"},
+        "processing_context": {
+            "image_analysis_result": {"main_subject": "Latte", "secondary_elements": ["saucer", "spoon"], "style_mood": paragraph()},
+            "suggested_marketing_strategies": strategies,
+            "style_guidance_sets": [
+                {"style_keywords": ["warm", "rustic", "film grain"], "style_description": paragraph(),
+                 "marketing_impact": paragraph(), "source_strategy_index": i}
+                for i in range(variants)
+            ],
+            "generated_image_prompts": [
+                {"source_strategy_index": i,
+                 "visual_concept": {"main_subject": "Latte", "composition_and_framing": paragraph(), "background_environment": paragraph(),
+                                    "lighting_and_mood": paragraph(), "color_palette": paragraph(), "visual_style": paragraph(),
+                                    "suggested_alt_text": "A latte on an oak counter"}}
+                for i in range(variants)
+            ],
+            "final_assembled_prompts": [{"index": i, "prompt": paragraph() + " " + paragraph()} for i in range(variants)],
+            "generated_image_results": [
+                {"index": i, "status": "success", "result_path": f"edited_image_strategy_{i}.png"} for i in range(variants)
+            ],
+            "image_assessment": [
+                {"image_index": i, "assessment_scores": {"concept_adherence": 4, "technical_quality": 5},
+                 "general_score": 4.5, "assessment_justification": {"concept_adherence": paragraph()}}
+                for i in range(variants)
+            ],
+            "llm_call_usage": {
+                f"stage_{i}": {"prompt_tokens": 3120 + i, "completion_tokens": 812 + i, "total_tokens": 3932 + 2 * i,
+                               "latency_seconds": 4.217 + i, "latency_ms": 4217 + i, "model": "openai/gpt-4.1-mini",
+                               "provider": "OpenRouter",
+                               "cost_breakdown": {"input_cost": 0.001248, "output_cost": 0.001299, "total_cost": 0.002547,
+                                                  "currency": "USD", "input_rate": 0.4, "output_rate": 1.6,
+                                                  "notes": "Token-based pricing"}}
+                for i in range(8)
+            },
+            "cost_summary": {
+                "stage_costs": [{"stage_name": f"stage_{i}", "total_cost": 0.0123, "duration_seconds": 4.2} for i in range(8)],
+                "total_pipeline_cost_usd": 0.0984,
+            },
+        },
+    }
+
+
+def time_ops(before: Callable[[], Any], after: Callable[[], Any], repeat: int) -> Tuple[float, float]:
+    """Median milliseconds per call of each, sampled alternately so drift hits both alike."""
+    before()  # Warm up
+    after()
+    samples: Tuple[List[float], List[float]] = ([], [])
+    for _ in range(repeat):
+        for func, func_samples in zip((before, after), samples):
+            started = time.perf_counter()
+            func()
+            func_samples.append((time.perf_counter() - started) * 1000.0)
+    return round(statistics.median(samples[0]), 4), round(statistics.median(samples[1]), 4)
+
+
+def benchmark_document(name: str, raw: bytes, repeat: int, run_dir: Path) -> Dict[str, Any]:
+    from churns.core import run_metadata, serialization
+    from churns.core.run_metadata import (
+        LEGACY_METADATA_FILENAME, REFINEMENT_SECTIONS, load_run_metadata, write_run_metadata
+    )
+
+    document = json.loads(raw)
+    legacy_path = run_dir / LEGACY_METADATA_FILENAME
+    legacy_path.write_bytes(raw)
+    layouts = {"": run_dir / "plain"}
+    if run_metadata.zstandard is not None:
+        layouts[" (zstd)"] = run_dir / "zstd"
+    sectioned_bytes = {}
+    for suffix, layout_dir in layouts.items():
+        compression = "zstd" if suffix else "none"
+        sectioned_bytes[compression] = write_run_metadata(layout_dir, document, compression).stat().st_size
+    sections = [value for value in document.get("processing_context", {}).values() if value]
+
+    def stdlib_stage_updates():
+        for section in sections:
+            column = json.dumps({"data": section})
+            json.dumps({"type": "stage_update", "run_id": "run", "data": {"output_data": section}})
+            json.loads(column)
+
+    def fast_stage_updates():
+        for section in sections:
+            column = serialization.dumps_str({"data": section})
+            serialization.dumps_str({"type": "stage_update", "run_id": "run", "data": {"output_data": section}})
+            serialization.loads(column)
+
+    operations = {
+        "metadata_write": (lambda: json.dumps(document, indent=2),
+                           lambda: serialization.dumps(document, indent=True)),
+        "metadata_read": (lambda: json.loads(raw.decode("utf-8")),
+                          lambda: serialization.loads(raw)),
+        "context_copy": (lambda: json.loads(json.dumps(document, default=str)),
+                         lambda: serialization.to_jsonable(document)),
+        "stage_updates": (stdlib_stage_updates, fast_stage_updates),
+    }
+    section_reads = {
+        "results_read": ("strategies", "concepts", "results", "costs"),
+        "caption_read": ("settings", "strategies", "concepts"),
+        "preset_read": ("strategies", "concepts", "results"),
+        "refinement_read": REFINEMENT_SECTIONS,
+    }
+    for suffix, layout_dir in layouts.items():
+        for op_name, sections_read in section_reads.items():
+            operations[op_name + suffix] = (lambda: serialization.read_json_file(legacy_path),
+                                            lambda d=layout_dir, s=sections_read: load_run_metadata(d, s))
+
+    results: Dict[str, Any] = {
+        "file": name, "size_bytes": len(raw), "stage_sections": len(sections),
+        "sectioned_bytes": sectioned_bytes,
+        "operations_ms": {},
+    }
+    for op_name, (stdlib_op, fast_op) in operations.items():
+        stdlib_ms, fast_ms = time_ops(stdlib_op, fast_op, repeat)
+        results["operations_ms"][op_name] = {
+            "before": stdlib_ms,
+            "after": fast_ms,
+            "speedup": round(stdlib_ms / fast_ms, 2) if fast_ms else None,
+        }
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    sys.path.insert(0, str(REPO_ROOT))
+    from churns.core import serialization
+
+    paths = [Path(p) for p in args.metadata_files] or sorted(Path("data/runs").glob("*/pipeline_metadata.json"))
+    documents = [(str(path), path.read_bytes()) for path in paths]
+    if not documents:
+        print(f"ℹ️  No pipeline_metadata.json found; using a synthetic document with {args.synthetic_variants} variants")
+        synthetic = json.dumps(synthetic_metadata(args.synthetic_variants), indent=2).encode("utf-8")
+        documents = [("synthetic", synthetic)]
+
+    from churns.core import run_metadata
+
+    backend = "orjson" if serialization.orjson is not None else "json (orjson not installed)"
+    if run_metadata.zstandard is None:
+        backend += ", no zstd rows (zstandard not installed)"
+    print(f"🚀 Benchmarking {len(documents)} document(s), {args.repeat} repetitions, backend: {backend}")
+    report = {"backend": backend, "repeat": args.repeat, "documents": []}
+    for name, raw in documents:
+        with tempfile.TemporaryDirectory() as run_dir:
+            result = benchmark_document(name, raw, args.repeat, Path(run_dir))
+        report["documents"].append(result)
+        sectioned = ", ".join(f"{size / 1024:.1f} KB {compression}"
+                              for compression, size in result["sectioned_bytes"].items())
+        print(f"\n📄 {name} ({result['size_bytes'] / 1024:.1f} KB, sectioned: {sectioned}, "
+              f"{result['stage_sections']} stage sections)")
+        for op_name, timing in result["operations_ms"].items():
+            print(f"   {op_name:<22} {timing['before']:>9.3f} ms → {timing['after']:>9.3f} ms  (x{timing['speedup']})")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
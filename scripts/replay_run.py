@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""Provider Cassette Replay
+
+Re-executes a recorded pipeline run from its provider cassette, without
+calling any provider, and reports where the time went:
+
+- wall time of the whole replay and of each stage
+- recorded provider latency versus local processing time
+- how many recorded interactions were used, left over or missing
+
+Record a cassette by running the API with ``PROVIDER_CASSETTE_MODE=record``;
+each run then writes ``data/runs/{run_id}/cassettes/{mode}_{timestamp}.jsonl``.
+Replaying with ``--latency zero`` isolates the local code paths (parsing,
+prompt assembly, cost calculation, file I/O) from network time.
+
+Usage
+-----
+$ python scripts/replay_run.py data/runs/<run_id>/cassettes/generation_<ts>.jsonl
+$ python scripts/replay_run.py <cassette> --latency zero --repeat 5 --output replay.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay a pipeline run from its provider cassette")
+    parser.add_argument("cassette", help="Path to a cassette .jsonl file")
+    parser.add_argument("--latency", choices=["original", "zero"], default="original",
+                        help="Wait the recorded provider latency, or answer immediately")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of replays to run")
+    parser.add_argument("--output-dir", default=None,
+                        help="Directory for replay artifacts (default: a temporary directory)")
+    parser.add_argument("--output", default=None, help="Write the report as JSON to this file")
+    return parser.parse_args(argv)
+
+
+async def replay_once(cassette_path: str, latency: str, output_dir: str) -> Dict[str, Any]:
+    from churns.core.provider_cassette import ProviderCassette
+    from churns.pipeline.executor import replay_cassette
+
+    stage_seconds: Dict[str, float] = {}
+
+    async def progress_callback(stage_name, stage_order, status, message, output_data=None,
+                                error_message=None, duration_seconds=None):
+        if duration_seconds is not None:
+            stage_seconds[stage_name] = round(duration_seconds, 4)
+
+    cassette = ProviderCassette.load(cassette_path, latency=latency)
+    started = time.perf_counter()
+    await replay_cassette(cassette, latency=latency, output_directory=output_dir, progress_callback=progress_callback)
+    wall_seconds = time.perf_counter() - started
+
+    recorded_provider_seconds = sum(entry["duration_ms"] for entry in cassette.interactions) / 1000.0
+    return {
+        "wall_seconds": round(wall_seconds, 4),
+        "recorded_provider_seconds": round(recorded_provider_seconds, 4),
+        "stages_seconds": stage_seconds,
+        "interactions": cassette.replay_stats(),
+    }
+
+
+async def replay(args: argparse.Namespace) -> Dict[str, Any]:
+    os.environ["PROVIDER_CASSETTE_MODE"] = "replay"
+    sys.path.insert(0, str(REPO_ROOT))
+
+    base_dir = Path(args.output_dir) if args.output_dir else Path(tempfile.mkdtemp(prefix="churns-replay-"))
+    replays = []
+    for index in range(args.repeat):
+        result = await replay_once(args.cassette, args.latency, str(base_dir / f"replay_{index}"))
+        replays.append(result)
+        print(f"Replay {index + 1}/{args.repeat}: {result['wall_seconds']:.3f}s "
+              f"({result['interactions']['replayed']}/{result['interactions']['recorded']} interactions)")
+
+    return {
+        "cassette": str(args.cassette),
+        "latency": args.latency,
+        "output_dir": str(base_dir),
+        "replays": replays,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(replay(args))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+        print(f"Report written to {args.output}")
+    else:
+        print(text)
+
+    diverged = any(r["interactions"]["misses"] for r in report["replays"])
+    return 1 if diverged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,7 +20,12 @@ from pathlib import Path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from sqlmodel import Session, select
-from churns.api.database import PipelineRun, PipelineStage, RunStatus, engine
+from churns.api.database import PipelineRun, RunStatus, create_sync_engine, delete_run_rows
+from churns.core.blob_store import release_blobs
+from churns.core.constants import IMAGE_DERIVATIVE_CACHE_DIR
+from churns.core.image_derivatives import remove_run_derivatives
+
+engine = create_sync_engine()
 
 
 def list_runs():
@@ -78,20 +83,19 @@ def delete_run_by_id(run_id: str, dry_run: bool = False):
             return False
         
         try:
-            # Delete stages first (foreign key constraint)
-            stages = session.exec(select(PipelineStage).where(PipelineStage.run_id == run_id)).all()
-            for stage in stages:
-                session.delete(stage)
-            
-            # Delete the run
-            session.delete(run)
+            # Delete stages and refinement jobs with the run (foreign key constraint)
+            blob_hashes = delete_run_rows(session, run)
             session.commit()
             print(f"✅ Deleted run from database")
             
-            # Delete files
+            # Give back the run's uploaded image, logo, masks and reference images
+            release_blobs(blob_hashes)
+            
+            # Delete files, and the cached previews of the run's images
             if run_dir.exists():
+                removed = remove_run_derivatives(run_dir)
                 shutil.rmtree(run_dir)
-                print(f"✅ Deleted run directory: {run_dir}")
+                print(f"✅ Deleted run directory: {run_dir} ({removed} cached previews)")
             
             print(f"🎉 Successfully deleted run: {run_id}")
             return True
@@ -134,18 +138,15 @@ def delete_runs_by_status(status: str, dry_run: bool = False):
         for run in runs:
             print(f"\nDeleting run {run.id[:8]}...")
             try:
-                # Delete stages first
-                stages = session.exec(select(PipelineStage).where(PipelineStage.run_id == run.id)).all()
-                for stage in stages:
-                    session.delete(stage)
-                
-                # Delete the run
-                session.delete(run)
+                # Delete stages and refinement jobs with the run
+                blob_hashes = delete_run_rows(session, run)
                 session.commit()
+                release_blobs(blob_hashes)
                 
-                # Delete files
+                # Delete files, and the cached previews of the run's images
                 run_dir = Path(f"./data/runs/{run.id}")
                 if run_dir.exists():
+                    remove_run_derivatives(run_dir)
                     shutil.rmtree(run_dir)
                 
                 deleted_count += 1
@@ -190,18 +191,15 @@ def delete_old_runs(days: int, dry_run: bool = False):
         for run in runs:
             print(f"\nDeleting old run {run.id[:8]}...")
             try:
-                # Delete stages first
-                stages = session.exec(select(PipelineStage).where(PipelineStage.run_id == run.id)).all()
-                for stage in stages:
-                    session.delete(stage)
-                
-                # Delete the run
-                session.delete(run)
+                # Delete stages and refinement jobs with the run
+                blob_hashes = delete_run_rows(session, run)
                 session.commit()
+                release_blobs(blob_hashes)
                 
-                # Delete files
+                # Delete files, and the cached previews of the run's images
                 run_dir = Path(f"./data/runs/{run.id}")
                 if run_dir.exists():
+                    remove_run_derivatives(run_dir)
                     shutil.rmtree(run_dir)
                 
                 deleted_count += 1
@@ -237,17 +235,19 @@ def clear_all_runs(dry_run: bool = False):
             return False
         
         try:
-            # Delete all stages first
-            session.exec("DELETE FROM pipeline_stages")
-            # Delete all runs
-            session.exec("DELETE FROM pipeline_runs")
+            # Delete all stages, refinement jobs and runs
+            blob_hashes = []
+            for run in runs:
+                blob_hashes.extend(delete_run_rows(session, run))
             session.commit()
+            release_blobs(blob_hashes)
             
-            # Delete all run directories
+            # Delete all run directories and every cached preview
             runs_dir = Path("./data/runs")
             if runs_dir.exists():
                 shutil.rmtree(runs_dir)
                 runs_dir.mkdir()
+            shutil.rmtree(IMAGE_DERIVATIVE_CACHE_DIR, ignore_errors=True)
             
             print(f"🎉 Deleted all {len(runs)} runs")
             return True
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Convert run metadata to sectioned storage.
+
+Runs saved before sectioned storage keep everything in one
+``pipeline_metadata.json``. This rewrites each of them as the
+``pipeline_metadata.sections`` file described in ``churns.core.run_metadata``
+and points ``pipeline_runs.metadata_file_path`` at it. The API reads both
+layouts, so runs can be migrated at any time.
+
+Usage:
+    python scripts/utilities/migrate_run_metadata.py --dry-run
+    python scripts/utilities/migrate_run_metadata.py
+    python scripts/utilities/migrate_run_metadata.py --keep-legacy --compression zstd
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from churns.core.run_metadata import LEGACY_METADATA_FILENAME, migrate_run_metadata
+
+# Database path
+DB_PATH = "./data/runs.db"
+RUNS_DIR = Path("./data/runs")
+
+
+def find_legacy_runs(runs_dir: Path):
+    """Run directories that still have a pipeline_metadata.json"""
+    return sorted(path.parent for path in runs_dir.glob(f"*/{LEGACY_METADATA_FILENAME}"))
+
+
+def update_metadata_paths(metadata_paths):
+    """Point pipeline_runs.metadata_file_path at the migrated metadata files"""
+    if not os.path.exists(DB_PATH):
+        print(f"⚠️  Database not found: {DB_PATH} (metadata paths not updated)")
+        return 0
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        cursor = conn.cursor()
+        updated = 0
+        for run_id, metadata_path in metadata_paths.items():
+            cursor.execute(
+                "UPDATE pipeline_runs SET metadata_file_path = ? WHERE id = ?",
+                (metadata_path, run_id)
+            )
+            updated += cursor.rowcount
+        conn.commit()
+        return updated
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert pipeline_metadata.json files to sectioned run metadata")
+    parser.add_argument("--runs-dir", default=str(RUNS_DIR), help="Directory holding the run directories")
+    parser.add_argument("--compression", choices=["zstd", "none"], default=None,
+                        help="Section compression (default: RUN_METADATA_COMPRESSION, else none)")
+    parser.add_argument("--keep-legacy", action="store_true", help="Keep pipeline_metadata.json after migrating")
+    parser.add_argument("--skip-db", action="store_true", help="Do not update metadata_file_path in the database")
+    parser.add_argument("--dry-run", action="store_true", help="List the runs that would be migrated")
+    args = parser.parse_args()
+
+    run_dirs = find_legacy_runs(Path(args.runs_dir))
+    if not run_dirs:
+        print("✅ No runs with pipeline_metadata.json found")
+        return
+
+    print(f"📋 Found {len(run_dirs)} run(s) with pipeline_metadata.json")
+    if args.dry_run:
+        for run_dir in run_dirs:
+            size_kb = (run_dir / LEGACY_METADATA_FILENAME).stat().st_size / 1024
+            print(f"  {run_dir.name}  ({size_kb:.1f} KB)")
+        print("🔍 Dry run - nothing was changed")
+        return
+
+    metadata_paths = {}
+    legacy_bytes = sectioned_bytes = failed = 0
+    for run_dir in run_dirs:
+        try:
+            result = migrate_run_metadata(run_dir, compression=args.compression, keep_legacy=args.keep_legacy)
+        except Exception as e:
+            print(f"❌ {run_dir.name}: {e}")
+            failed += 1
+            continue
+        metadata_paths[run_dir.name] = result["metadata_path"]
+        legacy_bytes += result["legacy_bytes"]
+        sectioned_bytes += result["sectioned_bytes"]
+        print(f"  ✅ {run_dir.name}: {result['legacy_bytes'] / 1024:.1f} KB → {result['sectioned_bytes'] / 1024:.1f} KB")
+
+    if metadata_paths and not args.skip_db:
+        updated = update_metadata_paths(metadata_paths)
+        print(f"🗄️  Updated metadata_file_path for {updated} run(s)")
+
+    print(f"\n📊 Migrated {len(metadata_paths)} run(s), {failed} failed")
+    if legacy_bytes:
+        print(f"   {legacy_bytes / 1024:.1f} KB → {sectioned_bytes / 1024:.1f} KB "
+              f"({sectioned_bytes / legacy_bytes:.0%} of the original size)")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,11 @@ from pathlib import Path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from sqlmodel import Session, select
-from churns.api.database import PipelineRun, PipelineStage, engine
+from churns.api.database import PipelineRun, create_sync_engine, delete_run_rows
+from churns.core.blob_store import release_blobs
+from churns.core.image_derivatives import remove_run_derivatives
+
+engine = create_sync_engine()
 
 
 def show_recent_runs():
@@ -73,21 +77,19 @@ def delete_run_interactive(run):
     
     try:
         with Session(engine) as session:
-            # Delete stages first
-            stages = session.exec(select(PipelineStage).where(PipelineStage.run_id == run.id)).all()
-            for stage in stages:
-                session.delete(stage)
-            
-            # Delete the run
+            # Delete stages and refinement jobs with the run
             fresh_run = session.get(PipelineRun, run.id)
-            if fresh_run:
-                session.delete(fresh_run)
+            blob_hashes = delete_run_rows(session, fresh_run) if fresh_run else []
             session.commit()
             
             print("✅ Deleted from database")
             
-            # Delete files
+            # Give back the run's uploaded image, logo, masks and reference images
+            release_blobs(blob_hashes)
+            
+            # Delete files, and the cached previews of the run's images
             if run_dir.exists():
+                remove_run_derivatives(run_dir)
                 shutil.rmtree(run_dir)
                 print("✅ Deleted files")
             
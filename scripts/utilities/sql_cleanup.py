@@ -11,6 +11,11 @@ import shutil
 from pathlib import Path
 from datetime import datetime
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from churns.core.blob_store import brand_kit_logo_hash, release_blobs
+from churns.core.image_derivatives import remove_run_derivatives
+
 # Database path
 DB_PATH = "./data/runs.db"
 RUNS_DIR = Path("./data/runs")
@@ -113,6 +118,41 @@ def list_runs_sql():
     conn.close()
 
 
+def _table_columns(cursor, table: str):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def _run_blob_hashes(cursor, run_ids):
+    """Blob hashes the runs and their refinement jobs hold (skipping columns an old database lacks)."""
+    placeholders = ','.join(['?' for _ in run_ids])
+    hashes = []
+    run_columns = _table_columns(cursor, "pipeline_runs")
+    if "image_blob_sha256" in run_columns:
+        cursor.execute(f"SELECT image_blob_sha256, brand_kit FROM pipeline_runs WHERE id IN ({placeholders})", run_ids)
+        for image_hash, brand_kit in cursor.fetchall():
+            hashes.extend((image_hash, brand_kit_logo_hash(brand_kit)))
+    if {"reference_blob_sha256", "mask_blob_sha256"} <= _table_columns(cursor, "refinement_jobs"):
+        cursor.execute(
+            f"SELECT reference_blob_sha256, mask_blob_sha256 FROM refinement_jobs WHERE parent_run_id IN ({placeholders})",
+            run_ids
+        )
+        for row in cursor.fetchall():
+            hashes.extend(row)
+    return [sha256 for sha256 in hashes if sha256]
+
+
+def _delete_run_rows(cursor, run_ids):
+    """Delete runs with their stages and refinement jobs; returns (runs, stages) deleted."""
+    placeholders = ','.join(['?' for _ in run_ids])
+    cursor.execute(f"DELETE FROM pipeline_stages WHERE run_id IN ({placeholders})", run_ids)
+    stages_deleted = cursor.rowcount
+    if _table_columns(cursor, "refinement_jobs"):
+        cursor.execute(f"DELETE FROM refinement_jobs WHERE parent_run_id IN ({placeholders})", run_ids)
+    cursor.execute(f"DELETE FROM pipeline_runs WHERE id IN ({placeholders})", run_ids)
+    return cursor.rowcount, stages_deleted
+
+
 def delete_run_sql(run_id: str):
     """Delete a run using direct SQL"""
     conn = connect_db()
@@ -141,23 +181,23 @@ def delete_run_sql(run_id: str):
         return False
     
     try:
-        # Delete stages first
-        cursor.execute("DELETE FROM pipeline_stages WHERE run_id = ?", (run_id,))
-        stages_deleted = cursor.rowcount
-        
-        # Delete run
-        cursor.execute("DELETE FROM pipeline_runs WHERE id = ?", (run_id,))
-        runs_deleted = cursor.rowcount
+        # Delete stages and refinement jobs with the run
+        blob_hashes = _run_blob_hashes(cursor, [run_id])
+        runs_deleted, stages_deleted = _delete_run_rows(cursor, [run_id])
         
         conn.commit()
         
         print(f"✅ Deleted {runs_deleted} run and {stages_deleted} stages from database")
         
-        # Delete files
+        # Give back the run's uploaded image, logo, masks and reference images
+        release_blobs(blob_hashes)
+        
+        # Delete files, and the cached previews of the run's images
         run_dir = RUNS_DIR / run_id
         if run_dir.exists():
+            removed = remove_run_derivatives(run_dir)
             shutil.rmtree(run_dir)
-            print(f"✅ Deleted run directory: {run_dir}")
+            print(f"✅ Deleted run directory: {run_dir} ({removed} cached previews)")
         
         print(f"🎉 Successfully deleted run: {run_id}")
         return True
@@ -197,24 +237,21 @@ def bulk_delete_by_status_sql(status: str):
         return False
     
     try:
-        # Delete stages for all runs
-        placeholders = ','.join(['?' for _ in run_ids])
-        cursor.execute(f"DELETE FROM pipeline_stages WHERE run_id IN ({placeholders})", run_ids)
-        stages_deleted = cursor.rowcount
-        
-        # Delete runs
-        cursor.execute(f"DELETE FROM pipeline_runs WHERE id IN ({placeholders})", run_ids)
-        runs_deleted = cursor.rowcount
+        # Delete stages and refinement jobs for all runs
+        blob_hashes = _run_blob_hashes(cursor, run_ids)
+        runs_deleted, stages_deleted = _delete_run_rows(cursor, run_ids)
         
         conn.commit()
         
         print(f"✅ Deleted {runs_deleted} runs and {stages_deleted} stages from database")
+        release_blobs(blob_hashes)
         
         # Delete files
         deleted_dirs = 0
         for run_id in run_ids:
             run_dir = RUNS_DIR / run_id
             if run_dir.exists():
+                remove_run_derivatives(run_dir)
                 shutil.rmtree(run_dir)
                 deleted_dirs += 1
         